@@ -0,0 +1,118 @@
+"""
+Benchmark of the memory of the games being played: bytes per active game with 10k games of 150 plies waiting for
+their next move, as run_game kept them before (a Board with its move stack, the embed of the board message and the
+legal moves of the ply) and as it keeps them now (a GameRecord, bot.game.record)
+
+Also measures the time to build the Board of the current position from a record (each time a move is parsed) and
+to replay a whole game (when the engine needs it), and checks that they match the Boards of the games.
+
+Usage: python -m benchmarks.active_games [--games 10000] [--plies 150] [--seed 1]
+"""
+import argparse
+import random
+import time
+import tracemalloc
+from typing import Callable, List
+
+import chess
+import discord
+
+from bot.game.board import Board
+from bot.game.moves import MoveIndex
+from bot.game.record import GameRecord
+
+DISTINCT_GAMES = 200  # random games that the active games play
+
+
+def random_games(count: int, plies: int, rng: random.Random) -> List[Board]:
+    """Games of random moves that last exactly `plies` plies and aren't over"""
+    games = []
+    while len(games) < count:
+        board = Board()
+        while len(board.move_stack) < plies:
+            moves = list(board.legal_moves)
+            if not moves:
+                break
+            board.push(rng.choice(moves))
+        if len(board.move_stack) == plies and not board.is_game_over():
+            games.append(board)
+    return games
+
+
+def embed() -> discord.Embed:
+    """The embed that the game kept for its board message"""
+    embed = discord.Embed(color=0x0473b3)
+    embed.set_image(url='attachment://board.png')
+    embed.add_field(name='Special words:', value='\n**`resign`**: resigns the game\n**`draw`**: offers/accepts draw')
+    embed.set_footer(text='Last move: Nf3 by white')
+    return embed
+
+
+def previous_game(moves: List[chess.Move]) -> tuple:
+    """What a game waiting for a move kept before: its Board, the board message's embed and the ply's legal moves"""
+    board = Board()
+    for move in moves:
+        board.push(move)
+    return board, embed(), MoveIndex(board)
+
+
+def record_game(moves: List[chess.Move]) -> GameRecord:
+    """What a game waiting for a move keeps now, recorded like run_game does"""
+    board, record = Board(), GameRecord()
+    for move in moves:
+        board.push(move)
+        record.push(board, move)
+    return record
+
+
+def traced(make: Callable, games: List[Board]) -> tuple:
+    """Bytes allocated by the objects of the games that are still alive, and the objects"""
+    tracemalloc.start()
+    kept = [make(game) for game in games]
+    size, _ = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return size, kept
+
+
+def timed(function: Callable, number: int) -> float:
+    start = time.perf_counter()
+    for _ in range(number):
+        function()
+    return (time.perf_counter() - start) / number
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--games', type=int, default=10000, help='active at the same time')
+    parser.add_argument('--plies', type=int, default=150, help='played in each game')
+    parser.add_argument('--seed', type=int, default=1)
+    args = parser.parse_args()
+    rng = random.Random(args.seed)
+
+    distinct = random_games(min(DISTINCT_GAMES, args.games), args.plies, rng)
+    for game in distinct:
+        # the record of a game played by run_game is the same as the one made out of its Board
+        record, made = record_game(game.move_stack), GameRecord(game)
+        assert (record.bitboards, record.moves, record.keys) == (made.bitboards, made.moves, made.keys)
+        board = record.board()
+        assert board.fen() == game.fen() and board.position_key == game.position_key, 'the position is not the same'
+        assert board.repetitions[board.position_key] == game.repetitions[game.position_key], 'repetitions differ'
+        assert record.replay().move_stack == game.move_stack, 'the replayed game is not the same'
+    games = [rng.choice(distinct) for _ in range(args.games)]
+
+    # each active game has objects of its own, its moves are played again
+    before, kept = traced(lambda game: previous_game(game.move_stack), games)
+    del kept
+    after, records = traced(lambda game: record_game(game.move_stack), games)
+    print(f'{args.games} active games of {args.plies} plies')
+    print(f'Board, embed and legal moves: {before / args.games:8.0f} bytes per game, {before / 2 ** 20:6.1f} MiB')
+    print(f'GameRecord:                   {after / args.games:8.0f} bytes per game, {after / 2 ** 20:6.1f} MiB '
+          f'({before / after:.0f}x less)')
+
+    record = records[0]
+    print(f'\nBoard of the position built in {timed(record.board, 10000) * 1e6:.1f} µs (each parsed move), '
+          f'whole game replayed in {timed(record.replay, 100) * 1000:.1f} ms (each engine move)')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,72 @@
+"""
+Benchmark of !analyze: wall time to analyze a 60-move game (121 positions) with 1, 2, 4 and 8 worker processes,
+with an empty evaluation cache and again once its positions are cached
+
+The speedup with more workers is bounded by the machine's CPU cores (printed first).
+
+Usage: python -m benchmarks.analysis [--depth 3] [--workers 1 2 4 8] [--plies 120] [--pgn game.pgn]
+"""
+import argparse
+import asyncio
+import os
+import random
+import time
+
+import chess.pgn
+
+from benchmarks.utils import LagMonitor, scripted_game
+from bot.game.analysis import Analyzer
+
+
+def game_moves(args):
+    if args.pgn:
+        with open(args.pgn) as f:
+            return [move.uci() for move in chess.pgn.read_game(f).mainline_moves()]
+    return [move.uci() for move in scripted_game(random.Random(args.seed), args.plies)]
+
+
+async def bench(args, workers: int, moves):
+    analyzer = Analyzer(workers=workers, depth=args.depth)
+    # starts the worker processes before measuring, without filling the cache
+    await asyncio.gather(*[
+        asyncio.get_event_loop().run_in_executor(analyzer.executor, time.sleep, 0.1) for _ in range(workers)
+    ])
+    monitor = LagMonitor()
+    task = asyncio.ensure_future(monitor.run())
+    start = time.perf_counter()
+    analysis = await analyzer.analyze(moves)
+    cold = time.perf_counter() - start
+    start = time.perf_counter()
+    await analyzer.analyze(moves)
+    warm = time.perf_counter() - start
+    task.cancel()
+    analyzer.close()
+    return cold, warm, monitor.max_lag, analysis
+
+
+async def run(args):
+    moves = game_moves(args)
+    print(f'{len(moves)} plies ({len(moves) + 1} positions) at depth {args.depth}, {os.cpu_count()} CPU cores')
+    baseline = None
+    for workers in args.workers:
+        cold, warm, lag, analysis = await bench(args, workers, moves)
+        baseline = baseline or cold
+        print(f'{workers} workers: {cold:7.2f} s cold ({baseline / cold:4.1f}x), {warm * 1000:7.2f} ms cached, '
+              f'max loop lag {lag * 1000:5.1f} ms')
+    print(f'Accuracy: white {analysis.accuracy(chess.WHITE):.1f}%, black {analysis.accuracy(chess.BLACK):.1f}%, '
+          f'{len(analysis.flagged())} moves flagged')
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--depth', type=int, default=3)
+    parser.add_argument('--workers', type=int, nargs='+', default=[1, 2, 4, 8])
+    parser.add_argument('--plies', type=int, default=120, help='of the random game, if no --pgn is given')
+    parser.add_argument('--pgn', help='PGN file of the game to analyze')
+    parser.add_argument('--seed', type=int, default=1)
+    args = parser.parse_args()
+    asyncio.get_event_loop().run_until_complete(run(args))
+
+
+if __name__ == '__main__':
+    main()
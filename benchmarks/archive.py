@@ -0,0 +1,113 @@
+"""
+Benchmark of the game archive: append throughput, size on disk, random lookups of games and of players'
+histories, reopening and exporting, with 10M archived games
+
+The games are random games of 20 to 120 plies (a pool of them is archived over and over, with their own ids and
+players), so the archive takes about 3.5 GB with the default 10M games.
+
+Usage: python -m benchmarks.archive [--games 10000000] [--players 100000] [--lookups 10000] [--directory DIR]
+"""
+import argparse
+import os
+import random
+import shutil
+import tempfile
+import time
+
+from benchmarks.utils import scripted_game
+from bot.game.archive import GameArchive, export, pgn_text
+
+POOL = 1000  # distinct games
+
+
+def percentile(timings, fraction: float) -> float:
+    return sorted(timings)[int(len(timings) * fraction)] * 1e6
+
+
+def random_pgns(rng: random.Random):
+    pgns = []
+    for number in range(POOL):
+        moves = [move.uci() for move in scripted_game(rng, rng.randint(20, 120))]
+        headers = {
+            'Event': 'ChessBot game', 'Site': 'Discord', 'Date': '2020.05.17', 'White': f'Player{number}',
+            'Black': f'Player{number + 1}', 'Result': rng.choice(['1-0', '0-1', '1/2-1/2']),
+            'GameId': str(number), 'GuildId': str(rng.getrandbits(60)), 'ChannelId': str(rng.getrandbits(60)),
+            'WhiteId': str(rng.getrandbits(60)), 'BlackId': str(rng.getrandbits(60)),
+            'Termination': rng.choice(['resignation', 'checkmate', 'draw agreed']),
+        }
+        pgns.append(pgn_text(headers, moves))
+    return pgns
+
+
+def directory_size(path: str) -> int:
+    return sum(os.path.getsize(os.path.join(path, name)) for name in os.listdir(path))
+
+
+def run(args, path: str):
+    rng = random.Random(args.seed)
+    pgns = random_pgns(rng)
+    players = [rng.getrandbits(60) for _ in range(args.players)]
+
+    archive = GameArchive(path)
+    raw = 0
+    start = last = time.perf_counter()
+    for game_id in range(1, args.games + 1):
+        pgn = pgns[game_id % POOL]
+        raw += len(pgn)
+        archive.append_pgn(game_id, (rng.choice(players), rng.choice(players)), pgn)
+        if game_id % 1_000_000 == 0:
+            now = time.perf_counter()
+            print(f'  {game_id:>10} games, {1_000_000 / (now - last):8.0f} games/s', flush=True)
+            last = now
+    elapsed = time.perf_counter() - start
+    archive.close()
+    size = directory_size(path)
+    print(f'Append:     {args.games / elapsed:8.0f} games/s, {size / 2 ** 20:.0f} MiB on disk '
+          f'({size / args.games:.0f} bytes per game, {raw / size:.1f}x smaller than the PGN text)')
+
+    start = time.perf_counter()
+    archive = GameArchive(path)
+    print(f'Reopen:     {(time.perf_counter() - start) * 1000:8.1f} ms ({len(archive.heads)} players)')
+
+    timings = []
+    for game_id in (rng.randint(1, args.games) for _ in range(args.lookups)):
+        start = time.perf_counter()
+        assert archive.read_pgn(game_id).startswith('[Event')
+        timings.append(time.perf_counter() - start)
+    print(f'!pgn:       p50 {percentile(timings, 0.5):8.1f} µs, p99 {percentile(timings, 0.99):8.1f} µs')
+
+    timings = []
+    for user_id in (rng.choice(players) for _ in range(args.lookups // 10)):
+        start = time.perf_counter()
+        archive.read_history(user_id, 10)
+        timings.append(time.perf_counter() - start)
+    print(f'!history:   p50 {percentile(timings, 0.5):8.1f} µs, p99 {percentile(timings, 0.99):8.1f} µs '
+          f'(10 games, {args.games * 2 // args.players} per player)')
+    archive.close()
+
+    start = time.perf_counter()
+    exported = 0
+    for exported, _ in enumerate(export(path), start=1):
+        if exported == min(args.games, 1_000_000):
+            break
+    print(f'Export:     {exported / (time.perf_counter() - start):8.0f} games/s')
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--games', type=int, default=10_000_000)
+    parser.add_argument('--players', type=int, default=100_000)
+    parser.add_argument('--lookups', type=int, default=10_000)
+    parser.add_argument('--directory', help='where the archive is written, a temporary folder if not given')
+    parser.add_argument('--seed', type=int, default=1)
+    args = parser.parse_args()
+
+    directory = tempfile.mkdtemp(prefix='archive-', dir=args.directory)
+    try:
+        run(args, directory)
+    finally:
+        shutil.rmtree(directory)
+
+
+if __name__ == '__main__':
+    main()
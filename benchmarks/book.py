@@ -0,0 +1,117 @@
+"""
+Benchmark of opening book lookups on a multi-million-entry Polyglot book
+
+Builds a small book from random games with bot.game.book (checking that every game's moves are found in it),
+then merges its entries with millions of random ones and measures lookups: raw binary searches on the key and
+legal book moves of real positions.
+
+Usage: python -m benchmarks.book [--entries 4000000] [--games 500] [--lookups 20000]
+"""
+import argparse
+import io
+import os
+import random
+import tempfile
+import time
+
+import chess
+import chess.pgn
+import chess.polyglot
+
+from bot.game.board import Board
+from bot.game.book import OpeningBook, build_book
+
+
+def random_games(count: int, plies: int, rng: random.Random):
+    for _ in range(count):
+        board = chess.Board()
+        for _ in range(plies):
+            moves = list(board.legal_moves)
+            if not moves:
+                break
+            board.push(rng.choice(moves[:4]))  # only a few moves per position, so that games share openings
+        game = chess.pgn.Game.from_board(board)
+        game.headers['Result'] = rng.choice(['1-0', '0-1', '1/2-1/2'])
+        yield chess.pgn.read_game(io.StringIO(str(game)))
+
+
+def current_rss() -> int:
+    """Resident memory of the process in bytes (Linux only, 0 elsewhere)"""
+    try:
+        with open('/proc/self/statm') as f:
+            return int(f.read().split()[1]) * os.sysconf('SC_PAGE_SIZE')
+    except OSError:
+        return 0
+
+
+def percentile(timings, fraction: float) -> float:
+    return sorted(timings)[int(len(timings) * fraction)] * 1e6
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--entries', type=int, default=4000000)
+    parser.add_argument('--games', type=int, default=500)
+    parser.add_argument('--lookups', type=int, default=20000)
+    parser.add_argument('--seed', type=int, default=1)
+    args = parser.parse_args()
+    rng = random.Random(args.seed)
+
+    with tempfile.TemporaryDirectory() as directory:
+        small_path, big_path = os.path.join(directory, 'small.bin'), os.path.join(directory, 'big.bin')
+        games = list(random_games(args.games, 16, rng))
+        start = time.perf_counter()
+        entries = build_book(games, small_path, plies=12)
+        print(f'Built a book of {entries} entries from {len(games)} games in {time.perf_counter() - start:.2f} s')
+
+        boards = []
+        book = OpeningBook(small_path)
+        for game in games:
+            board = Board()
+            for move in list(game.mainline_moves())[:12]:
+                if game.headers['Result'] != ('0-1' if board.turn == chess.WHITE else '1-0'):
+                    assert move in book.moves(board), f'{move} missing from the book'
+                boards.append(board.copy())
+                board.push(move)
+        real = list(book.reader)
+        book.close()
+
+        # the real entries (sorted) are merged into millions of random ones, keeping the book sorted by key
+        struct = chess.polyglot.ENTRY_STRUCT
+        filler = sorted(rng.getrandbits(64) for _ in range(max(0, args.entries - len(real))))
+        merged = sorted([(entry.key, entry.raw_move, entry.weight) for entry in real] + [(key, 0, 1) for key in filler])
+        with open(big_path, 'wb') as f:
+            f.write(b''.join(struct.pack(key, raw_move, weight, 0) for key, raw_move, weight in merged))
+        del filler, merged
+
+        rss = current_rss()
+        book = OpeningBook(big_path)
+        try:
+            keys = [rng.choice(boards).zobrist_hash() for _ in range(args.lookups // 2)]
+            keys += [rng.getrandbits(64) for _ in range(args.lookups // 2)]  # mostly missing positions
+            timings = []
+            for key in keys:
+                start = time.perf_counter()
+                list(book.reader.find_all(key))
+                timings.append(time.perf_counter() - start)
+            print(f'Book of {len(book)} entries ({os.path.getsize(big_path) / 2 ** 20:.0f} MiB)')
+            print(f'Key lookups:        mean {sum(timings) / len(timings) * 1e6:6.1f} us, '
+                  f'p50 {percentile(timings, 0.5):6.1f} us, p99 {percentile(timings, 0.99):6.1f} us')
+
+            timings = []
+            for _ in range(args.lookups):
+                board = rng.choice(boards)
+                start = time.perf_counter()
+                book.moves(board)
+                timings.append(time.perf_counter() - start)
+            print(f'Legal book moves:   mean {sum(timings) / len(timings) * 1e6:6.1f} us, '
+                  f'p50 {percentile(timings, 0.5):6.1f} us, p99 {percentile(timings, 0.99):6.1f} us')
+            growth = current_rss() - rss
+            print(f'RSS growth while using the book: {growth / 2 ** 20:.1f} MiB '
+                  f'(mapped pages of the file, shared with other processes)')
+        finally:
+            book.close()
+
+
+if __name__ == '__main__':
+    main()
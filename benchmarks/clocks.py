@@ -0,0 +1,189 @@
+"""
+Benchmark (and check) of the clocks and idle timeouts of games: 50k simulated games (10k at a time) wait for their
+players' moves like Chess.run_game does, with a clock and an idle timeout, while simulated players move, think too
+long (their flag falls) or leave the game (it is abandoned)
+
+The deadlines are timers of bot.game.clock.Scheduler (a single heap), or an asyncio.wait_for per wait with
+`--mode wait_for` (a task and a timer of the event loop for every move) to compare. Checks that the scheduler's heap
+stays bounded by the pending timers, and that every timer and the games' memory are released once they end
+
+Usage: python -m benchmarks.clocks [--games 50000] [--concurrent 10000] [--mode scheduler|wait_for]
+"""
+import argparse
+import asyncio
+import collections
+import gc
+import random
+import resource
+import sys
+import time
+
+import chess
+
+from bot.game.clock import Clock, Scheduler, Timer, TimeControl, earliest, next_message
+
+
+class Move:
+    """A player's message with a move"""
+    __slots__ = ('author', 'content')
+
+    def __init__(self, author: int, content: str):
+        self.author = author
+        self.content = content
+
+
+async def get_message(inbox: asyncio.Queue, check):
+    while True:
+        message = await inbox.get()
+        if check(message):
+            return message
+
+
+async def wait_for_message(inbox: asyncio.Queue, check, deadline: float):
+    """The alternative: a wait_for for each wait, which runs the wait in a task with a timer of its own"""
+    try:
+        return await asyncio.wait_for(get_message(inbox, check), deadline - asyncio.get_event_loop().time())
+    except asyncio.TimeoutError:
+        return None
+
+
+class Simulation:
+
+    def __init__(self, args):
+        self.args = args
+        self.rng = random.Random(args.seed)
+        self.time_control = TimeControl.parse(args.time_control)
+        self.scheduler = Scheduler()
+        self.results: collections.Counter = collections.Counter()
+        self.lateness = []  # how late timeouts were noticed, after their deadline
+        self.waits = 0
+        self.max_pending = self.max_heap = 0
+        self.max_blocks = sys.getallocatedblocks()
+
+    def think(self, style: str) -> float:
+        mean = self.args.think * (5 if style == 'slow' else 1)
+        return self.rng.expovariate(1 / mean)
+
+    async def wait(self, inbox: asyncio.Queue, check, deadline: float):
+        self.waits += 1
+        if self.args.mode == 'wait_for':
+            return await wait_for_message(inbox, check, deadline)
+        return await next_message(inbox, check, self.scheduler, deadline)
+
+    async def game(self):
+        """A game with its players, who are slow or leave the game at some point for some of them"""
+        loop = asyncio.get_event_loop()
+        inbox = asyncio.Queue()
+        roll = self.rng.random()
+        style = 'slow' if roll < self.args.slow else 'leaves' if roll < self.args.slow + self.args.leave else 'fast'
+        leaves_at = self.rng.randrange(self.args.plies) if style == 'leaves' else None
+        players = {chess.WHITE: 1, chess.BLACK: 2}
+        clock = Clock(self.time_control)
+        clock.start(loop.time())
+        for ply in range(self.args.plies):
+            player = players[clock.turn]
+            turn_started = loop.time()
+            move = None if ply == leaves_at else loop.call_later(
+                self.think(style), inbox.put_nowait, Move(player, 'e4')
+            )
+            deadline = earliest(turn_started + self.args.idle_timeout, clock.flag_time())
+            message = await self.wait(inbox, lambda m: m.author == player, deadline)
+            if message is None or clock.flagged(loop.time()):
+                if move:
+                    move.cancel()  # the player stops thinking once the game is over
+                self.lateness.append(loop.time() - deadline)
+                self.results['flag fall' if clock.flagged(loop.time()) else 'abandoned'] += 1
+                return
+            clock.press(loop.time())
+        self.results['played'] += 1
+
+    async def watch(self):
+        """Samples the scheduler's pending timers, the size of its heap and the memory blocks allocated"""
+        while True:
+            self.max_blocks = max(self.max_blocks, sys.getallocatedblocks())
+            self.max_pending = max(self.max_pending, len(self.scheduler))
+            self.max_heap = max(self.max_heap, self.scheduler.heap_size())
+            assert self.scheduler.heap_size() <= 2 * len(self.scheduler) + 1, 'cancelled timers pile up in the heap'
+            await asyncio.sleep(0.05)
+
+    async def run(self):
+        games = iter(range(self.args.games))
+
+        async def play():
+            for _ in games:  # a new game starts as soon as one ends, until every game was played
+                await self.game()
+
+        watcher = asyncio.ensure_future(self.watch())
+        await asyncio.gather(*[play() for _ in range(self.args.concurrent)])
+        watcher.cancel()
+
+
+def time_timers(count: int) -> tuple:
+    """Microseconds to schedule and cancel a timer (a move made in time), and to schedule and call one"""
+    loop = asyncio.get_event_loop()
+    scheduler = Scheduler()
+    now = loop.time()
+    start = time.perf_counter()
+    for number in range(count):
+        scheduler.schedule(now + 60 + number % 1000, print).cancel()
+    cancel = (time.perf_counter() - start) / count * 1e6
+    called = []
+    start = time.perf_counter()
+    for _ in range(count):
+        scheduler.schedule(now, called.append)
+    loop.run_until_complete(asyncio.sleep(0))
+    call = (time.perf_counter() - start) / count * 1e6
+    assert len(called) == count
+    return cancel, call
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--games', type=int, default=50_000)
+    parser.add_argument('--concurrent', type=int, default=10_000, help='games played at the same time')
+    parser.add_argument('--plies', type=int, default=16, help='of a game played to its end')
+    parser.add_argument('--time-control', default='0.2+0', help='minutes+seconds, 12 seconds each by default')
+    parser.add_argument('--think', type=float, default=0.5, help='mean seconds a player thinks about a move')
+    parser.add_argument('--slow', type=float, default=0.1, help='share of games whose players think 5x longer')
+    parser.add_argument('--leave', type=float, default=0.05, help='share of games abandoned by a player')
+    parser.add_argument('--idle-timeout', type=float, default=5, help='seconds')
+    parser.add_argument('--mode', choices=['scheduler', 'wait_for'], default='scheduler')
+    parser.add_argument('--seed', type=int, default=1)
+    args = parser.parse_args()
+    loop = asyncio.get_event_loop()
+
+    simulation = Simulation(args)
+    gc.collect()
+    blocks, rss = sys.getallocatedblocks(), resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    start, cpu = time.perf_counter(), time.process_time()
+    loop.run_until_complete(simulation.run())
+    elapsed, cpu = time.perf_counter() - start, time.process_time() - cpu
+    peak_rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss - rss  # KiB
+    lateness = sorted(simulation.lateness)
+    del simulation.lateness
+    gc.collect()
+    left = sys.getallocatedblocks() - blocks
+    leaked = collections.Counter(
+        type(o).__name__ for o in gc.get_objects() if isinstance(o, (asyncio.Queue, Clock, Timer, Move))
+    )
+
+    print(f'Games:    {args.games} in {elapsed:.1f} s ({args.mode}), {dict(simulation.results)}')
+    print(f'Waits:    {simulation.waits}, {cpu / simulation.waits * 1e6:.1f} µs of CPU each (with the simulation)')
+    if lateness:
+        print(f'Timeouts: noticed {lateness[len(lateness) // 2] * 1000:.1f} ms after their deadline (p50), '
+              f'{lateness[int(len(lateness) * 0.99)] * 1000:.1f} ms (p99)')
+    print(f'Memory:   peak RSS grew by {peak_rss / 2 ** 10:.1f} MiB ({peak_rss * 1024 / args.concurrent:.0f} B per '
+          f'concurrent game), {(simulation.max_blocks - blocks) / args.concurrent:.0f} blocks allocated per '
+          f'concurrent game at most, {left} blocks left at the end')
+    if args.mode == 'scheduler':
+        print(f'Timers:   {simulation.max_pending} pending at most, heap of {simulation.max_heap} entries at most, '
+              f'{simulation.scheduler.called} called')
+        assert len(simulation.scheduler) == 0 and simulation.scheduler.heap_size() == 0, 'timers left after the games'
+    cancel, call = time_timers(200_000)
+    print(f'Timers:   {cancel:.2f} µs to schedule and cancel one, {call:.2f} µs to schedule and call one')
+    assert sum(simulation.results.values()) == args.games
+    assert not leaked, f'objects of the games left once they ended: {dict(leaked)}'
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,158 @@
+"""
+Benchmark of commands per second with logging enabled, through the bot's real command processing (Bot.invoke:
+checks, argument parsing and the command) against in-memory fakes of Discord with --latency-ms per API call
+
+Compares the previous setup (every command showed that the bot was typing, an API call, and logged a line to a
+FileHandler on the event loop) with the current one (a log record put on the queue of bot.logs, no typing). Also
+times a log record on the event loop with each setup, and move events with and without sampling.
+
+Usage: python -m benchmarks.commands [--commands 5000] [--concurrency 50] [--latency-ms 20]
+"""
+import argparse
+import asyncio
+import datetime
+import glob
+import logging
+import os
+import tempfile
+import time
+
+from discord.ext import commands
+from discord.ext.commands.view import StringView
+
+from benchmarks.fakes import DISCORD_LIMITS, FakeChannel, FakeGuild, FakeHTTP, FakeMember
+from bot.bot_client import Bot
+from bot.logs import setup_logging
+
+UNLIMITED = dict.fromkeys(list(DISCORD_LIMITS) + ['typing'], (10 ** 9, 1.0))
+
+
+class FakeCommandContext(commands.Context):
+    """A command's context whose messages go to a benchmarks.fakes.FakeChannel"""
+
+    async def trigger_typing(self):
+        await self.channel.http.request('typing', self.channel.id)
+
+    async def send(self, content=None, **fields):
+        return await self.channel.send(content, **fields)
+
+
+async def previous_check(ctx: commands.Context, **kwargs):
+    """CommandErrorHandler.bot_check before the logging pipeline"""
+    await ctx.trigger_typing()
+    time = datetime.datetime.utcnow()
+    msg = f"'{ctx.command}' ran by '{ctx.author}' as '{ctx.invoked_with}' at {time}. with '{ctx.message.content}'"
+    logging.info(msg)
+    return True
+
+
+def configure(setup: str, path: str, sampling: dict = None):
+    """Logs to path like the bot did (a FileHandler) or does (bot.logs), returns the queue's listener if any"""
+    root = logging.getLogger()
+    for handler in root.handlers[:]:
+        root.removeHandler(handler)
+        handler.close()
+    if setup == 'previous':
+        handler = logging.FileHandler(filename=path, encoding='utf-8', mode='w')
+        handler.setFormatter(logging.Formatter('%(asctime)s:%(levelname)s:%(name)s: %(message)s'))
+        root.addHandler(handler)
+        root.setLevel(logging.INFO)
+        return None
+    return setup_logging(path, sampling=sampling)
+
+
+def make_bot(setup: str, directory: str) -> Bot:
+    bot = Bot({'prefix': '!', 'archive_path': os.path.join(directory, 'archive')})
+    if setup == 'previous':
+        bot.add_check(previous_check)
+    else:
+        bot.load_extension('bot.cogs.error_handler')
+
+    @bot.command()
+    async def ping(ctx: commands.Context, times: int = 1):
+        await ctx.send('pong' * times)
+
+    return bot
+
+
+async def run_commands(args, bot: Bot, http: FakeHTTP):
+    me = FakeMember('ChessBot', bot=True)
+    guild = FakeGuild(me)
+    channels = [FakeChannel(guild, http) for _ in range(args.concurrency)]
+    command = bot.get_command('ping')
+    latencies = []
+
+    async def user(channel: FakeChannel, count: int):
+        author = FakeMember('Player')
+        for _ in range(count):
+            message = channel.message_from(author, '!ping 2')
+            message._state = None  # commands.Context keeps the connection's state, there is none
+            view = StringView(message.content)
+            view.skip_string('!')
+            view.get_word()
+            ctx = FakeCommandContext(
+                prefix='!', view=view, bot=bot, message=message, invoked_with='ping', command=command
+            )
+            start = time.perf_counter()
+            await bot.invoke(ctx)
+            latencies.append(time.perf_counter() - start)
+
+    start = time.perf_counter()
+    per_user = args.commands // args.concurrency
+    await asyncio.gather(*[user(channel, per_user) for channel in channels])
+    elapsed = time.perf_counter() - start
+    latencies.sort()
+    return len(latencies) / elapsed, latencies[len(latencies) // 2], latencies[int(len(latencies) * 0.99)]
+
+
+def time_records(logger: logging.Logger, count: int, **extra) -> float:
+    """Microseconds of the calling thread's CPU time per record (the queue's thread writes them on its own time)"""
+    start = time.thread_time()
+    for number in range(count):
+        logger.info('Move %s in game %s', 'e2e4', number, extra=extra)
+    return (time.thread_time() - start) / count * 1e6
+
+
+def bench(args, setup: str, directory: str):
+    path = os.path.join(directory, f'{setup}.log')
+    listener = configure(setup, path)
+    bot = make_bot(setup, directory)
+    http = FakeHTTP(latency=args.latency_ms / 1000, limits=UNLIMITED)
+    speed, p50, p99 = bot.loop.run_until_complete(run_commands(args, bot, http))
+    calls = {route: count / args.commands for route, count in http.calls.items()}
+    record = time_records(logging.getLogger('bot.games'), args.records)
+    if listener:
+        listener.stop()
+    lines = 0
+    for name in glob.glob(f'{path}*'):  # with the rotated files
+        with open(name, encoding='utf-8') as f:
+            lines += sum(1 for _ in f)
+    print(f'{setup:9} {speed:8.0f} commands/s, p50 {p50 * 1000:6.1f} ms, p99 {p99 * 1000:6.1f} ms, '
+          f'API calls per command: {", ".join(f"{route} {count:.1f}" for route, count in sorted(calls.items()))}, '
+          f'{record:5.1f} µs of CPU per log record on the event loop ({lines} lines written)')
+    bot.archive.close()
+
+
+def bench_sampling(args, directory: str):
+    for rate in (1, 0.1, 0.01):
+        listener = configure('current', os.path.join(directory, f'sampled-{rate}.log'), {'move': rate})
+        cost = time_records(logging.getLogger('bot.games'), args.records, event='move', game_id=1, ply=1)
+        listener.stop()
+        print(f'Move events sampled at {rate:<4}: {cost:5.1f} µs of CPU each on the event loop')
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--commands', type=int, default=5000)
+    parser.add_argument('--concurrency', type=int, default=50, help='users sending commands at the same time')
+    parser.add_argument('--latency-ms', type=float, default=20, help='of each Discord API call')
+    parser.add_argument('--records', type=int, default=100_000, help='log records timed on the event loop')
+    args = parser.parse_args()
+    with tempfile.TemporaryDirectory() as directory:
+        for setup in ('previous', 'current'):
+            bench(args, setup, directory)
+        bench_sampling(args, directory)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,98 @@
+"""
+Benchmark of the database layer: event loop lag while hundreds of queries are in flight at the same time
+
+The same mix of queries (3 reads of a game's moves for each insert of a move) is run with --concurrency queries
+at a time, either on the event loop itself (like a cog calling peewee directly) or awaited through the repository
+(bot.orm.repository), whose threads use a pool of SQLite connections in WAL mode. With the repository the lag
+should stay flat as the concurrency grows.
+
+Usage: python -m benchmarks.database [--concurrency 100 300 500] [--operations 3000] [--workers 2]
+"""
+import argparse
+import asyncio
+import os
+import random
+import tempfile
+import time
+
+from playhouse.pool import PooledSqliteDatabase
+
+from benchmarks.utils import LagMonitor
+from bot.orm.models import ActiveGame, Game, Move, Rating
+from bot.orm.repository import Repository
+
+GAMES = 200
+PLIES = 60
+
+
+def setup_database(path: str) -> PooledSqliteDatabase:
+    database = PooledSqliteDatabase(
+        path, max_connections=32, timeout=10, check_same_thread=False,
+        pragmas={'journal_mode': 'wal', 'busy_timeout': 5000, 'synchronous': 'normal'}
+    )
+    database.bind([Game, Move, ActiveGame, Rating])
+    database.create_tables([Game, Move, ActiveGame, Rating])
+    with database.atomic():
+        for number in range(GAMES):
+            game = Game.create(guild_id=1, channel_id=number, white_id=2 * number, black_id=2 * number + 1)
+            Move.insert_many([{'game': game.id, 'ply': ply, 'uci': 'e2e4'} for ply in range(1, PLIES + 1)]).execute()
+    return database
+
+
+def queries(rng: random.Random, operations: int, next_ply: dict):
+    """(is it a write, query) of the benchmark's mix, in order"""
+    for number in range(operations):
+        game_id = rng.randrange(GAMES) + 1
+        if number % 4 == 0:
+            next_ply[game_id] = next_ply.get(game_id, PLIES) + 1
+            yield True, Move.insert(game=game_id, ply=next_ply[game_id], uci='e7e5')
+        else:
+            yield False, Move.select().where(Move.game == game_id).order_by(Move.ply)
+
+
+async def run(mode: str, repository: Repository, concurrency: int, operations: int, next_ply: dict):
+    async def on_loop(write, query):
+        return query.execute() if write else list(query)
+
+    async def awaited(write, query):
+        return await (repository.execute(query) if write else repository.fetch(query))
+
+    run_query = awaited if mode == 'repository' else on_loop
+    monitor = LagMonitor()
+    task = asyncio.ensure_future(monitor.run())
+    await asyncio.sleep(0.01)
+    batch = []
+    start = time.perf_counter()
+    for write, query in queries(random.Random(concurrency), operations, next_ply):
+        batch.append(run_query(write, query))
+        if len(batch) == concurrency:
+            await asyncio.gather(*batch)
+            batch = []
+    await asyncio.gather(*batch)
+    elapsed = time.perf_counter() - start
+    task.cancel()
+    print(f'{mode:10} {concurrency:5} at a time: {operations / elapsed:8.0f} queries/s, event loop lag '
+          f'p50 {monitor.percentile(0.5) * 1000:6.2f} ms, p99 {monitor.percentile(0.99) * 1000:6.2f} ms, '
+          f'max {monitor.max_lag * 1000:7.2f} ms')
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--concurrency', type=int, nargs='+', default=[100, 300, 500])
+    parser.add_argument('--operations', type=int, default=3000)
+    parser.add_argument('--workers', type=int, default=2, help='reading threads of the repository')
+    args = parser.parse_args()
+    loop = asyncio.get_event_loop()
+
+    with tempfile.TemporaryDirectory() as directory:
+        database = setup_database(os.path.join(directory, 'database.db'))
+        repository = Repository(database, workers=args.workers)
+        next_ply = {}
+        for mode in ('event loop', 'repository'):
+            for concurrency in args.concurrency:
+                loop.run_until_complete(run(mode, repository, concurrency, args.operations, next_ply))
+        repository.close()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,103 @@
+"""
+Micro-benchmark of draw detection after every move of 300-ply games: python-chess (which replays the move stack
+to find repetitions) against the incremental Zobrist hash of bot.game.board.Board
+
+Games are random, but often play back the move made two plies before, so that positions repeat. Before timing,
+every position is cross-checked against python-chess: Polyglot hash, repetitions and claimable draws.
+
+Usage: python -m benchmarks.draw_detection [--games 20] [--plies 300] [--seed 1]
+"""
+import argparse
+import random
+import time
+from typing import List
+
+import chess
+import chess.polyglot
+
+from bot.game.board import Board
+
+
+def legacy_is_drawn(board: chess.Board) -> bool:
+    """The check used before the incremental hash, which evaluates every condition"""
+    return any([
+        board.is_insufficient_material(), board.can_claim_threefold_repetition(),
+        board.can_claim_fifty_moves(), board.is_stalemate()
+    ])
+
+
+def repetitive_game(rng: random.Random, plies: int) -> List[chess.Move]:
+    board = chess.Board()
+    while len(board.move_stack) < plies and not board.is_game_over():
+        moves = list(board.generate_legal_moves())
+        if len(board.move_stack) >= 2 and rng.random() < 0.4:
+            previous = board.move_stack[-2]
+            back = chess.Move(previous.to_square, previous.from_square)
+            if back in moves:
+                board.push(back)
+                continue
+        board.push(rng.choice(moves))
+    return board.move_stack
+
+
+def cross_check(games: List[List[chess.Move]]) -> int:
+    """Checks every position against python-chess, returns how many draws by repetition were found"""
+    repetitions = 0
+    for moves in games:
+        board, reference = Board(), chess.Board()
+        for move in moves:
+            board.push(move)
+            reference.push(move)
+            assert board.zobrist_hash() == chess.polyglot.zobrist_hash(reference), reference.fen()
+            assert board.is_repetition(3) == reference.is_repetition(3), reference.fen()
+            assert board.can_claim_threefold_repetition() == reference.can_claim_threefold_repetition()
+            assert board.is_drawn() == any([
+                reference.is_repetition(3), reference.can_claim_fifty_moves(),
+                reference.is_insufficient_material(), reference.is_stalemate()
+            ]), reference.fen()
+            repetitions += board.is_repetition(3)
+        # popping every move must give back the hashes of the previous positions
+        copy = board.copy()
+        while copy.move_stack:
+            copy.pop()
+            reference.pop()
+            assert copy.zobrist_hash() == chess.polyglot.zobrist_hash(reference)
+        assert copy.repetitions == {copy.position_key: 1}
+    return repetitions
+
+
+def bench(board_class, is_drawn, games: List[List[chess.Move]]) -> float:
+    """Average time of pushing a move and checking for a draw, per ply"""
+    plies = 0
+    start = time.perf_counter()
+    for moves in games:
+        board = board_class()
+        for move in moves:
+            board.push(move)
+            is_drawn(board)
+            plies += 1
+    return (time.perf_counter() - start) / plies
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--games', type=int, default=20)
+    parser.add_argument('--plies', type=int, default=300)
+    parser.add_argument('--seed', type=int, default=1)
+    args = parser.parse_args()
+
+    rng = random.Random(args.seed)
+    games = [repetitive_game(rng, args.plies) for _ in range(args.games)]
+    repetitions = cross_check(games)
+    print(f'Cross-checked {sum(len(moves) for moves in games)} positions against python-chess '
+          f'({repetitions} threefold repetitions)')
+
+    old = bench(chess.Board, legacy_is_drawn, games)
+    new = bench(Board, Board.is_drawn, games)
+    print(f'python-chess (push + is_drawn): {old * 1e6:8.1f} us/ply')
+    print(f'Zobrist      (push + is_drawn): {new * 1e6:8.1f} us/ply')
+    print(f'Speedup: {old / new:.1f}x')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,75 @@
+"""
+Benchmark of the engine: nodes per second of the search, and how responsive the event loop stays while
+several searches run at the same time in the engine's process pool (compared with searching on the event loop)
+
+Usage: python -m benchmarks.engine [--depth 4] [--seconds 2] [--searches 4] [--workers 2]
+"""
+import argparse
+import asyncio
+import time
+
+import chess
+
+from benchmarks.utils import LagMonitor
+from bot.game import engine
+from bot.game.board import Board
+from bot.game.engine import Engine
+
+POSITIONS = [
+    chess.STARTING_FEN,
+    'r1bqkbnr/pppp1ppp/2n5/4p3/4P3/5N2/PPPP1PPP/RNBQKB1R w KQkq - 2 3',
+    'r1bq1rk1/pp2bppp/2n1pn2/3p4/2PP4/2N1PN2/PP3PPP/R2QKB1R w KQ - 0 8',
+    '2r3k1/pp3ppp/4p3/3n4/3P4/P4N2/1P3PPP/2R3K1 w - - 0 25',
+    '8/5pk1/6p1/3R4/7P/6P1/r4PK1/8 b - - 0 40',
+]
+
+
+async def responsiveness(args) -> None:
+    searches = [(Board(fen), {'seconds': args.seconds}) for fen in POSITIONS[:args.searches]]
+    pool = Engine(workers=args.workers, max_seconds=args.seconds)
+    await pool.best_move(Board(), depth=1)  # starts the worker processes before measuring
+
+    monitor = LagMonitor()
+    task = asyncio.ensure_future(monitor.run())
+    start = time.perf_counter()
+    await asyncio.gather(*[pool.best_move(board, **limit) for board, limit in searches])
+    elapsed = time.perf_counter() - start
+    task.cancel()
+    pool.close()
+    print(f'{len(searches)} searches in the process pool: {elapsed:.2f} s, '
+          f'max event loop lag {monitor.max_lag * 1000:.1f} ms')
+
+    monitor = LagMonitor()
+    task = asyncio.ensure_future(monitor.run())
+    await asyncio.sleep(0.01)
+    start = time.perf_counter()
+    engine.search(POSITIONS[0], [], seconds=args.seconds)  # what would happen without the pool
+    await asyncio.sleep(0.01)
+    task.cancel()
+    print(f'1 search on the event loop: {time.perf_counter() - start:.2f} s, '
+          f'max event loop lag {monitor.max_lag * 1000:.1f} ms')
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--depth', type=int, default=4)
+    parser.add_argument('--seconds', type=float, default=2.0)
+    parser.add_argument('--searches', type=int, default=4)
+    parser.add_argument('--workers', type=int, default=2)
+    args = parser.parse_args()
+
+    nodes = seconds = 0
+    for fen in POSITIONS:
+        engine.transpositions.clear()
+        result = engine.search(fen, [], depth=args.depth, seconds=600)
+        nodes += result.nodes
+        seconds += result.seconds
+        print(f'depth {result.depth}: {result.move:6} score {result.score:6} '
+              f'{result.nodes:8} nodes {result.nodes / result.seconds:8.0f} nodes/s')
+    print(f'Total: {nodes} nodes in {seconds:.2f} s, {nodes / seconds:.0f} nodes/s')
+
+    asyncio.get_event_loop().run_until_complete(responsiveness(args))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,118 @@
+"""
+Benchmark (and check) of the error aggregator: 10k unexpected errors from a few places in the code go through
+the command error handler while the owner's digests are sent, the number of messages sent to the owner must stay
+bounded by the number of digest intervals (it used to be one message per error, or up to three when they failed)
+
+Usage: python -m benchmarks.errors [--errors 10000] [--seconds 2] [--interval 0.25]
+"""
+import argparse
+import asyncio
+import math
+import random
+import time
+from types import SimpleNamespace
+
+import chess
+from discord.ext import commands
+
+from benchmarks.fakes import DISCORD_LIMITS, FakeChannel, FakeContext, FakeGuild, FakeHTTP, FakeMember
+from bot.cogs.error_handler import CommandErrorHandler
+from bot.errors import ErrorAggregator, send_digests
+from bot.game.archive import decompress
+
+# the players' channel isn't rate limited (the replies to 10k errors would take hours), the owner's messages are counted
+UNLIMITED = dict.fromkeys(DISCORD_LIMITS, (10 ** 9, 1.0))
+
+
+def index_error():
+    return [][1]
+
+
+def key_error():
+    return {}['missing']
+
+
+def zero_division():
+    return 1 / 0
+
+
+def attribute_error():
+    return None.missing
+
+
+def bad_move():
+    return chess.Move.from_uci('z9z9')
+
+
+def corrupt_game():
+    return decompress(b'not compressed')
+
+
+SITES = [index_error, key_error, zero_division, attribute_error, bad_move, corrupt_game]
+
+
+def raise_error(site) -> Exception:
+    try:
+        site()
+    except Exception as e:
+        return commands.CommandInvokeError(e)
+
+
+async def run(args):
+    me = FakeMember('ChessBot', bot=True)
+    channel = FakeChannel(FakeGuild(me), FakeHTTP(latency=0, limits=UNLIMITED))
+    owner_http = FakeHTTP(latency=0, limits=UNLIMITED)
+    owner = FakeChannel(FakeGuild(me), owner_http)  # the owner's private channel
+    bot = SimpleNamespace(settings={'prefix': '!'}, errors=ErrorAggregator(capacity=args.capacity))
+    handler = CommandErrorHandler(bot)
+
+    async def send(embed):
+        await owner.send(embed=embed)
+
+    digests = asyncio.ensure_future(send_digests(bot.errors, send, args.interval))
+    rng = random.Random(args.seed)
+    bursts = max(1, int(args.seconds * 100))  # errors come in bursts every 10 ms
+    per_burst = math.ceil(args.errors / bursts)
+    handled, handling = 0, 0.0
+    start = time.perf_counter()
+    while handled < args.errors:
+        for _ in range(min(per_burst, args.errors - handled)):
+            ctx = FakeContext(channel, FakeMember('Player'), '!play @Player bot')
+            ctx.command = None
+            error = raise_error(rng.choice(SITES))
+            mark = time.perf_counter()
+            await handler.on_command_error(ctx, error)
+            handling += time.perf_counter() - mark
+            handled += 1
+        await asyncio.sleep(0.01)
+    elapsed = time.perf_counter() - start
+    await asyncio.sleep(args.interval * 1.5)  # the last digest
+    digests.cancel()
+
+    messages = owner_http.calls['send']
+    bound = math.ceil((elapsed + args.interval * 1.5) / args.interval)
+    groups = bot.errors.recent()
+    print(f'Errors:       {handled} in {elapsed:.2f} s, {handling / handled * 1e6:.0f} µs each in the error handler')
+    print(f'Fingerprints: {len(groups)} ({bot.errors.dropped} dropped), '
+          f'{max(len(group.samples) for group in groups)} samples kept for each at most')
+    print(f'Owner:        {messages} messages (at most {bound} allowed, {handled} before), '
+          f'{channel.http.calls["send"]} replies to the players')
+    assert messages <= bound, f'{messages} messages sent to the owner, more than {bound}'
+    if not bot.errors.dropped:
+        assert sum(group.count for group in groups) == handled
+        assert all(not group.new for group in groups), 'errors left out of the digests'
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--errors', type=int, default=10_000)
+    parser.add_argument('--seconds', type=float, default=2, help='over which the errors happen')
+    parser.add_argument('--interval', type=float, default=0.25, help='between digests, in seconds')
+    parser.add_argument('--capacity', type=int, default=256, help='fingerprints kept by the aggregator')
+    parser.add_argument('--seed', type=int, default=1)
+    args = parser.parse_args()
+    asyncio.get_event_loop().run_until_complete(run(args))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,76 @@
+"""
+Benchmark of the NumPy batch evaluator: positions per second against the pure Python reference
+(bot.game.evaluation.evaluate) and the engine's material and piece-square evaluation, for several batch sizes
+
+Before timing, every term of the batch evaluation is checked against the reference for every position
+(and material against bot.game.engine.evaluate), the benchmark fails if any of them differ.
+
+Usage: python -m benchmarks.evaluation [--positions 100000] [--batches 1 64 1024 16384]
+"""
+import argparse
+import random
+import time
+
+from benchmarks.utils import scripted_game
+from bot.game import engine, evaluation
+from bot.game.board import Board
+
+
+def random_positions(rng: random.Random, count: int):
+    boards = []
+    while len(boards) < count:
+        board = Board()
+        for move in scripted_game(rng, rng.randint(1, 150)):
+            board.push(move)
+            if rng.random() < 0.2:
+                boards.append(board.copy(stack=False))
+    return boards[:count]
+
+
+def check_parity(boards):
+    terms = evaluation.batch_terms(evaluation.pack(boards)).tolist()
+    for board, batch in zip(boards, terms):
+        reference = evaluation.terms(board)
+        assert tuple(batch) == reference, f'{board.fen()}: {batch} != {reference}'
+        assert reference[0] == engine.evaluate(board), board.fen()
+    print(f'Parity:     the batch evaluation matches the reference for {len(boards)} positions')
+
+
+def rate(function, boards) -> float:
+    start = time.perf_counter()
+    function(boards)
+    return len(boards) / (time.perf_counter() - start)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--positions', type=int, default=100_000)
+    parser.add_argument('--batches', type=int, nargs='+', default=[1, 64, 1024, 16384])
+    parser.add_argument('--seed', type=int, default=1)
+    args = parser.parse_args()
+
+    boards = random_positions(random.Random(args.seed), args.positions)
+    check_parity(boards)
+
+    reference = rate(lambda batch: [evaluation.evaluate(board) for board in batch], boards)
+    print(f'Reference:  {reference:10.0f} positions/s (pure Python, one position at a time)')
+    print(f'Material:   {rate(lambda batch: [engine.evaluate(board) for board in batch], boards):10.0f} positions/s '
+          f'(bot.game.engine.evaluate, material and piece-square tables only)')
+    packed = evaluation.pack(boards)
+    print(f'Packing:    {rate(evaluation.pack, boards):10.0f} positions/s')
+    for size in args.batches:
+        batches = [boards[start:start + size] for start in range(0, len(boards), size)]
+        start = time.perf_counter()
+        for batch in batches:
+            evaluation.evaluate_batch(batch)
+        speed = len(boards) / (time.perf_counter() - start)
+        start = time.perf_counter()
+        for offset in range(0, len(boards), size):
+            evaluation.batch_terms(packed[offset:offset + size])
+        packed_speed = len(boards) / (time.perf_counter() - start)
+        print(f'Batch {size:>5}: {speed:10.0f} positions/s ({speed / reference:5.1f}x), '
+              f'{packed_speed:10.0f} positions/s already packed')
+
+
+if __name__ == '__main__':
+    main()
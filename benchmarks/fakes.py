@@ -0,0 +1,233 @@
+"""
+In-memory fakes of the discord.py objects the bot uses, so games can be played without connecting to Discord
+
+FakeHTTP stands for Discord's API: every call made by the fakes goes through it, which counts calls by route,
+adds latency and enforces per-channel rate limits like Discord does (a call over the limit gets a 429 response
+and is retried after the bucket resets, like discord.py does)
+"""
+import asyncio
+import collections
+import datetime
+import itertools
+import shutil
+import tempfile
+from types import SimpleNamespace
+from typing import Deque, Dict, List, Tuple
+
+from bot.game.archive import GameArchive
+from bot.game.book import OpeningBook
+from bot.game.clock import Scheduler
+from bot.game.router import GameRouter
+from bot.orm.store import GameStore
+from bot.sharding import process_name, shard_of
+
+ids = itertools.count(1)
+
+# Discord's limits of the message routes of each channel, and the global one of the bot, (calls, seconds)
+DISCORD_LIMITS = {'send': (5, 5.0), 'edit': (5, 5.0), 'delete': (5, 5.0), 'bulk_delete': (5, 5.0), 'global': (50, 1.0)}
+
+
+class FakeHTTP:
+
+    def __init__(self, latency: float = 0.01, limits: Dict[str, Tuple[int, float]] = None):
+        self.latency = latency
+        self.limits = limits or DISCORD_LIMITS
+        self.calls: collections.Counter = collections.Counter()  # by route
+        self.rate_limited: collections.Counter = collections.Counter()  # 429 responses, by route
+        self.windows: Dict[Tuple[str, int], Deque[float]] = collections.defaultdict(collections.deque)
+
+    def retry_after(self, key: Tuple[str, int], now: float) -> float:
+        """Seconds until the bucket resets, 0 if a call can be made (the call is counted)"""
+        calls, period = self.limits[key[0]]
+        window = self.windows[key]
+        while window and window[0] <= now - period:
+            window.popleft()
+        if len(window) < calls:
+            return 0
+        return window[0] + period - now
+
+    async def request(self, route: str, channel_id: int):
+        while True:
+            self.calls[route] += 1
+            now = asyncio.get_event_loop().time()
+            retry_after = max(self.retry_after((route, channel_id), now), self.retry_after(('global', 0), now))
+            if not retry_after:
+                self.windows[(route, channel_id)].append(now)
+                self.windows[('global', 0)].append(now)
+                await asyncio.sleep(self.latency)
+                return
+            self.rate_limited[route] += 1
+            await asyncio.sleep(self.latency + retry_after)  # retries after the bucket resets
+
+    def total(self) -> int:
+        return sum(self.calls.values())
+
+
+class FakeMember:
+
+    def __init__(self, name: str, bot: bool = False, member_id: int = None):
+        self.id = member_id or next(ids)
+        self.name = self.display_name = name
+        self.mention = f'<@{self.id}>'
+        self.bot = bot
+
+    def __eq__(self, other) -> bool:
+        return getattr(other, 'id', None) == self.id
+
+    def __hash__(self) -> int:
+        return self.id
+
+    def __str__(self) -> str:
+        return self.name
+
+
+class FakeMessage:
+
+    def __init__(self, channel: 'FakeChannel', author: FakeMember, content: str = '', **fields):
+        self.id = next(ids)
+        self.channel = channel
+        self.guild = channel.guild
+        self.author = author
+        self.content = content or ''
+        self.embed = fields.get('embed')
+        self.file = fields.get('file')
+        self.created_at = datetime.datetime.utcnow()
+
+    async def edit(self, **fields):
+        await self.channel.http.request('edit', self.channel.id)
+        self.content = fields.get('content', self.content)
+        self.embed = fields.get('embed', self.embed)
+
+    async def delete(self):
+        await self.channel.http.request('delete', self.channel.id)
+        self.channel.messages.pop(self.id, None)
+
+
+class FakeGuild:
+
+    def __init__(self, me: FakeMember, guild_id: int = None):
+        self.id = guild_id or next(ids)
+        self.me = me
+        self.members: Dict[int, FakeMember] = {me.id: me}
+        self.channels: Dict[int, 'FakeChannel'] = {}
+
+    def get_member(self, member_id: int) -> FakeMember:
+        return self.members.get(member_id)
+
+    async def fetch_member(self, member_id: int) -> FakeMember:
+        return self.members[member_id]
+
+    def get_channel(self, channel_id: int) -> 'FakeChannel':
+        return self.channels.get(channel_id)
+
+
+class FakeChannel:
+
+    def __init__(self, guild: FakeGuild, http: FakeHTTP, channel_id: int = None):
+        self.id = channel_id or next(ids)
+        self.guild = guild
+        self.http = http
+        self.messages: Dict[int, FakeMessage] = {}
+        self.new_board = asyncio.Event()  # set whenever a message with an attachment (a board) is sent
+        guild.channels[self.id] = self
+
+    async def send(self, content: str = None, **fields) -> FakeMessage:
+        await self.http.request('send', self.id)
+        message = FakeMessage(self, self.guild.me, content, **fields)
+        self.messages[message.id] = message
+        if message.file:
+            self.new_board.set()
+        return message
+
+    async def delete_messages(self, messages: List[FakeMessage]):
+        if len(messages) == 1:
+            return await messages[0].delete()  # like discord.py, which uses the normal route for one message
+        await self.http.request('bulk_delete', self.id)
+        for message in messages:
+            self.messages.pop(message.id, None)
+
+    def message_from(self, author: FakeMember, content: str) -> FakeMessage:
+        """A message that a member sent to the channel (received through the gateway, so it isn't an API call)"""
+        message = FakeMessage(self, author, content)
+        self.messages[message.id] = message
+        return message
+
+
+class FakeContext:
+    """The context of a command sent by `author` in `channel`"""
+
+    def __init__(self, channel: FakeChannel, author: FakeMember, content: str = ''):
+        self.channel = channel
+        self.guild = channel.guild
+        self.author = author
+        self.message = channel.message_from(author, content)
+
+    async def send(self, content: str = None, **fields) -> FakeMessage:
+        return await self.channel.send(content, **fields)
+
+
+class FakeGateway:
+    """
+    Stands for the gateway's event stream: members' messages are received by the bot like Bot.on_message does,
+    i.e. routed to the inbox of the game their author is playing in the channel
+    """
+
+    def __init__(self, bot: 'FakeBot'):
+        self.bot = bot
+        self.events = 0
+
+    def receive(self, channel: FakeChannel, author: FakeMember, content: str) -> FakeMessage:
+        message = channel.message_from(author, content)
+        self.events += 1
+        if not author.bot:
+            self.bot.router.route(message)
+        return message
+
+
+class FakeBot:
+    """
+    The parts of bot.bot_client.Bot that the cogs use. The bot is never ready, so games are not resumed.
+    Finished games are archived in a temporary folder, unless an archive is given
+    """
+
+    def __init__(
+        self, me: FakeMember, store: GameStore, updates, shard_ids: List[int] = None, shard_count: int = 1,
+        archive: GameArchive = None, settings: dict = None
+    ):
+        self.user = me
+        self.settings = settings or {}
+        self.store = store
+        self.updates = updates
+        self.router = GameRouter()
+        self.timers = Scheduler()
+        self.book = OpeningBook()
+        self.temporary_archive = None if archive else tempfile.mkdtemp(prefix='archive-')
+        self.archive = archive or GameArchive(self.temporary_archive)
+        self.shard_count = shard_count
+        self.process_name = process_name(shard_ids)
+        self.tasks: List[asyncio.Future] = []
+        self.loop = SimpleNamespace(create_task=self.create_task)
+        self.create_task(store.run())
+
+    def create_task(self, coroutine) -> asyncio.Future:
+        task = asyncio.ensure_future(coroutine)
+        self.tasks.append(task)
+        return task
+
+    async def wait_until_ready(self):
+        await asyncio.Event().wait()
+
+    def dispatch(self, event: str, *args):
+        pass  # no cog listens to the bot's events
+
+    def shard_of(self, guild_id: int) -> int:
+        return shard_of(guild_id, self.shard_count)
+
+    async def close(self):
+        await self.updates.flush()
+        await self.store.close()
+        self.archive.close()
+        if self.temporary_archive:
+            shutil.rmtree(self.temporary_archive)
+        for task in self.tasks:
+            task.cancel()
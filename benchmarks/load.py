@@ -0,0 +1,204 @@
+"""
+Offline load test: plays scripted PGN games through the Chess cog's !play against in-memory fakes of Discord
+
+Each game is started with Chess.play (skipping the command's checks and cooldown) in a channel of its own, then its
+players send the moves of a PGN game through the fake gateway, one at a time: a player sends a move once the board
+of the previous one was sent. Up to --concurrency games are played at the same time. No network access or token
+is needed: Discord's API is benchmarks.fakes.FakeHTTP, and the games are saved in a temporary SQLite database.
+
+Reports moves per second, the p50/p99 latency from a move being received to its board being sent, API calls per
+move and the process' peak RSS, as JSON (on stdout, or in --output) so that runs of different commits can be compared.
+
+Usage: python -m benchmarks.load [--games 200] [--concurrency 50] [--plies 60] [--pgn games.pgn] [--output load.json]
+                                 [--latency-ms 0] [--discord-limits]
+"""
+import argparse
+import asyncio
+import io
+import json
+import os
+import random
+import resource
+import subprocess
+import sys
+import tempfile
+import time
+from typing import Iterator, List, Optional
+
+import chess
+import chess.pgn
+
+from benchmarks.fakes import DISCORD_LIMITS, FakeBot, FakeChannel, FakeContext, FakeGateway, FakeGuild, FakeHTTP, \
+    FakeMember
+from benchmarks.persistence import use_database
+from benchmarks.utils import scripted_game
+from bot.cogs.chess import Chess
+from bot.game.board import Board
+from bot.game.updates import UpdateQueue
+from bot.orm.store import GameStore
+
+UNLIMITED = (10 ** 9, 1.0)
+
+
+def generated_pgn(rng: random.Random, games: int, plies: int) -> str:
+    """PGN text of random games of `plies` moves, which aren't over before their last move"""
+    exported = []
+    for _ in range(games):
+        board = Board()
+        for move in scripted_game(rng, plies):
+            board.push(move)
+        exported.append(str(chess.pgn.Game.from_board(board)))
+    return '\n\n'.join(exported)
+
+
+def read_pgn(text: str, games: int) -> Iterator[List[str]]:
+    """The moves (in SAN) of the first `games` games of the PGN text, starting over if it has fewer"""
+    scripts = []
+    pgn = io.StringIO(text)
+    while True:
+        game = chess.pgn.read_game(pgn)
+        if game is None:
+            break
+        board, moves = game.board(), []
+        for move in game.mainline_moves():
+            moves.append(board.san(move))
+            board.push(move)
+        if moves:
+            scripts.append(moves)
+    if not scripts:
+        raise ValueError('The PGN has no games')
+    for number in range(games):
+        yield scripts[number % len(scripts)]
+
+
+async def next_board(channel: FakeChannel, game: asyncio.Future) -> bool:
+    """Waits for the next board sent to the channel, False if the game ended instead"""
+    board = asyncio.ensure_future(channel.new_board.wait())
+    await asyncio.wait([board, game], return_when=asyncio.FIRST_COMPLETED)
+    if not board.done():
+        board.cancel()
+        return False
+    channel.new_board.clear()
+    return True
+
+
+async def play(cog: Chess, gateway: FakeGateway, channel: FakeChannel, moves: List[str], latencies: List[float]):
+    """Plays the moves in the channel, recording how long each one took to show up on the board"""
+    white, black = FakeMember('white'), FakeMember('black')
+    channel.guild.members.update({white.id: white, black.id: black})
+    game = asyncio.ensure_future(Chess.play.callback(cog, FakeContext(channel, white, '!play'), white, black))
+    if not await next_board(channel, game):
+        return await game
+    players = (white, black)
+    for ply, move in enumerate(moves):
+        start = time.perf_counter()
+        gateway.receive(channel, players[ply % 2], move)
+        if not await next_board(channel, game):
+            break  # e.g. a draw by repetition that the PGN played on
+        latencies.append(time.perf_counter() - start)
+    if not game.done():
+        gateway.receive(channel, white, 'resign')
+    await game
+
+
+def percentile(values: List[float], fraction: float) -> float:
+    values = sorted(values)
+    return values[min(len(values) - 1, int(len(values) * fraction))]
+
+
+def peak_rss() -> int:
+    """Peak resident memory of the process in bytes (ru_maxrss is in kilobytes on Linux, bytes on macOS)"""
+    rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return rss if sys.platform == 'darwin' else rss * 1024
+
+
+def commit() -> Optional[str]:
+    try:
+        return subprocess.check_output(['git', 'rev-parse', 'HEAD'], stderr=subprocess.DEVNULL).decode().strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+async def run(args, scripts: List[List[str]], database_path: str) -> dict:
+    if args.discord_limits:
+        limits, global_limit = DISCORD_LIMITS, DISCORD_LIMITS['global']
+    else:
+        limits = dict.fromkeys(DISCORD_LIMITS, UNLIMITED)
+        global_limit = UNLIMITED
+    http = FakeHTTP(latency=args.latency_ms / 1000, limits=limits)
+    me = FakeMember('ChessBot', bot=True)
+    database = use_database(database_path)
+    bot = FakeBot(me, GameStore(database=database), UpdateQueue(limits, global_limit))
+    cog = Chess(bot)
+    gateway = FakeGateway(bot)
+    guild = FakeGuild(me)
+    latencies: List[float] = []
+    slots = asyncio.Semaphore(args.concurrency)
+
+    async def play_game(moves: List[str]):
+        async with slots:
+            await play(cog, gateway, FakeChannel(guild, http), moves, latencies)
+
+    start = time.perf_counter()
+    await asyncio.gather(*(play_game(moves) for moves in scripts))
+    elapsed = time.perf_counter() - start
+    await bot.close()
+    database.close()
+
+    moves = len(latencies)
+    return {
+        'games': len(scripts),
+        'moves': moves,
+        'seconds': round(elapsed, 3),
+        'moves_per_second': round(moves / elapsed, 1),
+        'latency_ms': {
+            'p50': round(percentile(latencies, 0.5) * 1000, 3) if moves else None,
+            'p99': round(percentile(latencies, 0.99) * 1000, 3) if moves else None,
+        },
+        'api_calls_per_move': round(http.total() / moves, 3) if moves else None,
+        'api_calls': dict(http.calls),
+        'rate_limited': dict(http.rate_limited),
+        'peak_rss_bytes': peak_rss(),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--games', type=int, default=200)
+    parser.add_argument('--concurrency', type=int, default=50, help='games played at the same time')
+    parser.add_argument('--plies', type=int, default=60, help='length of the generated games (without --pgn)')
+    parser.add_argument('--pgn', help='PGN file of the games to play, generated at random if not given')
+    parser.add_argument('--latency-ms', type=float, default=0, help="latency of every call to Discord's API")
+    parser.add_argument('--discord-limits', action='store_true', help="enforces Discord's rate limits")
+    parser.add_argument('--seed', type=int, default=1)
+    parser.add_argument('--output', help='file the JSON results are written to, instead of stdout')
+    args = parser.parse_args()
+
+    if args.pgn:
+        with open(args.pgn) as f:
+            text = f.read()
+    else:
+        text = generated_pgn(random.Random(args.seed), min(args.games, 1000), args.plies)
+    scripts = list(read_pgn(text, args.games))
+
+    with tempfile.TemporaryDirectory() as directory:
+        results = asyncio.get_event_loop().run_until_complete(run(args, scripts, os.path.join(directory, 'load.db')))
+    report = {
+        'benchmark': 'load',
+        'commit': commit(),
+        'python': sys.version.split()[0],
+        'parameters': {
+            'games': args.games, 'concurrency': args.concurrency, 'pgn': args.pgn, 'plies': args.plies,
+            'latency_ms': args.latency_ms, 'discord_limits': args.discord_limits, 'seed': args.seed,
+        },
+        'results': results,
+    }
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(report, f, indent=2)
+    else:
+        print(json.dumps(report, indent=2))
+
+
+if __name__ == '__main__':
+    main()
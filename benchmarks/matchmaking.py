@@ -0,0 +1,128 @@
+"""
+Benchmark of the matchmaking of !seek (bot.game.matchmaking): pairing latency of new seeks with 1k, 10k and 100k seeks
+queued (in more guilds as the queue grows, 6 time controls each), against a list of the queued seeks scanned for the
+nearest opponent, then the cost of the passes that match the seeks whose windows widened while they waited
+
+Usage: python -m benchmarks.matchmaking [--sizes 1000 10000 100000] [--seeks 20000]
+"""
+import argparse
+import random
+import time
+from typing import List, Optional
+
+from bot.game.clock import TimeControl
+from bot.game.matchmaking import WIDENING, Matchmaker, Seek
+
+TIME_CONTROLS = [None] + [TimeControl.parse(text) for text in ('1+0', '3+2', '5+3', '10+0', '15+10')]
+SEEKS_PER_GUILD = 20  # queued seeks per guild, the number of guilds grows with the queue
+LINEAR_SEEKS = 200  # seeks timed with the scanned list, which is slow with a long queue
+
+
+class LinearMatchmaker:
+    """Every queued seek in a list, scanned for the nearest one whose window and the new seek's accept each other"""
+
+    def __init__(self, matchmaker: Matchmaker, seeks: List[Seek]):
+        self.matchmaker = matchmaker  # for the windows
+        self.seeks = list(seeks)
+
+    def add(self, seek: Seek, now: float) -> Optional[Seek]:
+        window = self.matchmaker.window(seek, now)
+        best, best_difference = None, None
+        for index, other in enumerate(self.seeks):
+            if other.guild_id != seek.guild_id or other.time_control != seek.time_control:
+                continue
+            difference = abs(other.rating - seek.rating)
+            if difference <= min(window, self.matchmaker.window(other, now)):
+                if best is None or difference < best_difference:
+                    best, best_difference = index, difference
+        if best is None:
+            self.seeks.append(seek)
+            return None
+        return self.seeks.pop(best)
+
+
+class Seeks:
+    """Random seeks: guild, time control and a rating around 1500"""
+
+    def __init__(self, rng: random.Random, guilds: int):
+        self.rng = rng
+        self.guilds = guilds
+        self.users = 0
+
+    def new(self, now: float) -> Seek:
+        self.users += 1
+        rating = min(max(self.rng.gauss(1500, 350), 100), 3000)
+        return Seek(
+            self.rng.randrange(self.guilds), self.users, 0, self.rng.choice(TIME_CONTROLS), rating, now
+        )
+
+
+def percentile(values: List[float], fraction: float) -> float:
+    values = sorted(values)
+    return values[min(len(values) - 1, int(len(values) * fraction))]
+
+
+def fill(size: int, seed: int):
+    """A matchmaker with `size` seeks queued, made at time 0"""
+    seeks = Seeks(random.Random(seed), max(1, size // SEEKS_PER_GUILD))
+    matchmaker = Matchmaker()
+    while len(matchmaker) < size:
+        matchmaker.add(seeks.new(0), 0)
+    return matchmaker, seeks
+
+
+def time_adds(matchmaker, seeks: Seeks, count: int, now: float):
+    latencies, matched = [], 0
+    for _ in range(count):
+        seek = seeks.new(now)
+        start = time.perf_counter()
+        opponent = matchmaker.add(seek, now)
+        latencies.append(time.perf_counter() - start)
+        matched += opponent is not None
+    return latencies, matched
+
+
+def bench_pairing(args):
+    print(f'{"queued":>8} {"guilds":>7}   {"buckets p50":>11} {"p99":>8} {"matched":>8}   {"list p50":>9} {"p99":>9}')
+    for size in args.sizes:
+        matchmaker, seeks = fill(size, args.seed)
+        queued = list(matchmaker._seeks.values())
+        latencies, matched = time_adds(matchmaker, seeks, args.seeks, 0)
+        linear = LinearMatchmaker(Matchmaker(), queued)
+        linear_latencies, _ = time_adds(linear, Seeks(random.Random(args.seed + 1), seeks.guilds), LINEAR_SEEKS, 0)
+        print(
+            f'{size:>8} {seeks.guilds:>7}   {percentile(latencies, 0.5) * 1e6:>8.1f} µs '
+            f'{percentile(latencies, 0.99) * 1e6:>5.1f} µs {matched / args.seeks:>7.0%}   '
+            f'{percentile(linear_latencies, 0.5) * 1e3:>6.2f} ms {percentile(linear_latencies, 0.99) * 1e3:>6.2f} ms'
+        )
+
+
+def bench_widening(args):
+    size = max(args.sizes)
+    matchmaker, _ = fill(size, args.seed)
+    print(f'\nWidening ({WIDENING} rating points per second), {len(matchmaker)} seeks all made at 0 s:')
+    for now in range(args.interval, args.seconds + 1, args.interval):
+        start = time.perf_counter()
+        pairs = matchmaker.widen(now)
+        elapsed = time.perf_counter() - start
+        for seek, other in pairs:
+            window = min(matchmaker.window(seek, now), matchmaker.window(other, now))
+            assert abs(seek.rating - other.rating) <= window + matchmaker.bucket_size, 'matched outside the window'
+        print(f'  {now:>3} s: {len(pairs):>6} pairs matched in {elapsed * 1000:6.1f} ms '
+              f'({elapsed / max(len(pairs), 1) * 1e6:4.1f} µs per pair), {len(matchmaker):>6} left')
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--sizes', type=int, nargs='+', default=[1_000, 10_000, 100_000], help='seeks queued')
+    parser.add_argument('--seeks', type=int, default=20_000, help='new seeks timed at each size')
+    parser.add_argument('--seconds', type=int, default=60, help='that the queued seeks wait, with --sizes largest')
+    parser.add_argument('--interval', type=int, default=5, help='seconds between widening passes')
+    parser.add_argument('--seed', type=int, default=1)
+    args = parser.parse_args()
+    bench_pairing(args)
+    bench_widening(args)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,98 @@
+"""
+Cost of recording the bot's metrics, checked against their budget (bot.metrics.RECORD_BUDGET per recording)
+
+Times counter increments and histogram observations the way the bot records them, the overhead that timing
+adds to parsing a move (the cheapest instrumented hot path), and exporting every metric in Prometheus' format.
+Exits with status 1 if recording goes over its budget.
+
+Usage: python -m benchmarks.metrics [--records 1000000] [--moves 20000]
+"""
+import argparse
+import itertools
+import random
+import sys
+import time
+import timeit
+
+from benchmarks.utils import scripted_game
+from bot.game.board import Board
+from bot.game.moves import MoveIndex
+from bot.metrics import RECORD_BUDGET, Counter, Histogram, Registry
+
+
+def per_call(statement, number: int) -> float:
+    """Best of 3 runs of the statement, in seconds per call"""
+    return min(timeit.repeat(statement, number=number, repeat=3)) / number
+
+
+def parse_overhead(moves: int) -> float:
+    """Seconds that timing and observing add to each move parsed"""
+    rng = random.Random(1)
+    positions = []
+    while len(positions) < moves:
+        board = Board()
+        for move in scripted_game(rng, 60):
+            positions.append((MoveIndex(board.copy(stack=False)), board.san(move)))
+            board.push(move)
+    positions = positions[:moves]
+    histogram = Histogram('parse_seconds', 'Parsing')
+    observe = histogram.observe
+
+    def plain():
+        for index, text in positions:
+            index.parse(text)
+
+    def timed():
+        for index, text in positions:
+            start = time.perf_counter()
+            index.parse(text)
+            observe(time.perf_counter() - start)
+
+    plain()  # fills the indexes' caches, so that both runs parse the same way
+    base = min(timeit.repeat(plain, number=1, repeat=3)) / moves
+    instrumented = min(timeit.repeat(timed, number=1, repeat=3)) / moves
+    print(f'parse a move:           {base * 1e6:7.2f} µs, {instrumented * 1e6:7.2f} µs timed '
+          f'(+{(instrumented - base) / base:.1%})')
+    return instrumented - base
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--records', type=int, default=1_000_000)
+    parser.add_argument('--moves', type=int, default=20_000)
+    args = parser.parse_args()
+
+    registry = Registry()
+    counter = registry.register(Counter('calls_total', 'Calls'))
+    routes = registry.register(Counter('routes_total', 'Calls by route', labels=('method', 'route')))
+    latency = registry.register(Histogram('latency_seconds', 'Latency'))
+    commands = registry.register(Histogram('command_seconds', 'Commands', labels=('command', 'status')))
+    rng = random.Random(1)
+    values = [rng.lognormvariate(-7, 2) for _ in range(1024)]  # latencies from about 10 µs to 50 ms
+    value = itertools.cycle(values).__next__
+    message_route = ('POST', '/channels/{channel_id}/messages')
+
+    costs = {
+        'counter increment': per_call(counter.inc, args.records),
+        'labelled increment': per_call(lambda: routes.labels(*message_route).inc(), args.records),
+        'histogram observation': per_call(lambda: latency.observe(value()), args.records),
+        'labelled observation': per_call(lambda: commands.labels('play', 'ok').observe(value()), args.records),
+    }
+    for name, cost in costs.items():
+        print(f'{name + ":":23} {cost * 1e6:7.2f} µs')
+    timed_parse = parse_overhead(args.moves)
+
+    for index in range(100):  # a busy bot's worth of label combinations
+        commands.labels(f'command{index % 20}', 'ok' if index % 3 else 'error').observe(values[index])
+    exposition = per_call(registry.render, 100)
+    print(f'export every metric:    {exposition * 1e3:7.2f} ms ({len(registry.render().splitlines())} lines)')
+
+    worst = max(list(costs.values()) + [timed_parse])
+    print(f'budget: {RECORD_BUDGET * 1e6:.2f} µs per recording, worst: {worst * 1e6:.2f} µs')
+    if worst > RECORD_BUDGET:
+        print('over budget')
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
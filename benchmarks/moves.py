@@ -0,0 +1,106 @@
+"""
+Benchmark of parsing the players' messages: python-chess's push_san (what every message used to go through)
+compared with the lexical check and the per-ply legal move index, for valid moves, invalid moves and chat messages
+
+The legal moves to each square are generated once per ply, so messages are parsed again to time the cached index.
+Chat messages are rejected by the lexical check alone, without generating moves or any API calls (they used to
+go through push_san, then edit the board message and delete theirs)
+
+Usage: python -m benchmarks.moves [--positions 200] [--messages 5]
+"""
+import argparse
+import random
+import time
+
+import chess
+
+from bot.game.board import Board
+from bot.game.moves import MoveIndex
+
+CHATTER = [
+    'hello', 'good luck!', 'nice move', 'hmm', 'lol', 'brb', 'wait what', 'gg', 'let me think',
+    'oops', 'are you there?', 'ok', 'this is going to be a long game', 'wow', ':)',
+]
+
+
+def random_positions(count: int, rng: random.Random):
+    positions = []
+    while len(positions) < count:
+        board = Board()
+        for _ in range(rng.randrange(4, 80)):
+            moves = list(board.legal_moves)
+            if not moves or board.is_game_over():
+                break
+            board.push(rng.choice(moves))
+        if not board.is_game_over():
+            positions.append(board)
+    return positions
+
+
+def inputs(board: chess.Board, kind: str, count: int, rng: random.Random):
+    moves = list(board.legal_moves)
+    texts = []
+    for _ in range(count):
+        if kind == 'valid':
+            move = rng.choice(moves)
+            texts.append(rng.choice([board.san(move), move.uci(), board.lan(move), board.san(move).lower()]))
+        elif kind == 'invalid':
+            # well formed moves which aren't legal in the position
+            move = chess.Move(rng.randrange(64), rng.randrange(64))
+            while move in moves or move.from_square == move.to_square:
+                move = chess.Move(rng.randrange(64), rng.randrange(64))
+            texts.append(rng.choice([move.uci(), f'Q{chess.square_name(move.to_square)}']))
+        else:
+            texts.append(rng.choice(CHATTER))
+    return texts
+
+
+def push_san(board: chess.Board, text: str):
+    try:
+        board.push_san(text)
+    except ValueError:
+        return None
+    return board.pop()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--positions', type=int, default=200)
+    parser.add_argument('--messages', type=int, default=5, help='messages parsed in each position')
+    parser.add_argument('--seed', type=int, default=1)
+    args = parser.parse_args()
+    rng = random.Random(args.seed)
+    positions = random_positions(args.positions, rng)
+
+    for kind in ('valid', 'invalid', 'chatter'):
+        cases = [(board, inputs(board, kind, args.messages, rng)) for board in positions]
+        total = sum(len(texts) for _, texts in cases)
+
+        start = time.perf_counter()
+        expected = [[push_san(board, text) for text in texts] for board, texts in cases]
+        old = time.perf_counter() - start
+
+        indexes = [MoveIndex(board) for board in positions]
+        start = time.perf_counter()
+        parsed = [[index.parse(text) for text in texts] for index, (_, texts) in zip(indexes, cases)]
+        new = time.perf_counter() - start
+        start = time.perf_counter()
+        for index, (_, texts) in zip(indexes, cases):
+            for text in texts:
+                index.parse(text)  # again, with the legal moves already generated
+        cached = time.perf_counter() - start
+
+        for (board, texts), old_moves, new_moves in zip(cases, expected, parsed):
+            for text, old_move, new_move in zip(texts, old_moves, new_moves):
+                if old_move is not None or kind != 'valid':
+                    assert old_move == new_move, f'{text} in {board.fen()}: {old_move} != {new_move}'
+                else:
+                    assert new_move is not None, f'{text} in {board.fen()}'  # lenient notation push_san rejects
+
+        print(f'{kind:8} push_san: {total / old:8.0f}/s   move index: {total / new:8.0f}/s ({old / new:4.1f}x), '
+              f'cached: {total / cached:8.0f}/s ({old / cached:5.1f}x)   API calls per message before: '
+              f'{0 if kind == "valid" else 2}, after: {2 if kind == "invalid" else 0}')
+
+
+if __name__ == '__main__':
+    main()
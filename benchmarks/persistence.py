@@ -0,0 +1,157 @@
+"""
+Benchmark of game persistence: move write throughput and event loop lag of the write-behind store, compared with
+writing every move on its own on the event loop, plus a crash test
+
+The crash test plays games in a child process, kills it (SIGKILL) in the middle of the games and then checks
+that the boards rebuilt from the database match the games up to their last saved move.
+
+Usage: python -m benchmarks.persistence [--games 100] [--plies 100] [--batch-size 20] [--flush-ms 250]
+"""
+import argparse
+import asyncio
+import os
+import random
+import signal
+import subprocess
+import sys
+import tempfile
+import time
+from typing import List
+
+import chess
+import peewee
+
+from bot.orm.models import ActiveGame, Game, Move, Rating
+from benchmarks.utils import LagMonitor
+from bot.orm.store import GameStore
+
+
+def use_database(path: str) -> peewee.SqliteDatabase:
+    database = peewee.SqliteDatabase(path, pragmas={'journal_mode': 'wal', 'busy_timeout': 5000})
+    database.bind([Game, Move, ActiveGame, Rating])
+    database.create_tables([Game, Move, ActiveGame, Rating])
+    return database
+
+
+def random_game(seed: int, plies: int) -> List[chess.Move]:
+    """Moves of a random game, which is the same every time for the same seed"""
+    rng = random.Random(seed)
+    board = chess.Board()
+    for _ in range(plies):
+        moves = list(board.legal_moves)
+        if not moves:
+            break
+        board.push(rng.choice(moves))
+    return board.move_stack
+
+
+async def play_games(store: GameStore, game_moves: List[List[chess.Move]], delay: float = 0.0, report: bool = False):
+    """Plays the games concurrently, saving every move to the store"""
+    async def play(seed: int):
+        game = await store.create_game(1, 1, 2 * seed, 2 * seed + 1)
+        for ply, move in enumerate(game_moves[seed], start=1):
+            store.add_move(game.id, ply, move.uci())
+            if report:
+                print(f'{game.id} {ply}', flush=True)
+            await asyncio.sleep(delay)
+
+    await asyncio.gather(*[play(seed) for seed in range(len(game_moves))])
+
+
+async def bench_store(args) -> None:
+    game_moves = [random_game(seed, args.plies) for seed in range(args.games)]
+    store = GameStore(batch_size=args.batch_size, flush_interval=args.flush_ms / 1000)
+    monitor = LagMonitor()
+    tasks = [asyncio.ensure_future(store.run()), asyncio.ensure_future(monitor.run())]
+    start = time.perf_counter()
+    await play_games(store, game_moves)
+    await store.close()
+    elapsed = time.perf_counter() - start
+    tasks[1].cancel()
+    moves = Move.select().count()
+    print(f'Write-behind store:  {moves / elapsed:10.0f} moves/s, max event loop lag {monitor.max_lag * 1000:.1f} ms')
+
+
+async def bench_direct(args) -> None:
+    """Every move is inserted as soon as it is played, on the event loop (no batching, no thread)"""
+    game_moves = [random_game(seed, args.plies) for seed in range(args.games)]
+    monitor = LagMonitor()
+    task = asyncio.ensure_future(monitor.run())
+    start = time.perf_counter()
+    count = 0
+    for seed in range(args.games):
+        game = Game.create(guild_id=1, channel_id=1, white_id=2 * seed, black_id=2 * seed + 1)
+        for ply, move in enumerate(game_moves[seed], start=1):
+            Move.create(game=game, ply=ply, uci=move.uci())
+            count += 1
+            if count % 50 == 0:
+                await asyncio.sleep(0)
+    elapsed = time.perf_counter() - start
+    task.cancel()
+    print(f'Direct inserts:      {count / elapsed:10.0f} moves/s, max event loop lag {monitor.max_lag * 1000:.1f} ms')
+
+
+def crash_test(args) -> None:
+    with tempfile.TemporaryDirectory() as directory:
+        path = os.path.join(directory, 'crash.db')
+        child = subprocess.Popen(
+            [sys.executable, '-m', 'benchmarks.persistence', '--child', path, '--games', str(args.games),
+             '--plies', str(args.plies), '--batch-size', str(args.batch_size), '--flush-ms', str(args.flush_ms)],
+            stdout=subprocess.PIPE, universal_newlines=True
+        )
+        played = 0
+        for _ in child.stdout:
+            played += 1
+            if played == args.games * args.plies // 2:
+                break
+        child.send_signal(signal.SIGKILL)
+        child.wait()
+
+        use_database(path)
+        store = GameStore()
+        games = asyncio.get_event_loop().run_until_complete(store.active_games())
+        saved = 0
+        for game, moves in games:
+            seed = game.white_id // 2
+            expected = chess.Board()
+            for move in random_game(seed, args.plies)[:len(moves)]:
+                expected.push(move)
+            resumed = chess.Board()
+            for uci in moves:
+                resumed.push_uci(uci)
+            assert resumed.fen() == expected.fen(), f'game {game.id} does not match after {len(moves)} moves'
+            saved += len(moves)
+        print(f'Crash test:          killed after {played} moves, {saved} saved, '
+              f'{len(games)} games resumed with matching boards')
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--games', type=int, default=100)
+    parser.add_argument('--plies', type=int, default=100)
+    parser.add_argument('--batch-size', type=int, default=20)
+    parser.add_argument('--flush-ms', type=int, default=250)
+    parser.add_argument('--child', help=argparse.SUPPRESS)
+    args = parser.parse_args()
+    loop = asyncio.get_event_loop()
+
+    if args.child:
+        # runs inside the process that gets killed by the crash test
+        use_database(args.child)
+        store = GameStore(batch_size=args.batch_size, flush_interval=args.flush_ms / 1000)
+        loop.create_task(store.run())
+        game_moves = [random_game(seed, args.plies) for seed in range(args.games)]
+        loop.run_until_complete(play_games(store, game_moves, delay=0.001, report=True))
+        loop.run_until_complete(asyncio.sleep(3600))  # waits to be killed
+        return
+
+    with tempfile.TemporaryDirectory() as directory:
+        use_database(os.path.join(directory, 'store.db'))
+        loop.run_until_complete(bench_store(args))
+        use_database(os.path.join(directory, 'direct.db'))
+        loop.run_until_complete(bench_direct(args))
+    crash_test(args)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,171 @@
+"""
+Benchmark of the puzzle store of !puzzle (bot.game.puzzles) with a 3M-puzzle set: import time, latency of random
+picks by rating (and by theme), and the memory of processes that use it, against reading the set into memory
+
+Puzzles are made of a few thousand random positions, each with a random solution of legal moves, with ratings
+and themes drawn like Lichess' (a few common themes, many rare ones). Checks that picked puzzles are in the rating
+window and have the theme asked for, and that their solutions are legal.
+
+Usage: python -m benchmarks.puzzles [--puzzles 3000000] [--picks 20000] [--processes 4] [--path puzzles]
+"""
+import argparse
+import multiprocessing
+import os
+import random
+import tempfile
+import time
+from typing import Dict, Iterator, List
+
+import chess
+
+from bot.game.puzzles import BUCKET_SIZE, PICK_WINDOW, PuzzleStore, import_puzzles
+
+THEMES = (
+    ['short', 'middlegame', 'crushing', 'advantage', 'endgame', 'mate', 'mateIn2', 'fork', 'long', 'mateIn1']
+    + [f'theme{number}' for number in range(50)]
+)
+THEME_WEIGHTS = [1 / (rank + 1) for rank in range(len(THEMES))]
+
+
+def positions(count: int, rng: random.Random) -> List[tuple]:
+    """(FEN, moves) of random positions, the moves being legal from the position"""
+    found = []
+    while len(found) < count:
+        board = chess.Board()
+        for _ in range(rng.randrange(10, 60)):
+            moves = list(board.legal_moves)
+            if not moves:
+                break
+            board.push(rng.choice(moves))
+        fen, moves = board.fen(), []
+        for _ in range(rng.choice([2, 2, 4, 4, 6, 8])):
+            legal = list(board.legal_moves)
+            if not legal:
+                break
+            moves.append(rng.choice(legal))
+            board.push(moves[-1])
+        if len(moves) >= 2:
+            found.append((fen, ' '.join(move.uci() for move in moves)))
+    return found
+
+
+def rows(count: int, pool: List[tuple], rng: random.Random) -> Iterator[Dict[str, str]]:
+    """Rows like the ones of Lichess' puzzle database"""
+    for number in range(count):
+        fen, moves = rng.choice(pool)
+        rating = int(min(max(rng.gauss(1500, 450), 400), 3300))
+        themes = set(rng.choices(THEMES, THEME_WEIGHTS, k=rng.randrange(1, 5)))
+        yield {
+            'PuzzleId': f'{number:05x}', 'FEN': fen, 'Moves': moves, 'Rating': str(rating),
+            'RatingDeviation': str(rng.randrange(70, 100)), 'Themes': ' '.join(themes)
+        }
+
+
+def memory() -> Dict[str, int]:
+    """Resident memory of the process in KiB: anonymous (its own) and of files (shared with other processes)"""
+    fields = {}
+    with open('/proc/self/status') as f:
+        for line in f:
+            name, _, value = line.partition(':')
+            if name in ('VmRSS', 'RssAnon', 'RssFile'):
+                fields[name] = int(value.split()[0])
+    return fields
+
+
+def percentile(timings: List[float], fraction: float) -> float:
+    return sorted(timings)[int(len(timings) * fraction)] * 1e6
+
+
+def time_picks(store: PuzzleStore, picks: int, themes: List[str], rng: random.Random) -> List[float]:
+    timings = []
+    for _ in range(picks):
+        rating, theme = rng.uniform(300, 3400), rng.choice(themes)
+        start = time.perf_counter()
+        puzzle = store.pick(rating, theme, rng)
+        timings.append(time.perf_counter() - start)
+        assert theme is None or theme in puzzle.themes, f'{puzzle.id} is not a {theme} puzzle'
+        if 400 + PICK_WINDOW <= rating <= 3300 - PICK_WINDOW and theme in (None, 'short'):
+            assert abs(puzzle.rating - rating) <= PICK_WINDOW + BUCKET_SIZE, f'{puzzle.rating} picked for {rating}'
+    return timings
+
+
+def shard(path: str, picks: int, seed: int, results: multiprocessing.Queue):
+    """A process of the bot: opens the store and picks puzzles, reports its memory before and after"""
+    before = memory()
+    store = PuzzleStore(path)
+    time_picks(store, picks, [None, 'fork', 'theme40'], random.Random(seed))
+    results.put((before, memory()))
+    store.close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--puzzles', type=int, default=3_000_000)
+    parser.add_argument('--positions', type=int, default=5000, help='random positions the puzzles are made of')
+    parser.add_argument('--picks', type=int, default=20000, help='timed for each kind of pick')
+    parser.add_argument('--processes', type=int, default=4, help='that use the store at the same time')
+    parser.add_argument('--path', help='folder of the imported set, imported there if it has none (kept)')
+    parser.add_argument('--seed', type=int, default=1)
+    args = parser.parse_args()
+    rng = random.Random(args.seed)
+
+    with tempfile.TemporaryDirectory() as directory:
+        path = args.path or directory
+        if not os.path.exists(os.path.join(path, 'puzzles.json')):
+            pool = positions(args.positions, rng)
+            start = time.perf_counter()
+            imported, _ = import_puzzles(rows(args.puzzles, pool, rng), path)
+            elapsed = time.perf_counter() - start
+            print(f'Made and imported {imported} puzzles in {elapsed:.1f} s ({elapsed / imported * 1e6:.1f} µs each)')
+        size = os.path.getsize(os.path.join(path, 'puzzles.dat'))
+        index = os.path.getsize(os.path.join(path, 'themes.idx'))
+
+        before = memory()
+        start = time.perf_counter()
+        store = PuzzleStore(path)
+        opened = time.perf_counter() - start
+        print(f'Store of {len(store)} puzzles, {len(store.themes)} themes: {size / 2 ** 20:.0f} MiB of records, '
+              f'{index / 2 ** 20:.0f} MiB of theme index, opened in {opened * 1000:.1f} ms')
+
+        for name, themes in (
+            ('by rating', [None]), ('common theme', ['short', 'middlegame', 'fork']), ('rare theme', ['theme45'])
+        ):
+            timings = time_picks(store, args.picks, themes, rng)
+            print(f'Pick {name:<13} mean {sum(timings) / len(timings) * 1e6:5.1f} µs, '
+                  f'p50 {percentile(timings, 0.5):5.1f} µs, p99 {percentile(timings, 0.99):5.1f} µs')
+        for _ in range(100):
+            puzzle = store.pick(rng.uniform(400, 3300))
+            board = puzzle.board()
+            for move in puzzle.moves:
+                assert board.is_legal(move), f'{move} of puzzle {puzzle.id} is not legal'
+                board.push(move)
+        after = memory()
+        print(f'Memory of this process: +{(after["RssAnon"] - before["RssAnon"]) / 1024:.1f} MiB of its own, '
+              f'+{(after["RssFile"] - before["RssFile"]) / 1024:.1f} MiB of mapped pages (shared)')
+        store.close()
+
+        results = multiprocessing.Queue()
+        processes = [
+            multiprocessing.Process(target=shard, args=(path, args.picks, args.seed + number, results))
+            for number in range(args.processes)
+        ]
+        for process in processes:
+            process.start()
+        reports = [results.get() for _ in processes]
+        for process in processes:
+            process.join()
+        own = max(after['RssAnon'] - before['RssAnon'] for before, after in reports) / 1024
+        mapped = max(after['RssFile'] - before['RssFile'] for before, after in reports) / 1024
+        print(f'{args.processes} processes picking {args.picks} puzzles each: +{own:.1f} MiB of their own at most, '
+              f'+{mapped:.1f} MiB of shared pages at most')
+
+        before = memory()
+        with open(os.path.join(path, 'puzzles.dat'), 'rb') as f:
+            data = f.read()
+        loaded = (memory()['RssAnon'] - before['RssAnon']) / 1024
+        print(f'Reading the records into memory instead: +{loaded:.0f} MiB of its own in each process')
+        del data
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,117 @@
+"""
+Benchmark of the ratings with 1M rated players: Glicko-2 updates, and the leaderboard kept in order in memory
+
+Times rating a game, building the leaderboard, moving players in it as their ratings change, finding ranks and
+reading pages. The same pages and ranks are then read from SQLite (LIMIT/OFFSET and COUNT on the indexed rating
+column), which is what every !leaderboard and !rating would cost without the in-memory leaderboard.
+
+Usage: python -m benchmarks.ratings [--players 1000000] [--updates 100000] [--queries 1000] [--skip-database]
+"""
+import argparse
+import os
+import random
+import tempfile
+import time
+import timeit
+
+import peewee
+
+from benchmarks.book import current_rss
+from bot.game.ratings import PAGE_SIZE, Leaderboard, rate
+from bot.orm.models import Rating
+
+GUILD_ID = 1
+
+
+def bench_memory(args, ratings):
+    rng = random.Random(args.seed + 1)
+    rss = current_rss()
+    start = time.perf_counter()
+    leaderboard = Leaderboard(ratings)
+    print(f'Build:       {time.perf_counter() - start:8.2f} s for {len(leaderboard)} players, '
+          f'{(current_rss() - rss) / 2 ** 20:.0f} MiB')
+
+    updates = [(rng.randrange(args.players), rng.gauss(1500, 300)) for _ in range(args.updates)]
+    start = time.perf_counter()
+    for user_id, rating in updates:
+        leaderboard.update(user_id, rating)
+    print(f'Update:      {(time.perf_counter() - start) / args.updates * 1e6:8.2f} µs per rating change')
+
+    users = [rng.randrange(args.players) for _ in range(args.queries)]
+    start = time.perf_counter()
+    for user_id in users:
+        leaderboard.rank(user_id)
+    print(f'Rank:        {(time.perf_counter() - start) / args.queries * 1e6:8.2f} µs')
+
+    pages = leaderboard.pages()
+    for name, page in (('first', 1), ('middle', pages // 2), ('last', pages)):
+        cost = min(timeit.repeat(lambda: leaderboard.page(page), number=args.queries, repeat=3)) / args.queries
+        print(f'Page {name + ":":7} {cost * 1e6:8.2f} µs (page {page})')
+    return leaderboard
+
+
+def bench_database(args, ratings, directory: str):
+    rng = random.Random(args.seed + 2)
+    database = peewee.SqliteDatabase(os.path.join(directory, 'ratings.db'), pragmas={'journal_mode': 'wal'})
+    database.bind([Rating])
+    database.create_tables([Rating])
+    with database.atomic():
+        rows = [
+            {'guild_id': GUILD_ID, 'user_id': user_id, 'rating': rating, 'deviation': 50, 'volatility': 0.06}
+            for user_id, rating in ratings
+        ]
+        for start in range(0, len(rows), 10000):
+            Rating.insert_many(rows[start:start + 10000]).execute()
+
+    start = time.perf_counter()
+    query = (
+        Rating.select(Rating.user_id, Rating.rating).where(Rating.guild_id == GUILD_ID)
+        .order_by(Rating.rating.desc(), Rating.user_id).tuples()
+    )
+    Leaderboard(query.iterator())
+    print(f'Load:        {time.perf_counter() - start:8.2f} s to read the leaderboard in index order')
+
+    queries = max(1, args.queries // 20)
+    users = [rng.randrange(args.players) for _ in range(queries)]
+    start = time.perf_counter()
+    for user_id in users:
+        rating = Rating.get((Rating.guild_id == GUILD_ID) & (Rating.user_id == user_id)).rating
+        Rating.select().where((Rating.guild_id == GUILD_ID) & (Rating.rating > rating)).count()
+    print(f'Rank:        {(time.perf_counter() - start) / queries * 1e6:8.0f} µs (COUNT in SQLite)')
+
+    pages = -(-args.players // PAGE_SIZE)
+    for name, page in (('first', 1), ('middle', pages // 2), ('last', pages)):
+        start = time.perf_counter()
+        for _ in range(queries):
+            list(
+                Rating.select(Rating.user_id, Rating.rating).where(Rating.guild_id == GUILD_ID)
+                .order_by(Rating.rating.desc(), Rating.user_id).paginate(page, PAGE_SIZE).tuples()
+            )
+        print(f'Page {name + ":":7} {(time.perf_counter() - start) / queries * 1e6:8.0f} µs (LIMIT/OFFSET in SQLite)')
+    database.close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--players', type=int, default=1_000_000)
+    parser.add_argument('--updates', type=int, default=100_000)
+    parser.add_argument('--queries', type=int, default=1000)
+    parser.add_argument('--skip-database', action='store_true')
+    parser.add_argument('--seed', type=int, default=1)
+    args = parser.parse_args()
+
+    cost = min(timeit.repeat(lambda: rate((1500, 200, 0.06), (1400, 30, 0.06), 1), number=10000, repeat=3)) / 10000
+    print(f'Glicko-2:    {cost * 1e6:8.2f} µs to rate a player after a game')
+
+    rng = random.Random(args.seed)
+    ratings = [(user_id, rng.gauss(1500, 300)) for user_id in range(args.players)]
+    print('In memory:')
+    bench_memory(args, ratings)
+    if not args.skip_database:
+        print('SQLite:')
+        with tempfile.TemporaryDirectory() as directory:
+            bench_database(args, ratings, directory)
+
+
+if __name__ == '__main__':
+    main()
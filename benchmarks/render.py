@@ -0,0 +1,76 @@
+"""
+Benchmark of the board renderer: renders per second with and without the image cache, plus the cache hit rate
+
+Simulates games that share a handful of openings, where some moves are illegal retries (the same position is
+rendered again) and each position is shown from the point of view of the player to move.
+
+Usage: python -m benchmarks.render [--games 100] [--plies 60] [--seed 1]
+"""
+import argparse
+import random
+import time
+
+import chess
+
+from bot.game.render import BoardRenderer
+
+OPENINGS = [
+    ['e4', 'e5', 'Nf3', 'Nc6', 'Bb5'],
+    ['e4', 'c5', 'Nf3', 'd6', 'd4'],
+    ['d4', 'd5', 'c4', 'e6', 'Nc3'],
+    ['d4', 'Nf6', 'c4', 'g6', 'Nc3'],
+    ['c4', 'e5', 'Nc3', 'Nf6', 'g3'],
+]
+
+
+def simulated_boards(games: int, plies: int, seed: int):
+    """Yields the board after every ply (and after every illegal move retry) of randomly played games"""
+    rng = random.Random(seed)
+    for _ in range(games):
+        board = chess.Board()
+        for san in rng.choice(OPENINGS):
+            board.push_san(san)
+            yield board
+        for _ in range(plies):
+            moves = list(board.legal_moves)
+            if not moves:
+                break
+            board.push(rng.choice(moves))
+            yield board
+            if rng.random() < 0.1:  # illegal move: the same board is shown again
+                yield board
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--games', type=int, default=100)
+    parser.add_argument('--plies', type=int, default=60)
+    parser.add_argument('--seed', type=int, default=1)
+    args = parser.parse_args()
+
+    boards = [board.copy(stack=1) for board in simulated_boards(args.games, args.plies, args.seed)]
+    keys = [BoardRenderer.render_options(board, flipped=board.turn == chess.BLACK) for board in boards]
+
+    renderer = BoardRenderer()
+    renderer.sprite(chess.Piece.from_symbol('P'))  # fonts and sprites are loaded once per renderer
+    sample = keys[:500]
+    start = time.perf_counter()
+    for key in sample:
+        renderer.draw(*key)
+    uncached = len(sample) / (time.perf_counter() - start)
+
+    renderer = BoardRenderer()
+    start = time.perf_counter()
+    for board in boards:
+        renderer.render(board, flipped=board.turn == chess.BLACK)
+    elapsed = time.perf_counter() - start
+    renders = renderer.hits + renderer.misses
+
+    print(f'Positions rendered:      {renders}')
+    print(f'Uncached renders/s:      {uncached:.1f}')
+    print(f'Cached renders/s:        {renders / elapsed:.1f}')
+    print(f'Cache hit rate:          {renderer.hit_rate:.1%}')
+
+
+if __name__ == '__main__':
+    main()
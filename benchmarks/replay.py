@@ -0,0 +1,120 @@
+"""
+Benchmark of the GIF replays of !replay (bot.game.replay): encode time and size of 40, 100 and 300 ply games, against
+drawing and quantizing every frame as a whole and letting Pillow encode them, then the time to read a cached replay
+
+Checks that every frame of a replay shows the same board as the whole board drawn by BoardRenderer.
+
+Usage: python -m benchmarks.replay [--plies 40 100 300] [--repeat 5] [--seed 1]
+"""
+import argparse
+import io
+import random
+import statistics
+import tempfile
+import time
+
+import chess
+import chess.pgn
+from PIL import Image, ImageChops
+
+from bot.game.render import BoardRenderer
+from bot.game.replay import (
+    CAPTION_HEIGHT, FIRST_FRAME_MS, FRAME_MS, LAST_FRAME_MS, ReplayCache, ReplayEncoder, move_caption
+)
+
+
+def random_game(plies: int, rng: random.Random) -> chess.pgn.Game:
+    """A game of random moves that lasts exactly `plies` plies (games that end sooner are played again)"""
+    while True:
+        board = chess.Board()
+        while len(board.move_stack) < plies and not board.is_game_over():
+            board.push(rng.choice(list(board.legal_moves)))
+        if len(board.move_stack) == plies:
+            game = chess.pgn.Game.from_board(board)
+            game.headers.update(White='Alice', Black='Bob', Result='1/2-1/2', Termination='draw agreed')
+            return game
+
+
+def encode_whole_frames(encoder: ReplayEncoder, game: chess.pgn.Game, flipped: bool) -> bytes:
+    """The previous way: every frame put together whole (like BoardRenderer.draw), quantized and encoded by Pillow"""
+    renderer = encoder.renderer
+    size = renderer.square_size
+    board = game.board()
+    moves = list(game.mainline_moves())
+    frames = []
+    texts = [f'{game.headers["White"]} vs {game.headers["Black"]}']
+    for ply, move in enumerate(moves, 1):
+        texts.append(move_caption(ply, board.san(move)))
+        board.push(move)
+    board = game.board()
+    for ply, text in enumerate(texts):
+        if ply:
+            board.push(moves[ply - 1])
+        frame = Image.new('RGB', (size * 8, size * 8 + CAPTION_HEIGHT))
+        frame.paste(renderer.compose(*renderer.render_options(board, flipped)), (0, 0))
+        frame.paste(encoder.caption(text).convert('RGB'), (0, size * 8))
+        frames.append(frame.quantize(palette=renderer.palette(), dither=Image.NONE))
+    buffer = io.BytesIO()
+    durations = [FIRST_FRAME_MS] + [FRAME_MS] * (len(moves) - 1) + [LAST_FRAME_MS]
+    frames[0].save(buffer, 'GIF', save_all=True, append_images=frames[1:], duration=durations, loop=0)
+    return buffer.getvalue()
+
+
+def check_frames(gif: bytes, game: chess.pgn.Game, flipped: bool):
+    """Every frame of the replay has the board drawn by BoardRenderer after each ply"""
+    renderer = BoardRenderer()
+    image = Image.open(io.BytesIO(gif))
+    board = game.board()
+    moves = list(game.mainline_moves())
+    assert image.n_frames == len(moves) + 1, f'{image.n_frames} frames for {len(moves)} plies'
+    for frame in range(image.n_frames):
+        if frame:
+            board.push(moves[frame - 1])
+        image.seek(frame)
+        shown = image.convert('RGB').crop((0, 0, renderer.square_size * 8, renderer.square_size * 8))
+        drawn = Image.open(io.BytesIO(renderer.draw(*renderer.render_options(board, flipped)))).convert('RGB')
+        assert ImageChops.difference(shown, drawn).getbbox() is None, f'frame {frame} is not the board after it'
+
+
+def timed(function, repeat: int):
+    times, result = [], None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = function()
+        times.append(time.perf_counter() - start)
+    return statistics.median(times), result
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--plies', type=int, nargs='+', default=[40, 100, 300])
+    parser.add_argument('--repeat', type=int, default=5, help='encodes of each game, the median time is shown')
+    parser.add_argument('--seed', type=int, default=1)
+    args = parser.parse_args()
+    rng = random.Random(args.seed)
+
+    encoder = ReplayEncoder()
+    encoder.encode(random_game(10, rng))  # draws the tiles and palette, which every replay after shares
+    print(f'{"plies":>5}   {"incremental":>11} {"size":>9} {"per ply":>8}   {"whole frames":>12} {"size":>9}   speedup')
+    for plies in args.plies:
+        game = random_game(plies, rng)
+        for flipped in (False, True):
+            incremental, gif = timed(lambda: encoder.encode(game, flipped), args.repeat)
+            whole, whole_gif = timed(lambda: encode_whole_frames(encoder, game, flipped), args.repeat)
+            check_frames(gif, game, flipped)
+            print(
+                f'{plies:>5}{"f" if flipped else " "}  {incremental * 1000:>8.1f} ms {len(gif) / 1024:>6.0f} KiB '
+                f'{incremental / (plies + 1) * 1000:>5.2f} ms   {whole * 1000:>9.1f} ms '
+                f'{len(whole_gif) / 1024:>6.0f} KiB   {whole / incremental:>6.1f}x'
+            )
+
+    with tempfile.TemporaryDirectory() as path:
+        cache = ReplayCache(path)
+        cache.put(1, False, gif)
+        cached, data = timed(lambda: cache.get(1, False), 100)
+        assert data == gif
+        print(f'\nCached replay ({len(gif) / 1024:.0f} KiB) read in {cached * 1e6:.0f} µs')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,90 @@
+"""
+Load test of the game router: cost of handling one message as the number of concurrent games grows
+
+Compares the router with the old approach, where every game waited with `bot.wait_for('message', check=...)`
+and discord.py ran the check of every waiting game on every message. Half of the messages are moves sent by
+players and half are unrelated chatter.
+
+Usage: python -m benchmarks.router [--messages 20000] [--games 10 100 1000 10000]
+"""
+import argparse
+import asyncio
+import random
+import time
+from types import SimpleNamespace
+
+from bot.game.router import GameRouter
+
+CHANNELS_PER_GUILD = 5
+
+
+def fake_message(guild_id: int, channel_id: int, author_id: int, content: str) -> SimpleNamespace:
+    return SimpleNamespace(
+        guild=SimpleNamespace(id=guild_id), channel=SimpleNamespace(id=channel_id),
+        author=SimpleNamespace(id=author_id), content=content
+    )
+
+
+def make_messages(games: int, count: int, rng: random.Random):
+    """Messages of players of random games, mixed with messages of users that are not playing"""
+    messages = []
+    for _ in range(count):
+        game = rng.randrange(games)
+        guild_id, channel_id = game // CHANNELS_PER_GUILD, game % CHANNELS_PER_GUILD
+        if rng.random() < 0.5:
+            messages.append(fake_message(guild_id, channel_id, 2 * game + rng.randrange(2), 'e4'))
+        else:
+            messages.append(fake_message(guild_id, channel_id, 10 ** 9 + rng.randrange(10 ** 6), 'hello'))
+    return messages
+
+
+def bench_router(games: int, messages: list) -> float:
+    router = GameRouter()
+    inboxes = [
+        router.open(game // CHANNELS_PER_GUILD, game % CHANNELS_PER_GUILD, (2 * game, 2 * game + 1))
+        for game in range(games)
+    ]
+    start = time.perf_counter()
+    for message in messages:
+        router.route(message)
+    elapsed = time.perf_counter() - start
+    assert sum(inbox.qsize() for inbox in inboxes) > 0
+    return elapsed / len(messages)
+
+
+def bench_wait_for(games: int, messages: list) -> float:
+    """Emulates `Client.dispatch`, which calls the check of every pending `wait_for` listener"""
+    listeners = []
+    for game in range(games):
+        def check(message, white_id=2 * game, channel_id=game % CHANNELS_PER_GUILD):
+            return message.author.id == white_id and message.channel.id == channel_id
+        listeners.append(check)
+    start = time.perf_counter()
+    for message in messages:
+        for check in listeners:
+            if check(message):
+                pass
+    return (time.perf_counter() - start) / len(messages)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--messages', type=int, default=20000)
+    parser.add_argument('--games', type=int, nargs='+', default=[10, 100, 1000, 10000])
+    parser.add_argument('--seed', type=int, default=1)
+    args = parser.parse_args()
+
+    asyncio.set_event_loop(asyncio.new_event_loop())  # inboxes are asyncio queues
+    rng = random.Random(args.seed)
+    print(f'{"games":>8} {"router (us/msg)":>16} {"wait_for (us/msg)":>18}')
+    for games in args.games:
+        messages = make_messages(games, args.messages, rng)
+        # the old approach gets very slow with many games, so it only runs over part of the messages
+        legacy_messages = messages[:max(100, args.messages * 10 // games)]
+        router_cost = bench_router(games, messages)
+        legacy_cost = bench_wait_for(games, legacy_messages)
+        print(f'{games:>8} {router_cost * 1e6:>16.3f} {legacy_cost * 1e6:>18.3f}')
+
+
+if __name__ == '__main__':
+    main()
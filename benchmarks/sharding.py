@@ -0,0 +1,171 @@
+"""
+Fake-gateway harness of the multi-process mode: how many moves per second the bot handles with 1, 2, 4... processes
+
+A fake gateway sends each process the events of its own shards (games starting and the players' moves), which
+the processes play with the Chess cog against in-memory fakes of Discord (benchmarks.fakes). Every process uses
+the same SQLite database, and once every move was played the games are looked up in the shared registry to check
+that each one is found, owned by the process of its guild's shard.
+
+Usage: python -m benchmarks.sharding [--processes 1 2 4] [--shards 8] [--games 32] [--plies 40]
+"""
+import argparse
+import asyncio
+import multiprocessing
+import os
+import random
+import tempfile
+import time
+from typing import Dict, List
+
+from benchmarks.fakes import FakeBot, FakeChannel, FakeGuild, FakeHTTP, FakeMember
+from benchmarks.persistence import use_database
+from benchmarks.utils import scripted_game
+from bot.cogs.chess import Chess
+from bot.game.board import Board
+from bot.game.updates import UpdateQueue
+from bot.orm.models import ActiveGame
+from bot.orm.store import GameStore
+from bot.sharding import process_name, shard_of, shard_ranges
+
+BOT_ID = 1
+UNLIMITED = (10 ** 9, 1.0)  # rate limits aren't what is measured here
+
+
+class CountingChess(Chess):
+    """Chess cog that lets the harness know when every board it expects was sent"""
+
+    def __init__(self, bot):
+        super().__init__(bot)
+        self.boards = 0
+        self.expected = None
+        self.done = asyncio.Event()
+
+    async def send_board(self, *args, **kwargs):
+        message = await super().send_board(*args, **kwargs)
+        self.boards += 1
+        if self.boards == self.expected:
+            self.done.set()
+        return message
+
+
+async def serve(shard_ids: List[int], shard_count: int, database_path: str, events, results):
+    limits = {'send': UNLIMITED, 'edit': UNLIMITED, 'delete': UNLIMITED, 'bulk_delete': UNLIMITED, 'global': UNLIMITED}
+    http = FakeHTTP(latency=0, limits=limits)
+    me = FakeMember('ChessBot', bot=True, member_id=BOT_ID)
+    database = use_database(database_path)
+    bot = FakeBot(me, GameStore(database=database), UpdateQueue(limits, UNLIMITED), shard_ids, shard_count)
+    cog = CountingChess(bot)
+    guilds: Dict[int, FakeGuild] = {}
+    loop = asyncio.get_event_loop()
+    results.put(('ready', bot.process_name))
+
+    start = None
+    while True:
+        batch = await loop.run_in_executor(None, events.get)  # the process' connection to the gateway
+        if batch is None:
+            break
+        start = start or time.perf_counter()
+        for event in batch:
+            kind, guild_id, channel_id = event[:3]
+            guild = guilds.setdefault(guild_id, FakeGuild(me, guild_id))
+            channel = guild.get_channel(channel_id) or FakeChannel(guild, http, channel_id)
+            if kind == 'start':
+                white, black = (guild.members.setdefault(i, FakeMember(str(i), member_id=i)) for i in event[3:])
+                game = await bot.store.create_game(guild_id, channel_id, white.id, black.id)
+                bot.create_task(cog.start_game(channel, white, black, game, Board()))
+                await asyncio.sleep(0)  # lets the game open its inbox before its moves arrive
+            elif kind == 'message':
+                bot.router.route(channel.message_from(guild.members[event[3]], event[4]))
+            elif kind == 'expect':
+                cog.expected = event[3]
+                if cog.boards >= cog.expected:
+                    cog.done.set()
+                await cog.done.wait()
+                await bot.store.flush()
+                results.put(('idle', bot.process_name, cog.boards, time.perf_counter() - start))
+    await bot.close()
+    database.close()
+    results.put(('closed', bot.process_name))
+
+
+def worker(shard_ids: List[int], shard_count: int, database_path: str, events, results):
+    asyncio.get_event_loop().run_until_complete(serve(shard_ids, shard_count, database_path, events, results))
+
+
+def run(processes: int, args, database_path: str) -> float:
+    context = multiprocessing.get_context('spawn')
+    results = context.Queue()
+    ranges = shard_ranges(args.shards, processes)
+    queues = [context.Queue() for _ in ranges]
+    workers = [
+        context.Process(target=worker, args=(shard_ids, args.shards, database_path, queue, results))
+        for shard_ids, queue in zip(ranges, queues)
+    ]
+    for process in workers:
+        process.start()
+    for _ in workers:
+        assert results.get()[0] == 'ready'
+
+    rng = random.Random(args.seed)
+    owner = {shard_id: index for index, shard_ids in enumerate(ranges) for shard_id in shard_ids}
+    batches: List[List[tuple]] = [[] for _ in ranges]
+    resigns: List[List[tuple]] = [[] for _ in ranges]
+    expected = [0] * len(ranges)
+    games = {}
+    for number in range(args.games):
+        guild_id = (number << 22) | 1  # a guild on shard `number % shards`
+        channel_id, white_id, black_id = guild_id + 1, 2 * number + 10, 2 * number + 11
+        index = owner[shard_of(guild_id, args.shards)]
+        games[guild_id] = process_name(ranges[index])
+        batch = batches[index]
+        batch.append(('start', guild_id, channel_id, white_id, black_id))
+        board = Board()
+        for ply, move in enumerate(scripted_game(rng, args.plies)):
+            batch.append(('message', guild_id, channel_id, (white_id, black_id)[ply % 2], board.san(move)))
+            board.push(move)
+        expected[index] += len(board.move_stack) + 1
+        resigns[index].append(('message', guild_id, channel_id, white_id, 'resign'))
+
+    start = time.perf_counter()
+    for queue, batch, count in zip(queues, batches, expected):
+        queue.put(batch + [('expect', 0, 0, count)])
+    boards = sum(results.get()[2] for _ in workers)
+    elapsed = time.perf_counter() - start
+
+    database = use_database(database_path)
+    registered = {active.guild_id: active.process for active in ActiveGame.select()}
+    database.close()
+    assert registered == games, 'every game is registered by the process of its shard'
+
+    for queue, resign in zip(queues, resigns):
+        queue.put(resign)
+        queue.put(None)
+    for _ in workers:
+        assert results.get()[0] == 'closed'
+    for process in workers:
+        process.join()
+    print(f'{processes} process(es): {boards} moves and boards in {elapsed:.2f} s, {boards / elapsed:7.0f} moves/s '
+          f'({len(registered)} games found in the shared registry)')
+    return boards / elapsed
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--processes', type=int, nargs='+', default=[1, 2, 4])
+    parser.add_argument('--shards', type=int, default=8)
+    parser.add_argument('--games', type=int, default=32)
+    parser.add_argument('--plies', type=int, default=40)
+    parser.add_argument('--seed', type=int, default=1)
+    args = parser.parse_args()
+    print(f'{os.cpu_count()} CPUs')
+
+    baseline = None
+    with tempfile.TemporaryDirectory() as directory:
+        for processes in args.processes:
+            throughput = run(processes, args, os.path.join(directory, f'{processes}.db'))
+            baseline = baseline or throughput
+            print(f'{"":12}{throughput / baseline:.2f}x the throughput of {args.processes[0]} process(es)')
+
+
+if __name__ == '__main__':
+    main()
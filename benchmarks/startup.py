@@ -0,0 +1,100 @@
+"""
+Benchmark of the bot's startup: time to first command by phase, in fresh processes
+
+Each run starts a new interpreter that imports the bot, creates it (with a temporary database and archive),
+sets it up and runs !help against in-memory fakes of Discord. Connecting to Discord is simulated by a sleep of
+--connect-ms. The current startup (database and cogs set up at the same time, before connecting) is compared with
+the previous one, which loaded the cogs one second after the bot was ready.
+
+Usage: python -m benchmarks.startup [--runs 5] [--connect-ms 500]
+"""
+import argparse
+import asyncio
+import json
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+PHASES = ['interpreter', 'import', 'init', 'database', 'extensions', 'connect', 'first command', 'total']
+
+
+async def current(bot, connect: float):
+    await bot.setup()
+    await bot.timed('connect', asyncio.sleep(connect))
+
+
+async def previous(bot, connect: float):
+    """The cogs were loaded after on_ready, and a second later"""
+    await bot.timed('database', bot.db_setup())
+    await bot.timed('connect', asyncio.sleep(connect + 1))
+    await bot.timed('extensions', bot.load_all_extensions())
+
+
+SCHEDULES = {'current': current, 'previous': previous}
+
+
+def child(args):
+    """Runs in the benchmark's processes, prints the phases' durations"""
+    phases = {'interpreter': time.time() - args.spawned}
+    start = time.perf_counter()
+    from bot.bot_client import Bot  # imported here to time it
+    phases['import'] = time.perf_counter() - start
+
+    bot = Bot({'prefix': '!', 'archive_path': 'archive'})
+    from benchmarks.fakes import FakeChannel, FakeContext, FakeGuild, FakeHTTP, FakeMember
+
+    async def first_command():
+        await SCHEDULES[args.schedule](bot, args.connect_ms / 1000)
+        mark = time.perf_counter()
+        author = FakeMember('Owner')
+        ctx = FakeContext(FakeChannel(FakeGuild(FakeMember('ChessBot', bot=True)), FakeHTTP(latency=0)), author)
+        await bot.get_command('help').callback(bot.get_cog('Help'), ctx)
+        phases['first command'] = time.perf_counter() - mark
+
+    bot.loop.run_until_complete(first_command())
+    phases.update((phase, bot.startup[phase]) for phase in ('init', 'database', 'extensions', 'connect'))
+    phases['total'] = time.time() - args.spawned
+    bot.archive.close()
+    bot.repository.close()
+    print(json.dumps(phases))
+
+
+def run(args, schedule: str, directory: str) -> dict:
+    environment = dict(os.environ, PYTHONPATH=os.getcwd())
+    output = subprocess.run(
+        [sys.executable, '-m', 'benchmarks.startup', '--child', '--schedule', schedule, '--spawned', str(time.time()),
+         '--connect-ms', str(args.connect_ms)],
+        cwd=directory, env=environment, stdout=subprocess.PIPE, stderr=subprocess.PIPE, check=True
+    ).stdout.decode()
+    return json.loads(output.strip().splitlines()[-1])
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--runs', type=int, default=5)
+    parser.add_argument('--connect-ms', type=float, default=500)
+    parser.add_argument('--child', action='store_true', help=argparse.SUPPRESS)
+    parser.add_argument('--schedule', choices=SCHEDULES, help=argparse.SUPPRESS)
+    parser.add_argument('--spawned', type=float, help=argparse.SUPPRESS)
+    args = parser.parse_args()
+    if args.child:
+        return child(args)
+
+    print(f'Median of {args.runs} runs, in ms (connecting takes {args.connect_ms:.0f} ms, database and extensions '
+          f'overlap in the current startup):')
+    print(f'{"":10}' + ''.join(f'{phase:>14}' for phase in PHASES))
+    for schedule in ('previous', 'current'):
+        runs = []
+        for _ in range(args.runs):
+            with tempfile.TemporaryDirectory() as directory:
+                runs.append(run(args, schedule, directory))
+        print(f'{schedule:10}' + ''.join(
+            f'{statistics.median(phases[phase] for phases in runs) * 1000:14.1f}' for phase in PHASES
+        ))
+
+
+if __name__ == '__main__':
+    main()
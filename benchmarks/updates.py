@@ -0,0 +1,138 @@
+"""
+Simulated-HTTP harness of the games' Discord updates: API calls per game, 429 responses and how long each move
+takes to show up, with the update queue (coalesced edits, bulk deletions, rate limits per channel) and without it
+
+Games are played by the Chess cog against in-memory fakes of Discord (benchmarks.fakes), with players that chat,
+make illegal moves and offer draws. Without the queue every update is its own API call, made in order per channel,
+which is what the cog did before. Discord's rate limit periods are scaled down by --scale so games run quickly.
+
+Usage: python -m benchmarks.updates [--games 20] [--plies 40] [--think-ms 50] [--scale 0.05]
+"""
+import argparse
+import asyncio
+import collections
+import os
+import random
+import statistics
+import tempfile
+import time
+from typing import List
+
+from benchmarks.fakes import DISCORD_LIMITS, FakeBot, FakeChannel, FakeGuild, FakeHTTP, FakeMember
+from benchmarks.persistence import use_database
+from benchmarks.utils import scripted_game
+from bot.cogs.chess import Chess
+from bot.game.board import Board
+from bot.game.updates import UpdateQueue
+from bot.orm.store import GameStore
+
+CHATTER = ['hmm', 'nice move', 'brb', 'good luck!', 'oops']
+
+
+class Unbatched:
+    """What the cog did before the update queue: every update is its own API call, made in order per channel"""
+
+    def __init__(self):
+        self.locks = collections.defaultdict(asyncio.Lock)
+        self.tasks: List[asyncio.Future] = []
+
+    async def call(self, channel, function, *args, **kwargs):
+        async with self.locks[channel.id]:
+            return await function(*args, **kwargs)
+
+    async def send(self, channel, content: str = None, **fields):
+        return await self.call(channel, channel.send, content, **fields)
+
+    def edit(self, message, **fields):
+        self.tasks.append(asyncio.ensure_future(self.call(message.channel, message.edit, **fields)))
+
+    def delete(self, message):
+        self.tasks.append(asyncio.ensure_future(self.call(message.channel, message.delete)))
+
+    async def flush(self):
+        await asyncio.gather(*self.tasks)
+
+
+async def play(args, queued: bool, database_path: str):
+    rng = random.Random(args.seed)
+    limits = {route: (calls, period * args.scale) for route, (calls, period) in DISCORD_LIMITS.items()}
+    http = FakeHTTP(latency=args.latency_ms / 1000, limits=limits)
+    me = FakeMember('ChessBot', bot=True)
+    guild = FakeGuild(me)
+    database = use_database(database_path)
+    if queued:
+        route_limits = {route: limits[route] for route in ('send', 'edit', 'delete')}
+        updates = UpdateQueue(route_limits=route_limits, global_limit=limits['global'])
+    else:
+        updates = Unbatched()
+
+    bot = FakeBot(me, GameStore(database=database), updates)
+    cog = Chess(bot)
+    latencies: List[float] = []
+
+    async def play_game():
+        channel = FakeChannel(guild, http)
+        white, black = FakeMember('white'), FakeMember('black')
+        moves = scripted_game(rng, args.plies)
+        draw_ply = rng.randrange(len(moves))
+        game = await bot.store.create_game(guild.id, channel.id, white.id, black.id)
+        task = asyncio.ensure_future(cog.start_game(channel, white, black, game, Board()))
+        await channel.new_board.wait()
+
+        def say(player: FakeMember, content: str):
+            bot.router.route(channel.message_from(player, content))
+
+        board = Board()
+        for ply, move in enumerate(moves):
+            player, other = (white, black) if ply % 2 == 0 else (black, white)
+            if rng.random() < 0.3:
+                say(player, rng.choice(CHATTER))
+            if rng.random() < 0.2:
+                say(player, 'Ke5')  # illegal in these positions (or is at least unlikely to be legal)
+            if ply == draw_ply:
+                say(player, 'draw')
+                say(other, 'no')
+            channel.new_board.clear()
+            start = time.perf_counter()
+            say(player, board.san(move))
+            board.push(move)
+            await channel.new_board.wait()
+            latencies.append(time.perf_counter() - start)
+            await asyncio.sleep(rng.uniform(0, 2 * args.think_ms / 1000))
+        if not task.done():
+            say(white, 'resign')
+        await task
+
+    start = time.perf_counter()
+    await asyncio.gather(*[play_game() for _ in range(args.games)])
+    await bot.updates.flush()
+    elapsed = time.perf_counter() - start
+    await bot.close()
+    database.close()
+
+    calls = ', '.join(f'{route} {count / args.games:.1f}' for route, count in sorted(http.calls.items()))
+    print(f'{"Update queue" if queued else "No queue":12}: {http.total() / args.games:6.1f} API calls per game '
+          f'({calls}), {sum(http.rate_limited.values()) / args.games:5.1f} 429 responses per game')
+    latencies.sort()
+    print(f'{"":12}  move shown after p50 {statistics.median(latencies) * 1000:6.1f} ms, '
+          f'p99 {latencies[int(len(latencies) * 0.99)] * 1000:6.1f} ms, all games in {elapsed:.2f} s')
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--games', type=int, default=20, help='games played at the same time, each in its channel')
+    parser.add_argument('--plies', type=int, default=40)
+    parser.add_argument('--think-ms', type=float, default=50, help='average time the players take to move')
+    parser.add_argument('--latency-ms', type=float, default=5, help='latency of each API call')
+    parser.add_argument('--scale', type=float, default=0.05, help='scale of the rate limit periods')
+    parser.add_argument('--seed', type=int, default=1)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as directory:
+        for queued in (False, True):
+            path = os.path.join(directory, f'{queued}.db')
+            asyncio.get_event_loop().run_until_complete(play(args, queued, path))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,41 @@
+"""Helpers shared by the benchmarks"""
+import asyncio
+import random
+import time
+from typing import List
+
+import chess
+
+from bot.game.board import Board
+
+
+class LagMonitor:
+    """Measures how late the event loop wakes up a task that sleeps for `interval` seconds"""
+
+    def __init__(self, interval: float = 0.001):
+        self.interval = interval
+        self.max_lag = 0.0
+        self.lags: List[float] = []
+
+    async def run(self):
+        while True:
+            start = time.perf_counter()
+            await asyncio.sleep(self.interval)
+            lag = time.perf_counter() - start - self.interval
+            self.lags.append(lag)
+            self.max_lag = max(self.max_lag, lag)
+
+    def percentile(self, fraction: float) -> float:
+        lags = sorted(self.lags) or [0.0]
+        return lags[min(len(lags) - 1, int(len(lags) * fraction))]
+
+
+def scripted_game(rng: random.Random, plies: int) -> List[chess.Move]:
+    """A random game which isn't over before its last move"""
+    board = Board()
+    while len(board.move_stack) < plies:
+        moves = list(board.legal_moves)
+        if not moves or board.is_drawn():
+            return board.move_stack[:-1]
+        board.push(rng.choice(moves))
+    return board.move_stack
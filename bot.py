@@ -1,11 +1,15 @@
-import logging
-
 import asyncio
 import discord
 import json
+import multiprocessing
+import signal
 import sys
+import time
+from typing import List
 
 from bot.bot_client import Bot
+from bot.logs import setup_logging
+from bot.sharding import IDENTIFY_INTERVAL, process_name, recommended_shard_count, shard_ranges
 
 
 def load_settings() -> dict:
@@ -18,22 +22,69 @@ def load_settings() -> dict:
         return json.load(f)
 
 
-async def run(settings: dict) -> None:
-    bot = Bot(settings=settings)
+async def run(bot: Bot, token: str) -> None:
     try:
-        await bot.start(settings.get('token'))
+        await bot.start(token)
     except KeyboardInterrupt:
         await bot.logout()
     except discord.errors.LoginFailure:
         print(f"Error: Invalid Token. Please input a valid token in '/bot/settings.json' file.")
         sys.exit(1)
 
+
+def run_process(settings: dict, shard_ids: List[int] = None, shard_count: int = None, delay: float = 0) -> None:
+    """
+    Runs the bot (or a range of its shards) until it is closed, SIGTERM and SIGINT close it cleanly:
+    pending moves and message updates are saved and sent before disconnecting
+    """
+    log_file = f'discord-{shard_ids[0]}.log' if shard_ids else 'discord.log'
+    listener = setup_logging(log_file, sampling=settings.get('log_sampling'))
+    if shard_ids:
+        time.sleep(delay)  # processes identify one after the other, like the shards of a single process do
+    loop = asyncio.new_event_loop()
+    asyncio.set_event_loop(loop)
+    bot = Bot(settings=settings, shard_ids=shard_ids, shard_count=shard_count)
+    for signal_number in (signal.SIGTERM, signal.SIGINT):
+        loop.add_signal_handler(signal_number, lambda: asyncio.ensure_future(bot.close()))
+    try:
+        loop.run_until_complete(run(bot, settings.get('token')))
+    finally:
+        listener.stop()  # writes the records that are still queued
+
+
+def run_processes(settings: dict, processes: int) -> None:
+    """
+    Starts one process for each range of shards and waits for them, SIGTERM (or SIGINT) is passed on to every
+    process so that they all close cleanly
+    """
+    shard_count = settings.get('shard_count') or asyncio.get_event_loop().run_until_complete(
+        recommended_shard_count(settings.get('token'))
+    )
+    shard_count = max(shard_count, processes)
+    context = multiprocessing.get_context('spawn')
+    workers, delay = [], 0.0
+    for shard_ids in shard_ranges(shard_count, processes):
+        worker = context.Process(
+            target=run_process, args=(settings, shard_ids, shard_count, delay), name=process_name(shard_ids)
+        )
+        worker.start()
+        workers.append(worker)
+        delay += len(shard_ids) * IDENTIFY_INTERVAL
+
+    def stop(signal_number, frame):
+        for worker in workers:
+            if worker.is_alive():
+                worker.terminate()  # SIGTERM
+
+    signal.signal(signal.SIGTERM, stop)
+    signal.signal(signal.SIGINT, stop)
+    for worker in workers:
+        worker.join()
+
+
 if __name__ == '__main__':
-    logger = logging.getLogger('discord')
-    logger.setLevel(logging.INFO)
-    handler = logging.FileHandler(filename='discord.log', encoding='utf-8', mode='w')
-    handler.setFormatter(logging.Formatter('%(asctime)s:%(levelname)s:%(name)s: %(message)s'))
-    logger.addHandler(handler)
-    loop = asyncio.get_event_loop()
     settings = load_settings()
-    loop.run_until_complete(run(settings))
+    if settings.get('processes', 1) > 1:
+        run_processes(settings, settings['processes'])
+    else:
+        run_process(settings, shard_count=settings.get('shard_count'))
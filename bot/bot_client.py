@@ -1,25 +1,135 @@
 import asyncio
 import logging
 import datetime
+import os
+import time
+from collections import OrderedDict
 from pathlib import Path
+from typing import Dict, List, Tuple
 
 import discord
 from discord.ext import commands
 
+from bot.errors import ErrorAggregator, send_digests
+from bot.game.analysis import Analyzer
+from bot.game.archive import ArchiveSet
+from bot.game.book import OpeningBook
+from bot.game.clock import Scheduler
+from bot.game.engine import Engine
+from bot.game.matchmaking import Matchmaker
+from bot.game.puzzles import PuzzleStore
+from bot.game.replay import CACHE_MB, Replays
+from bot.game.router import GameRouter
+from bot.game.updates import UpdateQueue
+from bot.metrics import ACTIVE_GAMES, API_CALLS, COMMANDS, REGISTRY, monitor_loop_lag, serve
 from bot.orm.db import db
+from bot.orm.models import ActiveGame, Game, Move, PuzzleRating, Rating
+from bot.orm.repository import Repository
+from bot.orm.store import GameStore
+from bot.sharding import process_name, shard_of
 
+COGS_PATH = Path(__file__).parent / 'cogs'
+NOT_EXTENSIONS = ['utils', 'embeds', 'models', '__init__']  # modules of bot/cogs that aren't cogs
 
-class Bot(commands.Bot):
-    def __init__(self, settings: dict):
-        super().__init__(command_prefix=settings.get('prefix'), case_insensitive=True)
+
+async def show_typing(ctx: commands.Context):
+    """
+    Shows that the bot is typing before a command that can take a while to answer runs, it is an API call so
+    only those commands use it, from a hook of their cog (`@command.before_invoke` on a method that awaits it)
+    """
+    await ctx.trigger_typing()
+
+
+class Bot(commands.AutoShardedBot):
+    """
+    The bot runs every shard in one process by default. With `processes` in settings.json, bot.py starts several
+    processes that run a range of shards each (shard_ids), out of shard_count shards
+    """
+
+    def __init__(self, settings: dict, shard_ids: List[int] = None, shard_count: int = None):
+        created = time.perf_counter()
+        super().__init__(
+            command_prefix=settings.get('prefix'), case_insensitive=True, shard_ids=shard_ids, shard_count=shard_count
+        )
         self.settings = settings
+        self.process_name = process_name(shard_ids)
+        self.closing = False
         self.start_time = None
         self.app_info = None
+        self.manifest = self.scan_cogs()
+        # how long each phase of the startup took, reported once the first command has run
+        self.startup: Dict[str, float] = OrderedDict()
+        self.created = self.startup_mark = created
+        self.router = GameRouter()
+        self.updates = UpdateQueue()
+        self.timers = Scheduler()  # deadlines of every game: clocks and idle timeouts
+        self.matchmaker = Matchmaker()  # players looking for an opponent (!seek)
+        self.repository = Repository(db, workers=settings.get('db_workers', 2))
+        self.store = GameStore(
+            batch_size=settings.get('move_batch_size', 20),
+            flush_interval=settings.get('move_flush_ms', 250) / 1000,
+            repository=self.repository
+        )
+        self.metrics_server = None
+        self.errors = ErrorAggregator()
+        self.book = OpeningBook(settings.get('opening_book'))
+        self.puzzles = PuzzleStore(settings.get('puzzles_path'))  # memory mapped, shared by every process
+        # each process writes to an archive of its own and reads the other processes' ones, in the same folder
+        self.archive = ArchiveSet(settings.get('archive_path') or 'archive', self.process_name.replace(' ', '-'))
+        # GIFs of !replay, cached in the archive's folder
+        self.replays = Replays(
+            os.path.join(self.archive.path, 'replays'), settings.get('replay_cache_mb', CACHE_MB) * 2 ** 20
+        )
+        self.engine = Engine(
+            workers=settings.get('engine_workers', 2),
+            max_seconds=settings.get('engine_max_seconds', 5),
+            book_path=settings.get('opening_book')
+        )
+        self.analyzer = Analyzer(
+            workers=settings.get('analysis_workers', 2),
+            depth=settings.get('analysis_depth', 3)
+        )
 
-        self.db_setup()
         self.remove_command('help')
+        self.count_api_calls()
+        ACTIVE_GAMES.function = self.router.games
         self.loop.create_task(self.track_start())
-        self.loop.create_task(self.load_all_extensions())
+        self.loop.create_task(self.store.run())
+        self.loop.create_task(monitor_loop_lag())
+        self.loop.create_task(self.report_errors())
+        if settings.get('metrics_port'):
+            self.loop.create_task(self.serve_metrics(settings['metrics_port'] + (shard_ids[0] if shard_ids else 0)))
+        self.startup['init'] = time.perf_counter() - created
+
+    async def start(self, *args, **kwargs):
+        """Sets the database up and loads the cogs before connecting to Discord, so commands work once connected"""
+        await self.setup()
+        self.startup_mark = time.perf_counter()
+        await super().start(*args, **kwargs)
+
+    async def setup(self):
+        """
+        Creates the database's tables (on the repository's thread) while the cogs are loaded on the event loop
+        """
+        await asyncio.gather(
+            self.timed('database', self.db_setup()), self.timed('extensions', self.load_all_extensions())
+        )
+
+    async def timed(self, phase: str, coroutine):
+        start = time.perf_counter()
+        result = await coroutine
+        self.startup[phase] = time.perf_counter() - start
+        return result
+
+    def mark_startup(self, phase: str):
+        """Records how long a phase took since the previous one was marked, only the first time it happens"""
+        if phase not in self.startup:
+            now = time.perf_counter()
+            self.startup[phase] = now - self.startup_mark
+            self.startup_mark = now
+
+    async def on_connect(self):
+        self.mark_startup('connect')
 
     async def track_start(self):
         """
@@ -28,15 +138,57 @@ class Bot(commands.Bot):
         await self.wait_until_ready()
         self.start_time = datetime.datetime.utcnow()
 
+    def count_api_calls(self):
+        """Counts every request made to the Discord API by its route (e.g. 'POST /channels/{channel_id}/messages')"""
+        request = self.http.request
+
+        async def counted_request(route, **kwargs):
+            API_CALLS.labels(route.method, route.path).inc()
+            return await request(route, **kwargs)
+
+        self.http.request = counted_request
+
+    async def serve_metrics(self, port: int):
+        """
+        Serves the bot's metrics to Prometheus on http://127.0.0.1:port/metrics, each process of the bot uses
+        the port plus its first shard id
+        """
+        try:
+            self.metrics_server = await serve(REGISTRY, '127.0.0.1', port)
+        except OSError as e:
+            logging.error(f'Could not serve metrics on port {port}: {e}')
+
+    async def invoke(self, ctx: commands.Context):
+        """Runs a command, recording how long it took"""
+        start = time.perf_counter()
+        await super().invoke(ctx)
+        if ctx.command is not None:
+            status = 'error' if ctx.command_failed else 'ok'
+            COMMANDS.labels(ctx.command.qualified_name, status).observe(time.perf_counter() - start)
+            if 'first command' not in self.startup:
+                self.mark_startup('first command')
+                self.report_startup()
+
+    def report_startup(self):
+        """Prints and logs how long the bot took to run its first command, by phase (database and extensions overlap)"""
+        phases = ', '.join(f'{phase} {seconds:.2f} s' for phase, seconds in self.startup.items())
+        message = f'Time to first command: {time.perf_counter() - self.created:.2f} s ({phases})'
+        print(message)
+        logging.getLogger('discord').info(message)
+
     @staticmethod
-    def get_cogs():
-        """Gets cog names from /cogs/ folder"""
-        not_extensions = ['utils', 'embeds', 'models', '__init__']
-        cogs = [x.stem for x in Path('bot/cogs').glob('*.py')]
-        for cog in cogs:
-            if cog in not_extensions:
-                cogs.remove(cog)
-        return cogs
+    def scan_cogs() -> Dict[str, Tuple[int, int]]:
+        """Manifest of the cogs of bot/cogs: modification time and size of each cog's source, by name"""
+        manifest = {}
+        for path in sorted(COGS_PATH.glob('*.py')):
+            if path.stem not in NOT_EXTENSIONS:
+                stat = path.stat()
+                manifest[path.stem] = (stat.st_mtime_ns, stat.st_size)
+        return manifest
+
+    def get_cogs(self) -> List[str]:
+        """Names of the cogs, from the manifest made when the bot started (or last reloaded its cogs)"""
+        return list(self.manifest)
 
     async def unload_all_extensions(self):
         """Unloads all cog extensions"""
@@ -53,8 +205,6 @@ class Bot(commands.Bot):
 
     async def load_all_extensions(self):
         """Attempts to load all .py files in /cogs/ as cog extensions"""
-        await self.wait_until_ready()
-        await asyncio.sleep(1)  # ensure that on_ready has completed and finished printing
         errored = False
         for extension in self.get_cogs():
             try:
@@ -67,21 +217,31 @@ class Bot(commands.Bot):
         print('-' * 10)
         return errored
 
-    async def reload_all_extensions(self):
-        """Attempts to reload all .py files in /cogs/ as cog extensions"""
-        await self.wait_until_ready()
-        await asyncio.sleep(1)  # ensure that on_ready has completed and finished printing
+    async def reload_all_extensions(self) -> Tuple[List[str], bool]:
+        """
+        Reloads the cogs whose source changed since they were loaded, loads new cogs and unloads deleted ones.
+        Returns the names of those cogs, and whether any of them failed
+        """
+        manifest = self.scan_cogs()
+        changed = [cog for cog in manifest.keys() | self.manifest.keys() if manifest.get(cog) != self.manifest.get(cog)]
         errored = False
-        for extension in self.get_cogs():
+        for extension in sorted(changed):
+            name = f'bot.cogs.{extension}'
             try:
-                self.reload_extension(f'bot.cogs.{extension}')
+                if extension not in manifest:
+                    self.unload_extension(name)
+                elif name in self.extensions:
+                    self.reload_extension(name)
+                else:
+                    self.load_extension(name)
                 print(f'- reloaded Extension: {extension}')
             except Exception as e:
                 error = f'{extension}:\n {type(e).__name__} : {e}'
                 print(f'Failed to reload extension {error}')
                 errored = True
+        self.manifest = manifest
         print('-' * 10)
-        return errored
+        return changed, errored
 
     async def on_ready(self):
         """
@@ -94,6 +254,7 @@ class Bot(commands.Bot):
             f'Using discord.py version: {discord.__version__}\n'
             f'Owner: {self.app_info.owner}\n'
             f'Prefix: {self.settings.get("prefix")}\n'
+            f'Shards: {self.process_name if self.shard_ids else "all"} (of {self.shard_count})\n'
             f'Original Template Maker: SourSpoon / Spoon#7805\n'
             f'Updated by: https://github.com/johnvictorfs\n'
             f'Template available at: https://github.com/johnvictorfs/discord_bot_template'
@@ -107,40 +268,50 @@ class Bot(commands.Bot):
         if message.author.bot:
             return  # Ignore all bot messages
 
+        if self.router.route(message) and not message.content.startswith(self.settings.get('prefix')):
+            return  # Message was a move (or some other text) sent by a player to their game
+
         await self.process_commands(message)
 
-    async def send_logs(self, e: Exception, tb: str, ctx: commands.Context = None):
+    async def close(self):
         """
-        Sends logs of errors to the bot's instance owner as a private Discord message
+        Saves the moves that haven't been written to the database yet, makes the pending message updates
+        and stops the engine before disconnecting
         """
-        owner = self.app_info.owner
-        separator = ("_\\" * 15) + "_"
-        info_embed = None
-        if ctx:
-            info_embed = discord.Embed(title="__Error Info__", color=discord.Color.dark_red())
-            info_embed.add_field(name="Message", value=ctx.message.content, inline=False)
-            info_embed.add_field(name="By", value=ctx.author, inline=False)
-            info_embed.add_field(name="In Guild", value=ctx.guild, inline=False)
-            info_embed.add_field(name="In Channel", value=ctx.channel, inline=False)
-        try:
-            await owner.send(content=f"{separator}\n**{e}:**\n```python\n{tb}```", embed=info_embed)
-        except discord.errors.HTTPException:
-            logging.error(f"{e}: {tb}")
-            try:
-                await owner.send(
-                    content=f"(Sending first 500 chars of traceback, too long)\n{separator}\n**{e}:**"
-                    f"\n```python\n{tb[:500]}```",
-                    embed=info_embed
-                )
-            except Exception:
-                await owner.send(content="Error trying to send error logs.", embed=info_embed)
+        if self.closing:
+            return  # e.g. SIGTERM and SIGINT both received
+        self.closing = True
+        await self.updates.flush()
+        await self.store.close()
+        self.repository.close()
+        self.engine.close()
+        self.analyzer.close()
+        self.book.close()
+        self.puzzles.close()
+        self.archive.close()
+        self.replays.close()
+        if self.metrics_server:
+            await self.metrics_server.cleanup()
+        await super().close()
 
-    @staticmethod
-    def db_setup():
+    def shard_of(self, guild_id: int) -> int:
+        """The shard of the bot that receives a guild's events"""
+        return shard_of(guild_id, self.shard_count or 1)
+
+    async def report_errors(self):
+        """
+        Sends the bot's owner a digest of the errors every `error_digest_minutes` (if there were any),
+        instead of a private message for each error
+        """
+        await self.wait_until_ready()
+        await send_digests(self.errors, self.send_error_digest, self.settings.get('error_digest_minutes', 5) * 60)
+
+    async def send_error_digest(self, embed: discord.Embed):
+        await self.app_info.owner.send(embed=embed)
+
+    async def db_setup(self):
         """
         Setup the bot's database, creates necessary tables if not yet created
         """
-        db.connect()
-        models = []  # Add bot.orm.models Models here
-        db.create_tables(models)
-        db.close()
+        models = [Game, Move, ActiveGame, Rating, PuzzleRating]  # Add bot.orm.models Models here
+        await self.repository.create_tables(models)
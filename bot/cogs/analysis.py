@@ -0,0 +1,93 @@
+import io
+from typing import Optional
+
+import chess
+import chess.pgn
+import discord
+from discord.ext import commands
+
+from bot.bot_client import Bot
+from bot.game.analysis import Analysis as GameAnalysis, MoveReport
+
+FLAGGED_LISTED = 15  # moves listed by !analyze
+SYMBOLS = {'blunder': '??', 'mistake': '?', 'inaccuracy': '?!'}
+PLURALS = {'blunder': 'Blunders', 'mistake': 'Mistakes', 'inaccuracy': 'Inaccuracies'}
+
+
+def move_text(move: MoveReport) -> str:
+    number = (move.ply + 1) // 2
+    dots = '.' if move.color == chess.WHITE else '...'
+    return (
+        f'{number}{dots} {move.san}{SYMBOLS[move.label]} '
+        f'({move.before / 100:+.2f} → {move.after / 100:+.2f}, {move.label})'
+    )
+
+
+def analysis_embed(game_id: int, headers: chess.pgn.Headers, analysis: GameAnalysis) -> discord.Embed:
+    embed = discord.Embed(
+        title=f'Analysis of #{game_id}: {headers["White"]} vs {headers["Black"]} ({headers["Result"]})',
+        color=0x0473b3
+    )
+    for color, name in ((chess.WHITE, headers['White']), (chess.BLACK, headers['Black'])):
+        accuracy = analysis.accuracy(color)
+        embed.add_field(
+            name=f'{"White" if color == chess.WHITE else "Black"}: {name}',
+            value=(
+                f'Accuracy: **{accuracy:.1f}%**\n' if accuracy is not None else 'No moves\n'
+            ) + '\n'.join(f'{plural}: {analysis.count(color, label)}' for label, plural in PLURALS.items())
+        )
+    flagged = analysis.flagged()
+    lines = [move_text(move) for move in flagged[:FLAGGED_LISTED]]
+    if len(flagged) > FLAGGED_LISTED:
+        lines.append(f'and {len(flagged) - FLAGGED_LISTED} more')
+    embed.description = '\n'.join(lines) or 'No inaccuracies, mistakes or blunders.'
+    embed.set_footer(text='Scores are in pawns, from white\'s point of view')
+    return embed
+
+
+class Analysis(commands.Cog):
+
+    def __init__(self, bot: Bot):
+        self.bot = bot
+
+    async def read_game(self, game_id: int, guild_id: int, owner: bool = False) -> Optional[chess.pgn.Game]:
+        """A finished game of the guild from the archive, None if there isn't one"""
+        pgn = await self.bot.archive.pgn(game_id)
+        if pgn is None:
+            return None
+        game = chess.pgn.read_game(io.StringIO(pgn))
+        if game.headers.get('GuildId') != str(guild_id) and not owner:
+            return None
+        return game
+
+    async def analyze_game(self, channel: discord.TextChannel, game_id: int, game: chess.pgn.Game):
+        moves = [move.uci() for move in game.mainline_moves()]
+        async with channel.typing():
+            analysis = await self.bot.analyzer.analyze(moves)
+        await channel.send(embed=analysis_embed(game_id, game.headers, analysis))
+
+    @commands.guild_only()
+    @commands.cooldown(1, 30, commands.BucketType.user)
+    @commands.command(aliases=['analyse', 'review'])
+    async def analyze(self, ctx: commands.Context, game_id: int):
+        """
+        Evaluates every position of a finished game of this server, flags its inaccuracies, mistakes and blunders
+        and shows each player's accuracy, e.g. !analyze 42 (the game ids are shown by !history)
+        """
+        game = await self.read_game(game_id, ctx.guild.id, await self.bot.is_owner(ctx.author))
+        if game is None:
+            return await ctx.send(f'Game #{game_id} is not a finished game of this server.')
+        await self.analyze_game(ctx.channel, game_id, game)
+
+    @commands.Cog.listener()
+    async def on_game_archived(self, channel: discord.TextChannel, game_id: int):
+        """Analyzes every game once it is archived, with `auto_analyze` in settings.json"""
+        if not self.bot.settings.get('auto_analyze'):
+            return
+        game = await self.read_game(game_id, channel.guild.id)
+        if game is not None and game.mainline_moves():
+            await self.analyze_game(channel, game_id, game)
+
+
+def setup(bot):
+    bot.add_cog(Analysis(bot))
@@ -0,0 +1,109 @@
+import io
+
+import chess.pgn
+import discord
+from discord.ext import commands
+
+from bot.bot_client import Bot, show_typing
+
+HISTORY_LISTED = 10  # games shown by !history
+HISTORY_SCANNED = 50  # last games of the player read by !history, only the ones of the server are shown
+
+
+def read_headers(pgn: str) -> chess.pgn.Headers:
+    return chess.pgn.read_headers(io.StringIO(pgn))
+
+
+class Side(commands.Converter):
+    """
+    Converts the side the board of a replay is seen from, `white` or `black`, to whether the board is flipped
+    """
+    async def convert(self, ctx: commands.Context, argument: str) -> bool:
+        if argument.lower() in ('white', 'black'):
+            return argument.lower() == 'black'
+        raise commands.BadArgument(f'Invalid side: {argument}, it should be white or black')
+
+
+class Archive(commands.Cog):
+
+    def __init__(self, bot: Bot):
+        self.bot = bot
+
+    @commands.guild_only()
+    @commands.cooldown(1, 5, commands.BucketType.user)
+    @commands.command(aliases=['export'])
+    async def pgn(self, ctx: commands.Context, game_id: int):
+        """
+        Sends the PGN of a finished game of this server, e.g. !pgn 42 (the game ids are shown by !history)
+        """
+        pgn = await self.bot.archive.pgn(game_id)
+        if pgn is not None:
+            headers = read_headers(pgn)
+            if headers.get('GuildId') != str(ctx.guild.id) and not await self.bot.is_owner(ctx.author):
+                pgn = None
+        if pgn is None:
+            return await ctx.send(f'Game #{game_id} is not a finished game of this server.')
+        file = discord.File(io.BytesIO(pgn.encode()), filename=f'game-{game_id}.pgn')
+        await ctx.send(
+            f'**#{game_id}** {headers["White"]} vs {headers["Black"]}: {headers["Result"]} '
+            f'({headers.get("Termination", "unknown")})',
+            file=file
+        )
+
+    @commands.guild_only()
+    @commands.cooldown(1, 10, commands.BucketType.user)
+    @commands.command(aliases=['gif', 'animate'])
+    async def replay(self, ctx: commands.Context, game_id: int, flipped: Side = False):
+        """
+        Sends an animated GIF of a finished game of this server, move by move, e.g. !replay 42
+        Add `black` to see the board from black's side: !replay 42 black
+        """
+        pgn = await self.bot.archive.pgn(game_id)
+        if pgn is not None:
+            headers = read_headers(pgn)
+            if headers.get('GuildId') != str(ctx.guild.id) and not await self.bot.is_owner(ctx.author):
+                pgn = None
+        if pgn is None:
+            return await ctx.send(f'Game #{game_id} is not a finished game of this server.')
+        gif = await self.bot.replays.gif(game_id, pgn, flipped)
+        file = discord.File(io.BytesIO(gif), filename=f'game-{game_id}.gif')
+        await ctx.send(
+            f'**#{game_id}** {headers["White"]} vs {headers["Black"]}: {headers["Result"]} '
+            f'({headers.get("Termination", "unknown")})',
+            file=file
+        )
+
+    @replay.before_invoke
+    async def trigger_typing(self, ctx: commands.Context):
+        # rendering a GIF that isn't cached takes a while
+        await show_typing(ctx)
+
+    @commands.guild_only()
+    @commands.cooldown(1, 5, commands.BucketType.user)
+    @commands.command(aliases=['last'])
+    async def history(self, ctx: commands.Context, member: discord.Member = None):
+        """Lists the last finished games of a member (or your own) in this server"""
+        member = member or ctx.author
+        games = []
+        for pgn in await self.bot.archive.history(member.id, HISTORY_SCANNED):
+            headers = read_headers(pgn)
+            if headers.get('GuildId') == str(ctx.guild.id):
+                games.append(headers)
+            if len(games) == HISTORY_LISTED:
+                break
+        if not games:
+            return await ctx.send(f'{member.display_name} has no finished games in this server.')
+        lines = [
+            f'**#{headers["GameId"]}** {headers["White"]} vs {headers["Black"]}: {headers["Result"]} '
+            f'({headers.get("Termination", "unknown")}), {headers["Date"]}'
+            for headers in games
+        ]
+        embed = discord.Embed(
+            title=f'Last games of {member.display_name}', color=0x0473b3, description='\n'.join(lines)
+        )
+        embed.set_footer(text='Use !pgn <id> to get the PGN of a game')
+        await ctx.send(embed=embed)
+
+
+def setup(bot):
+    bot.add_cog(Archive(bot))
@@ -1,28 +1,116 @@
+import asyncio
+import io
+import logging
+import math
+import time
+from typing import Callable, List, Optional
+
 import chess
 from discord.ext import commands
 import discord
 from bot.bot_client import Bot
+from bot.game.archive import game_headers
+from bot.game.board import Board
+from bot.game.clock import Clock, TimeControl, earliest, minutes, next_message
+from bot.game.engine import MAX_DEPTH, evaluate
+from bot.game.moves import MoveIndex, could_be_move
+from bot.game.record import GameRecord
+from bot.game.render import BoardRenderer
+from bot.metrics import MOVE_PARSE, RENDER
+from bot.orm.models import Game
 
+BOARD_FILENAME = 'board.png'
+COLOR_NAMES = {chess.WHITE: 'white', chess.BLACK: 'black'}
+RESULTS = {chess.WHITE: '1-0', chess.BLACK: '0-1'}  # result of the game when each color wins
+DRAW = '1/2-1/2'
+GAMES_LISTED = 20  # games shown by !games
+IDLE_TIMEOUT_MINUTES = 15  # a game is abandoned by a player who doesn't move for that long, unless set in settings
+DRAW_OFFER_SECONDS = 60  # a draw offer that isn't answered in time is declined
+
+logger = logging.getLogger('bot.games')
+
+
+class Player(commands.Converter):
+    """
+    Converts a mention of a member, or the word `bot` (which means that the bot itself is going to play)
+    """
+    async def convert(self, ctx: commands.Context, argument: str) -> discord.Member:
+        if argument.lower() == 'bot':
+            return ctx.guild.me
+        return await commands.MemberConverter().convert(ctx, argument)
+
+
+class SearchLimit(commands.Converter):
+    """
+    Converts how deep (e.g. `4`) or how long in seconds (e.g. `3s`) the bot should think about each move
+    """
+    async def convert(self, ctx: commands.Context, argument: str) -> dict:
+        try:
+            if argument.lower().endswith('s'):
+                seconds = float(argument[:-1])
+                if seconds > 0:
+                    return {'seconds': seconds}
+            else:
+                depth = int(argument)
+                if 0 < depth <= MAX_DEPTH:
+                    return {'depth': depth}
+        except ValueError:
+            pass
+        raise commands.BadArgument(f'Invalid search limit: {argument}')
 
-class Board(chess.Board):
-    def is_drawn(self) -> bool:
-        """
-        Function checks for stalemate/insufficient material/threefold repetition/fifty moves rule
-        """
-        return any([
-            self.is_insufficient_material(), self.can_claim_threefold_repetition(),
-            self.can_claim_fifty_moves(), self.is_stalemate()
-        ])
+
+class TimeControlArgument(commands.Converter):
+    """
+    Converts a time control: minutes for each player plus seconds added after each move, e.g. `5+3`
+    """
+    async def convert(self, ctx: commands.Context, argument: str) -> TimeControl:
+        try:
+            return TimeControl.parse(argument)
+        except ValueError as e:
+            raise commands.BadArgument(str(e))
 
 
 class Chess(commands.Cog):
 
     def __init__(self, bot: Bot):
         self.bot = bot
+        self.renderer = BoardRenderer()
+        self.bot.loop.create_task(self.resume_games())
+
+    async def send_board(
+        self, channel: discord.TextChannel, board: Board, embed: discord.Embed, old_message: discord.Message = None
+    ) -> discord.Message:
+        """
+        Sends the rendered board as an image attachment of the embed, deleting the previous board message if any
+
+        The board is shown from the point of view of the player who is going to move
+        """
+        start = time.perf_counter()
+        png = self.renderer.render(board, flipped=board.turn == chess.BLACK)
+        RENDER.observe(time.perf_counter() - start)
+        file = discord.File(io.BytesIO(png), filename=BOARD_FILENAME)
+        board_message = await self.bot.updates.send(channel, embed=embed, file=file)
+        if old_message:
+            self.bot.updates.delete(old_message)
+        return board_message
+
+    async def next_message(
+        self, inbox: asyncio.Queue, check: Callable[[discord.Message], bool], deadline: float = None
+    ) -> Optional[discord.Message]:
+        """
+        Waits for the next message in the game's inbox that passes the check, other messages are ignored
+
+        Returns None if the deadline (a time of the event loop) comes first, it is a timer of the bot's scheduler
+        """
+        return await next_message(inbox, check, self.bot.timers, deadline)
 
     def illegal_msg(self, player: discord.Member) -> str:
         return f'{player.mention} wait, that\'s illegal! Please, make another move.'
 
+    def ambiguous_msg(self, player: discord.Member, board: chess.Board, moves: List[chess.Move]) -> str:
+        sans = ' or '.join(f'`{board.san(move)}`' for move in moves)
+        return f'{player.mention} that could be {sans}, please write the one you mean (the piece in uppercase).'
+
     def game_over_msg(self, winner: discord.Member) -> str:
         return f'The game is over! The winner is {winner.mention}.'
 
@@ -30,179 +118,333 @@ class Chess(commands.Cog):
     @commands.cooldown(1, 5, commands.BucketType.user)
     @commands.has_permissions(manage_channels=True)
     @commands.command(aliases=['chalenge', 'challeng', 'fight', 'challenge', 'chaleng'])
-    async def play(self, ctx: commands.Context, white_player: discord.Member, black_player: discord.Member):
+    async def play(
+        self, ctx: commands.Context, white_player: Player, black_player: Player,
+        time_control: Optional[TimeControlArgument] = None, search_limit: SearchLimit = None
+    ):
         """
         This command !play is going to be used in order to start a game of chess between both players.
         First name is white, second name is black. It should be used like this: !play @Player1 @Player2
+        Optionally with a time control, minutes for each player plus seconds per move: !play @Player1 @Player2 5+3
+        Use `bot` instead of a mention to play against the bot, optionally with how deep (e.g. `4`) or
+        how long (e.g. `3s`) it should think about each move: !play @Player1 bot 3s
         """
         if ctx.author not in (white_player, black_player):
             return await ctx.send('You can only start a game if you are a player yourself.')
+        await self.new_game(ctx.channel, white_player, black_player, time_control, search_limit)
 
-        def check_white_move(message: discord.Message) -> bool:
-            """
-            This function will verify if the first, third, etc. messages during game are valid
-            i.e. it must either be a MOVE sent by the white_player, or a RESIGN message sent by any player
-            or a DRAW message sent by any player
-            """
-            return (message.author == white_player or message.content.lower() in ('resign', 'draw'))
-
-        def check_black_move(message: discord.Message) -> bool:
-            """
-            This function will verify if the second, fourth, etc. messages during game are valid
-            i.e. it must either be a MOVE sent by the black_player, or a RESIGN message sent by any player
-            or a DRAW message sent by any player
-            """
-            return (message.author == black_player or message.content.lower() in ('resign', 'draw'))
+    async def new_game(
+        self, channel: discord.TextChannel, white_player: discord.Member, black_player: discord.Member,
+        time_control: TimeControl = None, search_limit: dict = None
+    ):
+        """
+        Starts a game between the players in the channel and plays it until it is over, unless one of them is
+        already playing there (used by !play, and by !seek once two players are matched)
+        """
+        for player in (white_player, black_player):
+            if self.bot.router.is_playing(channel.guild.id, channel.id, player.id):
+                return await self.bot.updates.send(
+                    channel, f'{player.mention} is already playing a game in this channel.'
+                )
 
-        board = Board()  # creates an instance of Board class, which is going to be used during the game
+        game = await self.bot.store.create_game(channel.guild.id, channel.id, white_player.id, black_player.id)
 
         # sends a message to let the players know about their pieces' color
-        await ctx.send(
+        await self.bot.updates.send(
+            channel,
             f'{white_player.mention} will play with white pieces and '
-            f'{black_player.mention} plays with black pieces!\n'
+            f'{black_player.mention} plays with black pieces'
+            f'{f" ({time_control} time control)" if time_control else ""}!\n'
             f'Check out the board below:\n'
         )
+        await self.start_game(channel, white_player, black_player, game, Board(), search_limit, time_control)
+
+    @commands.guild_only()
+    @commands.cooldown(1, 5, commands.BucketType.channel)
+    @commands.command(aliases=['matches'])
+    async def games(self, ctx: commands.Context, scope: str = None):
+        """
+        Lists the games being played in this server, or in every server with `!games all` (bot owner only)
+        Games are found in every process of the bot, not only in the one that runs this server's shard
+        """
+        everywhere = scope == 'all' and await self.bot.is_owner(ctx.author)
+        games = await self.bot.store.registered_games(None if everywhere else ctx.guild.id)
+        if not games:
+            return await ctx.send('There are no games being played right now.')
+
+        lines = []
+        for active, plies in games[:GAMES_LISTED]:
+            game = active.game
+            where = f'server {game.guild_id}, ' if everywhere else ''
+            lines.append(
+                f'**#{game.id}** <@{game.white_id}> vs <@{game.black_id}> in {where}<#{game.channel_id}>, '
+                f'{plies} moves ({active.process}, shard {active.shard_id})'
+            )
+        if len(games) > GAMES_LISTED:
+            lines.append(f'... and {len(games) - GAMES_LISTED} more')
+        embed = discord.Embed(title=f'Games being played ({len(games)})', color=0x0473b3, description='\n'.join(lines))
+        await ctx.send(embed=embed)
+
+    async def resume_games(self):
+        """
+        Resumes the games that were being played when the bot stopped, from their last saved move
 
+        Clocks aren't saved, resumed games have none (they are still abandoned by a player who doesn't move)
+        """
+        await self.bot.wait_until_ready()
+        for game, moves in await self.bot.store.active_games():
+            guild = self.bot.get_guild(game.guild_id)
+            channel = guild and guild.get_channel(game.channel_id)
+            if channel is None:
+                continue
+            if self.bot.router.is_playing(guild.id, channel.id, game.white_id):
+                continue  # game is still running (e.g. the cog was reloaded)
+            try:
+                white_player = guild.get_member(game.white_id) or await guild.fetch_member(game.white_id)
+                black_player = guild.get_member(game.black_id) or await guild.fetch_member(game.black_id)
+            except discord.HTTPException:
+                continue
+
+            board = Board()
+            for uci in moves:
+                board.push_uci(uci)
+
+            await self.bot.updates.send(
+                channel,
+                f'Resuming the game between {white_player.mention} (white) and {black_player.mention} (black)!'
+            )
+            self.bot.loop.create_task(self.start_game(channel, white_player, black_player, game, board))
+
+    async def start_game(
+        self, channel: discord.TextChannel, white_player: discord.Member, black_player: discord.Member,
+        game: Game, board: Board, search_limit: dict = None, time_control: TimeControl = None
+    ):
+        """
+        Registers the game with the bot's router and plays it, until it is over
+        """
+        clock = Clock(time_control, board.turn) if time_control else None
+        record = GameRecord(board)
+        del board  # the Board of a resumed game has its whole move stack
+        players = (white_player.id, black_player.id)
+        # from now on every message sent by the players in this channel goes to the game's inbox
+        inbox = self.bot.router.open(channel.guild.id, channel.id, players)
+        # lets every process of the bot know that this one is playing the game
+        self.bot.store.register_game(game, self.bot.shard_of(channel.guild.id), self.bot.process_name)
+        try:
+            await self.run_game(channel, white_player, black_player, inbox, game, record, search_limit or {}, clock)
+        finally:
+            self.bot.router.close(channel.guild.id, channel.id, players)
+
+    async def end_game(
+        self, channel: discord.TextChannel, game: Game, record: GameRecord, result: str, termination: str, msg: str,
+        clock: Clock = None
+    ):
+        """Saves the game's result, archives it and lets the players know that the game is over"""
+        # games against the bot or against oneself don't change ratings
+        rated = game.white_id != game.black_id and self.bot.user.id not in (game.white_id, game.black_id)
+        self.bot.store.finish_game(game.id, result, rated)
+        self.bot.loop.create_task(self.archive_game(channel, game, record, result, termination, clock))
+        await self.bot.updates.send(channel, f'{msg}\nWatch it again with `!replay {game.id}`.')
+
+    async def time_out(
+        self, channel: discord.TextChannel, game: Game, record: GameRecord, players: dict, clock: Optional[Clock],
+        idle_timeout: float
+    ):
+        """
+        Ends the game of the player to move, who ran out of time or didn't move for idle_timeout seconds
+
+        Running out of time is a draw if the opponent couldn't checkmate with the pieces they have left
+        """
+        player, opponent = players[record.turn], players[not record.turn]
+        if clock and clock.flagged(asyncio.get_event_loop().time()):
+            if record.board().has_insufficient_material(not record.turn):
+                msg = f'{player.mention} ran out of time, but {opponent.mention} can\'t checkmate! The game is a draw!'
+                return await self.end_game(channel, game, record, DRAW, 'time forfeit', msg, clock)
+            msg = f'{player.mention} ran out of time! The winner is {opponent.mention}.'
+            return await self.end_game(channel, game, record, RESULTS[not record.turn], 'time forfeit', msg, clock)
+        msg = f'{player.mention} didn\'t move for {minutes(idle_timeout)}, the game is abandoned! ' \
+              f'The winner is {opponent.mention}.'
+        return await self.end_game(channel, game, record, RESULTS[not record.turn], 'abandoned', msg, clock)
+
+    async def archive_game(
+        self, channel: discord.TextChannel, game: Game, record: GameRecord, result: str, termination: str,
+        clock: Clock = None
+    ):
+        """Appends the game's PGN to the bot's archive, for !pgn, !history, !analyze and !replay"""
+        names = []
+        for user_id in (game.white_id, game.black_id):
+            member = channel.guild.get_member(user_id)
+            names.append(member.display_name if member else str(user_id))
+        headers = game_headers(
+            game, names[0], names[1], result, termination, clock.time_control.pgn() if clock else '-'
+        )
+        try:
+            await self.bot.archive.append(
+                game.id, (game.white_id, game.black_id), headers, record.uci_moves()
+            )
+        except OSError as e:
+            logging.error(f'Error archiving game {game.id}: {e}')
+        else:
+            self.bot.dispatch('game_archived', channel, game.id)
+
+    def game_embed(self, footer: Optional[str], clock: Clock = None) -> discord.Embed:
+        """The embed of a game's board message, made for each board rather than kept for the whole game"""
         embed = discord.Embed(color=0x0473b3)  # creates embed
-        embed.set_image(url=f'http://www.fen-to-image.com/image/{board.fen().split()[0]}')  # sets board image
+        embed.set_image(url=f'attachment://{BOARD_FILENAME}')  # the board image is sent as an attachment
         embed.add_field(
             name='Special words:',
             value='\n**`resign`**: resigns the game'
             f'\n**`draw`**: offers/accepts draw'
         )
+        if clock:
+            embed.add_field(name='Time control:', value=str(clock.time_control))
+        if footer:
+            embed.set_footer(text=footer)
+        return embed
+
+    async def run_game(
+        self, channel: discord.TextChannel, white_player: discord.Member, black_player: discord.Member,
+        inbox: asyncio.Queue, game: Game, record: GameRecord, search_limit: dict, clock: Clock = None
+    ):
+        """
+        Plays the game until it is over, reading the players' messages from the game's inbox
 
-        board_message = await ctx.send(embed=embed)  # sends the board (also saves it on board_message)
-        black_invalid_move = False  # checks if black_player has made an invalid move
-        black_refused_draw = False  # checks if black_player has refused a draw
+        When the bot is one of the players, its moves are searched by the engine within search_limit (and within
+        its time, with a clock). A player who runs out of time, or doesn't move for the idle timeout, loses
 
+        While it waits for a move the game only keeps its record: a Board of the position is built once a message
+        has to be parsed (and kept for the rest of the ply), the whole game's Board when the engine needs it
+        """
+        players = {chess.WHITE: white_player, chess.BLACK: black_player}
+        loop = asyncio.get_event_loop()
+        idle_timeout = self.bot.settings.get('idle_timeout_minutes', IDLE_TIMEOUT_MINUTES) * 60
+
+        board = record.replay()  # the first board shows the last move of a resumed game
+        footer = f'Last move: {board.peek().uci()}' if board.move_stack else None
+        board_message = await self.send_board(channel, board, self.game_embed(footer, clock))  # sends the board
+        if clock:
+            clock.start(loop.time())  # once the first player can see the board
+
+        ply = None
         while True:
-            if not (black_invalid_move or black_refused_draw):
-                #  if player 2 makes an invalid move, this block will not execute, thus making player 2 repeat his move
-                #  game begins by asking the white's move, updating board and then showing the updated board
-                #  the line below will get the player's move
-                white_msg = await self.bot.wait_for('message', check=check_white_move)
+            player = players[record.turn]
+            color = COLOR_NAMES[record.turn]
+            message = None  # message with the player's move, deleted once the board is updated
+            if ply != len(record):  # a move was played, not just an illegal one or a declined draw
+                ply = len(record)
+                turn_started = loop.time()
+                board = legal_moves = None  # the previous ply's, built again when a move has to be parsed
+
+            if player.id == self.bot.user.id:
+                # the bot's move is searched in the engine's worker processes, so other games don't wait for it
+                limit = dict(search_limit)
+                if clock:
+                    limit['seconds'] = min(limit.get('seconds') or math.inf, clock.budget(loop.time()))
+                board = record.replay()  # the engine looks at the game's history for repetitions
+                result = await self.bot.engine.best_move(board, **limit)
+                move = chess.Move.from_uci(result.move)
+            else:
+                def check_move(message: discord.Message) -> bool:
+                    """
+                    This function will verify if the messages during game are valid
+                    i.e. it must either be a MOVE sent by the player to move, or a RESIGN message sent by any player
+                    or a DRAW message sent by any player. Chat messages that can't be moves are ignored
+                    """
+                    if message.content.lower() in ('resign', 'draw'):
+                        return True
+                    return message.author == player and could_be_move(message.content)
 
-                if white_msg.content.lower() == 'resign':
+                #  the line below will get the player's move, until the player's time runs out or the game is idle
+                deadline = earliest(turn_started + idle_timeout, clock and clock.flag_time())
+                message = await self.next_message(inbox, check=check_move, deadline=deadline)
+                if message is None:
+                    return await self.time_out(channel, game, record, players, clock, idle_timeout)
+                # the other player from whoever sent the message (which is not necessarily the player to move)
+                other_player = black_player if message.author == white_player else white_player
+
+                if message.content.lower() == 'resign':
                     # if the message is 'resign' (sent by any player), the game will end
-                    return await ctx.send(f'{white_msg.author.mention} resigns! The game is over!')
-                if white_msg.content.lower() == 'draw':
+                    result = RESULTS[chess.WHITE if other_player == white_player else chess.BLACK]
+                    resign_msg = f'{message.author.mention} resigns! The game is over!'
+                    return await self.end_game(channel, game, record, result, 'resignation', resign_msg, clock)
+
+                if message.content.lower() == 'draw':
                     # if the message is 'draw' (sent by any player), the bot must wait for the other player's response
-                    await board_message.edit(content=f'{white_msg.author.mention} offers a draw! Type `draw`'
-                                             f' in order to accept it or anything else to decline it!', embed=embed)
-                    bot_message = await ctx.send(f'{white_msg.author.mention} offers a draw! Type `draw` '
-                                                 f'in order to accept it or anything else to decline it!')
-
-                    # if message's author is equal to whoever sent the challenge
-                    if white_msg.author == white_player:
-                        # waits for other player's response
-                        response = await self.bot.wait_for('message', check=lambda m: m.author == black_player)
-                        if response.content.lower() == 'draw':  # if the response is draw then the game draws
-                            await board_message.edit(content=f'The game is a draw!', embed=embed)
-                            return await ctx.send('The game is a draw!')
-                        else:
-                            # if the response is not draw then the game continues
-                            await board_message.edit(content=f'Draw declined!', embed=embed)
-                            await bot_message.delete()
-                            await response.delete()
-                            await white_msg.delete()
-                            continue
-                    elif white_msg.author == black_player:  # if message's author is equal to the challenged person
-                        # waits for other player's response
-                        response = await self.bot.wait_for('message', check=lambda m: m.author == white_player)
-                        if response.content.lower() == 'draw':  # if the response is draw then the game draws
-                            await board_message.edit(content=f'The game is a draw!', embed=embed)
-                            return await ctx.send('The game is a draw!')
-                        else:
-                            # if the response is not draw then the game continues
-                            await board_message.edit(content=f'Draw declined!', embed=embed)
-                            await bot_message.delete()
-                            await response.delete()
-                            await white_msg.delete()
-                            continue
-                try:
-                    board.push_san(white_msg.content)  # updates board
-                except ValueError:
-                    # player 1 has made an illegal move
-                    embed.set_image(url=f'http://www.fen-to-image.com/image/{board.fen().split()[0]}')  # updates image
-                    await board_message.edit(content=self.illegal_msg(white_player), embed=embed)
-                    await white_msg.delete()
-                    continue
+                    draw_msg = (
+                        f'{message.author.mention} offers a draw! Type `draw`'
+                        f' in order to accept it or anything else to decline it!'
+                    )
+                    self.bot.updates.edit(board_message, content=draw_msg)
+                    bot_message = await self.bot.updates.send(channel, draw_msg)
 
-                #  the line below edits bot's message in order to show the updated board and shows his move
-                embed.set_image(url=f'http://www.fen-to-image.com/image/{board.fen().split()[0]}')  # updates image
-                embed.set_footer(text=f'Last move: {white_msg.content} by white')
-                await board_message.edit(content='', embed=embed)
-                await white_msg.delete()  # deletes player's message
-                if board.is_drawn():  # checks if the current position is a draw
-                    return await ctx.send('The game is a draw!')
-                elif board.is_checkmate():  # checks if the current position is checkmate
-                    return await ctx.send(self.game_over_msg(winner=ctx.author))
-
-            #  asks for the challenged's move, updates board and then shows the updated board
-            #  the line below will get the player's move
-            black_msg = await self.bot.wait_for('message', check=check_black_move)
-
-            if black_msg.content.lower() == 'resign':
-                # if the message is 'resign' (sent by any player), the game will end
-                return await ctx.send(f'{black_msg.author.mention} resigns! The game is over!')
-
-            if black_msg.content.lower() == 'draw':
-                # if the message is 'draw' (sent by any player), the bot must wait for the other player's response
-                draw_msg = (
-                    f'{black_msg.author.mention} offers a draw! Type `draw`'
-                    f' in order to accept it or anything else to decline it!'
-                )
-                await board_message.edit(content=draw_msg, embed=embed)
-                bot_message = await ctx.send(draw_msg)
-
-                if black_msg.author == white_player:  # if message's author is equal to whoever sent the challenge
-                    # gets response from the other player
-                    response = await self.bot.wait_for('message', check=lambda msg: msg.author == black_player)
-
-                    if response.content.lower() == 'draw':  # if response is draw then the game draws
-                        await board_message.edit(content=f'The game is a draw!', embed=embed)
-                        return await ctx.send('The game is a draw!')
-                    else:  # if response is not draw then the game continues
-                        await board_message.edit(content=f'Draw declined!', embed=embed)
-                        await black_msg.delete()
-                        await response.delete()
-                        await bot_message.delete()
-                        black_refused_draw = True
-                        continue
-                elif black_msg.author == black_player:  # if message's author is equal to challenged player
-                    # gets response from the other player
-                    response = await self.bot.wait_for('message', check=lambda m: m.author == white_player)
-                    if response.content.lower() == 'draw':  # if response is draw then the game draws
-                        await board_message.edit(content=f'The game is a draw!', embed=embed)
-                        return await ctx.send('The game is a draw!')
-                    else:  # if response is not draw then the game continues
-                        await board_message.edit(content=f'Draw declined!', embed=embed)
-                        await black_msg.delete()
-                        await response.delete()
-                        await bot_message.delete()
-                        black_refused_draw = True
+                    if other_player.id == self.bot.user.id:
+                        # the bot accepts a draw unless it thinks it is winning
+                        score = evaluate(record.board())
+                        response, accepted = None, (score if other_player == white_player else -score) <= 0
+                    else:
+                        # the offer is declined if it isn't answered in time (the clock keeps running meanwhile)
+                        deadline = earliest(loop.time() + DRAW_OFFER_SECONDS, clock and clock.flag_time())
+                        response = await self.next_message(
+                            inbox, check=lambda m: m.author == other_player, deadline=deadline
+                        )
+                        accepted = response is not None and response.content.lower() == 'draw'
+
+                    if accepted:  # if the response is draw then the game draws
+                        self.bot.updates.edit(board_message, content=f'The game is a draw!')
+                        return await self.end_game(
+                            channel, game, record, DRAW, 'draw agreed', 'The game is a draw!', clock
+                        )
+                    else:
+                        # if the response is not draw then the game continues
+                        self.bot.updates.edit(board_message, content=f'Draw declined!')
+                        self.bot.updates.delete(bot_message)
+                        if response:
+                            self.bot.updates.delete(response)
+                        self.bot.updates.delete(message)
                         continue
-            try:
-                black_invalid_move = False
-                black_refused_draw = False
-                board.push_san(black_msg.content)  # updates board
-            except ValueError:
-                # player 2 has made an illegal move
-                embed.set_image(url=f'http://www.fen-to-image.com/image/{board.fen().split()[0]}')  # updates image
-                await board_message.edit(content=self.illegal_msg(black_player), embed=embed)
-                await black_msg.delete()
-                black_invalid_move = True
-                continue
 
-            #  the line below edits bot's message in order to show the updated board and shows his move
-            embed.set_image(url=f'http://www.fen-to-image.com/image/{board.fen().split()[0]}')  # updates image
-            embed.set_footer(text=f'Last move: {black_msg.content} by black')
-            await board_message.edit(content='', embed=embed)
-            await black_msg.delete()
-            if board.is_drawn():
-                return await ctx.send('The game is a draw!')
-            elif board.is_checkmate():
-                return await ctx.send(self.game_over_msg(winner=black_player))
+                if legal_moves is None:
+                    board = record.board()
+                    legal_moves = MoveIndex(board)  # kept for the rest of the ply, so it is only built once
+                start = time.perf_counter()
+                move = legal_moves.parse(message.content)
+                MOVE_PARSE.observe(time.perf_counter() - start)
+                if move is None:
+                    # player has made an illegal (or ambiguous) move, so he has to make another one
+                    content = self.ambiguous_msg(player, board, legal_moves.ambiguous) if legal_moves.ambiguous \
+                        else self.illegal_msg(player)
+                    self.bot.updates.edit(board_message, content=content)
+                    self.bot.updates.delete(message)
+                    continue
+            if clock and clock.flagged(loop.time()):
+                # the move came too late, the player's time ran out before the timer was called
+                return await self.time_out(channel, game, record, players, clock, idle_timeout)
+            opening = ' (opening book)' if move in self.bot.book.moves(board) else ''
+            move_text = board.san(move)
+            board.push(move)  # updates board
+            record.push(board, move)
+            if clock:
+                clock.press(loop.time())
+            self.bot.store.add_move(game.id, len(record), move.uci())
+            logger.info(
+                'Move %s in game %s', move.uci(), game.id,
+                extra={'event': 'move', 'game_id': game.id, 'ply': len(record), 'move': move.uci()}
+            )
+
+            #  the line below sends the updated board (replacing the old one) and shows the move
+            footer = f'Last move: {move_text} by {color}{opening}'
+            embed = self.game_embed(f'{footer}\nClock: {clock}' if clock else footer, clock)
+            board_message = await self.send_board(channel, board, embed, board_message)
+            if message:
+                self.bot.updates.delete(message)  # deletes player's message
+            draw_reason = board.draw_reason()  # checks if the current position is a draw
+            if draw_reason:
+                return await self.end_game(channel, game, record, DRAW, draw_reason, 'The game is a draw!', clock)
+            elif board.is_checkmate():  # checks if the current position is checkmate
+                return await self.end_game(
+                    channel, game, record, RESULTS[not board.turn], 'checkmate', self.game_over_msg(winner=player),
+                    clock
+                )
 
 
 def setup(bot):
@@ -1,10 +1,10 @@
-import traceback
-import datetime
 import logging
 
 import discord
 from discord.ext import commands
 
+logger = logging.getLogger('bot.commands')
+
 
 class CommandErrorHandler(commands.Cog):
 
@@ -14,12 +14,16 @@ class CommandErrorHandler(commands.Cog):
     @staticmethod
     async def bot_check(ctx: commands.Context, **kwargs):
         """
-        This runs at the start of every command
+        This runs at the start of every command, it only logs it (commands that take long show that the bot
+        is typing themselves, see bot.bot_client.show_typing)
         """
-        await ctx.trigger_typing()
-        time = datetime.datetime.utcnow()
-        msg = f"'{ctx.command}' ran by '{ctx.author}' as '{ctx.invoked_with}' at {time}. with '{ctx.message.content}'"
-        logging.info(msg)
+        logger.info(
+            "'%s' ran by '%s' as '%s'", ctx.command, ctx.author, ctx.invoked_with,
+            extra={
+                'event': 'command', 'command': ctx.command.qualified_name, 'author_id': ctx.author.id,
+                'guild_id': ctx.guild and ctx.guild.id, 'channel_id': ctx.channel.id, 'content': ctx.message.content
+            }
+        )
         return True
 
     @commands.Cog.listener()
@@ -28,8 +32,8 @@ class CommandErrorHandler(commands.Cog):
         Runs on every uncaught exception that happens in a Cog at Runtime
 
         Tries to deal with most of actual discord.py errors, otherwise sends a
-        default error message and then sends traceback and error name to the
-        Bot's owner (by a Discord private message)
+        default error message and records the error, which will be in the next
+        digest of errors sent to the Bot's owner (by a Discord private message)
         """
 
         if hasattr(ctx.command, 'on_error'):
@@ -69,6 +73,10 @@ class CommandErrorHandler(commands.Cog):
                     p_type = 'Member'
                 elif p_type == 'int':
                     p_type = 'Number'
+                elif p_type == 'Player':
+                    p_type = 'Member or "bot"'
+                elif p_type == 'SearchLimit':
+                    p_type = 'Depth (e.g. 4) or Seconds (e.g. 3s)'
 
                 embed.add_field(name=param, value=f"**Type:** *{p_type}*\n*{default}*", inline=False)
             try:
@@ -109,8 +117,7 @@ class CommandErrorHandler(commands.Cog):
 
         else:
             await ctx.send(f"Unknown error. The logs of this error have been sent to a Dev and will be fixed shortly.")
-            tb = ''.join(traceback.format_exception(type(error), error, error.__traceback__))
-            await self.bot.send_logs(error, tb, ctx)
+            self.bot.errors.record(error, ctx)
 
 
 def setup(bot):
@@ -23,6 +23,42 @@ class Help(commands.Cog):
                   'and [black_player].\nRemember to mention them and not to include the square brackets!'
                   '\nUsage example: !play @Paul @Lily'
                              )
+        embed_help.add_field(
+            name='!play [white_player] [black_player] [minutes+increment]',
+            value='Starts a game with a clock: each player has [minutes], plus [increment] seconds after each move.'
+                  '\nA player who runs out of time loses. Usage example: !play @Paul @Lily 5+3'
+        )
+        embed_help.add_field(  # play against the bot
+            name='!play [white_player] bot [depth or seconds]',
+            value='Starts a game against the bot, which can also play white (!play bot @Paul).'
+                  '\nOptionally choose how deep or how long it thinks about each move.'
+                  '\nUsage example: !play @Paul bot 3s'
+        )
+        embed_help.add_field(
+            name='!seek [minutes+increment]',
+            value='Looks for an opponent with a close rating in this server, the game starts in the chess channel.'
+                  '\n!cancel stops looking. Usage example: !seek 5+3'
+        )
+        embed_help.add_field(
+            name='!puzzle [rating] [theme]',
+            value='Sends a tactics puzzle close to your puzzle rating (or to the rating given), optionally of a theme.'
+                  '\nUsage example: !puzzle 1800 fork'
+        )
+        embed_help.add_field(name='!games', value='Lists the games being played in this server')
+        embed_help.add_field(name='!rating [member]', value="Shows a member's rating (or your own)")
+        embed_help.add_field(
+            name='!leaderboard [page] [global]',
+            value='Shows the best rated players of this server, or of every server with `global`'
+        )
+        embed_help.add_field(name='!history [member]', value="Lists a member's last finished games (or your own)")
+        embed_help.add_field(name='!pgn [game id]', value='Sends the PGN of a finished game')
+        embed_help.add_field(
+            name='!replay [game id] [white or black]',
+            value='Sends an animated GIF of a finished game, optionally seen from black\'s side'
+        )
+        embed_help.add_field(
+            name='!analyze [game id]', value="Flags a finished game's mistakes and shows each player's accuracy"
+        )
         await ctx.send(embed=embed_help)  # sends embed
 
 
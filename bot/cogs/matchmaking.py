@@ -0,0 +1,118 @@
+import asyncio
+import logging
+import random
+
+import discord
+from discord.ext import commands
+
+from bot.bot_client import Bot
+from bot.cogs.chess import TimeControlArgument
+from bot.game.matchmaking import Seek
+from bot.game.ratings import DEFAULT_RATING
+
+SEEK_MINUTES = 10  # a seek that nobody accepted is cancelled after that long
+WIDEN_SECONDS = 5  # how often the waiting seeks, whose windows widened, are compared again
+CHESS_CHANNEL = 'chess'  # name of the channel where matched games are played, unless set in settings
+
+
+class Matchmaking(commands.Cog):
+
+    def __init__(self, bot: Bot):
+        self.bot = bot
+        self.widening = self.bot.loop.create_task(self.widen_windows())
+
+    def cog_unload(self):
+        self.widening.cancel()
+
+    def chess_channel(self, guild: discord.Guild, fallback: discord.TextChannel) -> discord.TextChannel:
+        """The guild's channel for games, the channel of the seek if the guild has none"""
+        name = self.bot.settings.get('chess_channel', CHESS_CHANNEL)
+        return discord.utils.get(guild.text_channels, name=name) or fallback
+
+    @commands.guild_only()
+    @commands.cooldown(1, 5, commands.BucketType.user)
+    @commands.command(aliases=['queue', 'findgame'])
+    async def seek(self, ctx: commands.Context, time_control: TimeControlArgument = None):
+        """
+        Looks for an opponent with a close rating in this server, e.g. !seek 5+3 (or !seek for a game without clock)
+        The more you wait, the wider the accepted ratings. The game starts in the server's chess channel
+        """
+        rating = await self.bot.store.ratings.rating(ctx.author.id, ctx.guild.id)
+        now = asyncio.get_event_loop().time()
+        seek = Seek(
+            ctx.guild.id, ctx.author.id, ctx.channel.id, time_control, rating.rating if rating else DEFAULT_RATING, now
+        )
+        opponent = self.bot.matchmaker.add(seek, now)
+        if opponent is not None:
+            return await self.start_match(opponent, seek)
+
+        seek.expiry = self.bot.timers.schedule(now + SEEK_MINUTES * 60, lambda timer: self.expire(seek))
+        await ctx.send(
+            f'{ctx.author.mention} is looking for {f"a {time_control}" if time_control else "an untimed"} game '
+            f'(rating {seek.rating:.0f} ± {self.bot.matchmaker.window(seek, now):.0f}, wider the more you wait). '
+            f'Type `!cancel` to stop looking.'
+        )
+
+    @commands.guild_only()
+    @commands.command(aliases=['unseek'])
+    async def cancel(self, ctx: commands.Context):
+        """Stops looking for an opponent (see !seek)"""
+        if self.bot.matchmaker.cancel(ctx.guild.id, ctx.author.id) is None:
+            return await ctx.send('You are not looking for a game.')
+        await ctx.send(f'{ctx.author.mention} is not looking for a game anymore.')
+
+    def expire(self, seek: Seek):
+        """Cancels a seek that nobody accepted in time (a timer of the bot's scheduler)"""
+        self.bot.matchmaker.cancel(seek.guild_id, seek.user_id)
+        channel = self.bot.get_channel(seek.channel_id)
+        if channel is not None:
+            self.bot.loop.create_task(self.bot.updates.send(
+                channel, f'<@{seek.user_id}> nobody accepted your seek in {SEEK_MINUTES} minutes, try again later!'
+            ))
+
+    async def start_match(self, seek: Seek, other: Seek):
+        """
+        Starts the game of two matched seeks in the guild's chess channel, colors are drawn at random
+        """
+        guild = self.bot.get_guild(seek.guild_id)
+        chess = self.bot.get_cog('Chess')
+        if guild is None or chess is None:
+            return
+        try:
+            players = [guild.get_member(s.user_id) or await guild.fetch_member(s.user_id) for s in (seek, other)]
+        except discord.HTTPException as e:
+            logging.error(f'Could not start the game of seeks {seek.user_id} and {other.user_id}: {e}')
+            return
+        random.shuffle(players)
+        fallback = guild.get_channel(other.channel_id)
+        channel = self.chess_channel(guild, fallback)
+        if channel is None:
+            return
+        if fallback is not None and channel != fallback:
+            await self.bot.updates.send(
+                fallback, f'{players[0].mention} and {players[1].mention} were matched, the game starts in '
+                f'{channel.mention}!'
+            )
+        self.bot.loop.create_task(chess.new_game(channel, players[0], players[1], seek.time_control))
+
+    async def widen_windows(self):
+        """
+        Matches the seeks that accept each other now that they waited longer, every WIDEN_SECONDS
+
+        The pairs are out of the matchmaker once matched: a pair whose game couldn't start is dropped (its error is
+        recorded for the owner's digest) and the other pairs still start
+        """
+        while True:
+            await asyncio.sleep(WIDEN_SECONDS)
+            for seek, other in self.bot.matchmaker.widen(asyncio.get_event_loop().time()):
+                try:
+                    await self.start_match(seek, other)
+                except asyncio.CancelledError:
+                    raise
+                except Exception as e:
+                    logging.error(f'Could not start the game of seeks {seek.user_id} and {other.user_id}: {e!r}')
+                    self.bot.errors.record(e)
+
+
+def setup(bot):
+    bot.add_cog(Matchmaking(bot))
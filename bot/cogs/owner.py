@@ -1,6 +1,12 @@
+import discord
 from discord.ext import commands
 
 from bot.bot_client import Bot
+from bot.metrics import ACTIVE_GAMES, API_CALLS, COMMANDS, LOOP_LAG, MOVE_PARSE, RENDER, summary
+
+API_ROUTES_SHOWN = 5  # busiest Discord API routes shown by !stats
+ERRORS_LISTED = 15  # groups of errors shown by !errors
+TRACEBACK_SHOWN = 1500  # last characters of a sample's traceback shown by !errors <fingerprint>
 
 
 class Owner(commands.Cog):
@@ -22,11 +28,65 @@ class Owner(commands.Cog):
     @commands.has_permissions(manage_guild=True)
     @commands.command(aliases=['reloadall'])
     async def reload_all_cogs(self, ctx: commands.Context):
-        """Reloads all cogs"""
-        err = await self.bot.reload_all_extensions()
+        """Reloads the cogs that changed since they were loaded"""
+        changed, err = await self.bot.reload_all_extensions()
         if err:
             return await ctx.send('Error when reloading extensions. Check the bot logs.')
-        return await ctx.send('All extensions were reloaded successfully.')
+        if not changed:
+            return await ctx.send('No extension changed since it was loaded.')
+        return await ctx.send(f'Reloaded extensions: {", ".join(sorted(changed))}.')
+
+    @commands.is_owner()
+    @commands.command(aliases=['metrics'])
+    async def stats(self, ctx: commands.Context):
+        """Shows the metrics of this process of the bot, also served to Prometheus if metrics_port is set"""
+        embed = discord.Embed(title=f'Stats ({self.bot.process_name})', color=discord.Color.blurple())
+        embed.add_field(name='Active games', value=str(ACTIVE_GAMES.value()))
+        embed.add_field(name='Discord API calls', value=str(int(API_CALLS.total())))
+        for name, histogram in [
+            ('Commands', COMMANDS), ('Move parsing', MOVE_PARSE), ('Board rendering', RENDER),
+            ('Event loop lag', LOOP_LAG)
+        ]:
+            embed.add_field(name=name, value=summary(histogram) or 'Nothing recorded yet', inline=False)
+        routes = sorted(API_CALLS.children.items(), key=lambda item: item[1].value, reverse=True)
+        if routes:
+            embed.add_field(name='Busiest API routes', inline=False, value='\n'.join(
+                f'`{method} {route}`: {int(calls.value)}' for (method, route), calls in routes[:API_ROUTES_SHOWN]
+            ))
+        return await ctx.send(embed=embed)
+
+    @commands.is_owner()
+    @commands.command()
+    async def errors(self, ctx: commands.Context, fingerprint: str = None):
+        """Lists the errors of this process of the bot by fingerprint, or shows samples of one of them"""
+        if fingerprint is None:
+            groups = self.bot.errors.recent()
+            if not groups:
+                return await ctx.send('No errors since the bot started.')
+            embed = discord.Embed(
+                title=f'Errors ({self.bot.process_name}): {self.bot.errors.recorded} in total',
+                color=discord.Color.dark_red(),
+                description='\n'.join(
+                    f'`{group.fingerprint}` **{group.name}** x{group.count} at `{group.location}`, '
+                    f'last {group.last_seen:%Y-%m-%d %H:%M} UTC'
+                    for group in groups[:ERRORS_LISTED]
+                )
+            )
+            embed.set_footer(text='Use !errors <fingerprint> to see samples of an error')
+            return await ctx.send(embed=embed)
+
+        group = self.bot.errors.find(fingerprint)
+        if group is None:
+            return await ctx.send(f'No error (or more than one) has a fingerprint starting with `{fingerprint}`.')
+        embed = discord.Embed(
+            title=f'{group.name} `{group.fingerprint}`', color=discord.Color.dark_red(),
+            description=f'{group.count} times at `{group.location}`, first {group.first_seen:%Y-%m-%d %H:%M} UTC, '
+                        f'last {group.last_seen:%Y-%m-%d %H:%M} UTC'
+        )
+        for sample in reversed(group.samples):
+            value = f'{sample.message[:300]}\n{sample.context[:600]}'.strip() or '-'
+            embed.add_field(name=f'{sample.time:%Y-%m-%d %H:%M:%S} UTC', value=value, inline=False)
+        await ctx.send(embed=embed, content=f'```python\n{group.samples[-1].traceback[-TRACEBACK_SHOWN:]}```')
 
 
 def setup(bot):
@@ -0,0 +1,129 @@
+import asyncio
+from typing import Optional
+
+import discord
+from discord.ext import commands
+
+from bot.bot_client import Bot
+from bot.cogs.chess import BOARD_FILENAME, COLOR_NAMES
+from bot.game.moves import MoveIndex, could_be_move
+from bot.game.puzzles import Puzzle
+from bot.game.ratings import DEFAULT_RATING, DEFAULT_VOLATILITY
+
+PUZZLE_MINUTES = 5  # a puzzle that isn't solved in time is failed
+THEMES_LISTED = 30  # themes shown when an unknown one is asked for
+
+
+def solution_text(puzzle: Puzzle) -> str:
+    """The moves of the solution in SAN, e.g. `23. Nf7+ Kg8 24. Nh6#`"""
+    board = puzzle.board()
+    board.push(puzzle.moves[0])
+    return board.variation_san(puzzle.moves[1:])
+
+
+class Puzzles(commands.Cog):
+
+    def __init__(self, bot: Bot):
+        self.bot = bot
+
+    @commands.guild_only()
+    @commands.cooldown(1, 5, commands.BucketType.user)
+    @commands.command(aliases=['tactic', 'tactics'])
+    async def puzzle(self, ctx: commands.Context, rating: Optional[int] = None, theme: str = None):
+        """
+        Sends a tactics puzzle close to your puzzle rating, or to the given rating, optionally of a theme,
+        e.g. !puzzle, !puzzle 1800 or !puzzle 1800 fork. Type your moves like in a game, or `resign` to give up
+        """
+        puzzles = self.bot.puzzles
+        if not len(puzzles):
+            return await ctx.send('There are no puzzles yet, the bot\'s owner has to import them first.')
+        name = None
+        if theme is not None:
+            name = puzzles.theme(theme)
+            if name is None:
+                themes = ', '.join(sorted(puzzles.themes)[:THEMES_LISTED])
+                return await ctx.send(f'There is no puzzle theme `{theme}`. Some of the themes are: {themes}')
+        chess = self.bot.get_cog('Chess')
+        if chess is None:
+            return
+        if self.bot.router.is_playing(ctx.guild.id, ctx.channel.id, ctx.author.id):
+            return await ctx.send(f'{ctx.author.mention} is already playing in this channel.')
+
+        player = await self.bot.store.ratings.puzzle_rating(ctx.author.id)
+        before = player.rating if player else DEFAULT_RATING
+        puzzle = puzzles.pick(before if rating is None else rating, name)
+        if puzzle is None:
+            return await ctx.send(f'There are no puzzles of the theme {name}.')
+
+        # from now on the player's messages in this channel go to the puzzle, like a game's
+        inbox = self.bot.router.open(ctx.guild.id, ctx.channel.id, [ctx.author.id])
+        try:
+            solved = await self.solve(ctx.channel, ctx.author, puzzle, chess, inbox)
+        finally:
+            self.bot.router.close(ctx.guild.id, ctx.channel.id, [ctx.author.id])
+
+        player = await self.bot.store.ratings.rate_puzzle(
+            ctx.author.id, (puzzle.rating, puzzle.deviation, DEFAULT_VOLATILITY), solved
+        )
+        result = 'solved the puzzle!' if solved else f'failed the puzzle, the solution was {solution_text(puzzle)}'
+        await self.bot.updates.send(
+            ctx.channel,
+            f'{ctx.author.mention} {result}\nPuzzle rating: **{player.rating:.0f}** ({player.rating - before:+.0f}). '
+            f'Puzzle {puzzle.id} is rated {puzzle.rating} ({", ".join(puzzle.themes) or "no themes"}): <{puzzle.url}>'
+        )
+
+    async def solve(
+        self, channel: discord.TextChannel, player: discord.Member, puzzle: Puzzle, chess: commands.Cog,
+        inbox: asyncio.Queue
+    ) -> bool:
+        """
+        Shows the puzzle and reads the player's moves from the inbox, their moves are parsed like the moves of
+        a game (see Chess.run_game). Returns whether they found every move of the solution (or another checkmate)
+        """
+        board = puzzle.board()
+        board.push(puzzle.moves[0])  # the opponent's move that leads to the puzzle
+        deadline = asyncio.get_event_loop().time() + PUZZLE_MINUTES * 60
+        embed = discord.Embed(
+            title=f'Puzzle {puzzle.id}: {COLOR_NAMES[board.turn]} to play', color=0x0473b3,
+            description=f'Find the best move! Type `resign` to give up, you have {PUZZLE_MINUTES} minutes.'
+        )
+        embed.set_image(url=f'attachment://{BOARD_FILENAME}')
+        embed.set_footer(text=f'Last move: {board.peek().uci()}')
+        board_message = await chess.send_board(channel, board, embed)
+
+        for ply in range(1, len(puzzle.moves), 2):
+            legal_moves = MoveIndex(board)
+            while True:
+                message = await chess.next_message(
+                    inbox, check=lambda m: m.content.lower() == 'resign' or could_be_move(m.content),
+                    deadline=deadline
+                )
+                if message is None or message.content.lower() == 'resign':
+                    return False
+                move = legal_moves.parse(message.content)
+                if move is not None:
+                    break
+                content = chess.ambiguous_msg(player, board, legal_moves.ambiguous) if legal_moves.ambiguous \
+                    else chess.illegal_msg(player)
+                self.bot.updates.edit(board_message, content=content)
+                self.bot.updates.delete(message)
+
+            self.bot.updates.delete(message)
+            move_text = board.san(move)
+            board.push(move)
+            if board.is_checkmate():
+                return True  # any checkmate solves the puzzle, even if it isn't the one of the solution
+            if move != puzzle.moves[ply]:
+                return False
+            if ply + 1 == len(puzzle.moves):
+                return True
+            reply = puzzle.moves[ply + 1]
+            footer = f'{move_text} is right! The reply is {board.san(reply)}, find the next move'
+            board.push(reply)
+            embed.set_footer(text=footer)
+            board_message = await chess.send_board(channel, board, embed, board_message)
+        return True
+
+
+def setup(bot):
+    bot.add_cog(Puzzles(bot))
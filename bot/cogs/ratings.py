@@ -0,0 +1,71 @@
+from typing import Optional
+
+import discord
+from discord.ext import commands
+
+from bot.bot_client import Bot, show_typing
+from bot.orm.ratings import GLOBAL
+
+
+class Ratings(commands.Cog):
+
+    def __init__(self, bot: Bot):
+        self.bot = bot
+
+    @commands.guild_only()
+    @commands.cooldown(1, 5, commands.BucketType.user)
+    @commands.command(aliases=['elo', 'glicko'])
+    async def rating(self, ctx: commands.Context, member: discord.Member = None):
+        """
+        Shows the rating of a member (or your own) in this server and in every server
+        Games against the bot are not rated
+        """
+        member = member or ctx.author
+        embed = discord.Embed(title=f'Rating of {member.display_name}', color=0x0473b3)
+        for name, guild_id in (('This server', ctx.guild.id), ('Every server', GLOBAL)):
+            rating = await self.bot.store.ratings.rating(member.id, guild_id)
+            if rating is None:
+                embed.add_field(name=name, value='No rated games yet', inline=False)
+                continue
+            rank = (await self.bot.store.ratings.leaderboard(guild_id)).rank(member.id)
+            embed.add_field(
+                name=name, inline=False,
+                value=f'**{rating.rating:.0f}** ± {2 * rating.deviation:.0f}, #{rank}\n'
+                      f'{rating.wins} wins, {rating.losses} losses and {rating.draws} draws'
+            )
+        puzzles = await self.bot.store.ratings.puzzle_rating(member.id)
+        if puzzles is not None:
+            embed.add_field(
+                name='Puzzles', inline=False,
+                value=f'**{puzzles.rating:.0f}** ± {2 * puzzles.deviation:.0f}\n'
+                      f'{puzzles.solved} solved and {puzzles.failed} failed'
+            )
+        await ctx.send(embed=embed)
+
+    @commands.guild_only()
+    @commands.cooldown(1, 5, commands.BucketType.channel)
+    @commands.command(aliases=['top', 'ranking'])
+    async def leaderboard(self, ctx: commands.Context, page: Optional[int] = 1, scope: str = None):
+        """
+        Shows a page of the ratings' leaderboard of this server, or of every server with `!leaderboard [page] global`
+        """
+        everywhere = scope == 'global'
+        leaderboard = await self.bot.store.ratings.leaderboard(GLOBAL if everywhere else ctx.guild.id)
+        if not len(leaderboard):
+            return await ctx.send('Nobody has played a rated game yet.')
+        page = min(max(page, 1), leaderboard.pages())
+        lines = [f'**{rank}.** <@{user_id}> {rating:.0f}' for rank, user_id, rating in leaderboard.page(page)]
+        title = 'Leaderboard of every server' if everywhere else 'Leaderboard'
+        embed = discord.Embed(title=title, color=0x0473b3, description='\n'.join(lines))
+        embed.set_footer(text=f'Page {page} of {leaderboard.pages()} ({len(leaderboard)} players)')
+        await ctx.send(embed=embed)
+
+    @rating.before_invoke
+    @leaderboard.before_invoke
+    async def trigger_typing(self, ctx: commands.Context):
+        # the first time, the leaderboard is read from the database
+        await show_typing(ctx)
+
+
+def setup(bot):
+    bot.add_cog(Ratings(bot))
@@ -0,0 +1,154 @@
+"""
+Aggregation of the bot's unexpected errors: errors are grouped by fingerprint (their type and the frame that
+raised them), counted, and the owner gets a digest of what happened every few minutes instead of a message per error
+"""
+import asyncio
+import datetime
+import hashlib
+import logging
+import os
+import traceback
+from collections import OrderedDict, deque
+from typing import Awaitable, Callable, Deque, List, NamedTuple, Optional, Tuple
+
+import discord
+
+BOT_PATH = os.path.dirname(os.path.abspath(__file__))
+DIGEST_LISTED = 10  # groups of errors shown in a digest, the most frequent first
+
+
+class ErrorSample(NamedTuple):
+    time: datetime.datetime
+    message: str
+    context: str  # the command's message and where it was sent, if the error happened in a command
+    traceback: str
+
+
+class ErrorGroup:
+    """Every occurrence of an error with the same fingerprint, with the last few samples of it"""
+
+    def __init__(self, fingerprint: str, name: str, location: str, samples: int):
+        self.fingerprint = fingerprint
+        self.name = name  # type of the exception
+        self.location = location  # file, line and function that raised it
+        self.count = 0
+        self.reported = 0  # count when the last digest was sent
+        self.first_seen = self.last_seen = datetime.datetime.utcnow()
+        self.samples: Deque[ErrorSample] = deque(maxlen=samples)
+
+    @property
+    def new(self) -> int:
+        """Occurrences since the last digest"""
+        return self.count - self.reported
+
+
+def innermost_frame(error: BaseException) -> Optional[traceback.FrameSummary]:
+    """The deepest frame of the traceback that is in the bot's code, or the deepest one if none is"""
+    frames = traceback.extract_tb(error.__traceback__)
+    for frame in reversed(frames):
+        if frame.filename.startswith(BOT_PATH):
+            return frame
+    return frames[-1] if frames else None
+
+
+def fingerprint(error: BaseException) -> Tuple[str, str, str]:
+    """Short hash of the error's type and the frame that raised it, the name of the type and that frame's location"""
+    name = f'{type(error).__module__}.{type(error).__qualname__}'
+    frame = innermost_frame(error)
+    if frame is None:
+        location = 'unknown'
+    else:
+        location = f'{os.path.relpath(frame.filename, os.path.dirname(BOT_PATH))}:{frame.lineno} in {frame.name}'
+    return hashlib.sha1(f'{name} {location}'.encode()).hexdigest()[:8], type(error).__name__, location
+
+
+def command_context(ctx) -> str:
+    return f'{ctx.message.content!r} by {ctx.author} in {ctx.guild} #{ctx.channel}'
+
+
+class ErrorAggregator:
+    """
+    Groups of errors by fingerprint, the least recently seen are dropped once there are more than `capacity` of them
+    (and only the last `samples` occurrences of each are kept), so memory use is bounded however many errors happen
+    """
+
+    def __init__(self, capacity: int = 256, samples: int = 5):
+        self.capacity = capacity
+        self.samples = samples
+        self.groups: 'OrderedDict[str, ErrorGroup]' = OrderedDict()
+        self.recorded = 0
+        self.dropped = 0  # groups dropped to stay under capacity
+
+    def record(self, error: BaseException, ctx=None) -> ErrorGroup:
+        """Counts an error, the first time a fingerprint is seen its traceback is also logged"""
+        key, name, location = fingerprint(error)
+        group = self.groups.get(key)
+        if group is None:
+            group = self.groups[key] = ErrorGroup(key, name, location, self.samples)
+            if len(self.groups) > self.capacity:
+                self.groups.popitem(last=False)
+                self.dropped += 1
+        self.groups.move_to_end(key)
+        tb = ''.join(traceback.format_exception(type(error), error, error.__traceback__))
+        if not group.count:
+            logging.error(f'New error {key} ({location}):\n{tb}')
+        group.count += 1
+        group.last_seen = datetime.datetime.utcnow()
+        group.samples.append(ErrorSample(group.last_seen, str(error), command_context(ctx) if ctx else '', tb))
+        self.recorded += 1
+        return group
+
+    def digest(self) -> List[ErrorGroup]:
+        """Groups with occurrences since the last digest, the most frequent first"""
+        return sorted((group for group in self.groups.values() if group.new), key=lambda group: -group.new)
+
+    def mark_reported(self, groups: List[ErrorGroup]):
+        for group in groups:
+            group.reported = group.count
+
+    def find(self, prefix: str) -> Optional[ErrorGroup]:
+        """The group whose fingerprint starts with the prefix, None if there isn't exactly one"""
+        matches = [group for key, group in self.groups.items() if key.startswith(prefix.lower())]
+        return matches[0] if len(matches) == 1 else None
+
+    def recent(self) -> List[ErrorGroup]:
+        """Every group, the most recently seen first"""
+        return list(reversed(self.groups.values()))
+
+
+def digest_embed(groups: List[ErrorGroup]) -> discord.Embed:
+    embed = discord.Embed(
+        title=f'{sum(group.new for group in groups)} errors since the last digest',
+        color=discord.Color.dark_red()
+    )
+    for group in groups[:DIGEST_LISTED]:
+        sample = group.samples[-1]
+        embed.add_field(
+            name=f'`{group.fingerprint}` {group.name}{" (new)" if not group.reported else ""}',
+            value=f'{group.new} times ({group.count} in total) at `{group.location}`\n{sample.message[:200]}',
+            inline=False
+        )
+    if len(groups) > DIGEST_LISTED:
+        embed.add_field(name='...', value=f'and {len(groups) - DIGEST_LISTED} other errors', inline=False)
+    embed.set_footer(text='Use !errors <fingerprint> to see samples of an error')
+    return embed
+
+
+async def send_digests(
+    aggregator: ErrorAggregator, send: Callable[[discord.Embed], Awaitable[None]], interval: float
+):
+    """
+    Sends a digest of the errors every `interval` seconds if there were any, so at most one message per interval
+    is sent whatever the number of errors. Errors of a digest that couldn't be sent are in the next one
+    """
+    while True:
+        await asyncio.sleep(interval)
+        groups = aggregator.digest()
+        if not groups:
+            continue
+        try:
+            await send(digest_embed(groups))
+        except discord.HTTPException as e:
+            logging.error(f'Could not send the errors digest: {e}')
+        else:
+            aggregator.mark_reported(groups)
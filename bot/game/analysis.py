@@ -0,0 +1,172 @@
+"""
+Post-game analysis: every position of a game is evaluated by the engine, moves that lose too much are flagged
+and each player gets an accuracy (the formula of https://lichess.org/page/accuracy)
+"""
+import asyncio
+import math
+import time
+from collections import OrderedDict
+from concurrent.futures import ProcessPoolExecutor
+from typing import Dict, List, NamedTuple, Optional, Tuple
+
+import chess
+
+from bot.game.board import Board
+from bot.game.engine import MATE, MAX_DEPTH, Searcher
+
+MATE_SCORE = 1000  # mates count as this many centipawns, so that a missed mate isn't an endless loss
+SECONDS_PER_POSITION = 10.0  # a position's search stops after this long, even before its depth
+
+# centipawns a move must lose to be each of these, from the worst
+LABELS = ((300, 'blunder'), (100, 'mistake'), (50, 'inaccuracy'))
+
+
+def evaluate_positions(fens: List[str], depth: int) -> List[int]:
+    """
+    Searches each position to the depth, returns their scores in centipawns from white's point of view
+    (clamped to ±MATE_SCORE). This is what runs in the worker processes
+    """
+    scores = []
+    for fen in fens:
+        board = Board(fen)
+        if board.is_checkmate():
+            score = -MATE_SCORE
+        elif board.is_stalemate() or board.is_insufficient_material():
+            score = 0
+        else:
+            score = Searcher(board, deadline=time.monotonic() + SECONDS_PER_POSITION).search(depth)[1]
+            if abs(score) >= MATE - MAX_DEPTH:
+                score = MATE_SCORE if score > 0 else -MATE_SCORE
+            score = max(-MATE_SCORE, min(MATE_SCORE, score))
+        scores.append(score if board.turn == chess.WHITE else -score)
+    return scores
+
+
+def win_percent(centipawns: int) -> float:
+    """Chances of winning (0 to 100) of a player who is ahead by the centipawns"""
+    return 50 + 50 * (2 / (1 + math.exp(-0.00368208 * centipawns)) - 1)
+
+
+def move_accuracy(before: int, after: int) -> float:
+    """Accuracy (0 to 100) of a move that took the player's score from before to after (their point of view)"""
+    loss = win_percent(before) - win_percent(after)
+    return max(0.0, min(100.0, 103.1668 * math.exp(-0.04354 * loss) - 3.1669))
+
+
+class MoveReport(NamedTuple):
+    ply: int  # 1 for white's first move
+    san: str
+    color: bool
+    before: int  # score before and after the move, in centipawns from white's point of view
+    after: int
+    loss: int  # centipawns lost by the move, from the point of view of who played it
+    label: Optional[str]  # 'blunder', 'mistake', 'inaccuracy' or None
+
+
+class Analysis:
+
+    def __init__(self, moves: List[MoveReport]):
+        self.moves = moves
+
+    def of(self, color: bool) -> List[MoveReport]:
+        return [move for move in self.moves if move.color == color]
+
+    def accuracy(self, color: bool) -> Optional[float]:
+        """Average accuracy of a player's moves, None if they haven't moved"""
+        sign = 1 if color == chess.WHITE else -1
+        accuracies = [move_accuracy(sign * move.before, sign * move.after) for move in self.of(color)]
+        return sum(accuracies) / len(accuracies) if accuracies else None
+
+    def count(self, color: bool, label: str) -> int:
+        return sum(move.label == label for move in self.of(color))
+
+    def flagged(self) -> List[MoveReport]:
+        return [move for move in self.moves if move.label]
+
+
+class EvalCache:
+    """Scores of positions (by their Zobrist hash and the depth of the search), the least recently used are dropped"""
+
+    def __init__(self, size: int = 100000):
+        self.size = size
+        self.scores: 'OrderedDict[Tuple[int, int], int]' = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, key: Tuple[int, int]) -> Optional[int]:
+        score = self.scores.get(key)
+        if score is None:
+            self.misses += 1
+            return None
+        self.hits += 1
+        self.scores.move_to_end(key)
+        return score
+
+    def put(self, key: Tuple[int, int], score: int):
+        self.scores[key] = score
+        self.scores.move_to_end(key)
+        if len(self.scores) > self.size:
+            self.scores.popitem(last=False)
+
+
+class Analyzer:
+    """
+    Analyzes games in a pool of worker processes: a game's positions that aren't cached are split into batches,
+    which the workers search at the same time
+    """
+
+    def __init__(self, workers: int = 2, depth: int = 3, cache_size: int = 100000):
+        self.workers = workers
+        self.depth = depth
+        self.cache = EvalCache(cache_size)
+        self.executor = ProcessPoolExecutor(max_workers=workers)
+
+    async def evaluate(self, boards: List[Board]) -> List[int]:
+        """Scores of the positions, from white's point of view"""
+        keys = [(board.zobrist_hash(), self.depth) for board in boards]
+        scores: Dict[Tuple[int, int], int] = {}
+        missing: Dict[Tuple[int, int], str] = {}
+        for key, board in zip(keys, boards):
+            score = self.cache.get(key)
+            if score is None:
+                missing[key] = board.fen()
+            else:
+                scores[key] = score
+        if missing:
+            # a few batches per worker, so that a worker that gets the slow positions doesn't hold up the others
+            items = list(missing.items())
+            size = max(1, math.ceil(len(items) / (self.workers * 4)))
+            batches = [items[i:i + size] for i in range(0, len(items), size)]
+            loop = asyncio.get_event_loop()
+            results = await asyncio.gather(*[
+                loop.run_in_executor(self.executor, evaluate_positions, [fen for _, fen in batch], self.depth)
+                for batch in batches
+            ])
+            for batch, batch_scores in zip(batches, results):
+                for (key, _), score in zip(batch, batch_scores):
+                    scores[key] = score
+                    self.cache.put(key, score)
+        return [scores[key] for key in keys]
+
+    async def analyze(self, moves: List[str]) -> Analysis:
+        """Analyzes a game from the starting position, its moves in UCI notation"""
+        board = Board()
+        boards, sans = [board.copy(stack=False)], []
+        for uci in moves:
+            move = chess.Move.from_uci(uci)
+            sans.append(board.san(move))
+            board.push(move)
+            boards.append(board.copy(stack=False))
+        scores = await self.evaluate(boards)
+
+        reports = []
+        for ply, san in enumerate(sans, start=1):
+            color = chess.WHITE if ply % 2 else chess.BLACK
+            before, after = scores[ply - 1], scores[ply]
+            loss = (before - after) if color == chess.WHITE else (after - before)
+            label = next((name for threshold, name in LABELS if loss >= threshold), None)
+            reports.append(MoveReport(ply, san, color, before, after, loss, label))
+        return Analysis(reports)
+
+    def close(self):
+        self.executor.shutdown(wait=False)
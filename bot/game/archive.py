@@ -0,0 +1,334 @@
+"""
+Append-only archive of finished games in PGN, compressed game by game in segment files
+
+Usage (exporting every game): python -m bot.game.archive archive/main [-o games.pgn]
+"""
+import argparse
+import asyncio
+import datetime
+import os
+import struct
+import sys
+import zlib
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, Iterator, List, Optional, Tuple
+
+import chess
+import chess.pgn
+
+SEGMENT_SIZE = 64 * 2 ** 20  # a new segment is started once the current one is bigger than this
+RECORD = struct.Struct('<I')  # length of each compressed game, before it in its segment
+LOCATION = struct.Struct('<III')  # segment, offset and length of a game's record, at game id * size in games.idx
+PLAYER_GAME = struct.Struct('<QQQ')  # user id, game id and previous record of the user + 1 (0 if none) in players.idx
+HEADS = struct.Struct('<QQ')  # user id and last record of the user + 1 in players.heads
+
+# text that most games share, used as zlib's preset dictionary: small records compress almost as well as whole files
+ZDICT = (
+    '[Event "ChessBot game"]\n[Site "Discord"]\n[Date "2020.01.01"]\n[Round "-"]\n[White ""]\n[Black ""]\n'
+    '[Result "1-0"]\n[Result "0-1"]\n[Result "1/2-1/2"]\n[GameId ""]\n[GuildId ""]\n[ChannelId ""]\n'
+    '[WhiteId ""]\n[BlackId ""]\n[Termination "resignation"]\n[Termination "checkmate"]\n'
+    '[Termination "draw agreed"]\n[Termination "threefold repetition"]\n[Termination "stalemate"]\n'
+    '1. e4 e5 2. Nf3 Nc6 3. Bb5 a6 4. Ba4 Nf6 5. O-O Be7 6. Re1 b5 7. Bb3 d6 8. c3 O-O 9. h3 Nb8 10. d4 Nbd7 '
+    '1. d4 Nf6 2. c4 e6 3. Nc3 Bb4 4. Qc2 d5 5. cxd5 exd5 6. Bg5 h6 7. Bh4 c5 8. dxc5 g5 9. Bg3 Ne4 10. e3 Qf6 '
+    '1. e4 c5 2. Nf3 d6 3. d4 cxd4 4. Nxd4 Nf6 5. Nc3 a6 6. Be3 e5 7. Nb3 Be6 8. f3 Be7 9. Qd2 O-O 10. O-O-O Nbd7 '
+    'Nxe5 Bxf7+ Kxf7 Qxd8 Rxd8 Qh5+ Kg8 Rxe8# Qxf7# exd6 dxe5 gxf6 hxg5 fxe5 Bxc6 bxc6 Rad1 Rfe8 Kh1 Kg7 '
+    '1-0\n\n0-1\n\n1/2-1/2\n\n'
+).encode()
+
+
+def compress(pgn: str) -> bytes:
+    compressor = zlib.compressobj(6, zlib.DEFLATED, 15, 9, zlib.Z_DEFAULT_STRATEGY, ZDICT)
+    return compressor.compress(pgn.encode()) + compressor.flush()
+
+
+def decompress(data: bytes) -> str:
+    decompressor = zlib.decompressobj(15, ZDICT)
+    return (decompressor.decompress(data) + decompressor.flush()).decode()
+
+
+def pgn_text(headers: Dict[str, str], moves: List[str]) -> str:
+    """PGN of a game from the starting position, with its moves in UCI notation"""
+    game = chess.pgn.Game()
+    game.headers.update(headers)
+    node = game
+    for uci in moves:
+        node = node.add_variation(chess.Move.from_uci(uci))
+    return str(game)
+
+
+class ArchiveReader:
+    """
+    Finds games in an archive through its two indexes on disk, without writing to it: the archive of another
+    process, which may still be appending games to it (see `refresh`)
+
+    games.idx is addressed by game id (the record of game n is at n * LOCATION.size), so finding a game is a
+    single read. players.idx has a record for each player of each game, linked to the player's previous one, so
+    a player's history is read backwards from their last record, which is kept in memory (and saved to
+    players.heads on close, so that opening the archive only reads the records added after it was saved)
+    """
+
+    def __init__(self, path: str, flags: int = os.O_RDONLY):
+        self.path = path
+        self.games_index = os.open(os.path.join(path, 'games.idx'), flags)
+        self.players_index = os.open(os.path.join(path, 'players.idx'), flags)
+        self.player_records = os.fstat(self.players_index).st_size // PLAYER_GAME.size
+        self.heads: Dict[int, int] = self._read_heads()
+        self._readers: Dict[int, int] = {}  # file descriptors of the segments, by number
+
+    def _segment_path(self, segment: int) -> str:
+        return os.path.join(self.path, f'{segment:06d}.pgnz')
+
+    def _read_heads(self) -> Dict[int, int]:
+        heads, covered = {}, 0
+        try:
+            with open(os.path.join(self.path, 'players.heads'), 'rb') as f:
+                data = f.read()
+            covered = struct.unpack_from('<Q', data)[0]
+            heads = dict(HEADS.iter_unpack(memoryview(data)[8:]))
+        except (OSError, struct.error):
+            pass
+        if covered > self.player_records:  # the index is older than the heads, they can't be trusted
+            heads, covered = {}, 0
+        self._scan_players(heads, covered, self.player_records)
+        return heads
+
+    def _scan_players(self, heads: Dict[int, int], start: int, end: int):
+        """Sets the heads of the players of records start to end (excluded) of players.idx"""
+        chunk = 65536 * PLAYER_GAME.size
+        for first in range(start * PLAYER_GAME.size, end * PLAYER_GAME.size, chunk):
+            data = os.pread(self.players_index, min(chunk, end * PLAYER_GAME.size - first), first)
+            data = data[:len(data) - len(data) % PLAYER_GAME.size]
+            record = first // PLAYER_GAME.size
+            for user_id, _, _ in PLAYER_GAME.iter_unpack(data):
+                record += 1
+                heads[user_id] = record
+
+    def refresh(self):
+        """Reads the players' records that were added to the archive since it was opened or last refreshed"""
+        records = os.fstat(self.players_index).st_size // PLAYER_GAME.size
+        if records > self.player_records:
+            self._scan_players(self.heads, self.player_records, records)
+            self.player_records = records
+
+    def _reader(self, segment: int) -> int:
+        reader = self._readers.get(segment)
+        if reader is None:
+            reader = self._readers[segment] = os.open(self._segment_path(segment), os.O_RDONLY)
+        return reader
+
+    def read_pgn(self, game_id: int) -> Optional[str]:
+        """PGN of a game, None if it isn't in the archive (reads and decompresses that game only)"""
+        data = os.pread(self.games_index, LOCATION.size, game_id * LOCATION.size)
+        if len(data) < LOCATION.size:
+            return None
+        segment, offset, length = LOCATION.unpack(data)
+        if not length:
+            return None
+        return decompress(os.pread(self._reader(segment), length, offset + RECORD.size))
+
+    def game_ids(self, user_id: int, limit: int) -> List[int]:
+        """Ids of the last games of a player, the most recent first"""
+        game_ids = []
+        record = self.heads.get(user_id, 0)
+        while record and len(game_ids) < limit:
+            _, game_id, record = PLAYER_GAME.unpack(
+                os.pread(self.players_index, PLAYER_GAME.size, (record - 1) * PLAYER_GAME.size)
+            )
+            game_ids.append(game_id)
+        return game_ids
+
+    def read_history(self, user_id: int, limit: int) -> List[str]:
+        return [self.read_pgn(game_id) for game_id in self.game_ids(user_id, limit)]
+
+    def export(self) -> Iterator[str]:
+        """Every game's PGN in the order they were archived"""
+        return export(self.path)
+
+    def close(self):
+        for descriptor in [self.games_index, self.players_index, *self._readers.values()]:
+            os.close(descriptor)
+
+
+class GameArchive(ArchiveReader):
+    """
+    Appends finished games to segment files and finds them again through the indexes (see ArchiveReader)
+
+    Only one process may write to an archive, every write runs on the archive's own thread, in order
+    """
+
+    def __init__(self, path: str):
+        os.makedirs(path, exist_ok=True)
+        super().__init__(path, os.O_RDWR | os.O_CREAT)
+        self.executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix='archive')
+        segments = sorted(int(name.split('.')[0]) for name in os.listdir(path) if name.endswith('.pgnz'))
+        self.segment = segments[-1] if segments else 1
+        self.segment_file = open(self._segment_path(self.segment), 'ab')
+
+    def _save_heads(self):
+        temporary = os.path.join(self.path, 'players.heads.tmp')
+        with open(temporary, 'wb') as f:
+            f.write(struct.pack('<Q', self.player_records))
+            f.write(b''.join(HEADS.pack(user_id, head) for user_id, head in self.heads.items()))
+        os.replace(temporary, os.path.join(self.path, 'players.heads'))
+
+    def append_pgn(self, game_id: int, player_ids: Tuple[int, int], pgn: str):
+        """Writes a game's PGN to the current segment, then its location and its players to the indexes"""
+        data = compress(pgn)
+        offset = self.segment_file.tell()
+        if offset and offset + RECORD.size + len(data) > SEGMENT_SIZE:
+            self.segment_file.close()
+            self.segment += 1
+            self.segment_file = open(self._segment_path(self.segment), 'ab')
+            offset = 0
+        self.segment_file.write(RECORD.pack(len(data)) + data)
+        self.segment_file.flush()  # the record is written before the indexes point at it
+        os.pwrite(self.games_index, LOCATION.pack(self.segment, offset, len(data)), game_id * LOCATION.size)
+        records = []
+        for user_id in dict.fromkeys(player_ids):  # a game against oneself is in the history once
+            records.append(PLAYER_GAME.pack(user_id, game_id, self.heads.get(user_id, 0)))
+            self.player_records += 1
+            self.heads[user_id] = self.player_records
+        os.pwrite(self.players_index, b''.join(records), (self.player_records - len(records)) * PLAYER_GAME.size)
+
+    def _append(self, game_id: int, player_ids: Tuple[int, int], headers: Dict[str, str], moves: List[str]):
+        self.append_pgn(game_id, player_ids, pgn_text(headers, moves))
+
+    async def append(self, game_id: int, player_ids: Tuple[int, int], headers: Dict[str, str], moves: List[str]):
+        """Archives a finished game, its moves in UCI notation"""
+        await asyncio.get_event_loop().run_in_executor(
+            self.executor, self._append, game_id, player_ids, headers, moves
+        )
+
+    async def pgn(self, game_id: int) -> Optional[str]:
+        return await asyncio.get_event_loop().run_in_executor(self.executor, self.read_pgn, game_id)
+
+    async def history(self, user_id: int, limit: int = 10) -> List[str]:
+        """PGNs of the last games of a player, the most recent first"""
+        return await asyncio.get_event_loop().run_in_executor(self.executor, self.read_history, user_id, limit)
+
+    def close(self):
+        """Waits for the games that are being archived and saves the players' last records"""
+        self.executor.shutdown(wait=True)
+        self.segment_file.close()
+        self._save_heads()
+        super().close()
+
+
+class ArchiveSet:
+    """
+    The archive of this process, which it writes to, and the archives of the other processes in the same folder,
+    read only
+
+    A guild's games are in the archive of the process that played them, which isn't the same once the processes
+    or the shards change (or Discord recommends another number of shards), so games are looked up in every
+    archive of the folder, including the ones of processes that don't exist anymore
+    """
+
+    def __init__(self, path: str, name: str):
+        self.root = path
+        self.name = name
+        self.archive = GameArchive(os.path.join(path, name))
+        self.path = self.archive.path
+        self.others: Dict[str, ArchiveReader] = {}
+
+    def archives(self) -> List[ArchiveReader]:
+        """This process' archive first, then the others, opening the ones that appeared since the last time"""
+        for name in sorted(os.listdir(self.root)):
+            if name != self.name and name not in self.others:
+                if os.path.exists(os.path.join(self.root, name, 'players.idx')):
+                    self.others[name] = ArchiveReader(os.path.join(self.root, name))
+        return [self.archive, *self.others.values()]
+
+    async def append(self, game_id: int, player_ids: Tuple[int, int], headers: Dict[str, str], moves: List[str]):
+        """Archives a finished game in this process' archive, its moves in UCI notation"""
+        await self.archive.append(game_id, player_ids, headers, moves)
+
+    def read_pgn(self, game_id: int) -> Optional[str]:
+        for archive in self.archives():
+            pgn = archive.read_pgn(game_id)
+            if pgn is not None:
+                return pgn
+        return None
+
+    async def pgn(self, game_id: int) -> Optional[str]:
+        """PGN of a game, from whichever archive has it, None if none has it"""
+        return await asyncio.get_event_loop().run_in_executor(self.archive.executor, self.read_pgn, game_id)
+
+    def read_history(self, user_id: int, limit: int) -> List[str]:
+        games = []
+        for archive in self.archives():
+            archive.refresh()
+            games += [(game_id, archive) for game_id in archive.game_ids(user_id, limit)]
+        games.sort(key=lambda game: -game[0])  # game ids grow as games are created
+        return [archive.read_pgn(game_id) for game_id, archive in games[:limit]]
+
+    async def history(self, user_id: int, limit: int = 10) -> List[str]:
+        """PGNs of the last games of a player in every archive, the most recent first"""
+        return await asyncio.get_event_loop().run_in_executor(
+            self.archive.executor, self.read_history, user_id, limit
+        )
+
+    def close(self):
+        self.archive.close()
+        for archive in self.others.values():
+            archive.close()
+
+
+def export(path: str) -> Iterator[str]:
+    """
+    Every game's PGN of an archive in the order they were archived, reading the segments one after the other
+    (each game is decompressed on its own, so memory use doesn't grow with the size of the archive).
+    Only reads the segments, so it can run while the bot is writing to the archive
+    """
+    segment = 1
+    while os.path.exists(os.path.join(path, f'{segment:06d}.pgnz')):
+        with open(os.path.join(path, f'{segment:06d}.pgnz'), 'rb') as f:
+            while True:
+                header = f.read(RECORD.size)
+                if len(header) < RECORD.size:
+                    break
+                length = RECORD.unpack(header)[0]
+                data = f.read(length)
+                if len(data) < length:
+                    break  # a record that is still being written
+                yield decompress(data)
+        segment += 1
+
+
+def game_headers(
+    game, white: str, black: str, result: str, termination: str, time_control: str = '-'
+) -> Dict[str, str]:
+    """PGN headers of a finished bot.orm.models.Game, time_control is `-` if it had no clock"""
+    return {
+        'Event': 'ChessBot game',
+        'Site': 'Discord',
+        'Date': (game.created or datetime.datetime.now()).strftime('%Y.%m.%d'),
+        'White': white,
+        'Black': black,
+        'Result': result,
+        'GameId': str(game.id),
+        'GuildId': str(game.guild_id),
+        'ChannelId': str(game.channel_id),
+        'WhiteId': str(game.white_id),
+        'BlackId': str(game.black_id),
+        'TimeControl': time_control,
+        'Termination': termination,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('archive', help='folder of the archive')
+    parser.add_argument('-o', '--output', help='PGN file to write, the standard output if not given')
+    args = parser.parse_args()
+    output = open(args.output, 'w') if args.output else sys.stdout
+    try:
+        for pgn in export(args.archive):
+            output.write(pgn + '\n\n')
+    finally:
+        if args.output:
+            output.close()
+
+
+if __name__ == '__main__':
+    main()
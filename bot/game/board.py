@@ -0,0 +1,167 @@
+from collections import Counter
+from typing import List, Optional, Tuple
+
+import chess
+from chess.polyglot import POLYGLOT_RANDOM_ARRAY
+
+# Polyglot keys, so that hashes are the same as the ones used by opening books (chess.polyglot.zobrist_hash)
+CASTLING_KEYS = (
+    (chess.BB_H1, POLYGLOT_RANDOM_ARRAY[768]), (chess.BB_A1, POLYGLOT_RANDOM_ARRAY[769]),
+    (chess.BB_H8, POLYGLOT_RANDOM_ARRAY[770]), (chess.BB_A8, POLYGLOT_RANDOM_ARRAY[771]),
+)
+EP_KEYS = POLYGLOT_RANDOM_ARRAY[772:780]
+TURN_KEY = POLYGLOT_RANDOM_ARRAY[780]
+
+
+class Board(chess.Board):
+    """
+    Board that keeps an incremental Zobrist hash of its position and counts how many times each position occurred
+
+    The hash is updated on every push/pop instead of being computed from scratch, so checking for repetitions
+    doesn't need to replay the move stack. Only standard chess is supported (no Chess960), and the position
+    must only be changed through python-chess methods (which clear the move stack), not by setting attributes
+    """
+
+    def clear_stack(self) -> None:
+        super().clear_stack()
+        self._rehash()
+
+    def _rehash(self) -> None:
+        """Computes the hash of the position from scratch and forgets every previous position"""
+        zobrist = self._castling_hash(self.clean_castling_rights())
+        for index, pieces in enumerate(self._piece_bitboards()):
+            for square in chess.scan_forward(pieces):
+                zobrist ^= POLYGLOT_RANDOM_ARRAY[64 * index + square]
+        if self.turn == chess.WHITE:
+            zobrist ^= TURN_KEY
+        self._zobrist = zobrist
+        self.position_key = zobrist ^ self._ep_hash()
+        self._history: List[Tuple[int, int]] = []  # (zobrist, position_key) before each move of the move stack
+        self.repetitions = Counter({self.position_key: 1})
+
+    def _piece_bitboards(self) -> Tuple[int, ...]:
+        """Bitboards of every piece type of each color, in Polyglot order (black pawns, white pawns, etc.)"""
+        white, black = self.occupied_co[chess.WHITE], self.occupied_co[chess.BLACK]
+        return (
+            self.pawns & black, self.pawns & white, self.knights & black, self.knights & white,
+            self.bishops & black, self.bishops & white, self.rooks & black, self.rooks & white,
+            self.queens & black, self.queens & white, self.kings & black, self.kings & white,
+        )
+
+    @staticmethod
+    def _castling_hash(castling_rights: int) -> int:
+        zobrist = 0
+        for mask, key in CASTLING_KEYS:
+            if castling_rights & mask:
+                zobrist ^= key
+        return zobrist
+
+    def _ep_hash(self, legal: bool = True) -> int:
+        """
+        Hash of the en passant square, only if it can be captured: with a legal move when legal is True (which
+        is what makes two positions the same for repetitions), or by any pawn next to it otherwise (Polyglot)
+        """
+        if self.ep_square is None:
+            return 0
+        if legal:
+            if not self.has_legal_en_passant():
+                return 0
+        else:
+            ep_mask = chess.BB_SQUARES[self.ep_square]
+            ep_mask = chess.shift_down(ep_mask) if self.turn == chess.WHITE else chess.shift_up(ep_mask)
+            if not (chess.shift_left(ep_mask) | chess.shift_right(ep_mask)) & self.pawns & self.occupied_co[self.turn]:
+                return 0
+        return EP_KEYS[chess.square_file(self.ep_square)]
+
+    def push(self, move: chess.Move) -> None:
+        zobrist = self._zobrist
+        before = self._piece_bitboards()
+        castling = self.clean_castling_rights()
+        super().push(move)
+
+        # only the squares whose pieces changed (usually two) are hashed again
+        for index, (pieces_before, pieces_after) in enumerate(zip(before, self._piece_bitboards())):
+            for square in chess.scan_forward(pieces_before ^ pieces_after):
+                zobrist ^= POLYGLOT_RANDOM_ARRAY[64 * index + square]
+        new_castling = self.clean_castling_rights()
+        if new_castling != castling:
+            zobrist ^= self._castling_hash(castling ^ new_castling)
+        zobrist ^= TURN_KEY
+
+        self._history.append((self._zobrist, self.position_key))
+        self._zobrist = zobrist
+        self.position_key = zobrist ^ self._ep_hash()
+        self.repetitions[self.position_key] += 1
+
+    def pop(self) -> chess.Move:
+        move = super().pop()
+        self.repetitions[self.position_key] -= 1
+        if not self.repetitions[self.position_key]:
+            del self.repetitions[self.position_key]
+        self._zobrist, self.position_key = self._history.pop()
+        return move
+
+    def copy(self, *, stack=True) -> 'Board':
+        board = super().copy(stack=stack)
+        board._zobrist, board.position_key = self._zobrist, self.position_key
+        board._history = self._history[len(self._history) - len(board.move_stack):]
+        if len(board._history) == len(self._history):
+            board.repetitions = self.repetitions.copy()
+        else:
+            board.repetitions = Counter(key for _, key in board._history)
+            board.repetitions[board.position_key] += 1
+        return board
+
+    def root(self) -> 'Board':
+        board = super().root()
+        board._rehash()
+        return board
+
+    def mirror(self) -> 'Board':
+        board = super().mirror()
+        board._rehash()
+        return board
+
+    def zobrist_hash(self) -> int:
+        """Polyglot hash of the position, same as chess.polyglot.zobrist_hash(board) but without computing it again"""
+        return self._zobrist ^ self._ep_hash(legal=False)
+
+    def is_repetition(self, count: int = 3) -> bool:
+        """Checks if the current position has occurred at least count times"""
+        return self.repetitions[self.position_key] >= count
+
+    def can_claim_threefold_repetition(self) -> bool:
+        """
+        Checks if the current position occurred for the third time or if one of the legal moves repeats a position
+        for the third time
+        """
+        if self.repetitions[self.position_key] >= 3:
+            return True
+        for move in self.generate_legal_moves():
+            self.push(move)
+            try:
+                if self.repetitions[self.position_key] >= 3:
+                    return True
+            finally:
+                self.pop()
+        return False
+
+    def is_drawn(self) -> bool:
+        """
+        Function checks for threefold repetition/fifty moves rule/insufficient material/stalemate
+
+        The cheapest checks come first, so most of the time this doesn't need to generate any moves
+        """
+        return self.draw_reason() is not None
+
+    def draw_reason(self) -> Optional[str]:
+        """Why the position is drawn (see is_drawn), None if it isn't"""
+        if self.is_repetition(3):
+            return 'threefold repetition'
+        if self.can_claim_fifty_moves():
+            return 'fifty-move rule'
+        if self.is_insufficient_material():
+            return 'insufficient material'
+        if self.is_stalemate():
+            return 'stalemate'
+        return None
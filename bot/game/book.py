@@ -0,0 +1,119 @@
+"""
+Polyglot (.bin) opening books
+
+Usage (building a book): python -m bot.game.book games.pgn [more.pgn ...] -o book.bin [--plies 24]
+"""
+import argparse
+import random
+from collections import Counter
+from typing import Iterable, List, Optional
+
+import chess
+import chess.pgn
+import chess.polyglot
+
+from bot.game.board import Board
+
+MAX_WEIGHT = 0xffff
+
+
+class OpeningBook:
+    """
+    Reads a Polyglot opening book by memory mapping the file, entries of a position are found
+    with a binary search on its key, so the book is never loaded into memory
+
+    Every process that opens the same book shares the same pages of the file (e.g. the engine's workers)
+    """
+
+    def __init__(self, path: Optional[str] = None):
+        self.path = path
+        self.reader = chess.polyglot.MemoryMappedReader(path) if path else None
+
+    def __len__(self) -> int:
+        return len(self.reader) if self.reader else 0
+
+    def entries(self, board: Board) -> List[chess.polyglot.Entry]:
+        """Gets the book entries of the board's position which have legal moves"""
+        if not self.reader:
+            return []
+        entries = []
+        for entry in self.reader.find_all(board.zobrist_hash()):
+            # castling moves are saved as the king capturing its own rook
+            move = entry.move
+            move = board._from_chess960(board.chess960, move.from_square, move.to_square, move.promotion)
+            if board.is_legal(move):
+                entries.append(entry._replace(move=move))
+        return entries
+
+    def moves(self, board: Board) -> List[chess.Move]:
+        """Gets the book moves of the board's position"""
+        return [entry.move for entry in self.entries(board)]
+
+    def weighted_choice(self, board: Board, rng: random.Random = random) -> Optional[chess.Move]:
+        """Picks one of the book moves of the position at random, moves with bigger weights are picked more often"""
+        entries = self.entries(board)
+        if not entries:
+            return None
+        return rng.choices([entry.move for entry in entries], weights=[entry.weight for entry in entries])[0]
+
+    def close(self):
+        if self.reader:
+            self.reader.close()
+
+
+def raw_move(board: chess.Board, move: chess.Move) -> int:
+    """Encodes a move like Polyglot does: to square, from square and promotion piece, castling as king takes rook"""
+    move = board._to_chess960(move)
+    promotion = move.promotion - 1 if move.promotion else 0
+    return move.to_square | move.from_square << 6 | promotion << 12
+
+
+def build_book(games: Iterable[chess.pgn.Game], output: str, plies: int = 24) -> int:
+    """
+    Builds a Polyglot book out of the first plies of each game, returns the number of entries written
+
+    Each move is weighted by the results of the games where it was played: 2 for a win, 1 for a draw
+    """
+    weights: Counter = Counter()
+    for game in games:
+        result = game.headers.get('Result', '*')
+        board = Board()
+        for ply, move in enumerate(game.mainline_moves()):
+            if ply >= plies:
+                break
+            won = '1-0' if board.turn == chess.WHITE else '0-1'
+            score = 2 if result == won else 1 if result == '1/2-1/2' else 0
+            if score:
+                weights[(board.zobrist_hash(), raw_move(board, move))] += score
+            board.push(move)
+
+    scale = max(1, -(-max(weights.values(), default=0) // MAX_WEIGHT))
+    entries = sorted(weights.items(), key=lambda item: (item[0][0], -item[1]))
+    with open(output, 'wb') as f:
+        for (key, move), weight in entries:
+            f.write(chess.polyglot.ENTRY_STRUCT.pack(key, move, max(1, weight // scale), 0))
+    return len(entries)
+
+
+def read_games(paths: Iterable[str]) -> Iterable[chess.pgn.Game]:
+    for path in paths:
+        with open(path, encoding='utf-8', errors='replace') as f:
+            while True:
+                game = chess.pgn.read_game(f)
+                if game is None:
+                    break
+                yield game
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('pgn', nargs='+', help='PGN files with the games of the book')
+    parser.add_argument('-o', '--output', required=True, help='path of the book (.bin) that is created')
+    parser.add_argument('--plies', type=int, default=24, help='how many plies of each game go into the book')
+    args = parser.parse_args()
+    entries = build_book(read_games(args.pgn), args.output, args.plies)
+    print(f'Wrote {entries} entries to {args.output}')
+
+
+if __name__ == '__main__':
+    main()
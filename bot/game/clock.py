@@ -0,0 +1,218 @@
+"""
+Chess clocks (`!play @a @b 5+3`) and the deadlines of games: when a player's time runs out (flag fall), or when a
+player doesn't move for too long (the game was abandoned)
+
+Every deadline of every game is a Timer of the bot's Scheduler: a single heap served by one callback of the event
+loop for the earliest deadline, instead of a sleeping task (or a wait_for) per game
+"""
+import asyncio
+import heapq
+import itertools
+import logging
+import re
+import time
+from typing import Callable, Dict, List, NamedTuple, Optional, Tuple
+
+import chess
+
+MAX_BASE_MINUTES = 180
+MAX_INCREMENT = 60  # seconds
+MOVES_TO_GO = 30  # moves the bot expects to still have to play, when it decides how long to think about one
+RESOLUTION = time.get_clock_info('monotonic').resolution  # the event loop can call a timer this early
+
+TIME_CONTROL = re.compile(r'^(\d+(?:\.\d+)?)\+(\d+)$')  # minutes, and the increment in seconds
+
+
+class TimeControl(NamedTuple):
+    base: float  # seconds each player starts with
+    increment: int  # seconds added after each move
+
+    @classmethod
+    def parse(cls, text: str) -> 'TimeControl':
+        """Time control like `5+3` (5 minutes, plus 3 seconds per move) or `10+0` (no increment)"""
+        match = TIME_CONTROL.match(text.strip())
+        if match is None:
+            raise ValueError(f'Invalid time control: {text}')
+        minutes, increment = float(match.group(1)), int(match.group(2))
+        if not 0 < minutes <= MAX_BASE_MINUTES or increment > MAX_INCREMENT:
+            raise ValueError(f'Invalid time control: {text}')
+        return cls(minutes * 60, increment)
+
+    def pgn(self) -> str:
+        """Value of the TimeControl header of PGN, e.g. 300+3"""
+        return f'{self.base:g}+{self.increment}'
+
+    def __str__(self) -> str:
+        return f'{self.base / 60:g}+{self.increment}'
+
+
+def format_seconds(seconds: float) -> str:
+    """4:05, or 0:09.3 under 10 seconds"""
+    seconds = max(seconds, 0)
+    if seconds < 10:
+        return f'0:{seconds:04.1f}'
+    minutes, seconds = divmod(int(seconds), 60)
+    return f'{minutes}:{seconds:02}'
+
+
+class Clock:
+    """
+    The time left of both players, the clock of the player to move runs from the moment it is started (times are
+    the event loop's, which is monotonic)
+    """
+
+    def __init__(self, time_control: TimeControl, turn: chess.Color = chess.WHITE):
+        self.time_control = time_control
+        self.remaining: Dict[chess.Color, float] = {chess.WHITE: time_control.base, chess.BLACK: time_control.base}
+        self.turn = turn
+        self.started: Optional[float] = None  # when the clock of the player to move was started
+
+    def start(self, now: float):
+        self.started = now
+
+    def time_left(self, color: chess.Color, now: float) -> float:
+        if color == self.turn and self.started is not None:
+            return self.remaining[color] - (now - self.started)
+        return self.remaining[color]
+
+    def flag_time(self) -> float:
+        """When the time of the player to move runs out, if they don't move before"""
+        return self.started + self.remaining[self.turn]
+
+    def flagged(self, now: float) -> bool:
+        return self.started is not None and self.time_left(self.turn, now) <= 0
+
+    def press(self, now: float):
+        """The player to move moved: their time stops (plus the increment) and the opponent's starts"""
+        self.remaining[self.turn] = self.time_left(self.turn, now) + self.time_control.increment
+        self.turn = not self.turn
+        self.started = now
+
+    def budget(self, now: float) -> float:
+        """How long the player to move can think about a move, to still have time for the next ones"""
+        left = self.time_left(self.turn, now)
+        return max(min(left / MOVES_TO_GO + self.time_control.increment * 0.8, left / 2), 0.01)
+
+    def __str__(self) -> str:
+        now = asyncio.get_event_loop().time()
+        return (
+            f'white {format_seconds(self.time_left(chess.WHITE, now))}, '
+            f'black {format_seconds(self.time_left(chess.BLACK, now))}'
+        )
+
+
+class Timer:
+    """A callback of the Scheduler at a given time, which can be cancelled until it is called"""
+    __slots__ = ('scheduler', 'when', 'callback', 'pending')
+
+    def __init__(self, scheduler: 'Scheduler', when: float, callback: Callable[['Timer'], None]):
+        self.scheduler = scheduler
+        self.when = when
+        self.callback = callback  # called with the timer
+        self.pending = True
+
+    def cancel(self):
+        if self.pending:
+            self.pending = False
+            self.scheduler.cancelled(self)
+
+
+class Scheduler:
+    """
+    Timers in a heap, served by a single callback of the event loop which is always set for the earliest one
+
+    Cancelled timers are only marked as such (a heap can't remove an entry that isn't the first one cheaply), and
+    the heap is rebuilt without them once they are more than half of it, so it never has more than twice as many
+    entries as pending timers
+    """
+
+    def __init__(self):
+        self._heap: List[Tuple[float, int, Timer]] = []
+        self._order = itertools.count()  # timers of the same time are called in the order they were scheduled
+        self._handle: Optional[asyncio.TimerHandle] = None
+        self._cancelled = 0  # cancelled timers still in the heap
+        self.called = 0
+
+    def __len__(self) -> int:
+        """Pending timers"""
+        return len(self._heap) - self._cancelled
+
+    def heap_size(self) -> int:
+        return len(self._heap)
+
+    def schedule(self, when: float, callback: Callable[[Timer], None]) -> Timer:
+        """Calls callback(timer) at `when` (a time of the event loop), unless the timer is cancelled before"""
+        timer = Timer(self, when, callback)
+        heapq.heappush(self._heap, (when, next(self._order), timer))
+        if self._handle is None or when < self._handle.when():
+            self._arm()
+        return timer
+
+    def cancelled(self, timer: Timer):
+        self._cancelled += 1
+        if self._cancelled > len(self._heap) // 2:
+            self._heap = [entry for entry in self._heap if entry[2].pending]
+            heapq.heapify(self._heap)
+            self._cancelled = 0
+            self._arm()
+
+    def _arm(self):
+        """Sets the event loop's callback for the earliest pending timer, if any"""
+        if self._handle is not None:
+            self._handle.cancel()
+            self._handle = None
+        while self._heap and not self._heap[0][2].pending:
+            heapq.heappop(self._heap)
+            self._cancelled -= 1
+        if self._heap:
+            self._handle = asyncio.get_event_loop().call_at(self._heap[0][0], self._run)
+
+    def _run(self):
+        self._handle = None
+        now = asyncio.get_event_loop().time() + RESOLUTION
+        while self._heap and self._heap[0][0] <= now:
+            _, _, timer = heapq.heappop(self._heap)
+            if not timer.pending:
+                self._cancelled -= 1
+                continue
+            timer.pending = False
+            self.called += 1
+            try:
+                timer.callback(timer)
+            except Exception:
+                # the other timers must still be called, or every clock and timeout of the process would stop
+                logging.exception(f'Error in the callback of a timer: {timer.callback!r}')
+        self._arm()
+
+
+async def next_message(
+    inbox: asyncio.Queue, check: Callable[[object], bool], scheduler: Scheduler, deadline: float = None
+):
+    """
+    Waits for the next message in a game's inbox that passes the check (other messages are ignored), None if the
+    deadline (a time of the event loop) comes first
+
+    The deadline's timer puts itself in the inbox, so waiting needs no other task. Timers left in the inbox by
+    waits that got a message first are ignored
+    """
+    timer = None if deadline is None else scheduler.schedule(deadline, inbox.put_nowait)
+    try:
+        while True:
+            message = await inbox.get()
+            if isinstance(message, Timer):
+                if message is timer:
+                    return None
+            elif check(message):
+                return message
+    finally:
+        if timer is not None:
+            timer.cancel()
+
+
+def earliest(*deadlines: Optional[float]) -> Optional[float]:
+    """The earliest of the deadlines that aren't None"""
+    return min((deadline for deadline in deadlines if deadline is not None), default=None)
+
+
+def minutes(seconds: float) -> str:
+    return f'{seconds / 60:g} minute{"" if seconds == 60 else "s"}'
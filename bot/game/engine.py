@@ -0,0 +1,302 @@
+import asyncio
+import time
+from concurrent.futures import ProcessPoolExecutor
+from typing import Dict, List, NamedTuple, Optional, Tuple
+
+import chess
+
+from bot.game.board import Board
+from bot.game.book import OpeningBook
+
+MATE = 100000
+INFINITY = 10 * MATE
+MAX_DEPTH = 64
+TT_SIZE = 1000000  # entries kept by each worker process before the transposition table is cleared
+
+EXACT, LOWER, UPPER = 0, 1, 2  # kinds of transposition table scores
+
+PIECE_VALUES = {chess.PAWN: 100, chess.KNIGHT: 320, chess.BISHOP: 330, chess.ROOK: 500, chess.QUEEN: 900, chess.KING: 0}
+
+# Piece-square tables from white's point of view, starting at a8 and ending at h1 (like a printed board)
+PIECE_SQUARE_TABLES = {
+    chess.PAWN: [
+        0, 0, 0, 0, 0, 0, 0, 0,
+        50, 50, 50, 50, 50, 50, 50, 50,
+        10, 10, 20, 30, 30, 20, 10, 10,
+        5, 5, 10, 25, 25, 10, 5, 5,
+        0, 0, 0, 20, 20, 0, 0, 0,
+        5, -5, -10, 0, 0, -10, -5, 5,
+        5, 10, 10, -20, -20, 10, 10, 5,
+        0, 0, 0, 0, 0, 0, 0, 0,
+    ],
+    chess.KNIGHT: [
+        -50, -40, -30, -30, -30, -30, -40, -50,
+        -40, -20, 0, 0, 0, 0, -20, -40,
+        -30, 0, 10, 15, 15, 10, 0, -30,
+        -30, 5, 15, 20, 20, 15, 5, -30,
+        -30, 0, 15, 20, 20, 15, 0, -30,
+        -30, 5, 10, 15, 15, 10, 5, -30,
+        -40, -20, 0, 5, 5, 0, -20, -40,
+        -50, -40, -30, -30, -30, -30, -40, -50,
+    ],
+    chess.BISHOP: [
+        -20, -10, -10, -10, -10, -10, -10, -20,
+        -10, 0, 0, 0, 0, 0, 0, -10,
+        -10, 0, 5, 10, 10, 5, 0, -10,
+        -10, 5, 5, 10, 10, 5, 5, -10,
+        -10, 0, 10, 10, 10, 10, 0, -10,
+        -10, 10, 10, 10, 10, 10, 10, -10,
+        -10, 5, 0, 0, 0, 0, 5, -10,
+        -20, -10, -10, -10, -10, -10, -10, -20,
+    ],
+    chess.ROOK: [
+        0, 0, 0, 0, 0, 0, 0, 0,
+        5, 10, 10, 10, 10, 10, 10, 5,
+        -5, 0, 0, 0, 0, 0, 0, -5,
+        -5, 0, 0, 0, 0, 0, 0, -5,
+        -5, 0, 0, 0, 0, 0, 0, -5,
+        -5, 0, 0, 0, 0, 0, 0, -5,
+        -5, 0, 0, 0, 0, 0, 0, -5,
+        0, 0, 0, 5, 5, 0, 0, 0,
+    ],
+    chess.QUEEN: [
+        -20, -10, -10, -5, -5, -10, -10, -20,
+        -10, 0, 0, 0, 0, 0, 0, -10,
+        -10, 0, 5, 5, 5, 5, 0, -10,
+        -5, 0, 5, 5, 5, 5, 0, -5,
+        0, 0, 5, 5, 5, 5, 0, -5,
+        -10, 5, 5, 5, 5, 5, 0, -10,
+        -10, 0, 5, 0, 0, 0, 0, -10,
+        -20, -10, -10, -5, -5, -10, -10, -20,
+    ],
+    chess.KING: [
+        -30, -40, -40, -50, -50, -40, -40, -30,
+        -30, -40, -40, -50, -50, -40, -40, -30,
+        -30, -40, -40, -50, -50, -40, -40, -30,
+        -30, -40, -40, -50, -50, -40, -40, -30,
+        -20, -30, -30, -40, -40, -30, -30, -20,
+        -10, -20, -20, -20, -20, -20, -20, -10,
+        20, 20, 0, 0, 0, 0, 20, 20,
+        20, 30, 10, 0, 0, 10, 30, 20,
+    ],
+}
+
+# value of each piece type on each square (a1 = 0, h8 = 63), for each color
+SQUARE_VALUES = {
+    color: {
+        piece_type: [
+            PIECE_VALUES[piece_type] + table[square ^ 56 if color == chess.WHITE else square]
+            for square in chess.SQUARES
+        ]
+        for piece_type, table in PIECE_SQUARE_TABLES.items()
+    }
+    for color in chess.COLORS
+}
+
+# transposition table of the process: position key -> (depth, score, kind of score, best move)
+transpositions: Dict[int, Tuple[int, int, int, Optional[chess.Move]]] = {}
+# opening books opened by the process, by path
+books: Dict[str, OpeningBook] = {}
+
+
+class SearchResult(NamedTuple):
+    move: str  # best move found, in UCI notation
+    score: int  # in centipawns from the point of view of the side to move
+    depth: int  # depth of the last completed iteration
+    nodes: int
+    seconds: float
+
+
+class SearchTimeout(Exception):
+    pass
+
+
+def evaluate(board: chess.Board) -> int:
+    """
+    Static evaluation of a position (material and piece-square tables) in centipawns, from white's point of view
+    """
+    score = 0
+    for color, sign in ((chess.WHITE, 1), (chess.BLACK, -1)):
+        for piece_type, values in SQUARE_VALUES[color].items():
+            for square in chess.scan_forward(board.pieces_mask(piece_type, color)):
+                score += sign * values[square]
+    return score
+
+
+class Searcher:
+    """
+    Alpha-beta (negamax) search with iterative deepening, quiescence search, move ordering
+    (transposition table move, captures by MVV-LVA and killer moves) and a transposition table
+    """
+
+    def __init__(self, board: Board, deadline: float):
+        self.board = board
+        self.deadline = deadline
+        self.nodes = 0
+        self.killers: List[List[chess.Move]] = [[] for _ in range(MAX_DEPTH + 1)]
+
+    def check_time(self):
+        self.nodes += 1
+        if not self.nodes & 1023 and time.monotonic() > self.deadline:
+            raise SearchTimeout
+
+    def capture_value(self, move: chess.Move) -> int:
+        """Most valuable victim first, then least valuable attacker (MVV-LVA)"""
+        victim = self.board.piece_type_at(move.to_square) or chess.PAWN  # empty square means en passant
+        return 10 * PIECE_VALUES[victim] - PIECE_VALUES[self.board.piece_type_at(move.from_square)] // 10
+
+    def ordered_moves(self, tt_move: Optional[chess.Move], ply: int) -> List[chess.Move]:
+        board = self.board
+        first, captures, killers, quiet = [], [], [], []
+        for move in board.generate_legal_moves():
+            if move == tt_move:
+                first.append(move)  # only if it is legal, entries of different positions can have the same key
+                continue
+            if board.is_capture(move) or move.promotion:
+                captures.append(move)
+            elif move in self.killers[ply]:
+                killers.append(move)
+            else:
+                quiet.append(move)
+        captures.sort(key=self.capture_value, reverse=True)
+        return first + captures + killers + quiet
+
+    def quiescence(self, alpha: int, beta: int) -> int:
+        """Searches captures only, until the position is quiet, so that the evaluation isn't made mid-exchange"""
+        self.check_time()
+        board = self.board
+        stand_pat = evaluate(board) if board.turn == chess.WHITE else -evaluate(board)
+        if stand_pat >= beta:
+            return stand_pat
+        alpha = max(alpha, stand_pat)
+
+        for move in sorted(board.generate_legal_captures(), key=self.capture_value, reverse=True):
+            board.push(move)
+            score = -self.quiescence(-beta, -alpha)
+            board.pop()
+            if score >= beta:
+                return score
+            alpha = max(alpha, score)
+        return alpha
+
+    def negamax(self, depth: int, alpha: int, beta: int, ply: int) -> Tuple[int, Optional[chess.Move]]:
+        self.check_time()
+        board = self.board
+        if ply and (board.is_repetition(2) or board.halfmove_clock >= 100 or board.is_insufficient_material()):
+            return 0, None
+
+        key = board.position_key
+        tt_move = None
+        entry = transpositions.get(key)
+        if entry:
+            entry_depth, entry_score, kind, tt_move = entry
+            if ply and entry_depth >= depth and (
+                kind == EXACT or (kind == LOWER and entry_score >= beta) or (kind == UPPER and entry_score <= alpha)
+            ):
+                return entry_score, tt_move
+
+        if depth <= 0:
+            return self.quiescence(alpha, beta), None
+
+        moves = self.ordered_moves(tt_move, ply)
+        if not moves:
+            return (-MATE + ply if board.is_check() else 0), None
+
+        original_alpha = alpha
+        best_score, best_move = -INFINITY, None
+        for move in moves:
+            board.push(move)
+            score = -self.negamax(depth - 1, -beta, -alpha, ply + 1)[0]
+            board.pop()
+            if score > best_score:
+                best_score, best_move = score, move
+            alpha = max(alpha, score)
+            if alpha >= beta:
+                if not board.is_capture(move) and move not in self.killers[ply]:
+                    self.killers[ply] = [move] + self.killers[ply][:1]
+                break
+
+        if best_score <= original_alpha:
+            kind = UPPER
+        elif best_score >= beta:
+            kind = LOWER
+        else:
+            kind = EXACT
+        if len(transpositions) >= TT_SIZE:
+            transpositions.clear()
+        transpositions[key] = (depth, best_score, kind, best_move)
+        return best_score, best_move
+
+    def search(self, max_depth: int) -> Tuple[Optional[chess.Move], int, int]:
+        """Searches deeper and deeper until max_depth or the deadline, returns the best move, score and depth"""
+        best_move, best_score, completed = None, 0, 0
+        for depth in range(1, min(max_depth, MAX_DEPTH) + 1):
+            try:
+                score, move = self.negamax(depth, -INFINITY, INFINITY, 0)
+            except SearchTimeout:
+                break
+            if move is not None:
+                best_move, best_score, completed = move, score, depth
+            if abs(score) >= MATE - MAX_DEPTH:
+                break  # found a forced mate, searching deeper won't change the move
+        return best_move, best_score, completed
+
+
+def open_book(path: str) -> OpeningBook:
+    """Gets an opening book, which is only opened (memory mapped) the first time the process needs it"""
+    book = books.get(path)
+    if book is None:
+        book = books[path] = OpeningBook(path)
+    return book
+
+
+def search(
+    root_fen: str, moves: List[str], depth: Optional[int] = None, seconds: float = 5.0, book_path: str = None
+) -> SearchResult:
+    """
+    Finds the best move of the position after playing the moves (in UCI notation) from the root position
+
+    Plays a move from the opening book if there is one, otherwise searches until depth is reached or the time
+    is up (whichever comes first). This is what runs in the worker processes, so it can block as long as it needs to
+    """
+    start = time.monotonic()
+    board = Board(root_fen)
+    for uci in moves:
+        board.push_uci(uci)
+
+    if book_path:
+        move = open_book(book_path).weighted_choice(board)
+        if move:
+            return SearchResult(move.uci(), 0, 0, 0, time.monotonic() - start)
+
+    searcher = Searcher(board, deadline=start + seconds)
+    move, score, completed = searcher.search(depth or MAX_DEPTH)
+    if move is None:
+        move = next(iter(board.generate_legal_moves()))  # not even depth 1 was completed in time
+    return SearchResult(move.uci(), score, completed, searcher.nodes, time.monotonic() - start)
+
+
+class Engine:
+    """
+    The bot's chess engine. Searches run in a pool of worker processes, never on the event loop,
+    so a long search doesn't freeze the other games and commands
+    """
+
+    def __init__(self, workers: int = 2, max_seconds: float = 5.0, book_path: str = None):
+        self.max_seconds = max_seconds
+        self.book_path = book_path
+        self.executor = ProcessPoolExecutor(max_workers=workers)
+
+    async def best_move(self, board: chess.Board, depth: Optional[int] = None, seconds: float = None) -> SearchResult:
+        """
+        Searches the board's position until depth or the time limit, which can't be longer than max_seconds
+        """
+        seconds = min(seconds or self.max_seconds, self.max_seconds)
+        root_fen = board.root().fen()
+        moves = [move.uci() for move in board.move_stack]
+        return await asyncio.get_event_loop().run_in_executor(
+            self.executor, search, root_fen, moves, depth, seconds, self.book_path
+        )
+
+    def close(self):
+        self.executor.shutdown(wait=False)
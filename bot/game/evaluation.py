@@ -0,0 +1,185 @@
+"""
+Static evaluation of many positions at once with NumPy (an optional dependency: `poetry install -E evaluation`)
+
+A batch of positions is packed into a (positions, 12) array of piece bitboards, and every term is computed for
+the whole batch with array operations: material and piece-square tables (the same as bot.game.engine.evaluate),
+mobility and pawn structure. `evaluate` computes the same terms one position at a time in pure Python, it is the
+reference the batch evaluation must match
+"""
+from typing import List, Sequence, Tuple
+
+import chess
+import numpy as np
+
+from bot.game.board import Board
+from bot.game.engine import SQUARE_VALUES
+from bot.game.engine import evaluate as material
+
+# Piece types of the bitboards of Board._piece_bitboards (black pawns, white pawns, black knights, etc.)
+PLANES = [(piece_type, color) for piece_type in chess.PIECE_TYPES for color in (chess.BLACK, chess.WHITE)]
+
+# centipawns for each square attacked by a piece type (and not occupied by a piece of the same color)
+MOBILITY = {chess.KNIGHT: 4, chess.BISHOP: 5, chess.ROOK: 2, chess.QUEEN: 1}
+DOUBLED_PAWN = -10  # for each pawn on a file after the first
+ISOLATED_PAWN = -15  # for each pawn with no pawn of the same color on the files next to it
+PASSED_PAWN = [0, 5, 10, 20, 35, 60, 100, 0]  # by rank, from the pawn's side
+
+# value of each piece on each square for white (positive) and black (negative), in plane order: plane * 64 + square
+WEIGHTS = np.array([
+    (1 if color == chess.WHITE else -1) * SQUARE_VALUES[color][piece_type][square]
+    for piece_type, color in PLANES for square in chess.SQUARES
+], dtype=np.int64)
+
+POPCOUNT = np.array([bin(byte).count('1') for byte in range(256)], dtype=np.int64)
+FILES = np.array(chess.BB_FILES, dtype=np.uint64)
+RANKS = np.array(chess.BB_RANKS, dtype=np.uint64)
+NOT_A = np.uint64(~chess.BB_FILE_A & chess.BB_ALL)
+NOT_H = np.uint64(~chess.BB_FILE_H & chess.BB_ALL)
+NOT_AB = np.uint64(~(chess.BB_FILE_A | chess.BB_FILE_B) & chess.BB_ALL)
+NOT_GH = np.uint64(~(chess.BB_FILE_G | chess.BB_FILE_H) & chess.BB_ALL)
+ALL = np.uint64(chess.BB_ALL)
+
+# (shift, mask of the squares a piece can land on) of each move of a knight and each direction of the sliders
+KNIGHT_JUMPS = [(17, NOT_A), (15, NOT_H), (10, NOT_AB), (6, NOT_GH), (-6, NOT_AB), (-10, NOT_GH), (-15, NOT_A),
+                (-17, NOT_H)]
+ROOK_RAYS = [(8, ALL), (-8, ALL), (1, NOT_A), (-1, NOT_H)]
+BISHOP_RAYS = [(9, NOT_A), (7, NOT_H), (-7, NOT_A), (-9, NOT_H)]
+RAYS = {chess.BISHOP: BISHOP_RAYS, chess.ROOK: ROOK_RAYS, chess.QUEEN: BISHOP_RAYS + ROOK_RAYS}
+
+
+def plane(piece_type: int, color: bool) -> int:
+    return (piece_type - 1) * 2 + (color == chess.WHITE)
+
+
+# Pure Python reference, one position at a time
+
+def mobility(board: chess.Board) -> int:
+    """Squares attacked by each piece type (not counting the pieces of the same color), from white's point of view"""
+    score = 0
+    for color, sign in ((chess.WHITE, 1), (chess.BLACK, -1)):
+        for piece_type, weight in MOBILITY.items():
+            attacked = 0
+            for square in chess.scan_forward(board.pieces_mask(piece_type, color)):
+                attacked |= board.attacks_mask(square)
+            score += sign * weight * chess.popcount(attacked & ~board.occupied_co[color])
+    return score
+
+
+def pawn_structure(board: chess.Board) -> int:
+    """Doubled, isolated and passed pawns, from white's point of view"""
+    score = 0
+    for color, sign in ((chess.WHITE, 1), (chess.BLACK, -1)):
+        pawns = board.pieces_mask(chess.PAWN, color)
+        enemy_pawns = board.pieces_mask(chess.PAWN, not color)
+        counts = [chess.popcount(pawns & file) for file in chess.BB_FILES]
+        for square in chess.scan_forward(pawns):
+            file, rank = chess.square_file(square), chess.square_rank(square)
+            neighbours = [f for f in (file - 1, file + 1) if 0 <= f < 8]
+            if not any(counts[f] for f in neighbours):
+                score += sign * ISOLATED_PAWN
+            ahead = range(rank + 1, 8) if color == chess.WHITE else range(rank)
+            blockers = [chess.square(f, r) for f in [file] + neighbours for r in ahead]
+            if not any(enemy_pawns & chess.BB_SQUARES[blocker] for blocker in blockers):
+                score += sign * PASSED_PAWN[rank if color == chess.WHITE else 7 - rank]
+        score += sign * DOUBLED_PAWN * sum(count - 1 for count in counts if count > 1)
+    return score
+
+
+def terms(board: chess.Board) -> Tuple[int, int, int]:
+    """Material and piece-square tables, mobility and pawn structure of a position, from white's point of view"""
+    return material(board), mobility(board), pawn_structure(board)
+
+
+def evaluate(board: chess.Board) -> int:
+    """Static evaluation of a position in centipawns, from white's point of view"""
+    return sum(terms(board))
+
+
+# NumPy, every position of a batch at once
+
+def pack(boards: Sequence[Board]) -> np.ndarray:
+    """(positions, 12) piece bitboards of the boards, in Polyglot order"""
+    return np.array([board._piece_bitboards() for board in boards], dtype=np.uint64).reshape(-1, 12)
+
+
+def shift(bitboards: np.ndarray, amount: int) -> np.ndarray:
+    """Moves every square up (positive) or down (negative) by the amount, squares off the board are dropped"""
+    return bitboards << np.uint64(amount) if amount > 0 else bitboards >> np.uint64(-amount)
+
+
+def popcount(bitboards: np.ndarray) -> np.ndarray:
+    return POPCOUNT[bitboards.astype('<u8').view(np.uint8)].reshape(*bitboards.shape, 8).sum(axis=-1)
+
+
+def slide(pieces: np.ndarray, empty: np.ndarray, amount: int, mask: np.uint64) -> np.ndarray:
+    """Squares attacked by the pieces in one direction, up to and including the first piece (Kogge-Stone fill)"""
+    empty = empty & mask
+    pieces = pieces | (empty & shift(pieces, amount))
+    empty = empty & shift(empty, amount)
+    pieces = pieces | (empty & shift(pieces, 2 * amount))
+    empty = empty & shift(empty, 2 * amount)
+    pieces = pieces | (empty & shift(pieces, 4 * amount))
+    return shift(pieces, amount) & mask
+
+
+def batch_material(bitboards: np.ndarray) -> np.ndarray:
+    planes = np.unpackbits(bitboards.astype('<u8').view(np.uint8), axis=1, bitorder='little')
+    return planes.astype(np.int64) @ WEIGHTS
+
+
+def batch_mobility(bitboards: np.ndarray) -> np.ndarray:
+    occupied_co = {
+        color: np.bitwise_or.reduce(bitboards[:, [plane(piece, color) for piece in chess.PIECE_TYPES]], axis=1)
+        for color in chess.COLORS
+    }
+    empty = ~(occupied_co[chess.WHITE] | occupied_co[chess.BLACK])
+    score = np.zeros(len(bitboards), dtype=np.int64)
+    for color, sign in ((chess.WHITE, 1), (chess.BLACK, -1)):
+        for piece_type, weight in MOBILITY.items():
+            pieces = bitboards[:, plane(piece_type, color)]
+            attacked = np.zeros_like(pieces)
+            if piece_type == chess.KNIGHT:
+                for amount, mask in KNIGHT_JUMPS:
+                    attacked |= shift(pieces, amount) & mask
+            else:
+                for amount, mask in RAYS[piece_type]:
+                    attacked |= slide(pieces, empty, amount, mask)
+            score += sign * weight * popcount(attacked & ~occupied_co[color])
+    return score
+
+
+def batch_pawn_structure(bitboards: np.ndarray) -> np.ndarray:
+    score = np.zeros(len(bitboards), dtype=np.int64)
+    for color, sign in ((chess.WHITE, 1), (chess.BLACK, -1)):
+        pawns = bitboards[:, plane(chess.PAWN, color)]
+        enemy_pawns = bitboards[:, plane(chess.PAWN, not color)]
+        counts = popcount(pawns[:, None] & FILES)  # (positions, 8) pawns on each file
+        score += sign * DOUBLED_PAWN * np.maximum(counts - 1, 0).sum(axis=1)
+
+        # files with pawns next to them, as bitboards
+        occupied_files = np.where(counts > 0, FILES, np.uint64(0)).astype(np.uint64)
+        files = np.bitwise_or.reduce(occupied_files, axis=1)
+        supported = shift(files, 1) & NOT_A | shift(files, -1) & NOT_H
+        score += sign * ISOLATED_PAWN * popcount(pawns & ~supported)
+
+        # squares behind (from the enemy pawns' point of view, in front of) the enemy pawns and their files
+        step = -8 if color == chess.WHITE else 8
+        front = shift(enemy_pawns, step)
+        for amount in (step, 2 * step, 4 * step):
+            front |= shift(front, amount)
+        front |= shift(front, 1) & NOT_A | shift(front, -1) & NOT_H
+        passed = pawns & ~front
+        ranks = popcount(passed[:, None] & RANKS)  # (positions, 8) passed pawns on each rank
+        bonus = np.array(PASSED_PAWN if color == chess.WHITE else PASSED_PAWN[::-1], dtype=np.int64)
+        score += sign * ranks @ bonus
+    return score
+
+
+def batch_terms(bitboards: np.ndarray) -> np.ndarray:
+    """(positions, 3) material and piece-square tables, mobility and pawn structure, from white's point of view"""
+    return np.stack([batch_material(bitboards), batch_mobility(bitboards), batch_pawn_structure(bitboards)], axis=1)
+
+
+def evaluate_batch(boards: Sequence[Board]) -> List[int]:
+    """Static evaluation of each position, the same as evaluate, in centipawns from white's point of view"""
+    return batch_terms(pack(boards)).sum(axis=1).tolist()
@@ -0,0 +1,186 @@
+"""
+Matchmaking of the players who seek a game (`!seek [time control]`): seeks wait in a pool of their guild and time
+control, in the bucket of their rating, until a seek of a player whose rating is close enough comes
+
+How close is the seek's window, which widens the longer a seek waits. A new seek is only compared with the oldest
+seek of the buckets within its window (and waiting seeks are older, so their windows are wider), so pairing
+takes as long with 10 or 100k seeks queued. When waiting seeks will accept each other is known in advance, so
+matching them as their windows widen only looks at the pools where it is due
+"""
+import heapq
+import itertools
+from collections import OrderedDict
+from typing import Dict, Hashable, List, Optional, Tuple
+
+BUCKET_SIZE = 50  # rating points of a bucket
+WINDOW = 100  # rating difference accepted by a new seek
+WIDENING = 10  # rating points added to the window of a seek every second it waits
+MAX_WINDOW = 800
+
+PoolKey = Tuple[int, Hashable]  # (guild id, time control)
+
+
+class Seek:
+    """A player looking for an opponent in a guild, with the channel where they asked"""
+    __slots__ = ('guild_id', 'user_id', 'channel_id', 'time_control', 'rating', 'created', 'bucket', 'expiry')
+
+    def __init__(
+        self, guild_id: int, user_id: int, channel_id: int, time_control: Hashable, rating: float, created: float
+    ):
+        self.guild_id = guild_id
+        self.user_id = user_id
+        self.channel_id = channel_id
+        self.time_control = time_control  # None for games without clocks
+        self.rating = rating
+        self.created = created
+        self.bucket = 0
+        self.expiry = None  # timer that cancels the seek if nobody accepts it in time
+
+    @property
+    def pool(self) -> PoolKey:
+        return self.guild_id, self.time_control
+
+
+class Matchmaker:
+    """
+    Seeks by pool (guild and time control), then by rating bucket in the order they were made. Every player has
+    at most one seek in a guild, a new one replaces the previous one
+
+    Seeks are matched when a new one comes (`add`) and, since windows widen over time, by `widen`: every pool
+    with seeks in two buckets or more has the time when the oldest seeks of two neighbouring buckets will accept
+    each other, in a heap
+    """
+
+    def __init__(
+        self, bucket_size: int = BUCKET_SIZE, window: float = WINDOW, widening: float = WIDENING,
+        max_window: float = MAX_WINDOW
+    ):
+        self.bucket_size = bucket_size
+        self.initial_window = window
+        self.widening = widening
+        self.max_window = max_window
+        self._pools: Dict[PoolKey, Dict[int, 'OrderedDict[int, Seek]']] = {}
+        self._sizes: Dict[PoolKey, int] = {}
+        self._seeks: Dict[Tuple[int, int], Seek] = {}  # by (guild id, user id)
+        # (time, order, pool) when seeks of the pool will accept each other, entries whose time isn't the one of
+        # their pool in _due_at anymore are skipped
+        self._due: List[Tuple[float, int, PoolKey]] = []
+        self._due_at: Dict[PoolKey, float] = {}
+        self._order = itertools.count()
+
+    def __len__(self) -> int:
+        return len(self._seeks)
+
+    def get(self, guild_id: int, user_id: int) -> Optional[Seek]:
+        return self._seeks.get((guild_id, user_id))
+
+    def window(self, seek: Seek, now: float) -> float:
+        return min(self.initial_window + self.widening * (now - seek.created), self.max_window)
+
+    def reach(self, seek: Seek, now: float) -> int:
+        """How many buckets away from its own the seek accepts an opponent"""
+        return int((self.window(seek, now) + 1e-9) // self.bucket_size)
+
+    def add(self, seek: Seek, now: float) -> Optional[Seek]:
+        """
+        Matches a new seek with the oldest seek of the nearest bucket within its window, which is removed and
+        returned. The seek is queued if there is none
+        """
+        self.cancel(seek.guild_id, seek.user_id)
+        seek.bucket = int(seek.rating // self.bucket_size)
+        buckets = self._pools.get(seek.pool)
+        if buckets:
+            opponent = self._nearest(buckets, seek.bucket, self.reach(seek, now))
+            if opponent is not None:
+                self._remove(opponent)
+                return opponent
+        self._pools.setdefault(seek.pool, {}).setdefault(seek.bucket, OrderedDict())[seek.user_id] = seek
+        self._seeks[(seek.guild_id, seek.user_id)] = seek
+        self._sizes[seek.pool] = self._sizes.get(seek.pool, 0) + 1
+        self._schedule(seek.pool)
+        return None
+
+    @staticmethod
+    def _nearest(buckets: Dict[int, 'OrderedDict[int, Seek]'], bucket: int, reach: int) -> Optional[Seek]:
+        """The oldest seek of the nearest bucket, the oldest of the two when both sides are as near"""
+        for distance in range(reach + 1):
+            found = [
+                next(iter(buckets[other].values()))
+                for other in {bucket - distance, bucket + distance} if other in buckets
+            ]
+            if found:
+                return min(found, key=lambda seek: seek.created)
+        return None
+
+    def cancel(self, guild_id: int, user_id: int) -> Optional[Seek]:
+        """Removes the player's seek in the guild, which is returned, None if they had none"""
+        seek = self._seeks.get((guild_id, user_id))
+        if seek is not None:
+            self._remove(seek)
+        return seek
+
+    def _remove(self, seek: Seek, schedule: bool = True):
+        del self._seeks[(seek.guild_id, seek.user_id)]
+        buckets = self._pools[seek.pool]
+        bucket = buckets[seek.bucket]
+        del bucket[seek.user_id]
+        if not bucket:
+            del buckets[seek.bucket]
+        size = self._sizes[seek.pool] = self._sizes[seek.pool] - 1
+        if not size:
+            del self._pools[seek.pool], self._sizes[seek.pool]
+        if schedule:
+            self._schedule(seek.pool)
+        if seek.expiry is not None:
+            seek.expiry.cancel()
+
+    def _neighbours(self, pool: PoolKey) -> List[Tuple[Seek, Seek]]:
+        """The oldest seeks of each pair of neighbouring buckets of the pool, in the order of their ratings"""
+        buckets = self._pools.get(pool)
+        if not buckets or len(buckets) < 2:
+            return []
+        oldest = [next(iter(buckets[bucket].values())) for bucket in sorted(buckets)]
+        return list(zip(oldest, oldest[1:]))
+
+    def _schedule(self, pool: PoolKey):
+        """Sets when two seeks of the pool will accept each other, if they ever will"""
+        due = None
+        for seek, other in self._neighbours(pool):
+            difference = (other.bucket - seek.bucket) * self.bucket_size
+            if difference <= self.max_window:
+                when = max(seek.created, other.created) + max(difference - self.initial_window, 0) / self.widening
+                due = when if due is None else min(due, when)
+        if due is None:
+            self._due_at.pop(pool, None)
+        elif due != self._due_at.get(pool):
+            self._due_at[pool] = due
+            heapq.heappush(self._due, (due, next(self._order), pool))
+            if len(self._due) > 2 * len(self._due_at) + 64:  # drops the entries that were replaced
+                self._due = [(when, order, key) for when, order, key in self._due if self._due_at.get(key) == when]
+                heapq.heapify(self._due)
+
+    def widen(self, now: float) -> List[Tuple[Seek, Seek]]:
+        """
+        Matches the waiting seeks whose windows now accept each other (the oldest seeks of neighbouring buckets,
+        both windows must reach the other's bucket) in the pools where it is due, returns the pairs, which are
+        removed
+        """
+        pools = []
+        while self._due and self._due[0][0] <= now:
+            when, _, pool = heapq.heappop(self._due)
+            if self._due_at.get(pool) == when:
+                del self._due_at[pool]
+                pools.append(pool)
+        pairs = []
+        for pool in pools:
+            matched = set()
+            for seek, other in self._neighbours(pool):
+                if seek in matched or other in matched:
+                    continue
+                if other.bucket - seek.bucket <= min(self.reach(seek, now), self.reach(other, now)):
+                    pairs.append((seek, other))
+                    matched.update((seek, other))
+            for seek in matched:
+                self._remove(seek, schedule=False)
+            self._schedule(pool)  # if nothing was matched (the pool changed since it was due) or seeks are left
+        return pairs
@@ -0,0 +1,133 @@
+"""
+Parsing of the moves that players type in the chat
+"""
+import re
+from typing import Dict, List, Optional
+
+import chess
+
+SUFFIXES = '+#!? '
+SEPARATORS = str.maketrans('', '', 'x:-=')  # capture marks, dashes of long algebraic notation and castling, `=Q`
+
+# a move without separators: SAN (`Nf3`, `ed5`, `e8Q`), UCI (`g1f3`), long algebraic (`Ng1f3`) or castling (`OO`)
+MOVE_PATTERN = re.compile(
+    r'(?P<piece>[KQRBN])?(?P<file>[a-h])?(?P<rank>[1-8])?(?P<target>[a-h][1-8])(?P<promotion>[QRBNqrbn])?'
+    r'|(?P<castling>[O0o]{2,3})'
+)
+
+
+def normalize(text: str) -> str:
+    """
+    Removes surrounding spaces, check marks (`+`, `#`), annotations (`!`, `?`) and separators (`x`, `-`, `=`),
+    which aren't needed to know what the move is
+    """
+    return text.strip().rstrip(SUFFIXES).translate(SEPARATORS)
+
+
+def readings(text: str) -> List[str]:
+    """
+    Ways of reading a normalized move, a lowercase piece letter is also read as uppercase. A `b` is read
+    as the pawn's file and as a bishop (`bc3`, see MoveIndex.parse when both are legal), `b2c3` is only UCI
+    """
+    if text[:1] in ('k', 'q', 'r', 'n') or (text[:1] == 'b' and (len(text) == 3 or not MOVE_PATTERN.fullmatch(text))):
+        return [text, text[0].upper() + text[1:]]
+    return [text]
+
+
+def could_be_move(text: str) -> bool:
+    """
+    Cheap lexical check of whether a message could be a move at all, so that chat messages are ignored
+    without generating the position's legal moves
+    """
+    if len(text) > 16:
+        return False
+    return any(MOVE_PATTERN.fullmatch(reading) for reading in readings(normalize(text)))
+
+
+class MoveIndex:
+    """
+    The legal moves of a position by target square, each square's moves are generated once per ply (the first time
+    a move to it is parsed), so parsing a move only looks at the few legal moves which go to the square it names
+
+    Accepts SAN (`Nf3`, `exd5`, `e8=Q`), UCI (`g1f3`, `e7e8q`), long algebraic notation (`Ng1-f3`, `e2-e4`),
+    castling with letter O or zeros (`O-O`, `0-0-0`) and lowercase piece letters (`nf3`)
+    """
+
+    def __init__(self, board: chess.Board):
+        self.board = board
+        self._targets: Dict[int, List[chess.Move]] = {}
+        self.ambiguous: List[chess.Move] = []  # legal moves that the last parsed text could be, if more than one
+
+    def moves_to(self, square: int) -> List[chess.Move]:
+        """Legal moves to the square, only generated the first time they are needed in the position"""
+        moves = self._targets.get(square)
+        if moves is None:
+            mask = chess.BB_SQUARES[square]
+            moves = self._targets[square] = list(self.board.generate_legal_moves(to_mask=mask))
+            if mask & chess.BB_BACKRANKS:
+                # castling moves are filtered by the rook's square, not the one the king goes to (e1g1)
+                moves += [move for move in self.board.generate_castling_moves()
+                          if move.to_square == square and move not in moves]
+        return moves
+
+    def _castling(self, queenside: bool) -> Optional[chess.Move]:
+        board = self.board
+        for move in board.generate_castling_moves():
+            if board.is_queenside_castling(move) == queenside and board.is_legal(move):
+                return move
+        return None
+
+    def _find(self, match) -> Optional[chess.Move]:
+        """The only legal move which fits the parts of the match, None if there isn't exactly one"""
+        board = self.board
+        piece, file, rank, promotion = match.group('piece', 'file', 'rank', 'promotion')
+        promotion = chess.PIECE_SYMBOLS.index(promotion.lower()) if promotion else None
+        if piece:
+            piece_type = chess.PIECE_SYMBOLS.index(piece.lower())
+        elif file and rank:
+            piece_type = None  # UCI, any piece can be on the square
+        else:
+            piece_type = chess.PAWN
+
+        found = None
+        for move in self.moves_to(chess.SQUARE_NAMES.index(match.group('target'))):
+            if (
+                (file and chess.FILE_NAMES[chess.square_file(move.from_square)] != file)
+                or (rank and chess.RANK_NAMES[chess.square_rank(move.from_square)] != rank)
+                or move.promotion != promotion
+                or (piece_type and board.piece_type_at(move.from_square) != piece_type)
+            ):
+                continue
+            if found:
+                return None  # ambiguous, e.g. Nd2 when both knights can go there
+            found = move
+        return found
+
+    def parse(self, text: str) -> Optional[chess.Move]:
+        """
+        Gets the legal move written in text, None if it isn't one (or can't be a move at all), or if the text
+        reads as several legal moves and isn't the SAN of one of them: `bb4` or `bc4` when a pawn and a bishop
+        can both go there (`bxc4` is the pawn's SAN), the moves are then in `ambiguous`
+        """
+        self.ambiguous = []
+        if len(text) > 16:
+            return None
+        moves = []
+        for reading in readings(normalize(text)):
+            match = MOVE_PATTERN.fullmatch(reading)
+            if match is None:
+                continue
+            if match.group('castling'):
+                move = self._castling(queenside=len(match.group('castling')) == 3)
+            else:
+                move = self._find(match)
+            if move and move not in moves:
+                moves.append(move)
+        if len(moves) > 1:
+            written = text.strip().rstrip(SUFFIXES)
+            exact = [move for move in moves if self.board.san(move).rstrip('+#') == written]
+            if len(exact) == 1:
+                return exact[0]
+            self.ambiguous = moves
+            return None
+        return moves[0] if moves else None
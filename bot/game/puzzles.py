@@ -0,0 +1,303 @@
+"""
+Tactics puzzles of !puzzle, imported once from Lichess' puzzle database (https://database.lichess.org/#puzzles)
+into fixed-width records sorted by rating, with an index of the puzzles of each theme
+
+The records and the theme index are memory mapped, so every process of the bot shares the pages of the files
+that were read (the set is never loaded into memory) and a random pick is a lookup in the offsets of the
+rating buckets, then a single record read
+
+Usage (importing the puzzles): python -m bot.game.puzzles lichess_db_puzzle.csv -o puzzles
+"""
+import argparse
+import array
+import csv
+import json
+import mmap
+import os
+import random
+import struct
+import sys
+from typing import Dict, Iterable, List, Optional, Tuple
+
+import chess
+
+BUCKET_SIZE = 50  # rating points of a bucket
+MAX_MOVES = 16  # puzzles with longer solutions (the opponent's first move included) are left out
+MAX_THEMES = 128
+PICK_WINDOW = 100  # rating difference of the puzzles picked for a rating, wider if there are none that close
+DEFAULT_DEVIATION = 80  # of the puzzles that have none
+
+# id, board (a nibble per square), turn and castling rights, en passant file + 1, rating, deviation, number of moves,
+# moves (from square, to square and promotion), themes (a bit per theme of the store)
+RECORD = struct.Struct(f'<8s32sBBHHBx{MAX_MOVES}H16s')
+RATING_OFFSET = struct.calcsize('<8s32sBB')  # of the rating in a record
+INDEX_ENTRY = struct.Struct('<I')  # record number of a puzzle, in the index of its theme
+PIECE_NIBBLES = {symbol: index + 1 for index, symbol in enumerate('PNBRQK')}
+PIECE_NIBBLES.update({symbol.lower(): nibble | 8 for symbol, nibble in PIECE_NIBBLES.items()})
+PIECE_NIBBLES['.'] = 0  # empty square
+# two squares (a byte of the board) as text and back, empty squares are dots
+PAIR_BYTES = {first + second: PIECE_NIBBLES[first] | PIECE_NIBBLES[second] << 4 for first in PIECE_NIBBLES
+              for second in PIECE_NIBBLES}
+PAIRS = {byte: text for text, byte in PAIR_BYTES.items()}
+EXPAND = str.maketrans({str(empty): '.' * empty for empty in range(1, 9)})  # FEN's numbers of empty squares as dots
+CASTLING = 'KQkq'
+PROMOTIONS = {'n': chess.KNIGHT, 'b': chess.BISHOP, 'r': chess.ROOK, 'q': chess.QUEEN}
+
+
+class Puzzle:
+    """
+    A position and its solution: the first move is the opponent's, which leads to the position the player
+    has to solve, the player's moves and the opponent's replies come after it
+    """
+    __slots__ = ('number', 'id', 'fen', 'moves', 'rating', 'deviation', 'themes')
+
+    def __init__(
+        self, number: int, puzzle_id: str, fen: str, moves: List[chess.Move], rating: int, deviation: int,
+        themes: List[str]
+    ):
+        self.number = number  # of the record
+        self.id = puzzle_id
+        self.fen = fen
+        self.moves = moves
+        self.rating = rating
+        self.deviation = deviation
+        self.themes = themes
+
+    def board(self) -> chess.Board:
+        return chess.Board(self.fen)
+
+    @property
+    def url(self) -> str:
+        return f'https://lichess.org/training/{self.id}'
+
+
+def pack_board(fen: str) -> Tuple[bytes, int, int]:
+    """The board, turn and castling rights, and en passant file + 1 of a FEN, without building a chess.Board"""
+    placement, turn, castling, ep = fen.split()[:4]
+    squares = ''.join(reversed(placement.translate(EXPAND).split('/')))  # a character per square, from a1 to h8
+    board = bytes(PAIR_BYTES[squares[square:square + 2]] for square in range(0, 64, 2))
+    flags = (turn == 'w') | sum(2 << index for index, right in enumerate(CASTLING) if right in castling)
+    return board, flags, 0 if ep == '-' else ord(ep[0]) - ord('a') + 1
+
+
+def unpack_fen(board: bytes, flags: int, ep: int) -> str:
+    squares = ''.join(map(PAIRS.__getitem__, board))
+    placement = '/'.join(squares[rank * 8:rank * 8 + 8] for rank in range(7, -1, -1))
+    for empty in range(8, 0, -1):
+        placement = placement.replace('.' * empty, str(empty))
+    castling = ''.join(right for index, right in enumerate(CASTLING) if flags & 2 << index) or '-'
+    white = flags & 1
+    ep_square = f'{chr(ord("a") + ep - 1)}{6 if white else 3}' if ep else '-'
+    return f'{placement} {"w" if white else "b"} {castling} {ep_square} 0 1'
+
+
+def pack_move(uci: str) -> int:
+    from_square = (ord(uci[0]) - ord('a')) + (int(uci[1]) - 1) * 8
+    to_square = (ord(uci[2]) - ord('a')) + (int(uci[3]) - 1) * 8
+    return from_square | to_square << 6 | PROMOTIONS.get(uci[4:5], 0) << 12
+
+
+def unpack_move(packed: int) -> chess.Move:
+    return chess.Move(packed & 63, packed >> 6 & 63, (packed >> 12) or None)
+
+
+class PuzzleStore:
+    """
+    Reads the puzzles imported by `import_puzzles` from `path` (a folder), nothing if path is None
+
+    puzzles.dat has the records sorted by rating, so the puzzles of a range of ratings are a range of record
+    numbers (the offsets of each rating bucket are in puzzles.json). themes.idx has the record numbers of each
+    theme's puzzles, in order, with the offsets of each bucket too. Both files are memory mapped, like opening books
+    """
+
+    def __init__(self, path: Optional[str] = None):
+        self.path = path
+        self.records = self.index = None
+        self.buckets: List[int] = [0]  # record number where each bucket starts, and the number of records
+        self.themes: Dict[str, dict] = {}  # by name: its bit in the records and its offsets by bucket in the index
+        self._names: Dict[str, str] = {}  # theme names by their lowercase name
+        self._bits: List[str] = []  # theme names by bit
+        if path:
+            with open(os.path.join(path, 'puzzles.json')) as f:
+                header = json.load(f)
+            if header['record_size'] != RECORD.size or header['bucket_size'] != BUCKET_SIZE:
+                raise ValueError(f'{path} was imported with another record format, import it again')
+            self.buckets = header['buckets']
+            self.themes = header['themes']
+            self.records = self._map(os.path.join(path, 'puzzles.dat'))
+            self.index = self._map(os.path.join(path, 'themes.idx'))
+        self._names = {name.lower(): name for name in self.themes}
+        self._bits = [''] * MAX_THEMES
+        for name, theme in self.themes.items():
+            self._bits[theme['bit']] = name
+
+    @staticmethod
+    def _map(path: str) -> Optional[mmap.mmap]:
+        with open(path, 'rb') as f:
+            if not os.fstat(f.fileno()).st_size:
+                return None
+            return mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+
+    def __len__(self) -> int:
+        return self.buckets[-1]
+
+    def theme(self, name: str) -> Optional[str]:
+        """The name of a theme of the store, whatever its case (e.g. `matein2` is `mateIn2`), None if it has none"""
+        return self._names.get(name.lower())
+
+    def get(self, number: int) -> Puzzle:
+        """The puzzle of a record"""
+        puzzle_id, board, flags, ep, rating, deviation, length, *moves, themes = RECORD.unpack_from(
+            self.records, number * RECORD.size
+        )
+        names, bits = [], int.from_bytes(themes, 'little')
+        while bits:
+            names.append(self._bits[(bits & -bits).bit_length() - 1])
+            bits &= bits - 1
+        return Puzzle(
+            number, puzzle_id.rstrip(b'\0').decode(), unpack_fen(board, flags, ep),
+            [unpack_move(move) for move in moves[:length]], rating, deviation, names
+        )
+
+    def _range(self, starts: List[int], rating: float) -> Optional[Tuple[int, int]]:
+        """
+        The (start, stop) offsets of the buckets within PICK_WINDOW of the rating, widened one bucket at a time
+        on both sides while they are empty. None if every bucket is
+        """
+        if starts[-1] == starts[0]:
+            return None
+        last = len(starts) - 2
+        low = min(max(int((rating - PICK_WINDOW) // BUCKET_SIZE), 0), last)
+        high = min(max(int((rating + PICK_WINDOW) // BUCKET_SIZE), 0), last)
+        while starts[high + 1] == starts[low]:
+            low, high = max(low - 1, 0), min(high + 1, last)
+        return starts[low], starts[high + 1]
+
+    def pick(self, rating: float, theme: str = None, rng: random.Random = random) -> Optional[Puzzle]:
+        """
+        A random puzzle rated close to the rating, of a theme if given (see `theme`), None if there are none
+        """
+        if theme is None:
+            found = self._range(self.buckets, rating)
+            return self.get(rng.randrange(*found)) if found else None
+        offsets = self.themes[theme]['buckets']
+        found = self._range(offsets, rating)
+        if found is None:
+            return None
+        return self.get(INDEX_ENTRY.unpack_from(self.index, rng.randrange(*found) * INDEX_ENTRY.size)[0])
+
+    def close(self):
+        for mapped in (self.records, self.index):
+            if mapped is not None:
+                mapped.close()
+
+
+def read_csv(path: str) -> Iterable[dict]:
+    """Rows of Lichess' puzzle database (PuzzleId,FEN,Moves,Rating,RatingDeviation,...,Themes,...)"""
+    with open(path, newline='', encoding='utf-8') as f:
+        yield from csv.DictReader(f)
+
+
+def import_puzzles(rows: Iterable[dict], path: str) -> Tuple[int, int]:
+    """
+    Writes the puzzles of the rows to the folder, returns how many were imported and how many were left out
+
+    The records are written in the order of the rows first (puzzles.dat.tmp), while the buckets are counted, then
+    copied to their place in their bucket, so that the whole set is never held in memory
+    """
+    os.makedirs(path, exist_ok=True)
+    temporary = os.path.join(path, 'puzzles.dat.tmp')
+    counts: Dict[int, int] = {}
+    bits: Dict[str, int] = {}
+    imported = skipped = 0
+    with open(temporary, 'wb') as f:
+        for row in rows:
+            moves = row['Moves'].split()
+            if len(moves) > MAX_MOVES or len(moves) < 2:
+                skipped += 1
+                continue
+            themes = 0
+            for name in row.get('Themes', '').split():
+                if name not in bits and len(bits) < MAX_THEMES:
+                    bits[name] = len(bits)
+                if name in bits:
+                    themes |= 1 << bits[name]
+            rating = int(row['Rating'])
+            board, flags, ep = pack_board(row['FEN'])
+            packed = [pack_move(move) for move in moves]
+            f.write(RECORD.pack(
+                row['PuzzleId'].encode()[:8], board, flags, ep, rating,
+                int(row.get('RatingDeviation') or DEFAULT_DEVIATION), len(moves),
+                *packed, *[0] * (MAX_MOVES - len(packed)), themes.to_bytes(16, 'little')
+            ))
+            bucket = rating // BUCKET_SIZE
+            counts[bucket] = counts.get(bucket, 0) + 1
+            imported += 1
+
+    # record numbers where each bucket starts
+    buckets, start = [], 0
+    for bucket in range(max(counts, default=-1) + 1):
+        buckets.append(start)
+        start += counts.get(bucket, 0)
+    buckets.append(start)
+
+    # second pass: every record goes to the next free place of its bucket
+    free = list(buckets[:-1])
+    entries: Dict[Tuple[int, int], array.array] = {}  # record numbers by (theme bit, bucket), in order
+    with open(temporary, 'rb') as source, open(os.path.join(path, 'puzzles.dat'), 'w+b') as f:
+        f.truncate(imported * RECORD.size)
+        if imported:
+            records = mmap.mmap(f.fileno(), 0)
+            while True:
+                chunk = source.read(RECORD.size * 4096)
+                if not chunk:
+                    break
+                for offset in range(0, len(chunk), RECORD.size):
+                    record = chunk[offset:offset + RECORD.size]
+                    bucket = struct.unpack_from('<H', record, RATING_OFFSET)[0] // BUCKET_SIZE
+                    number = free[bucket]
+                    free[bucket] += 1
+                    records[number * RECORD.size:(number + 1) * RECORD.size] = record
+                    themes = int.from_bytes(record[-16:], 'little')
+                    while themes:
+                        bit = (themes & -themes).bit_length() - 1
+                        entries.setdefault((bit, bucket), array.array('I')).append(number)
+                        themes &= themes - 1
+            records.close()
+    os.remove(temporary)
+
+    themes, offset = {}, 0
+    with open(os.path.join(path, 'themes.idx'), 'wb') as f:
+        for name, bit in bits.items():
+            offsets = []
+            for bucket in range(len(buckets) - 1):
+                offsets.append(offset)
+                numbers = entries.pop((bit, bucket), None)
+                if numbers is not None:
+                    if sys.byteorder == 'big':
+                        numbers.byteswap()
+                    numbers.tofile(f)
+                    offset += len(numbers)
+            offsets.append(offset)
+            themes[name] = {'bit': bit, 'buckets': offsets}
+    with open(os.path.join(path, 'puzzles.json'), 'w') as f:
+        json.dump({
+            'record_size': RECORD.size, 'bucket_size': BUCKET_SIZE, 'buckets': buckets, 'themes': themes
+        }, f)
+    return imported, skipped
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('csv', help="Lichess' puzzle database, uncompressed (lichess_db_puzzle.csv)")
+    parser.add_argument('-o', '--output', required=True, help='folder of the imported puzzles (puzzles_path)')
+    args = parser.parse_args()
+    imported, skipped = import_puzzles(read_csv(args.csv), args.output)
+    print(
+        f'Imported {imported} puzzles to {args.output} '
+        f'({skipped} with no solution or more than {MAX_MOVES} moves left out)'
+    )
+
+
+if __name__ == '__main__':
+    main()
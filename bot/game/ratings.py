@@ -0,0 +1,172 @@
+"""
+Glicko-2 ratings (http://www.glicko.net/glicko/glicko2.pdf) and leaderboards kept in order in memory
+
+Every game is its own rating period: both players are rated right after it ends, against the ratings
+their opponent had before the game
+"""
+import bisect
+import math
+from typing import Dict, Iterable, List, Optional, Tuple
+
+DEFAULT_RATING = 1500.0
+DEFAULT_DEVIATION = 350.0
+DEFAULT_VOLATILITY = 0.06
+TAU = 0.5  # how much the volatility can change, 0.3 to 1.2 according to the paper
+SCALE = 173.7178  # between the Glicko and Glicko-2 scales
+EPSILON = 0.000001  # tolerance of the volatility's iteration
+
+Rating = Tuple[float, float, float]  # (rating, deviation, volatility)
+
+PAGE_SIZE = 10  # players in each page of a leaderboard
+
+
+def g(phi: float) -> float:
+    return 1 / math.sqrt(1 + 3 * phi ** 2 / math.pi ** 2)
+
+
+def rate(player: Rating, opponent: Rating, score: float) -> Rating:
+    """
+    The rating of the player after a game against the opponent, where the player scored 1 (win), 0.5 (draw) or 0
+    """
+    mu, phi, sigma = (player[0] - DEFAULT_RATING) / SCALE, player[1] / SCALE, player[2]
+    mu_j, phi_j = (opponent[0] - DEFAULT_RATING) / SCALE, opponent[1] / SCALE
+
+    g_j = g(phi_j)
+    expected = 1 / (1 + math.exp(-g_j * (mu - mu_j)))
+    v = 1 / (g_j ** 2 * expected * (1 - expected))
+    delta = v * g_j * (score - expected)
+
+    # new volatility, by the Illinois algorithm (step 5 of the paper)
+    a = math.log(sigma ** 2)
+
+    def f(x: float) -> float:
+        ex = math.exp(x)
+        return ex * (delta ** 2 - phi ** 2 - v - ex) / (2 * (phi ** 2 + v + ex) ** 2) - (x - a) / TAU ** 2
+
+    low = a
+    if delta ** 2 > phi ** 2 + v:
+        high = math.log(delta ** 2 - phi ** 2 - v)
+    else:
+        k = 1
+        while f(a - k * TAU) < 0:
+            k += 1
+        high = a - k * TAU
+    f_low, f_high = f(low), f(high)
+    while abs(high - low) > EPSILON:
+        c = low + (low - high) * f_low / (f_high - f_low)
+        f_c = f(c)
+        if f_c * f_high <= 0:
+            low, f_low = high, f_high
+        else:
+            f_low /= 2
+        high, f_high = c, f_c
+    sigma = math.exp(low / 2)
+
+    phi_star = math.sqrt(phi ** 2 + sigma ** 2)
+    phi = 1 / math.sqrt(1 / phi_star ** 2 + 1 / v)
+    mu += phi ** 2 * g_j * (score - expected)
+    return SCALE * mu + DEFAULT_RATING, min(SCALE * phi, DEFAULT_DEVIATION), sigma
+
+
+class SortedKeys:
+    """
+    Sorted list split into buckets of at most 2 * LOAD keys, so that adding or removing a key only moves the keys
+    of one bucket, and finding a key's position only sums the lengths of the buckets before it
+    """
+    LOAD = 1000
+
+    def __init__(self, keys: Iterable = ()):
+        keys = sorted(keys)
+        self.buckets: List[list] = [keys[i:i + self.LOAD] for i in range(0, len(keys), self.LOAD)]
+        self.maxes = [bucket[-1] for bucket in self.buckets]  # last key of each bucket
+        self.size = len(keys)
+
+    def __len__(self) -> int:
+        return self.size
+
+    def add(self, key):
+        self.size += 1
+        if not self.buckets:
+            self.buckets.append([key])
+            self.maxes.append(key)
+            return
+        index = min(bisect.bisect_left(self.maxes, key), len(self.buckets) - 1)
+        bucket = self.buckets[index]
+        bisect.insort(bucket, key)
+        self.maxes[index] = bucket[-1]
+        if len(bucket) > 2 * self.LOAD:
+            self.buckets.insert(index + 1, bucket[self.LOAD:])
+            del bucket[self.LOAD:]
+            self.maxes.insert(index, bucket[-1])
+
+    def remove(self, key):
+        """Removes a key, which must be in the list"""
+        index = bisect.bisect_left(self.maxes, key)
+        bucket = self.buckets[index]
+        del bucket[bisect.bisect_left(bucket, key)]
+        self.size -= 1
+        if bucket:
+            self.maxes[index] = bucket[-1]
+        else:
+            del self.buckets[index]
+            del self.maxes[index]
+
+    def index(self, key) -> int:
+        """Position of a key that is in the list"""
+        bucket = bisect.bisect_left(self.maxes, key)
+        return sum(map(len, self.buckets[:bucket])) + bisect.bisect_left(self.buckets[bucket], key)
+
+    def slice(self, start: int, stop: int) -> list:
+        """The keys from position start to stop (excluded)"""
+        keys = []
+        for bucket in self.buckets:
+            if start >= len(bucket):
+                start, stop = start - len(bucket), stop - len(bucket)
+                continue
+            keys += bucket[start:stop]
+            if stop <= len(bucket):
+                break
+            start, stop = 0, stop - len(bucket)
+        return keys
+
+
+class Leaderboard:
+    """
+    Players of a guild (or every guild) ordered by rating, updated one player at a time as games end
+
+    Ranks and pages are found in memory, so paging through the leaderboard never queries the database
+    """
+
+    def __init__(self, ratings: Iterable[Tuple[int, float]] = ()):
+        self.ratings: Dict[int, float] = dict(ratings)
+        self.keys = SortedKeys((-rating, user_id) for user_id, rating in self.ratings.items())
+
+    def __len__(self) -> int:
+        return len(self.keys)
+
+    def update(self, user_id: int, rating: float):
+        old = self.ratings.get(user_id)
+        if old == rating:
+            return
+        if old is not None:
+            self.keys.remove((-old, user_id))
+        self.ratings[user_id] = rating
+        self.keys.add((-rating, user_id))
+
+    def rank(self, user_id: int) -> Optional[int]:
+        """Position of the player in the leaderboard (1 is the best), None if they aren't rated"""
+        rating = self.ratings.get(user_id)
+        if rating is None:
+            return None
+        return self.keys.index((-rating, user_id)) + 1
+
+    def pages(self, size: int = PAGE_SIZE) -> int:
+        return max(1, math.ceil(len(self) / size))
+
+    def page(self, number: int, size: int = PAGE_SIZE) -> List[Tuple[int, int, float]]:
+        """(rank, user id, rating) of the players in a page of the leaderboard, the first page is 1"""
+        start = (number - 1) * size
+        return [
+            (rank, user_id, -rating)
+            for rank, (rating, user_id) in enumerate(self.keys.slice(start, start + size), start=start + 1)
+        ]
@@ -0,0 +1,101 @@
+"""
+Compact record of a game being played, which is what a game keeps between its moves instead of a Board
+
+A Board with its move stack keeps a snapshot of the position for every ply (tens of KiB for a long game), and
+the game waits for the next move most of the time. The record keeps the position as bitboards in an array, the
+moves at 16 bits each and the position keys of the plies that can still repeat, and builds a Board when a move
+has to be parsed or played (the position alone), or when the whole game is needed (its history, replayed)
+"""
+from array import array
+from collections import Counter
+from typing import List, Optional
+
+import chess
+
+from bot.game.board import Board
+
+NO_SQUARE = 64  # ep_square of a position without an en passant square
+
+
+def pack_move(move: chess.Move) -> int:
+    """A move in 16 bits: from square, to square and promotion piece type (0 without one)"""
+    return move.from_square | move.to_square << 6 | (move.promotion or 0) << 12
+
+
+def unpack_move(packed: int) -> chess.Move:
+    return chess.Move(packed & 63, packed >> 6 & 63, packed >> 12 or None)
+
+
+class GameRecord:
+    """
+    The moves of a game (from the standard starting position) and its current position, see the module's docstring
+
+    Only standard chess is supported, like Board. The position is never changed in place: `push` takes the Board
+    the move was pushed on (built by `board` or `replay`) and packs its new position
+    """
+    __slots__ = ('bitboards', 'turn', 'ep_square', 'halfmove_clock', 'fullmove_number', 'moves', 'keys')
+
+    def __init__(self, board: Board = None):
+        if board is None:
+            board = Board()
+        self.moves = array('H', (pack_move(move) for move in board.move_stack))
+        self._pack(board)
+        # position keys since the last capture or pawn move, the positions before it can't occur again
+        keys = [key for _, key in board._history] + [board.position_key]
+        self.keys = array('Q', keys[max(len(keys) - board.halfmove_clock - 1, 0):])
+
+    def __len__(self) -> int:
+        """Plies played"""
+        return len(self.moves)
+
+    def _pack(self, board: Board):
+        # pawns, knights, bishops, rooks, queens, kings, white pieces, black pieces and castling rights
+        self.bitboards = array('Q', (
+            board.pawns, board.knights, board.bishops, board.rooks, board.queens, board.kings,
+            board.occupied_co[chess.WHITE], board.occupied_co[chess.BLACK], board.castling_rights
+        ))
+        self.turn = board.turn
+        self.ep_square = NO_SQUARE if board.ep_square is None else board.ep_square
+        self.halfmove_clock = board.halfmove_clock
+        self.fullmove_number = board.fullmove_number
+
+    def push(self, board: Board, move: chess.Move):
+        """Records the move, which was just pushed on the board (a Board of the record's position before it)"""
+        self.moves.append(pack_move(move))
+        self._pack(board)
+        if not board.halfmove_clock:
+            del self.keys[:]
+        self.keys.append(board.position_key)
+
+    def board(self) -> Board:
+        """
+        A Board of the current position, without a move stack but with the repetitions of the positions since
+        the last irreversible move, which is enough to parse, play and check the next move
+        """
+        board = Board(None)
+        (
+            board.pawns, board.knights, board.bishops, board.rooks, board.queens, board.kings,
+            white, black, board.castling_rights
+        ) = self.bitboards
+        board.occupied_co[chess.WHITE], board.occupied_co[chess.BLACK] = white, black
+        board.occupied = white | black
+        board.turn = self.turn
+        board.ep_square = None if self.ep_square == NO_SQUARE else self.ep_square
+        board.halfmove_clock = self.halfmove_clock
+        board.fullmove_number = self.fullmove_number
+        board.clear_stack()  # hashes the position
+        board.repetitions = Counter(self.keys)
+        return board
+
+    def replay(self) -> Board:
+        """A Board with the whole game: every move played again from the starting position"""
+        board = Board()
+        for packed in self.moves:
+            board.push(unpack_move(packed))
+        return board
+
+    def last_move(self) -> Optional[chess.Move]:
+        return unpack_move(self.moves[-1]) if self.moves else None
+
+    def uci_moves(self) -> List[str]:
+        return [unpack_move(packed).uci() for packed in self.moves]
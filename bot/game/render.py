@@ -0,0 +1,247 @@
+import io
+from collections import OrderedDict
+from typing import Dict, Optional, Tuple
+
+import chess
+from PIL import Image, ImageDraw, ImageFont
+
+LIGHT_SQUARE = (240, 217, 181)
+DARK_SQUARE = (181, 136, 99)
+LIGHT_HIGHLIGHT = (205, 210, 106)
+DARK_HIGHLIGHT = (170, 162, 58)
+CHECK_HIGHLIGHT = (235, 97, 80)
+
+WHITE_FILL, WHITE_OUTLINE = (248, 248, 248), (20, 20, 20)
+BLACK_FILL, BLACK_OUTLINE = (35, 35, 35), (210, 210, 210)
+
+SUPERSAMPLE = 4  # pieces are drawn bigger and then scaled down, which gives smooth edges
+
+# Piece shapes, in coordinates relative to a 1x1 square: ('polygon', points) or ('ellipse'/'rectangle', box)
+BASE = ('polygon', [(0.2, 0.86), (0.8, 0.86), (0.76, 0.76), (0.24, 0.76)])
+PIECE_SHAPES = {
+    chess.PAWN: [
+        ('polygon', [(0.34, 0.76), (0.66, 0.76), (0.57, 0.46), (0.43, 0.46)]),
+        ('ellipse', (0.37, 0.22, 0.63, 0.48)),
+    ],
+    chess.KNIGHT: [
+        ('polygon', [
+            (0.3, 0.76), (0.72, 0.76), (0.68, 0.46), (0.62, 0.26), (0.5, 0.16), (0.45, 0.22),
+            (0.3, 0.3), (0.2, 0.46), (0.27, 0.52), (0.42, 0.44), (0.33, 0.6)
+        ]),
+    ],
+    chess.BISHOP: [
+        ('polygon', [(0.35, 0.76), (0.65, 0.76), (0.58, 0.58), (0.42, 0.58)]),
+        ('ellipse', (0.36, 0.25, 0.64, 0.62)),
+        ('ellipse', (0.45, 0.12, 0.55, 0.22)),
+    ],
+    chess.ROOK: [
+        ('rectangle', (0.32, 0.38, 0.68, 0.76)),
+        ('polygon', [
+            (0.27, 0.2), (0.35, 0.2), (0.35, 0.27), (0.45, 0.27), (0.45, 0.2), (0.55, 0.2),
+            (0.55, 0.27), (0.65, 0.27), (0.65, 0.2), (0.73, 0.2), (0.73, 0.38), (0.27, 0.38)
+        ]),
+    ],
+    chess.QUEEN: [
+        ('polygon', [(0.25, 0.76), (0.75, 0.76), (0.8, 0.28), (0.64, 0.5), (0.5, 0.2), (0.36, 0.5), (0.2, 0.28)]),
+        ('ellipse', (0.15, 0.2, 0.25, 0.3)),
+        ('ellipse', (0.45, 0.1, 0.55, 0.2)),
+        ('ellipse', (0.75, 0.2, 0.85, 0.3)),
+    ],
+    chess.KING: [
+        ('polygon', [(0.28, 0.76), (0.72, 0.76), (0.68, 0.4), (0.32, 0.4)]),
+        ('polygon', [(0.32, 0.4), (0.68, 0.4), (0.6, 0.3), (0.4, 0.3)]),
+        ('rectangle', (0.46, 0.08, 0.54, 0.3)),
+        ('rectangle', (0.38, 0.14, 0.62, 0.21)),
+    ],
+}
+
+
+def draw_piece(piece: chess.Piece, size: int) -> Image.Image:
+    """
+    Draws a single piece as a transparent (RGBA) square image of the given size
+    """
+    big = size * SUPERSAMPLE
+    image = Image.new('RGBA', (big, big), (0, 0, 0, 0))
+    draw = ImageDraw.Draw(image)
+    fill, outline = (WHITE_FILL, WHITE_OUTLINE) if piece.color == chess.WHITE else (BLACK_FILL, BLACK_OUTLINE)
+    width = max(1, big // 24)
+
+    for kind, coords in [BASE] + PIECE_SHAPES[piece.piece_type]:
+        if kind == 'polygon':
+            points = [(x * big, y * big) for x, y in coords]
+            draw.polygon(points, fill=fill)
+            draw.line(points + [points[0]], fill=outline, width=width, joint='curve')
+        else:
+            box = [c * big for c in coords]
+            getattr(draw, kind)(box, fill=fill, outline=outline, width=width)
+
+    return image.resize((size, size), Image.LANCZOS)
+
+
+class BoardRenderer:
+    """
+    Renders chess boards as PNG images, keeping the most recently rendered positions in memory
+
+    Images are cached by board placement plus every render option, so repeated positions
+    (openings, illegal move retries, draw offers, etc.) don't need to be drawn again.
+    Boards are put together from pre-drawn square tiles and encoded with a fixed palette,
+    which is a lot cheaper than drawing and encoding every image from scratch
+    """
+
+    def __init__(self, square_size: int = 60, cache_size: int = 1024, compress_level: int = 1):
+        self.square_size = square_size
+        self.cache_size = cache_size
+        self.compress_level = compress_level
+        self.hits = 0
+        self.misses = 0
+        self._cache: OrderedDict = OrderedDict()
+        self._sprites: Dict[str, Image.Image] = {}
+        self._tiles: Dict[Tuple, Image.Image] = {}
+        self._boards: Dict[bool, Image.Image] = {}
+        self._labels: Dict[bool, Image.Image] = {}
+        self._palette: Optional[Image.Image] = None
+        self._font = ImageFont.load_default()
+
+    @property
+    def hit_rate(self) -> float:
+        total = self.hits + self.misses
+        return self.hits / total if total else 0.0
+
+    def sprite(self, piece: chess.Piece) -> Image.Image:
+        """Gets the image of a piece, drawing it only the first time it is needed"""
+        symbol = piece.symbol()
+        sprite = self._sprites.get(symbol)
+        if sprite is None:
+            sprite = self._sprites[symbol] = draw_piece(piece, self.square_size)
+        return sprite
+
+    def tile(self, piece: Optional[chess.Piece], color: Tuple[int, int, int]) -> Image.Image:
+        """Gets the image of a square of the given color, with the piece (if any) drawn on it"""
+        key = (piece.symbol() if piece else None, color)
+        tile = self._tiles.get(key)
+        if tile is None:
+            tile = Image.new('RGB', (self.square_size, self.square_size), color)
+            if piece:
+                sprite = self.sprite(piece)
+                tile.paste(sprite, (0, 0), sprite)
+            self._tiles[key] = tile
+        return tile
+
+    def square_box(self, square: int, flipped: bool) -> Tuple[int, int]:
+        """Gets the top left corner (in pixels) of a square on the image"""
+        file, rank = chess.square_file(square), chess.square_rank(square)
+        x, y = (7 - file, rank) if flipped else (file, 7 - rank)
+        return x * self.square_size, y * self.square_size
+
+    @staticmethod
+    def square_color(square: int, highlighted: bool = False) -> Tuple[int, int, int]:
+        light = (chess.square_file(square) + chess.square_rank(square)) % 2 == 1
+        if highlighted:
+            return LIGHT_HIGHLIGHT if light else DARK_HIGHLIGHT
+        return LIGHT_SQUARE if light else DARK_SQUARE
+
+    def empty_board(self, flipped: bool) -> Image.Image:
+        """Gets the image of the empty board, which every render starts from a copy of"""
+        board = self._boards.get(flipped)
+        if board is None:
+            board = self._boards[flipped] = Image.new('RGB', (self.square_size * 8, self.square_size * 8))
+            for square in chess.SQUARES:
+                board.paste(self.tile(None, self.square_color(square)), self.square_box(square, flipped))
+        return board
+
+    def labels(self, flipped: bool) -> Image.Image:
+        """
+        Gets a transparent image with the file letters along the bottom row and the rank numbers along the left column
+        """
+        labels = self._labels.get(flipped)
+        if labels is None:
+            size = self.square_size
+            labels = self._labels[flipped] = Image.new('RGBA', (size * 8, size * 8), (0, 0, 0, 0))
+            draw = ImageDraw.Draw(labels)
+            for square in chess.SQUARES:
+                x, y = self.square_box(square, flipped)
+                # uses the color of the opposite square so that the label stands out
+                color = self.square_color(square ^ 1)
+                if y == size * 7:
+                    file_name = chess.FILE_NAMES[chess.square_file(square)]
+                    draw.text((x + size - 9, y + size - 13), file_name, fill=color, font=self._font)
+                if x == 0:
+                    rank_name = chess.RANK_NAMES[chess.square_rank(square)]
+                    draw.text((x + 2, y + 1), rank_name, fill=color, font=self._font)
+        return labels
+
+    def palette(self) -> Image.Image:
+        """
+        Gets the palette shared by every rendered image, made out of all the colors a board can have
+        """
+        if self._palette is None:
+            size = self.square_size
+            colors = [LIGHT_SQUARE, DARK_SQUARE, LIGHT_HIGHLIGHT, DARK_HIGHLIGHT, CHECK_HIGHLIGHT]
+            atlas = Image.new('RGB', (size * 13, size * (len(colors) + 8)))
+            for row, color in enumerate(colors):
+                for column, symbol in enumerate('PNBRQKpnbrqk'):
+                    atlas.paste(self.tile(chess.Piece.from_symbol(symbol), color), (column * size, row * size))
+            board = self.empty_board(False).copy()
+            board.paste(self.labels(False), (0, 0), self.labels(False))
+            atlas.paste(board, (0, size * len(colors)))
+            self._palette = atlas.quantize(colors=128)
+        return self._palette
+
+    @staticmethod
+    def render_options(board: chess.Board, flipped: bool = False, highlight: bool = True) -> Tuple:
+        """
+        Gets the cache key of a board: its placement FEN, orientation, last move and checked king square
+        """
+        last_move = check = None
+        if highlight:
+            if board.move_stack:
+                last_move = board.peek().uci()
+            if board.is_check():
+                check = board.king(board.turn)
+        return board.board_fen(), flipped, last_move, check
+
+    def render(self, board: chess.Board, flipped: bool = False, highlight: bool = True) -> bytes:
+        """
+        Renders the board as PNG bytes, from black's point of view if flipped is True
+
+        When highlight is True the squares of the last move and the king in check are highlighted
+        """
+        key = self.render_options(board, flipped, highlight)
+        png = self._cache.get(key)
+        if png is not None:
+            self.hits += 1
+            self._cache.move_to_end(key)
+            return png
+
+        self.misses += 1
+        png = self.draw(*key)
+        self._cache[key] = png
+        if len(self._cache) > self.cache_size:
+            self._cache.popitem(last=False)
+        return png
+
+    def draw(self, board_fen: str, flipped: bool, last_move: Optional[str], check: Optional[int]) -> bytes:
+        """Draws a board from its render options, without looking at the cache"""
+        buffer = io.BytesIO()
+        image = self.compose(board_fen, flipped, last_move, check).quantize(palette=self.palette(), dither=Image.NONE)
+        image.save(buffer, 'PNG', compress_level=self.compress_level)
+        return buffer.getvalue()
+
+    def compose(self, board_fen: str, flipped: bool, last_move: Optional[str], check: Optional[int]) -> Image.Image:
+        """Puts the (RGB) image of a board together from its render options"""
+        board = chess.BaseBoard(board_fen)
+        highlighted = set()
+        if last_move:
+            move = chess.Move.from_uci(last_move)
+            highlighted = {move.from_square, move.to_square}
+
+        image = self.empty_board(flipped).copy()
+        for square in highlighted.union(board.piece_map(), [] if check is None else [check]):
+            if square == check:
+                color = CHECK_HIGHLIGHT
+            else:
+                color = self.square_color(square, highlighted=square in highlighted)
+            image.paste(self.tile(board.piece_at(square), color), self.square_box(square, flipped))
+        labels = self.labels(flipped)
+        image.paste(labels, (0, 0), labels)
+        return image
@@ -0,0 +1,243 @@
+"""
+Animated GIF replays of finished games (`!replay <id>`), cached on disk by game id
+
+The first frame is the whole board, every frame after it only has the squares that changed since the previous ply
+(the move, the highlights it replaces and a king that is or was in check) and the caption with the move, the rest
+of it is transparent so the previous frame shows through. Squares are the tiles of a BoardRenderer quantized once to
+its palette, which is the GIF's only color table, so frames are never drawn or quantized as a whole
+"""
+import asyncio
+import io
+import os
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, Optional, Tuple
+
+import chess
+import chess.pgn
+from PIL import GifImagePlugin, Image, ImageChops, ImageDraw, ImageFont
+
+from bot.game.render import BLACK_FILL, CHECK_HIGHLIGHT, WHITE_FILL, BoardRenderer
+
+CAPTION_HEIGHT = 20  # pixels of the strip under the board with the last move
+FIRST_FRAME_MS = 1500
+FRAME_MS = 1000
+LAST_FRAME_MS = 5000
+TRANSPARENT = 255  # palette index of the pixels that didn't change, the board's palette has 128 colors at most
+CACHE_MB = 256
+CHANGES_CACHED = 4096  # tiles of the squares that changed, shared by the frames of every game
+
+SquareState = Tuple[Optional[str], Tuple[int, int, int]]  # piece symbol (None if empty) and color of a square
+
+
+def move_caption(ply: int, san: str) -> str:
+    """The move in the usual notation, e.g. `12. Nf3` or `12... Nf6`, ply 1 being white's first move"""
+    return f'{(ply + 1) // 2}{"." if ply % 2 else "..."} {san}'
+
+
+class ReplayEncoder:
+    """
+    Encodes games as animated GIFs, from black's point of view if flipped. Keeps the tiles of the squares
+    (quantized, with the file and rank labels of the squares on the edges) it used, for every game after
+    """
+
+    def __init__(self, renderer: BoardRenderer = None):
+        self.renderer = renderer or BoardRenderer()
+        palette = self.renderer.palette().getpalette()[:768]
+        self.palette = palette + [0] * (768 - len(palette))
+        self._squares: Dict[Tuple, Image.Image] = {}
+        self._changes: Dict[Tuple, Image.Image] = {}
+        self._font = ImageFont.load_default()
+
+    def square(self, square: int, flipped: bool, state: SquareState) -> Image.Image:
+        """The quantized tile of a square showing a piece (or nothing) on a color, labelled if it is on an edge"""
+        renderer = self.renderer
+        x, y = renderer.square_box(square, flipped)
+        labelled = x == 0 or y == renderer.square_size * 7
+        key = (square if labelled else None, flipped, state)
+        tile = self._squares.get(key)
+        if tile is None:
+            symbol, color = state
+            tile = renderer.tile(chess.Piece.from_symbol(symbol) if symbol else None, color)
+            if labelled:
+                size = renderer.square_size
+                labels = renderer.labels(flipped).crop((x, y, x + size, y + size))
+                tile = tile.copy()
+                tile.paste(labels, (0, 0), labels)
+            tile = self._squares[key] = tile.quantize(palette=renderer.palette(), dither=Image.NONE)
+        return tile
+
+    def change(self, square: int, flipped: bool, before: SquareState, after: SquareState) -> Image.Image:
+        """
+        The tile of a square that changed from `before` to `after`, with the pixels that stayed the same
+        transparent (e.g. the color around a piece that moved away)
+        """
+        key = (square, flipped, before, after)
+        tile = self._changes.get(key)
+        if tile is None:
+            old, new = self.square(square, flipped, before), self.square(square, flipped, after)
+            # palette indexes read as grey levels, the ones that are the same are 0 in the difference
+            same = ImageChops.difference(
+                Image.frombytes('L', old.size, old.tobytes()), Image.frombytes('L', new.size, new.tobytes())
+            ).point(lambda value: 255 if value == 0 else 0, '1')
+            tile = new.copy()
+            tile.paste(TRANSPARENT, (0, 0) + tile.size, same)
+            if len(self._changes) >= CHANGES_CACHED:
+                self._changes.clear()
+            tile = self._changes[key] = tile
+        return tile
+
+    def caption(self, text: str) -> Image.Image:
+        caption = Image.new('RGB', (self.renderer.square_size * 8, CAPTION_HEIGHT), BLACK_FILL)
+        ImageDraw.Draw(caption).text((6, (CAPTION_HEIGHT - 11) // 2), text, fill=WHITE_FILL, font=self._font)
+        return caption.quantize(palette=self.renderer.palette(), dither=Image.NONE)
+
+    def state(self, board: chess.Board) -> Dict[int, SquareState]:
+        """
+        What the squares that aren't empty, highlighted (the last move) or in check show, like
+        BoardRenderer.draw. The squares left out are empty on their usual color
+        """
+        highlighted = set()
+        if board.move_stack:
+            move = board.peek()
+            highlighted = {move.from_square, move.to_square}
+        check = board.king(board.turn) if board.is_check() else None
+        pieces = board.piece_map()
+        squares = {}
+        for square in highlighted.union(pieces, [] if check is None else [check]):
+            piece = pieces.get(square)
+            if square == check:
+                color = CHECK_HIGHLIGHT
+            else:
+                color = self.renderer.square_color(square, highlighted=square in highlighted)
+            squares[square] = (piece.symbol() if piece else None, color)
+        return squares
+
+    def encode(self, game: chess.pgn.Game, flipped: bool = False) -> bytes:
+        """The GIF of a game, a frame for its starting position and one for each move, with the move under it"""
+        size = self.renderer.square_size
+        width, height = size * 8, size * 8 + CAPTION_HEIGHT
+        headers = game.headers
+        board = game.board()
+        moves = list(game.mainline_moves())
+
+        state = self.state(board)
+        first = Image.new('P', (width, height))
+        first.putpalette(self.palette)
+        for square in chess.SQUARES:
+            tile_state = state.get(square, (None, self.renderer.square_color(square)))
+            first.paste(self.square(square, flipped, tile_state), self.renderer.square_box(square, flipped))
+        caption = self.caption(f'{headers.get("White", "?")} vs {headers.get("Black", "?")}')
+        first.paste(caption, (0, size * 8))
+        header, _ = GifImagePlugin.getheader(first, info={'loop': 0})
+        chunks = header + GifImagePlugin.getdata(first, duration=LAST_FRAME_MS if not moves else FIRST_FRAME_MS)
+
+        for ply, move in enumerate(moves, 1):
+            text = move_caption(ply, board.san(move))
+            board.push(move)
+            if ply == len(moves):
+                text += f'   {headers.get("Result", "*")} ({headers.get("Termination", "unknown")})'
+            previous, state = state, self.state(board)
+            changed = [square for square in state.keys() | previous.keys() if state.get(square) != previous.get(square)]
+            previous_caption, caption = caption, self.caption(text)
+            # the frame is the box around the changed squares and the part of the caption whose text changed
+            boxes = [self.renderer.square_box(square, flipped) + (size, size) for square in changed]
+            text_box = ImageChops.difference(caption, previous_caption).getbbox()
+            if text_box:
+                boxes.append((text_box[0], size * 8, text_box[2] - text_box[0], CAPTION_HEIGHT))
+            if not boxes:
+                boxes.append((0, 0, 1, 1))
+            left, top = min(box[0] for box in boxes), min(box[1] for box in boxes)
+            right, bottom = max(box[0] + box[2] for box in boxes), max(box[1] + box[3] for box in boxes)
+            frame = Image.new('P', (right - left, bottom - top), TRANSPARENT)
+            for square in changed:
+                x, y = self.renderer.square_box(square, flipped)
+                plain = (None, self.renderer.square_color(square))
+                tile = self.change(square, flipped, previous.get(square, plain), state.get(square, plain))
+                frame.paste(tile, (x - left, y - top))
+            if text_box:
+                frame.paste(caption, (-left, size * 8 - top))
+            chunks += GifImagePlugin.getdata(
+                frame, offset=(left, top), duration=LAST_FRAME_MS if ply == len(moves) else FRAME_MS,
+                disposal=1, transparency=TRANSPARENT
+            )
+        chunks.append(b';')  # trailer
+        return b''.join(chunks)
+
+
+class ReplayCache:
+    """
+    Replays on disk by game id and orientation. Once they take more than max_bytes, the least recently sent
+    ones are deleted. Finished games don't change, so a cached replay is never encoded again
+    """
+
+    def __init__(self, path: str, max_bytes: int = CACHE_MB * 2 ** 20):
+        self.path = path
+        self.max_bytes = max_bytes
+        self.hits = 0
+        self.misses = 0
+        os.makedirs(path, exist_ok=True)
+        # name -> size, least recently sent first (by modification time, which get updates, after a restart)
+        self.files: 'OrderedDict[str, int]' = OrderedDict()
+        entries = [entry for entry in os.scandir(path) if entry.name.endswith('.gif')]
+        for entry in sorted(entries, key=lambda entry: entry.stat().st_mtime):
+            self.files[entry.name] = entry.stat().st_size
+        self.size = sum(self.files.values())
+
+    @staticmethod
+    def name(game_id: int, flipped: bool) -> str:
+        return f'{game_id}-{"black" if flipped else "white"}.gif'
+
+    def get(self, game_id: int, flipped: bool) -> Optional[bytes]:
+        name = self.name(game_id, flipped)
+        if name in self.files:
+            try:
+                with open(os.path.join(self.path, name), 'rb') as f:
+                    data = f.read()
+                os.utime(os.path.join(self.path, name))
+                self.files.move_to_end(name)
+                self.hits += 1
+                return data
+            except OSError:  # deleted by hand
+                self.size -= self.files.pop(name)
+        self.misses += 1
+        return None
+
+    def put(self, game_id: int, flipped: bool, data: bytes):
+        name = self.name(game_id, flipped)
+        temporary = os.path.join(self.path, name + '.tmp')
+        with open(temporary, 'wb') as f:
+            f.write(data)
+        os.replace(temporary, os.path.join(self.path, name))
+        self.size += len(data) - self.files.pop(name, 0)
+        self.files[name] = len(data)
+        while self.size > self.max_bytes and len(self.files) > 1:
+            old, size = self.files.popitem(last=False)
+            self.size -= size
+            try:
+                os.remove(os.path.join(self.path, old))
+            except OSError:
+                pass
+
+
+class Replays:
+    """Encodes the replays that aren't cached yet, on a thread of its own so that the bot keeps responding"""
+
+    def __init__(self, path: str, max_bytes: int = CACHE_MB * 2 ** 20):
+        self.encoder = ReplayEncoder()
+        self.cache = ReplayCache(path, max_bytes)
+        self.executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix='replay')
+
+    def read_gif(self, game_id: int, pgn: str, flipped: bool = False) -> bytes:
+        gif = self.cache.get(game_id, flipped)
+        if gif is None:
+            gif = self.encoder.encode(chess.pgn.read_game(io.StringIO(pgn)), flipped)
+            self.cache.put(game_id, flipped, gif)
+        return gif
+
+    async def gif(self, game_id: int, pgn: str, flipped: bool = False) -> bytes:
+        """The replay of an archived game (its PGN), encoded and cached the first time it is asked for"""
+        return await asyncio.get_event_loop().run_in_executor(self.executor, self.read_gif, game_id, pgn, flipped)
+
+    def close(self):
+        self.executor.shutdown(wait=False)
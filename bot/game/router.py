@@ -0,0 +1,55 @@
+import asyncio
+from typing import Dict, Iterable, Tuple
+
+import discord
+
+RouteKey = Tuple[int, int, int]  # (guild id, channel id, player id)
+
+
+class GameRouter:
+    """
+    Sends every message to the inbox of the game its author is playing in that channel
+
+    Games are indexed by (guild, channel, player), so finding the game a message belongs to is a single
+    dict lookup no matter how many games are running, and messages that don't belong to any game are
+    dropped right away (unlike `bot.wait_for`, which runs the check of every waiting game on every message)
+    """
+
+    def __init__(self):
+        self._inboxes: Dict[RouteKey, asyncio.Queue] = {}
+
+    def __len__(self) -> int:
+        return len(self._inboxes)
+
+    def games(self) -> int:
+        """How many games are routed, each one has a single inbox shared by its players"""
+        return len({id(inbox) for inbox in self._inboxes.values()})
+
+    def is_playing(self, guild_id: int, channel_id: int, player_id: int) -> bool:
+        return (guild_id, channel_id, player_id) in self._inboxes
+
+    def open(self, guild_id: int, channel_id: int, player_ids: Iterable[int]) -> asyncio.Queue:
+        """
+        Registers a game between the players in a channel, returns the inbox that receives their messages
+        """
+        inbox = asyncio.Queue()
+        for player_id in player_ids:
+            self._inboxes[(guild_id, channel_id, player_id)] = inbox
+        return inbox
+
+    def close(self, guild_id: int, channel_id: int, player_ids: Iterable[int]):
+        """Removes a game, its players' messages in the channel are not routed anymore"""
+        for player_id in player_ids:
+            self._inboxes.pop((guild_id, channel_id, player_id), None)
+
+    def route(self, message: discord.Message) -> bool:
+        """
+        Puts the message in the inbox of its game, returns False if the message is not part of any game
+        """
+        if message.guild is None:
+            return False
+        inbox = self._inboxes.get((message.guild.id, message.channel.id, message.author.id))
+        if inbox is None:
+            return False
+        inbox.put_nowait(message)
+        return True
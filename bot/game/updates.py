@@ -0,0 +1,232 @@
+import asyncio
+import collections
+import datetime
+import logging
+from typing import Callable, Deque, Dict, List, Optional, Tuple
+
+import discord
+
+# (calls, seconds) allowed by each route of a channel, which are Discord's rate limit buckets for messages
+ROUTE_LIMITS = {'send': (5, 5.0), 'edit': (5, 5.0), 'delete': (5, 5.0)}
+GLOBAL_LIMIT = (50, 1.0)  # requests per second of the whole bot
+MAX_BULK_DELETE = 100
+BULK_DELETE_AGE = datetime.timedelta(days=13, hours=23)  # older messages can only be deleted one by one
+
+
+class RateLimit:
+    """
+    Sliding window of the calls made to a rate limited route, waiting keeps the route under its limit
+    instead of running into 429 responses
+    """
+
+    def __init__(self, calls: int, period: float):
+        self.calls = calls
+        self.period = period
+        self.times: Deque[float] = collections.deque()
+
+    def delay(self) -> float:
+        """Seconds until the next call can be made, 0 if it can be made right away"""
+        now = asyncio.get_event_loop().time()
+        while self.times and self.times[0] <= now - self.period:
+            self.times.popleft()
+        if len(self.times) < self.calls:
+            return 0
+        return self.times[0] + self.period - now
+
+    async def wait(self):
+        """Waits until a call can be made"""
+        delay = self.delay()
+        while delay > 0:
+            await asyncio.sleep(delay)
+            delay = self.delay()
+
+    def count(self):
+        """Counts a call that is being made"""
+        self.times.append(asyncio.get_event_loop().time())
+
+
+class Update:
+    """A pending API call: sending a message to the channel, or editing one of its messages"""
+
+    def __init__(self, route: str, target, fields: dict):
+        self.route = route
+        self.target = target  # channel that the message is sent to, or message that is edited
+        self.fields = fields
+        self.future: Optional[asyncio.Future] = asyncio.get_event_loop().create_future() if route == 'send' else None
+        self.cancelled = False
+
+
+class ChannelUpdates:
+    """
+    Outbound updates of one channel, made in order by a worker task which only runs while there are updates
+
+    - Edits of a message that is still waiting for its edit replace it, so only the latest state is sent
+    - Deletions are collected and made in bulk, after the sends and edits that are ready
+    - Each route waits for its own rate limit, so deletions don't hold back the next board
+    """
+
+    def __init__(
+        self, channel: discord.TextChannel, limits: Dict[str, RateLimit], global_limit: RateLimit,
+        on_idle: Callable[['ChannelUpdates'], None]
+    ):
+        self.channel = channel
+        self.limits = limits
+        self.global_limit = global_limit
+        self.on_idle = on_idle
+        self.pending: Deque[Update] = collections.deque()
+        self.edits: Dict[int, Update] = {}  # pending edits by message id
+        self.deletions: Dict[int, discord.Message] = {}
+        self.task: Optional[asyncio.Future] = None
+        self.calls: collections.Counter = collections.Counter()  # API calls made, by route
+
+    def __len__(self) -> int:
+        return len(self.pending) + len(self.deletions)
+
+    def push(self, update: Update):
+        self.pending.append(update)
+        self.start()
+
+    def edit(self, message: discord.Message, fields: dict):
+        if message.id in self.deletions:
+            return
+        previous = self.edits.pop(message.id, None)
+        if previous:
+            previous.cancelled = True
+            fields = {**previous.fields, **fields}
+        update = self.edits[message.id] = Update('edit', message, fields)
+        self.push(update)
+
+    def delete(self, message: discord.Message):
+        previous = self.edits.pop(message.id, None)
+        if previous:
+            previous.cancelled = True  # no need to edit a message that is going to be deleted
+        self.deletions[message.id] = message
+        self.start()
+
+    def start(self):
+        if self.task is None or self.task.done():
+            self.task = asyncio.ensure_future(self.run())
+
+    async def ready(self, route: str):
+        """Waits until both the route's rate limit and the global one allow a call"""
+        limit = self.limits[route]
+        while limit.delay() > 0 or self.global_limit.delay() > 0:
+            await limit.wait()
+            await self.global_limit.wait()
+
+    def count(self, route: str):
+        self.limits[route].count()
+        self.global_limit.count()
+        self.calls[route] += 1
+
+    async def call(self, route: str):
+        await self.ready(route)
+        self.count(route)
+
+    async def run(self):
+        while self.pending or self.deletions:
+            if self.pending:
+                # waits before taking the update, so it can still be replaced by a newer edit in the meantime
+                await self.ready(self.pending[0].route)
+                update = self.pending.popleft()
+                if update.cancelled:
+                    continue
+                self.count(update.route)
+                if update.route == 'edit':
+                    del self.edits[update.target.id]  # from now on a new edit has to be made again
+                    try:
+                        await update.target.edit(**update.fields)
+                    except discord.HTTPException as e:
+                        logging.warning(f'Failed to edit message {update.target.id}: {e}')
+                else:
+                    try:
+                        message = await update.target.send(**update.fields)
+                    except Exception as e:
+                        if not update.future.done():
+                            update.future.set_exception(e)
+                    else:
+                        if not update.future.done():
+                            update.future.set_result(message)
+            else:
+                await self.call('delete')
+                messages = list(self.deletions.values())[:MAX_BULK_DELETE]
+                for message in messages:
+                    del self.deletions[message.id]
+                await self.bulk_delete(messages)
+        self.on_idle(self)
+
+    async def bulk_delete(self, messages: List[discord.Message]):
+        """
+        Deletes the messages with a single call, messages too old for a bulk delete are deleted one by one
+        (discord.py deletes a single message with the normal route)
+        """
+        oldest = datetime.datetime.utcnow() - BULK_DELETE_AGE
+        recent = [message for message in messages if message.created_at > oldest]
+        try:
+            if recent:
+                await self.channel.delete_messages(recent)
+            for message in messages:
+                if message.created_at <= oldest:
+                    await self.call('delete')
+                    await message.delete()
+        except discord.HTTPException as e:
+            logging.warning(f'Failed to delete messages in channel {self.channel.id}: {e}')
+
+
+class UpdateQueue:
+    """
+    Sends, edits and deletes the bot's messages through one queue per channel
+
+    Edits and deletions don't have to be awaited, they are made as soon as the channel's rate limits allow.
+    Sends are awaited to get the message that was sent, and are made in order with the channel's edits
+    """
+
+    def __init__(self, route_limits: Dict[str, Tuple[int, float]] = None, global_limit: Tuple[int, float] = None):
+        self.route_limits = route_limits or ROUTE_LIMITS
+        self.global_limit = RateLimit(*(global_limit or GLOBAL_LIMIT))
+        self.channels: Dict[int, ChannelUpdates] = {}
+        self.calls: collections.Counter = collections.Counter()  # API calls made by idle channels, by route
+
+    def channel(self, channel: discord.TextChannel) -> ChannelUpdates:
+        updates = self.channels.get(channel.id)
+        if updates is None:
+            limits = {route: RateLimit(*limit) for route, limit in self.route_limits.items()}
+            updates = self.channels[channel.id] = ChannelUpdates(channel, limits, self.global_limit, self.forget)
+        return updates
+
+    def forget(self, updates: ChannelUpdates):
+        """
+        Called when a channel has nothing left to do, it is forgotten (so that idle channels don't take any memory)
+        once its rate limits have reset, unless it gets new updates until then
+        """
+        period = max(limit.period for limit in updates.limits.values())
+        asyncio.get_event_loop().call_later(period, self._forget, updates)
+
+    def _forget(self, updates: ChannelUpdates):
+        if self.channels.get(updates.channel.id) is not updates or len(updates) or not updates.task.done():
+            return
+        if all(limit.delay() == 0 and not limit.times for limit in updates.limits.values()):
+            self.calls.update(updates.calls)
+            del self.channels[updates.channel.id]
+
+    async def send(self, channel: discord.TextChannel, content: str = None, **fields) -> discord.Message:
+        update = Update('send', channel, {'content': content, **fields})
+        self.channel(channel).push(update)
+        return await update.future
+
+    def edit(self, message: discord.Message, **fields):
+        self.channel(message.channel).edit(message, fields)
+
+    def delete(self, message: discord.Message):
+        self.channel(message.channel).delete(message)
+
+    def total_calls(self) -> collections.Counter:
+        calls = collections.Counter(self.calls)
+        for updates in self.channels.values():
+            calls.update(updates.calls)
+        return calls
+
+    async def flush(self):
+        """Waits until every update that was queued has been made"""
+        while any(not updates.task.done() for updates in self.channels.values()):
+            await asyncio.gather(*[updates.task for updates in list(self.channels.values())])
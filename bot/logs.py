@@ -0,0 +1,105 @@
+"""
+The bot's logging pipeline: records are put on a queue by whoever logs them (usually the event loop) and written
+to disk by a background thread, as JSON lines in files that are rotated, so logging never waits for the disk
+
+Frequent events (e.g. moves) can be sampled: `logger.info('...', extra={'event': 'move', ...})` is only written
+for one record out of every 1 / rate of that event, see Sampler
+"""
+import collections
+import copy
+import datetime
+import json
+import logging
+import logging.handlers
+import queue
+from typing import Dict
+
+MAX_BYTES = 10 * 2 ** 20  # a log file is rotated once it is bigger than this
+BACKUPS = 5  # rotated files kept
+
+# attributes that every LogRecord has, the others were given with `extra` and are written as fields of the line
+RECORD_ATTRIBUTES = set(vars(logging.LogRecord('', 0, '', 0, '', (), None))) | {'message', 'asctime'}
+
+
+class JsonFormatter(logging.Formatter):
+    """A JSON object per record: time, level, logger, process, message and the fields given with `extra`"""
+
+    def format(self, record: logging.LogRecord) -> str:
+        line = {
+            'time': datetime.datetime.utcfromtimestamp(record.created).isoformat(timespec='milliseconds') + 'Z',
+            'level': record.levelname,
+            'logger': record.name,
+            'process': record.processName,
+            'message': record.getMessage(),
+        }
+        line.update((key, value) for key, value in vars(record).items() if key not in RECORD_ATTRIBUTES)
+        if record.exc_info:
+            record.exc_text = self.formatException(record.exc_info)
+        if record.exc_text:
+            line['exception'] = record.exc_text
+        return json.dumps(line, default=str)
+
+
+class RecordQueueHandler(logging.handlers.QueueHandler):
+    """
+    Puts records on the queue with their message and traceback rendered (their arguments might change or not be
+    picklable), but not formatted: QueueHandler would format them with the default formatter and put the
+    traceback in the message, the listener's JsonFormatter does the rest
+    """
+
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        record = copy.copy(record)
+        record.msg = record.message = record.getMessage()
+        record.args = None
+        if record.exc_info:
+            record.exc_text = logging.Formatter().formatException(record.exc_info)
+            record.exc_info = None
+        return record
+
+
+class Sampler(logging.Filter):
+    """
+    Keeps one record out of every 1 / rate of each sampled event (records logged with `extra={'event': ...}`),
+    a rate of 0 drops every record of the event. The records that are kept have a `sampled` field with how many
+    records each of them stands for, so that counts can be scaled back up
+    """
+
+    def __init__(self, rates: Dict[str, float]):
+        super().__init__()
+        self.every = {event: round(1 / rate) if rate > 0 else 0 for event, rate in rates.items() if rate < 1}
+        self.counts: collections.Counter = collections.Counter()
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        every = self.every.get(getattr(record, 'event', None))
+        if every is None:
+            return True
+        if not every:
+            return False
+        self.counts[record.event] += 1
+        if self.counts[record.event] % every:
+            return False
+        record.sampled = every
+        return True
+
+
+def setup_logging(
+    path: str, sampling: Dict[str, float] = None, level: int = logging.INFO, max_bytes: int = MAX_BYTES,
+    backups: int = BACKUPS
+) -> logging.handlers.QueueListener:
+    """
+    Sends every log record to a queue, which a background thread writes to `path` as JSON lines (rotated at
+    max_bytes). Returns the listener, which must be stopped before the process exits to write what is left
+    """
+    file_handler = logging.handlers.RotatingFileHandler(
+        path, maxBytes=max_bytes, backupCount=backups, encoding='utf-8', delay=True
+    )
+    file_handler.setFormatter(JsonFormatter())
+    records = queue.Queue()
+    handler = RecordQueueHandler(records)
+    handler.addFilter(Sampler(sampling or {}))  # before the queue, dropped records cost nothing more
+    root = logging.getLogger()
+    root.setLevel(level)
+    root.addHandler(handler)
+    listener = logging.handlers.QueueListener(records, file_handler)
+    listener.start()
+    return listener
@@ -0,0 +1,258 @@
+"""
+Counters, gauges and latency histograms of the bot's hot paths, exported in Prometheus' text format
+
+Recording is meant to stay on in production: a counter increment or a histogram observation is a dict lookup
+(only with labels), a bisect and an addition. The budget is RECORD_BUDGET seconds per recording, which
+`python -m benchmarks.metrics` checks: a move is recorded twice (parsing and rendering), while rendering the board
+and sending it take milliseconds
+"""
+import abc
+import asyncio
+import bisect
+import math
+import time
+from typing import Callable, Dict, Iterable, List, Optional, Tuple
+
+from aiohttp import web
+
+RECORD_BUDGET = 2e-6  # seconds that recording a value may take
+
+# upper bounds (in seconds) of the histograms' buckets, from 100 µs to 10 s
+LATENCY_BUCKETS = (0.0001, 0.00025, 0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+
+
+def escape(value: str) -> str:
+    return str(value).replace('\\', '\\\\').replace('\n', '\\n').replace('"', '\\"')
+
+
+def format_labels(names: Iterable[str], values: Iterable[str], extra: str = '') -> str:
+    pairs = [f'{name}="{escape(value)}"' for name, value in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return '{' + ','.join(pairs) + '}' if pairs else ''
+
+
+def format_value(value: float) -> str:
+    if value == math.inf:
+        return '+Inf'
+    return repr(float(value)) if isinstance(value, float) and not value.is_integer() else str(int(value))
+
+
+class Metric(abc.ABC):
+    kind = ''
+
+    def __init__(self, name: str, documentation: str, labels: Tuple[str, ...] = ()):
+        self.name = name
+        self.documentation = documentation
+        self.label_names = labels
+        self.children: Dict[Tuple[str, ...], object] = {}
+
+    def labels(self, *values: str):
+        """The metric of one combination of label values, kept so that recording it again is a dict lookup"""
+        child = self.children.get(values)
+        if child is None:
+            child = self.children[values] = self.new_child()
+        return child
+
+    @abc.abstractmethod
+    def new_child(self):
+        """The value of one combination of label values"""
+
+    @abc.abstractmethod
+    def samples(self) -> Iterable[Tuple[str, str, float]]:
+        """(suffix, labels, value) of every sample of the metric"""
+
+    def render(self) -> List[str]:
+        lines = [f'# HELP {self.name} {self.documentation}', f'# TYPE {self.name} {self.kind}']
+        lines += [f'{self.name}{suffix}{labels} {format_value(value)}' for suffix, labels, value in self.samples()]
+        return lines
+
+
+class CounterValue:
+    __slots__ = ('value',)
+
+    def __init__(self):
+        self.value = 0.0
+
+    def inc(self, amount: float = 1):
+        self.value += amount
+
+
+class Counter(Metric):
+    """A value that only goes up, e.g. how many API calls were made"""
+    kind = 'counter'
+
+    def __init__(self, name: str, documentation: str, labels: Tuple[str, ...] = ()):
+        super().__init__(name, documentation, labels)
+        self.inc = self.labels().inc if not labels else None  # counters without labels record directly
+
+    def new_child(self) -> CounterValue:
+        return CounterValue()
+
+    def total(self) -> float:
+        return sum(child.value for child in self.children.values())
+
+    def samples(self):
+        for values, child in self.children.items():
+            yield '', format_labels(self.label_names, values), child.value
+
+
+class Gauge(Metric):
+    """A value that goes up and down, read from a function when the metrics are exported"""
+    kind = 'gauge'
+
+    def __init__(self, name: str, documentation: str, function: Callable[[], float] = None):
+        super().__init__(name, documentation)
+        self.function = function or (lambda: 0)
+
+    def new_child(self) -> 'Gauge':
+        return self  # a gauge has no labels
+
+    def value(self) -> float:
+        return self.function()
+
+    def samples(self):
+        yield '', '', self.value()
+
+
+class HistogramValue:
+    __slots__ = ('bounds', 'counts', 'sum', 'count')
+
+    def __init__(self, bounds: Tuple[float, ...]):
+        self.bounds = bounds
+        self.counts = [0] * (len(bounds) + 1)  # observations of each bucket (not cumulative), the last one is +Inf
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, value: float):
+        self.counts[bisect.bisect_left(self.bounds, value)] += 1
+        self.sum += value
+        self.count += 1
+
+    def quantile(self, q: float) -> float:
+        """Estimates a quantile from the buckets, interpolating inside the bucket like Prometheus does"""
+        if not self.count:
+            return math.nan
+        rank, seen = q * self.count, 0
+        for index, count in enumerate(self.counts):
+            if seen + count >= rank and count:
+                if index == len(self.bounds):
+                    return self.bounds[-1]  # in the +Inf bucket, the largest known bound is the best estimate
+                lower = self.bounds[index - 1] if index else 0.0
+                return lower + (self.bounds[index] - lower) * (rank - seen) / count
+            seen += count
+        return self.bounds[-1]
+
+
+class Histogram(Metric):
+    """Counts observations (e.g. latencies) in buckets, to estimate their distribution"""
+    kind = 'histogram'
+
+    def __init__(
+        self, name: str, documentation: str, labels: Tuple[str, ...] = (), buckets: Tuple[float, ...] = LATENCY_BUCKETS
+    ):
+        super().__init__(name, documentation, labels)
+        self.buckets = tuple(buckets)
+        self.observe = self.labels().observe if not labels else None  # histograms without labels record directly
+
+    def new_child(self) -> HistogramValue:
+        return HistogramValue(self.buckets)
+
+    def time(self, *values: str) -> 'Timer':
+        """Context manager that observes how long its block took"""
+        return Timer(self.labels(*values))
+
+    def samples(self):
+        for values, child in self.children.items():
+            cumulative = 0
+            for bound, count in zip(self.buckets + (math.inf,), child.counts):
+                cumulative += count
+                le = f'le="{format_value(bound) if bound == math.inf else repr(float(bound))}"'
+                yield '_bucket', format_labels(self.label_names, values, le), cumulative
+            yield '_sum', format_labels(self.label_names, values), child.sum
+            yield '_count', format_labels(self.label_names, values), child.count
+
+
+class Timer:
+    __slots__ = ('histogram', 'start')
+
+    def __init__(self, histogram: HistogramValue):
+        self.histogram = histogram
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc_info):
+        self.histogram.observe(time.perf_counter() - self.start)
+
+
+class Registry:
+
+    def __init__(self):
+        self.metrics: Dict[str, Metric] = {}
+
+    def register(self, metric: Metric) -> Metric:
+        self.metrics[metric.name] = metric
+        return metric
+
+    def render(self) -> str:
+        """Every metric in Prometheus' text exposition format"""
+        lines = []
+        for metric in self.metrics.values():
+            lines += metric.render()
+        return '\n'.join(lines) + '\n'
+
+
+REGISTRY = Registry()
+COMMANDS = REGISTRY.register(Histogram(
+    'chessbot_command_seconds', 'Time to dispatch and run commands', labels=('command', 'status')
+))
+MOVE_PARSE = REGISTRY.register(Histogram('chessbot_move_parse_seconds', 'Time to parse and validate a typed move'))
+RENDER = REGISTRY.register(Histogram('chessbot_render_seconds', 'Time to render a board image'))
+API_CALLS = REGISTRY.register(Counter(
+    'chessbot_discord_api_calls_total', 'Requests made to the Discord API', labels=('method', 'route')
+))
+LOOP_LAG = REGISTRY.register(Histogram(
+    'chessbot_event_loop_lag_seconds', 'How late the event loop wakes up a task that sleeps'
+))
+ACTIVE_GAMES = REGISTRY.register(Gauge('chessbot_active_games', 'Games being played by this process'))
+
+
+async def monitor_loop_lag(interval: float = 0.5):
+    """Observes how late the event loop wakes this task up, every `interval` seconds"""
+    observe = LOOP_LAG.observe
+    while True:
+        start = time.perf_counter()
+        await asyncio.sleep(interval)
+        observe(max(0.0, time.perf_counter() - start - interval))
+
+
+async def serve(registry: Registry, host: str, port: int) -> web.AppRunner:
+    """Serves the metrics on http://host:port/metrics, for Prometheus to scrape"""
+    async def metrics(request: web.Request) -> web.Response:
+        return web.Response(
+            body=registry.render().encode(), headers={'Content-Type': 'text/plain; version=0.0.4; charset=utf-8'}
+        )
+
+    app = web.Application()
+    app.router.add_get('/metrics', metrics)
+    runner = web.AppRunner(app)
+    await runner.setup()
+    await web.TCPSite(runner, host, port).start()
+    return runner
+
+
+def summary(histogram: Histogram) -> Optional[str]:
+    """Count, p50 and p99 of a histogram (of every combination of labels together), None if it is empty"""
+    merged = HistogramValue(histogram.buckets)
+    for child in histogram.children.values():
+        merged.counts = [a + b for a, b in zip(merged.counts, child.counts)]
+        merged.count += child.count
+        merged.sum += child.sum
+    if not merged.count:
+        return None
+    return (
+        f'{merged.count} · p50 {merged.quantile(0.5) * 1000:.2f} ms · '
+        f'p99 {merged.quantile(0.99) * 1000:.2f} ms · mean {merged.sum / merged.count * 1000:.2f} ms'
+    )
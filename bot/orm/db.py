@@ -1,4 +1,7 @@
-import peewee
+from playhouse.pool import PooledPostgresqlDatabase, PooledSqliteDatabase  # noqa: F401
+
+# connections of the pool: one for each thread of the repository (bot.orm.repository), plus a few spare
+MAX_CONNECTIONS = 16
 
 # BASE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
 
@@ -9,13 +12,24 @@ import peewee
 #     print('Database credentials file not found (\'orm/db_credentials.json\')')
 #     sys.exit(1)
 
-# db = peewee.PostgresqlDatabase(
+# db = PooledPostgresqlDatabase(
 #     credentials['name'],
+#     max_connections=MAX_CONNECTIONS,
+#     stale_timeout=300,
 #     user=credentials['user'],
 #     password=credentials['password'],
 #     host=credentials['host'],
 #     port=credentials['port']
 # )
 
+# WAL and a busy timeout let the bot's processes (see `processes` in settings.json) share the database,
+# WAL also lets the repository's threads read while a write is in progress (and synchronous=normal is safe with it)
 # Uncomment the line below if you wish to use Sqlite instead of Postgres for the bot's database
-db = peewee.SqliteDatabase('bot.db')
+db = PooledSqliteDatabase(
+    'bot.db',
+    max_connections=MAX_CONNECTIONS,
+    stale_timeout=300,
+    timeout=10,  # seconds to wait for a free connection
+    check_same_thread=False,  # a connection given back to the pool may be checked out by another thread
+    pragmas={'journal_mode': 'wal', 'busy_timeout': 5000, 'synchronous': 'normal'}
+)
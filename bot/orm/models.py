@@ -1,13 +1,86 @@
-# import datetime
+import datetime
 
-# import peewee
-# from bot.orm.db import db
+import peewee
+from bot.orm.db import db
 
 
-# class ExampleModel(peewee.Model):
-#     example_number_field = peewee.BigIntegerField(null=True, unique=True)
-#     example_text_field = peewee.TextField()
-#     created = peewee.DateTimeField(default=datetime.datetime.now)
+class Game(peewee.Model):
+    guild_id = peewee.BigIntegerField()
+    channel_id = peewee.BigIntegerField()
+    white_id = peewee.BigIntegerField()
+    black_id = peewee.BigIntegerField()
+    result = peewee.CharField(max_length=7, null=True, index=True)  # '1-0', '0-1', '1/2-1/2', None while active
+    created = peewee.DateTimeField(default=datetime.datetime.now)
+    finished = peewee.DateTimeField(null=True)
 
-#     class Meta:
-#         database = db
+    class Meta:
+        database = db
+
+
+class Move(peewee.Model):
+    game = peewee.ForeignKeyField(Game, backref='moves', on_delete='CASCADE')
+    ply = peewee.IntegerField()  # 1 for white's first move, 2 for black's first move, etc.
+    uci = peewee.CharField(max_length=5)
+
+    class Meta:
+        database = db
+        indexes = (
+            (('game', 'ply'), True),
+        )
+
+
+class ActiveGame(peewee.Model):
+    """
+    Games being played right now and the process playing them, shared by every process of the bot
+    (each process only sees the guilds of its own shards)
+    """
+    game = peewee.ForeignKeyField(Game, primary_key=True, on_delete='CASCADE')
+    guild_id = peewee.BigIntegerField(index=True)
+    shard_id = peewee.IntegerField()
+    process = peewee.CharField(max_length=64)
+    started = peewee.DateTimeField(default=datetime.datetime.now)
+
+    class Meta:
+        database = db
+
+
+class Rating(peewee.Model):
+    """
+    Glicko-2 rating of a player in a guild, or in every guild (guild_id 0), updated when their rated games end
+    """
+    guild_id = peewee.BigIntegerField()
+    user_id = peewee.BigIntegerField()
+    rating = peewee.FloatField()
+    deviation = peewee.FloatField()
+    volatility = peewee.FloatField()
+    wins = peewee.IntegerField(default=0)
+    losses = peewee.IntegerField(default=0)
+    draws = peewee.IntegerField(default=0)
+    updated = peewee.DateTimeField(default=datetime.datetime.now)
+
+    class Meta:
+        database = db
+        indexes = (
+            (('guild_id', 'user_id'), True),
+            (('guild_id', 'rating', 'user_id'), False),  # the leaderboard of a guild, in order
+        )
+
+    @property
+    def games(self) -> int:
+        return self.wins + self.losses + self.draws
+
+
+class PuzzleRating(peewee.Model):
+    """
+    Glicko-2 rating of a player's puzzles (!puzzle), in every guild, rated against the puzzles' own ratings
+    """
+    user_id = peewee.BigIntegerField(unique=True)
+    rating = peewee.FloatField()
+    deviation = peewee.FloatField()
+    volatility = peewee.FloatField()
+    solved = peewee.IntegerField(default=0)
+    failed = peewee.IntegerField(default=0)
+    updated = peewee.DateTimeField(default=datetime.datetime.now)
+
+    class Meta:
+        database = db
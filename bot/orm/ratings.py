@@ -0,0 +1,137 @@
+import asyncio
+import datetime
+from typing import Dict, List, Optional
+
+from bot.game.ratings import (
+    DEFAULT_DEVIATION, DEFAULT_RATING, DEFAULT_VOLATILITY, Leaderboard, Rating as Glicko, rate
+)
+from bot.orm.models import Game, PuzzleRating, Rating
+from bot.orm.repository import Repository
+
+GLOBAL = 0  # guild_id of the ratings of every guild together
+SCORES = {'1-0': (1.0, 0.0), '0-1': (0.0, 1.0), '1/2-1/2': (0.5, 0.5)}  # (white's score, black's score)
+
+
+def rate_game(game_id: int, result: str) -> List[Rating]:
+    """
+    Updates the ratings of both players of a finished game, in their guild and globally, returns the updated rows
+
+    Must run in the transaction that saves the game's result, so that a game is rated once, together with its result
+    """
+    game = Game.get_by_id(game_id)
+    rated = []
+    for guild_id in (game.guild_id, GLOBAL):
+        query = Rating.select().where(
+            (Rating.guild_id == guild_id) & Rating.user_id.in_([game.white_id, game.black_id])
+        ).for_update(Rating._meta.database.for_update)  # locks the rows, where the database supports it
+        ratings = {row.user_id: row for row in query}
+        players = [
+            ratings.get(user_id) or Rating(
+                guild_id=guild_id, user_id=user_id,
+                rating=DEFAULT_RATING, deviation=DEFAULT_DEVIATION, volatility=DEFAULT_VOLATILITY
+            )
+            for user_id in (game.white_id, game.black_id)
+        ]
+        before = [(player.rating, player.deviation, player.volatility) for player in players]
+        for player, opponent, score in zip(players, reversed(before), SCORES[result]):
+            player.rating, player.deviation, player.volatility = rate(
+                (player.rating, player.deviation, player.volatility), opponent, score
+            )
+            if score == 1:
+                player.wins += 1
+            elif score == 0:
+                player.losses += 1
+            else:
+                player.draws += 1
+            player.updated = datetime.datetime.now()
+            player.save(force_insert=player.id is None)
+            rated.append(player)
+    return rated
+
+
+def rate_puzzle(user_id: int, puzzle: Glicko, solved: bool) -> PuzzleRating:
+    """Updates the puzzle rating of a player who solved (or failed) a puzzle rated `puzzle`, returns the row"""
+    player = PuzzleRating.select().where(PuzzleRating.user_id == user_id).for_update(
+        PuzzleRating._meta.database.for_update
+    ).first() or PuzzleRating(
+        user_id=user_id, rating=DEFAULT_RATING, deviation=DEFAULT_DEVIATION, volatility=DEFAULT_VOLATILITY
+    )
+    player.rating, player.deviation, player.volatility = rate(
+        (player.rating, player.deviation, player.volatility), puzzle, 1.0 if solved else 0.0
+    )
+    if solved:
+        player.solved += 1
+    else:
+        player.failed += 1
+    player.updated = datetime.datetime.now()
+    player.save(force_insert=player.id is None)
+    return player
+
+
+class RatingStore:
+    """
+    Players' ratings and the leaderboards of the guilds (and the global one)
+
+    A leaderboard is read from the database (in the order of its index) the first time it is needed, then kept
+    in line with the database by `update`, which gets every rating saved by the game store once it is committed.
+    With several processes, the global leaderboard of a process only moves with the games of its own shards
+    (guilds' leaderboards are always up to date, since a guild's games are all played by the same process)
+    """
+
+    def __init__(self, repository: Repository):
+        self.repository = repository
+        self.leaderboards: Dict[int, Leaderboard] = {}
+        self._loading: Dict[int, asyncio.Future] = {}
+        self._missed: Dict[int, List[Rating]] = {}  # ratings updated while their leaderboard was being read
+
+    def update(self, ratings: List[Rating]):
+        """Moves the players whose ratings were saved in the leaderboards of their guild and the global one"""
+        for rating in ratings:
+            leaderboard = self.leaderboards.get(rating.guild_id)
+            if leaderboard is not None:
+                leaderboard.update(rating.user_id, rating.rating)
+            elif rating.guild_id in self._loading:
+                self._missed.setdefault(rating.guild_id, []).append(rating)
+
+    @staticmethod
+    def _read_leaderboard(guild_id: int) -> Leaderboard:
+        query = (
+            Rating.select(Rating.user_id, Rating.rating).where(Rating.guild_id == guild_id)
+            .order_by(Rating.rating.desc(), Rating.user_id).tuples()
+        )
+        return Leaderboard(query.iterator())
+
+    async def _load(self, guild_id: int) -> Leaderboard:
+        try:
+            leaderboard = await self.repository.read(self._read_leaderboard, guild_id)
+        finally:
+            del self._loading[guild_id]
+            missed = self._missed.pop(guild_id, [])
+        for rating in missed:
+            leaderboard.update(rating.user_id, rating.rating)
+        self.leaderboards[guild_id] = leaderboard
+        return leaderboard
+
+    async def leaderboard(self, guild_id: int = GLOBAL) -> Leaderboard:
+        """The leaderboard of a guild (or the global one)"""
+        leaderboard = self.leaderboards.get(guild_id)
+        if leaderboard is not None:
+            return leaderboard
+        loading = self._loading.get(guild_id)
+        if loading is None:
+            loading = self._loading[guild_id] = asyncio.ensure_future(self._load(guild_id))
+        return await asyncio.shield(loading)  # a command that gets cancelled doesn't cancel the others' wait
+
+    async def rating(self, user_id: int, guild_id: int = GLOBAL) -> Optional[Rating]:
+        """The rating of a player in a guild (or globally), None if they haven't played a rated game there"""
+        return await self.repository.fetch_one(
+            Rating.select().where((Rating.guild_id == guild_id) & (Rating.user_id == user_id))
+        )
+
+    async def puzzle_rating(self, user_id: int) -> Optional[PuzzleRating]:
+        """The puzzle rating of a player, None if they haven't tried a puzzle yet"""
+        return await self.repository.fetch_one(PuzzleRating.select().where(PuzzleRating.user_id == user_id))
+
+    async def rate_puzzle(self, user_id: int, puzzle: Glicko, solved: bool) -> PuzzleRating:
+        """Rates a player's puzzle (its rating, deviation and volatility), returns their new puzzle rating"""
+        return await self.repository.write(rate_puzzle, user_id, puzzle, solved)
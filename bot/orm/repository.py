@@ -0,0 +1,76 @@
+import asyncio
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, List, Optional, Type, TypeVar
+
+import peewee
+from playhouse.pool import PooledDatabase
+
+from bot.orm.db import db
+
+T = TypeVar('T')
+
+
+class Repository:
+    """
+    Runs the bot's queries on threads, so that cogs can `await` them without blocking the event loop
+
+    Reads run on a bounded pool of `workers` threads, writes on a single thread of their own: they reach the
+    database in the order they were made, and SQLite (which has a single writer even in WAL mode) never makes
+    two of them wait for each other. With a pooled database, each query checks a connection out of the pool
+    and gives it back once done, so there are never more connections than threads
+    """
+
+    def __init__(self, database: peewee.Database = None, workers: int = 2):
+        self.database = database or db
+        self.readers = ThreadPoolExecutor(max_workers=workers, thread_name_prefix='db-read')
+        self.writer = ThreadPoolExecutor(max_workers=1, thread_name_prefix='db-write')
+        self.pooled = isinstance(self.database, PooledDatabase)
+
+    def _run(self, function: Callable[..., T], *args) -> T:
+        if not self.pooled:
+            return function(*args)  # peewee keeps a connection open on each thread
+        with self.database.connection_context():
+            return function(*args)
+
+    async def read(self, function: Callable[..., T], *args) -> T:
+        """Runs a function that reads from the database on one of the reading threads"""
+        return await asyncio.get_event_loop().run_in_executor(self.readers, self._run, function, *args)
+
+    async def write(self, function: Callable[..., T], *args) -> T:
+        """Runs a function that writes to the database on the writing thread, in a transaction"""
+        def atomic():
+            with self.transaction():
+                return function(*args)
+        return await asyncio.get_event_loop().run_in_executor(self.writer, self._run, atomic)
+
+    def transaction(self):
+        """
+        A transaction of the writing thread, SQLite's takes the write lock right away: a transaction that reads
+        and then writes (e.g. rating a game) can't be made to fail by another process' write in between
+        """
+        if isinstance(self.database, peewee.SqliteDatabase):
+            return self.database.atomic('IMMEDIATE')
+        return self.database.atomic()
+
+    async def fetch(self, query: peewee.Query) -> list:
+        """Every row of a select query"""
+        return await self.read(list, query)
+
+    async def fetch_one(self, query: peewee.Query) -> Optional[peewee.Model]:
+        """The first row of a select query, None if it has none"""
+        return await self.read(query.first)
+
+    async def execute(self, query: peewee.Query):
+        """Runs an insert, update or delete query, returns what peewee returns (e.g. the id or the row count)"""
+        return await self.write(query.execute)
+
+    async def create_tables(self, models: List[Type[peewee.Model]]):
+        """Creates the tables (and their indexes) that don't exist yet"""
+        await self.write(self.database.create_tables, models)
+
+    def close(self):
+        """Waits for the queries that were started and closes every connection"""
+        self.readers.shutdown(wait=True)
+        self.writer.shutdown(wait=True)
+        if self.pooled:
+            self.database.close_all()
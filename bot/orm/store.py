@@ -0,0 +1,180 @@
+import asyncio
+import datetime
+import logging
+from typing import Dict, List, Optional, Tuple
+
+import peewee
+
+from bot.orm.models import ActiveGame, Game, Move, Rating
+from bot.orm.ratings import RatingStore, rate_game
+from bot.orm.repository import Repository
+
+MAX_RETRY_SECONDS = 30  # longest wait between two attempts to write a batch that failed
+
+
+class GameStore:
+    """
+    Saves games and their moves to the database without blocking the event loop
+
+    Moves are not written one by one: they are buffered and inserted in a single transaction every
+    `batch_size` moves or every `flush_interval` seconds, whichever comes first (write-behind).
+    Queries run on the threads of the repository, whose single writing thread makes writes reach the database
+    in the order they were made. A batch that fails to be written is kept and written again, before the moves
+    buffered after it
+    """
+
+    def __init__(
+        self, batch_size: int = 20, flush_interval: float = 0.25, database: peewee.Database = None,
+        repository: Repository = None
+    ):
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.repository = repository or Repository(database or Game._meta.database)
+        self.database = self.repository.database
+        self.ratings = RatingStore(self.repository)
+        self._moves: List[Dict] = []
+        self._results: List[Tuple[int, str, bool]] = []
+        self._registrations: List[Dict] = []
+        self._full = asyncio.Event()
+        self._flushing = asyncio.Lock()  # one flush at a time, so a failed batch is retried before the next ones
+        self._closed = False
+
+    async def create_game(self, guild_id: int, channel_id: int, white_id: int, black_id: int) -> Game:
+        """Creates a game right away, since its id is needed to save its moves"""
+        # pending writes go first, so that games are always created after the ones before them were saved
+        await self.flush()
+        return await self.repository.write(lambda: Game.create(
+            guild_id=guild_id, channel_id=channel_id, white_id=white_id, black_id=black_id
+        ))
+
+    def add_move(self, game_id: int, ply: int, uci: str):
+        """Buffers a move to be saved on the next flush"""
+        self._moves.append({'game': game_id, 'ply': ply, 'uci': uci})
+        if len(self._moves) >= self.batch_size:
+            self._full.set()
+
+    def finish_game(self, game_id: int, result: str, rated: bool = False):
+        """
+        Buffers the result of a game to be saved on the next flush, together with its players' new ratings if rated
+        """
+        self._results.append((game_id, result, rated))
+        self._full.set()
+
+    def register_game(self, game: Game, shard_id: int, process: str):
+        """
+        Buffers the registration of a game that the process is playing, so that every process can find it
+        (replacing the registration of the process that played it before a restart)
+        """
+        self._registrations.append({
+            'game': game.id, 'guild_id': game.guild_id, 'shard_id': shard_id, 'process': process
+        })
+        self._full.set()
+
+    @staticmethod
+    def _register(registrations: List[Dict]) -> peewee.Insert:
+        """Inserts the registrations, replacing the ones of the same games (an upsert, for SQLite and PostgreSQL)"""
+        return ActiveGame.insert_many(registrations).on_conflict(
+            conflict_target=[ActiveGame.game],
+            preserve=[ActiveGame.guild_id, ActiveGame.shard_id, ActiveGame.process, ActiveGame.started]
+        )
+
+    @staticmethod
+    def _write(
+        moves: List[Dict], results: List[Tuple[int, str, bool]], registrations: List[Dict] = ()
+    ) -> List[Rating]:
+        if registrations:
+            GameStore._register(registrations).execute()
+        if moves:
+            Move.insert_many(moves).execute()
+        ratings = []
+        for game_id, result, rated in results:
+            Game.update(result=result, finished=datetime.datetime.now()).where(Game.id == game_id).execute()
+            ActiveGame.delete().where(ActiveGame.game == game_id).execute()
+            if rated:
+                ratings += rate_game(game_id, result)
+        return ratings
+
+    async def flush(self) -> int:
+        """
+        Writes every buffered move and result in one transaction, returns how many moves were written
+
+        If the transaction fails nothing was written, whatever the error: the batch is put back in front of the
+        buffers (to be written by the next flush) and the error is raised
+        """
+        async with self._flushing:
+            moves, self._moves = self._moves, []
+            results, self._results = self._results, []
+            registrations, self._registrations = self._registrations, []
+            self._full.clear()
+            if moves or results or registrations:
+                try:
+                    ratings = await self.repository.write(self._write, moves, results, registrations)
+                except asyncio.CancelledError:
+                    raise
+                except Exception:
+                    self._moves[:0] = moves
+                    self._results[:0] = results
+                    self._registrations[:0] = registrations
+                    self._full.set()
+                    raise
+                self.ratings.update(ratings)  # once committed, so the leaderboards never show unsaved ratings
+            return len(moves)
+
+    async def run(self):
+        """
+        Flushes the buffer whenever it is full or `flush_interval` seconds have passed, until closed. While writes
+        fail (e.g. the database is down), they are retried less and less often, up to every MAX_RETRY_SECONDS. No error
+        stops the loop, only closing the store or cancelling the task
+        """
+        failures = 0
+        while not self._closed:
+            try:
+                await asyncio.wait_for(self._full.wait(), self.flush_interval)
+            except asyncio.TimeoutError:
+                pass
+            try:
+                await self.flush()
+                failures = 0
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                failures += 1
+                delay = min(self.flush_interval * 2 ** failures, MAX_RETRY_SECONDS)
+                logging.exception(f'Error saving games to the database, retrying in {delay:.1f} s: {e!r}')
+                await asyncio.sleep(delay)
+
+    async def close(self):
+        """Stops the flush loop and writes whatever is still buffered"""
+        self._closed = True
+        self._full.set()
+        await self.flush()
+
+    def _active_games(self) -> List[Tuple[Game, List[str]]]:
+        games = Game.select().where(Game.result.is_null()).order_by(Game.id)
+        moves = Move.select().join(Game).where(Game.result.is_null()).order_by(Move.game, Move.ply)
+        game_moves = {game.id: (game, []) for game in games}
+        for move in moves:
+            game_moves[move.game_id][1].append(move.uci)
+        return list(game_moves.values())
+
+    async def active_games(self) -> List[Tuple[Game, List[str]]]:
+        """Gets every game that has not finished yet, together with its moves (in UCI notation) in order"""
+        return await self.repository.read(self._active_games)
+
+    def _registered_games(self, guild_id: Optional[int]) -> List[Tuple[ActiveGame, int]]:
+        query = ActiveGame.select(ActiveGame, Game).join(Game).order_by(ActiveGame.started)
+        if guild_id is not None:
+            query = query.where(ActiveGame.guild_id == guild_id)
+        plies = dict(
+            Move.select(Move.game, peewee.fn.COUNT(Move.id)).join(ActiveGame, on=(Move.game == ActiveGame.game))
+            .group_by(Move.game).tuples()
+        )
+        return [(active, plies.get(active.game_id, 0)) for active in query]
+
+    async def registered_games(self, guild_id: Optional[int] = None) -> List[Tuple[ActiveGame, int]]:
+        """
+        Gets the games being played by any process of the bot (of a guild, or of every guild),
+        with how many moves were saved for each
+        """
+        await self.flush()
+        return await self.repository.read(self._registered_games, guild_id)
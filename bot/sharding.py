@@ -0,0 +1,39 @@
+from typing import List
+
+import discord
+
+IDENTIFY_INTERVAL = 5.0  # seconds between the identifies of the bot's shards, Discord allows one every 5 seconds
+
+
+def shard_of(guild_id: int, shard_count: int) -> int:
+    """The shard that receives a guild's events"""
+    return (guild_id >> 22) % shard_count
+
+
+def shard_ranges(shard_count: int, processes: int) -> List[List[int]]:
+    """Splits the shards in one range for each process, sizes differ by one shard at most"""
+    size, extra = divmod(shard_count, processes)
+    ranges, start = [], 0
+    for index in range(processes):
+        end = start + size + (1 if index < extra else 0)
+        ranges.append(list(range(start, end)))
+        start = end
+    return ranges
+
+
+def process_name(shard_ids: List[int] = None) -> str:
+    """Name of the process that runs the shards, saved with the games it plays"""
+    if not shard_ids:
+        return 'main'
+    return f'shards {shard_ids[0]}-{shard_ids[-1]}' if len(shard_ids) > 1 else f'shard {shard_ids[0]}'
+
+
+async def recommended_shard_count(token: str) -> int:
+    """Asks Discord how many shards the bot should have"""
+    http = discord.http.HTTPClient()
+    try:
+        await http.static_login(token, bot=True)
+        shard_count, _ = await http.get_bot_gateway()
+    finally:
+        await http.close()
+    return shard_count
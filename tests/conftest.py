@@ -0,0 +1,28 @@
+import asyncio
+
+import peewee
+import pytest
+
+from bot.orm.models import ActiveGame, Game, Move, PuzzleRating, Rating
+
+MODELS = [Game, Move, ActiveGame, Rating, PuzzleRating]
+
+
+@pytest.fixture
+def loop():
+    """An event loop of the test's own, set as the current one (objects that need one take it when they are made)"""
+    loop = asyncio.new_event_loop()
+    asyncio.set_event_loop(loop)
+    yield loop
+    loop.close()
+    asyncio.set_event_loop(None)
+
+
+@pytest.fixture
+def database(tmpdir):
+    """The bot's tables in a SQLite database of a temporary folder"""
+    database = peewee.SqliteDatabase(str(tmpdir.join('bot.db')), pragmas={'journal_mode': 'wal'})
+    database.bind(MODELS)
+    database.create_tables(MODELS)
+    yield database
+    database.close()
@@ -0,0 +1,43 @@
+import os
+
+from bot.game.archive import ArchiveSet, GameArchive, pgn_text
+
+
+def pgn(game_id: int, white_id: int, black_id: int) -> str:
+    return pgn_text({'GameId': str(game_id), 'WhiteId': str(white_id), 'BlackId': str(black_id)}, ['e2e4', 'e7e5'])
+
+
+def archived(path: str, games: list) -> GameArchive:
+    archive = GameArchive(path)
+    for game_id, white_id, black_id in games:
+        archive.append_pgn(game_id, (white_id, black_id), pgn(game_id, white_id, black_id))
+    return archive
+
+
+def test_games_of_other_layouts_of_shards_are_found(tmpdir):
+    root = str(tmpdir)
+    # two processes of 2 shards each played games, then the bot runs as one process of 4 shards
+    archived(os.path.join(root, 'shards-0-1'), [(1, 10, 11), (3, 10, 12)]).close()
+    archived(os.path.join(root, 'shards-2-3'), [(2, 10, 13), (4, 12, 13)]).close()
+    archives = ArchiveSet(root, 'shards-0-3')
+    archives.archive.append_pgn(5, (10, 13), pgn(5, 10, 13))
+
+    for game_id, white_id, black_id in [(1, 10, 11), (2, 10, 13), (4, 12, 13), (5, 10, 13)]:
+        assert archives.read_pgn(game_id) == pgn(game_id, white_id, black_id)
+    assert archives.read_pgn(6) is None
+    assert archives.read_history(10, 3) == [pgn(5, 10, 13), pgn(3, 10, 12), pgn(2, 10, 13)]
+    assert archives.read_history(13, 10) == [pgn(5, 10, 13), pgn(4, 12, 13), pgn(2, 10, 13)]
+    archives.close()
+
+
+def test_games_archived_by_a_running_process_are_found(tmpdir):
+    root = str(tmpdir)
+    other = archived(os.path.join(root, 'shards-0-0'), [(1, 10, 11)])
+    archives = ArchiveSet(root, 'shards-1-1')
+    assert archives.read_history(10, 10) == [pgn(1, 10, 11)]
+
+    other.append_pgn(2, (12, 10), pgn(2, 12, 10))  # after the other archive was opened
+    assert archives.read_pgn(2) == pgn(2, 12, 10)
+    assert archives.read_history(10, 10) == [pgn(2, 12, 10), pgn(1, 10, 11)]
+    other.close()
+    archives.close()
@@ -0,0 +1,90 @@
+import random
+from typing import List
+
+import chess
+import chess.polyglot
+import pytest
+
+from bot.game.board import Board
+
+# Polyglot keys of the positions of the book format's specification, after each of the moves
+POLYGLOT_KEYS = [
+    ([], 0x463b96181691fc9c),
+    (['e2e4'], 0x823c9b50fd114196),
+    (['e2e4', 'd7d5'], 0x0756b94461c50fb0),
+    (['e2e4', 'd7d5', 'e4e5'], 0x662fafb965db29d4),
+    (['e2e4', 'd7d5', 'e4e5', 'f7f5'], 0x22a48b5a8e47ff78),  # en passant can be captured
+    (['e2e4', 'd7d5', 'e4e5', 'f7f5', 'e1e2'], 0x652a607ca3f242c1),
+    (['e2e4', 'd7d5', 'e4e5', 'f7f5', 'e1e2', 'e8f7'], 0x00fdd303c946bdd9),
+    (['a2a4', 'b7b5', 'h2h4', 'b5b4', 'c2c4'], 0x3c8123ea7b067637),
+    (['a2a4', 'b7b5', 'h2h4', 'b5b4', 'c2c4', 'b4c3', 'a1a3'], 0x5c3f9b829b279560),
+]
+
+
+def repetitive_game(seed: int, plies: int) -> List[chess.Move]:
+    """A random game that often plays back the move made two plies before, so that positions repeat"""
+    rng = random.Random(seed)
+    board = chess.Board()
+    while len(board.move_stack) < plies and not board.is_game_over():
+        moves = list(board.generate_legal_moves())
+        if len(board.move_stack) >= 2 and rng.random() < 0.4:
+            previous = board.move_stack[-2]
+            back = chess.Move(previous.to_square, previous.from_square)
+            if back in moves:
+                board.push(back)
+                continue
+        board.push(rng.choice(moves))
+    return board.move_stack
+
+
+@pytest.mark.parametrize('moves, key', POLYGLOT_KEYS)
+def test_polyglot_keys(moves, key):
+    board = Board()
+    for uci in moves:
+        board.push_uci(uci)
+    assert board.zobrist_hash() == key
+
+
+@pytest.mark.parametrize('seed', range(8))
+def test_matches_python_chess(seed):
+    board, reference = Board(), chess.Board()
+    for move in repetitive_game(seed, 200):
+        board.push(move)
+        reference.push(move)
+        assert board.zobrist_hash() == chess.polyglot.zobrist_hash(reference), reference.fen()
+        assert board.is_repetition(3) == reference.is_repetition(3), reference.fen()
+        assert board.can_claim_threefold_repetition() == reference.can_claim_threefold_repetition(), reference.fen()
+        assert board.is_drawn() == any([
+            reference.is_repetition(3), reference.can_claim_fifty_moves(),
+            reference.is_insufficient_material(), reference.is_stalemate()
+        ]), reference.fen()
+
+    # popping every move gives back the hashes of the previous positions
+    while board.move_stack:
+        board.pop()
+        reference.pop()
+        assert board.zobrist_hash() == chess.polyglot.zobrist_hash(reference), reference.fen()
+    assert board.repetitions == {board.position_key: 1}
+
+
+def test_threefold_repetition():
+    board = Board()
+    for uci in ['g1f3', 'g8f6', 'f3g1', 'f6g8'] * 2:
+        assert board.draw_reason() is None
+        board.push_uci(uci)
+    assert board.is_repetition(3)
+    assert board.draw_reason() == 'threefold repetition'
+    board.pop()
+    assert not board.is_repetition(3)
+    assert board.can_claim_threefold_repetition()  # by moving the knight back
+
+
+def test_copy_keeps_the_repetitions_of_its_stack():
+    board = Board()
+    for uci in ['g1f3', 'g8f6', 'f3g1', 'f6g8'] * 2:
+        board.push_uci(uci)
+    assert board.copy().is_repetition(3)
+    assert board.copy(stack=4).repetitions[board.position_key] == 2
+    position = board.copy(stack=False)
+    assert position.repetitions == {position.position_key: 1}
+    assert position.zobrist_hash() == board.zobrist_hash()
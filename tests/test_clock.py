@@ -0,0 +1,117 @@
+import asyncio
+from typing import Optional
+
+import chess
+import pytest
+
+from bot.game.clock import Clock, Scheduler, TimeControl, earliest, format_seconds, next_message
+
+
+def play_turn(loop, clock: Clock, idle_timeout: float, think: Optional[float]) -> str:
+    """
+    How the turn of the player to move ends, waited for like Chess.run_game does: the player moves after `think`
+    seconds (never if None)
+    """
+    scheduler = Scheduler()
+
+    async def turn():
+        inbox = asyncio.Queue()
+        if think is not None:
+            loop.call_later(think, inbox.put_nowait, 'e4')
+        deadline = earliest(loop.time() + idle_timeout, clock.flag_time())
+        message = await next_message(inbox, lambda message: True, scheduler, deadline)
+        if message is None or clock.flagged(loop.time()):
+            return 'flag fall' if clock.flagged(loop.time()) else 'abandoned'
+        clock.press(loop.time())
+        return 'moved'
+
+    result = loop.run_until_complete(turn())
+    assert len(scheduler) == 0 and scheduler.heap_size() == 0, 'timers left after the turn'
+    return result
+
+
+@pytest.mark.parametrize('text, base, increment', [('5+3', 300, 3), ('0.5+0', 30, 0), (' 10+0 ', 600, 0)])
+def test_time_control(text, base, increment):
+    assert TimeControl.parse(text) == (base, increment)
+    assert str(TimeControl.parse(text)) == text.strip()
+
+
+@pytest.mark.parametrize('text', ['5', '5+', '0+3', '181+0', '5+61', '-1+0', 'a+b'])
+def test_invalid_time_control(text):
+    with pytest.raises(ValueError):
+        TimeControl.parse(text)
+
+
+def test_clock_runs_for_the_player_to_move():
+    clock = Clock(TimeControl(60, 2))
+    clock.start(100)
+    assert clock.time_left(chess.WHITE, 110) == 50 and clock.time_left(chess.BLACK, 110) == 60
+    clock.press(110)  # white moved after 10 seconds, and gets the increment
+    assert clock.turn == chess.BLACK and clock.remaining[chess.WHITE] == 52
+    assert clock.flag_time() == 170
+    assert not clock.flagged(169.9) and clock.flagged(170)
+    assert format_seconds(clock.time_left(chess.BLACK, 161.5)) == '0:08.5'
+
+
+def test_flag_falls_before_the_idle_timeout(loop):
+    clock = Clock(TimeControl(0.05, 0))
+    clock.start(loop.time())
+    assert play_turn(loop, clock, idle_timeout=5, think=None) == 'flag fall'
+
+
+def test_idle_timeout_before_the_flag_falls(loop):
+    clock = Clock(TimeControl(60, 0))
+    clock.start(loop.time())
+    assert play_turn(loop, clock, idle_timeout=0.05, think=None) == 'abandoned'
+    assert not clock.flagged(loop.time())
+
+
+def test_move_in_time_stops_the_clock(loop):
+    clock = Clock(TimeControl(1, 0))
+    clock.start(loop.time())
+    assert play_turn(loop, clock, idle_timeout=5, think=0.02) == 'moved'
+    assert clock.turn == chess.BLACK and 0.5 < clock.remaining[chess.WHITE] < 1
+    # black doesn't move, and the idle timeout is later than their flag
+    assert play_turn(loop, clock, idle_timeout=5, think=None) == 'flag fall'
+    assert clock.remaining[chess.WHITE] > 0.5  # white's clock didn't run meanwhile
+
+
+def test_scheduler_calls_timers_in_order(loop):
+    scheduler = Scheduler()
+    called = []
+    now = loop.time()
+    for delay, name in [(0.03, 'c'), (0.01, 'a'), (0.02, 'b1'), (0.02, 'b2'), (0.01, 'cancelled')]:
+        timer = scheduler.schedule(now + delay, lambda timer, name=name: called.append(name))
+    timer.cancel()
+    loop.run_until_complete(asyncio.sleep(0.05))
+    assert called == ['a', 'b1', 'b2', 'c']
+    assert scheduler.called == 4 and len(scheduler) == 0 and scheduler.heap_size() == 0
+
+
+def test_cancelled_timers_dont_pile_up(loop):
+    scheduler = Scheduler()
+    now = loop.time()
+    kept = [scheduler.schedule(now + 60, print) for _ in range(10)]
+    for number in range(1000):
+        scheduler.schedule(now + 30 + number, print).cancel()
+        assert scheduler.heap_size() <= 2 * len(scheduler) + 1
+    assert len(scheduler) == len(kept)
+    for timer in kept:
+        timer.cancel()
+    assert scheduler.heap_size() == 0
+
+
+def test_timers_after_a_failed_callback_are_called(loop):
+    scheduler = Scheduler()
+    called = []
+
+    def fail(timer):
+        raise RuntimeError('the game is gone')
+
+    now = loop.time()
+    scheduler.schedule(now + 0.01, fail)
+    scheduler.schedule(now + 0.01, lambda timer: called.append('same time'))
+    scheduler.schedule(now + 0.03, lambda timer: called.append('later'))
+    loop.run_until_complete(asyncio.sleep(0.06))
+    assert called == ['same time', 'later']
+    assert len(scheduler) == 0
@@ -0,0 +1,112 @@
+import asyncio
+import math
+from types import SimpleNamespace
+from typing import List
+
+import discord
+
+from bot.errors import ErrorAggregator, send_digests
+
+
+def index_error():
+    return [][1]
+
+
+def key_error():
+    return {}['missing']
+
+
+def zero_division():
+    return 1 / 0
+
+
+SITES = [index_error, key_error, zero_division]
+
+
+def raised(site) -> Exception:
+    try:
+        site()
+    except Exception as e:
+        return e
+
+
+def reported(embeds: List[discord.Embed]) -> int:
+    """Errors counted by the digests, from their titles"""
+    return sum(int(embed.title.split()[0]) for embed in embeds)
+
+
+def test_errors_are_grouped_by_fingerprint():
+    errors = ErrorAggregator(samples=3)
+    for n in range(30):
+        errors.record(raised(SITES[n % len(SITES)]))
+    groups = errors.digest()
+    assert sorted(group.name for group in groups) == ['IndexError', 'KeyError', 'ZeroDivisionError']
+    assert [group.count for group in groups] == [10, 10, 10]
+    assert all(len(group.samples) == 3 for group in groups)
+    assert errors.find(groups[0].fingerprint[:4]) is groups[0]
+
+    errors.mark_reported(groups)
+    assert errors.digest() == []
+    errors.record(raised(key_error))
+    assert [(group.name, group.new, group.count) for group in errors.digest()] == [('KeyError', 1, 11)]
+
+
+def test_capacity_drops_the_least_recently_seen():
+    errors = ErrorAggregator(capacity=2)
+    for site in [index_error, key_error, index_error, zero_division]:
+        errors.record(raised(site))
+    assert [group.name for group in errors.recent()] == ['ZeroDivisionError', 'IndexError']
+    assert errors.dropped == 1
+
+
+def test_digests_are_bounded_by_the_intervals(loop):
+    interval, bursts, per_burst = 0.02, 10, 500
+    errors = ErrorAggregator()
+    embeds = []
+
+    async def send(embed):
+        embeds.append(embed)
+
+    async def run():
+        digests = asyncio.ensure_future(send_digests(errors, send, interval))
+        start = loop.time()
+        for n in range(bursts * per_burst):
+            errors.record(raised(SITES[n % len(SITES)]))
+            if n % per_burst == per_burst - 1:
+                await asyncio.sleep(interval / 2)
+        await asyncio.sleep(interval * 1.5)  # the last digest
+        digests.cancel()
+        await asyncio.wait([digests])
+        return loop.time() - start
+
+    elapsed = loop.run_until_complete(run())
+    assert 1 <= len(embeds) <= math.ceil(elapsed / interval)  # one message per error before
+    assert reported(embeds) == bursts * per_burst
+    assert errors.digest() == []
+
+
+def test_errors_of_a_digest_that_failed_are_in_the_next_one(loop):
+    interval = 0.01
+    errors = ErrorAggregator()
+    embeds = []
+
+    async def send(embed):
+        if not embeds:
+            embeds.append(None)
+            raise discord.HTTPException(SimpleNamespace(status=503, reason='Service Unavailable'), 'unavailable')
+        embeds.append(embed)
+
+    async def run():
+        for _ in range(5):
+            errors.record(raised(zero_division))
+        digests = asyncio.ensure_future(send_digests(errors, send, interval))
+        await asyncio.sleep(interval * 1.5)  # the first digest fails
+        errors.record(raised(key_error))
+        await asyncio.sleep(interval * 4)
+        digests.cancel()
+        await asyncio.wait([digests])
+
+    loop.run_until_complete(run())
+    assert embeds[0] is None
+    assert reported(embeds[1:]) == 6
+    assert errors.digest() == []
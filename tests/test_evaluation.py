@@ -0,0 +1,60 @@
+import random
+from typing import List
+
+import pytest
+
+from bot.game import engine
+from bot.game.board import Board
+
+pytest.importorskip('numpy')
+from bot.game import evaluation  # noqa: E402 (needs NumPy, the "evaluation" extra)
+
+# positions that random games rarely reach: promoted pieces, lone kings, blocked and doubled pawns
+FENS = [
+    '4k3/8/8/8/8/8/8/4K3 w - - 0 1',
+    '4k3/1Q6/8/8/8/8/6q1/4K3 b - - 0 60',
+    'r3k2r/pppq1ppp/2np1n2/2b1p3/2B1P3/2NP1N2/PPPQ1PPP/R3K2R w KQkq - 4 8',
+    '8/2p5/2p5/2P1k3/2P5/2P1K3/8/8 w - - 0 50',
+    'rnbqkbnr/ppp1p1pp/8/3pPp2/8/8/PPPP1PPP/RNBQKBNR w KQkq f6 0 3',
+]
+
+
+def random_positions(seed: int, count: int) -> List[Board]:
+    """Positions along random games, the same every time for the same seed"""
+    rng = random.Random(seed)
+    boards = []
+    while len(boards) < count:
+        board = Board()
+        for _ in range(rng.randint(1, 150)):
+            moves = list(board.legal_moves)
+            if not moves:
+                break
+            board.push(rng.choice(moves))
+            if rng.random() < 0.2:
+                boards.append(board.copy(stack=False))
+    return boards[:count]
+
+
+def check_parity(boards: List[Board]):
+    terms = evaluation.batch_terms(evaluation.pack(boards)).tolist()
+    assert len(terms) == len(boards)
+    for board, batch in zip(boards, terms):
+        reference = evaluation.terms(board)
+        assert tuple(batch) == reference, board.fen()
+        assert reference[0] == engine.evaluate(board), board.fen()
+
+
+@pytest.mark.parametrize('seed', range(4))
+def test_batch_matches_the_reference(seed):
+    check_parity(random_positions(seed, 200))
+
+
+@pytest.mark.parametrize('fen', FENS)
+def test_batch_matches_the_reference_in_special_positions(fen):
+    check_parity([Board(fen)])
+
+
+def test_evaluate_batch():
+    boards = random_positions(10, 50) + [Board(fen) for fen in FENS]
+    assert evaluation.evaluate_batch(boards) == [evaluation.evaluate(board) for board in boards]
+    assert evaluation.evaluate_batch([Board()]) == [0]  # the starting position is symmetrical
@@ -0,0 +1,32 @@
+import asyncio
+from types import SimpleNamespace
+
+from bot.cogs import matchmaking
+from bot.errors import ErrorAggregator
+from bot.game.matchmaking import Matchmaker, Seek
+
+
+def test_widening_goes_on_after_a_pair_fails_to_start(loop, monkeypatch):
+    monkeypatch.setattr(matchmaking, 'WIDEN_SECONDS', 0.01)
+    bot = SimpleNamespace(loop=loop, matchmaker=Matchmaker(widening=10000), errors=ErrorAggregator())
+    now = loop.time()
+    for guild_id in (1, 2, 3):  # the ratings are too far apart to be matched when the seeks are made
+        assert bot.matchmaker.add(Seek(guild_id, 10, 100, None, 1200, now), now) is None
+        assert bot.matchmaker.add(Seek(guild_id, 20, 100, None, 1800, now), now) is None
+    cog = matchmaking.Matchmaking(bot)
+    started = []
+
+    async def start_match(seek, other):
+        if seek.guild_id == 2:
+            raise RuntimeError('the guild is gone')
+        started.append(seek.guild_id)
+
+    cog.start_match = start_match
+    loop.run_until_complete(asyncio.sleep(0.1))
+    cog.cog_unload()
+    loop.run_until_complete(asyncio.wait([cog.widening]))
+
+    assert sorted(started) == [1, 3]
+    assert len(bot.matchmaker) == 0  # the pair that failed is dropped
+    assert [(group.name, group.count) for group in bot.errors.recent()] == [('RuntimeError', 1)]
+    assert cog.widening.cancelled()
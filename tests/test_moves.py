@@ -0,0 +1,51 @@
+import chess
+import pytest
+
+from bot.game.moves import MoveIndex, could_be_move
+
+PAWN_AND_BISHOP = '4k3/8/8/8/8/B7/1P6/7K w - - 0 1'  # b2-b4 and Ba3-b4 are legal
+CAPTURES = '4k3/8/8/8/8/2n5/1P6/4B2K w - - 0 1'  # bxc3 and Bxc3 are legal
+
+
+@pytest.mark.parametrize('text, uci', [
+    ('e4', 'e2e4'), ('e2e4', 'e2e4'), ('e2-e4', 'e2e4'), ('Nf3', 'g1f3'), ('nf3', 'g1f3'), ('Ng1-f3', 'g1f3'),
+    ('Nf3!?', 'g1f3'), ('e5', None), ('Nd2', None),
+])
+def test_parse(text, uci):
+    move = MoveIndex(chess.Board()).parse(text)
+    assert (move and move.uci()) == uci
+
+
+@pytest.mark.parametrize('fen, text, uci', [
+    (PAWN_AND_BISHOP, 'b4', 'b2b4'), (PAWN_AND_BISHOP, 'Bb4', 'a3b4'),
+    (CAPTURES, 'bxc3', 'b2c3'), (CAPTURES, 'Bxc3', 'e1c3'), (CAPTURES, 'bxc3+', 'b2c3'),
+])
+def test_san_of_a_pawn_or_a_bishop(fen, text, uci):
+    assert MoveIndex(chess.Board(fen)).parse(text).uci() == uci
+
+
+@pytest.mark.parametrize('fen, text, moves', [
+    (PAWN_AND_BISHOP, 'bb4', ['a3b4', 'b2b4']), (CAPTURES, 'bc3', ['b2c3', 'e1c3'])
+])
+def test_lowercase_bishop_move_that_a_pawn_can_make_is_ambiguous(fen, text, moves):
+    legal_moves = MoveIndex(chess.Board(fen))
+    assert legal_moves.parse(text) is None
+    assert sorted(move.uci() for move in legal_moves.ambiguous) == moves
+    assert legal_moves.parse('b4' if fen == PAWN_AND_BISHOP else 'Bxc3') is not None
+    assert legal_moves.ambiguous == []
+
+
+def test_lowercase_bishop_move_without_a_pawn_move():
+    board = chess.Board('4k3/8/8/8/8/8/3B4/4K3 w - - 0 1')
+    assert MoveIndex(board).parse('bb4').uci() == 'd2b4'
+
+
+def test_castling():
+    board = chess.Board('r3k2r/8/8/8/8/8/8/R3K2R w KQkq - 0 1')
+    assert MoveIndex(board).parse('O-O').uci() == 'e1g1'
+    assert MoveIndex(board).parse('0-0-0').uci() == 'e1c1'
+
+
+@pytest.mark.parametrize('text, expected', [('e4', True), ('bb4', True), ('hello', False), ('good game', False)])
+def test_could_be_move(text, expected):
+    assert could_be_move(text) == expected
@@ -0,0 +1,142 @@
+import asyncio
+import random
+from typing import List
+
+import chess
+import peewee
+import pytest
+
+from bot.game.board import Board
+from bot.orm.models import ActiveGame, Game, Move
+from bot.orm.store import GameStore
+
+
+def random_game(seed: int, plies: int) -> List[chess.Move]:
+    """Moves of a random game, the same every time for the same seed"""
+    rng = random.Random(seed)
+    board = chess.Board()
+    for _ in range(plies):
+        moves = list(board.legal_moves)
+        if not moves:
+            break
+        board.push(rng.choice(moves))
+    return board.move_stack
+
+
+def resumed_board(moves: List[str]) -> Board:
+    """The board of a resumed game, rebuilt like Chess.resume_games does"""
+    board = Board()
+    for uci in moves:
+        board.push_uci(uci)
+    return board
+
+
+def failing_once(store: GameStore, error: Exception = None):
+    """Makes the store's next write fail, like a database that went away for a moment by default"""
+    write = store.repository.write
+
+    async def fail(*args):
+        store.repository.write = write
+        raise error or peewee.OperationalError('database is locked')
+
+    store.repository.write = fail
+
+
+def test_resume_after_crash(loop, database):
+    games = [random_game(seed, 40) for seed in range(3)]
+    store = GameStore(batch_size=1000, database=database)
+    ids = [loop.run_until_complete(store.create_game(1, 1, 2 * n, 2 * n + 1)).id for n in range(len(games))]
+    for game_id, moves in zip(ids, games):
+        for ply, move in enumerate(moves[:25], start=1):
+            store.add_move(game_id, ply, move.uci())
+    assert loop.run_until_complete(store.flush()) == 75
+    for game_id, moves in zip(ids, games):
+        for ply, move in enumerate(moves[25:], start=26):
+            store.add_move(game_id, ply, move.uci())
+    store.repository.close()  # the process is killed: the moves buffered since the last flush are lost
+
+    resumed = loop.run_until_complete(GameStore(database=database).active_games())
+    assert [game.id for game, _ in resumed] == ids
+    for (game, moves), played in zip(resumed, games):
+        expected = Board()
+        for move in played[:25]:
+            expected.push(move)
+        assert resumed_board(moves).fen() == expected.fen()
+
+
+def test_failed_flush_is_written_by_the_next_one(loop, database):
+    moves = random_game(1, 30)
+    store = GameStore(batch_size=1000, database=database)
+    game = loop.run_until_complete(store.create_game(1, 1, 2, 3))
+    for ply, move in enumerate(moves[:20], start=1):
+        store.add_move(game.id, ply, move.uci())
+
+    failing_once(store)
+    with pytest.raises(peewee.OperationalError):
+        loop.run_until_complete(store.flush())
+    assert Move.select().count() == 0
+    for ply, move in enumerate(moves[20:], start=21):
+        store.add_move(game.id, ply, move.uci())
+    store.finish_game(game.id, '1/2-1/2')
+    assert loop.run_until_complete(store.flush()) == 30
+
+    saved = Move.select().where(Move.game == game.id).order_by(Move.ply)
+    assert [(move.ply, move.uci) for move in saved] == [(ply, move.uci()) for ply, move in enumerate(moves, start=1)]
+    assert Game.get_by_id(game.id).result == '1/2-1/2'
+    store.repository.close()
+
+
+@pytest.mark.parametrize('error', [peewee.OperationalError('database is locked'), ValueError('not a database error')])
+def test_run_retries_until_the_write_succeeds(loop, database, error):
+    store = GameStore(batch_size=1000, flush_interval=0.01, database=database)
+    game = loop.run_until_complete(store.create_game(1, 1, 2, 3))
+    task = loop.create_task(store.run())
+    failing_once(store, error)
+    store.add_move(game.id, 1, 'e2e4')
+    store.finish_game(game.id, '1-0')
+    loop.run_until_complete(asyncio.sleep(0.5))  # the first write fails, the one after the backoff is saved
+
+    assert [move.uci for move in Move.select()] == ['e2e4']
+    assert Game.get_by_id(game.id).result == '1-0'
+    loop.run_until_complete(store.close())
+    loop.run_until_complete(task)
+    store.repository.close()
+
+
+def test_failed_registration_is_written_by_the_next_flush(loop, database):
+    store = GameStore(database=database)
+    game = loop.run_until_complete(store.create_game(1, 1, 2, 3))
+    store.register_game(game, 0, 'shard 0')
+    failing_once(store)
+    with pytest.raises(peewee.OperationalError):
+        loop.run_until_complete(store.flush())
+    assert not ActiveGame.select().exists()
+
+    loop.run_until_complete(store.flush())
+    assert [(active.game_id, active.process) for active in ActiveGame.select()] == [(game.id, 'shard 0')]
+    store.finish_game(game.id, '0-1')
+    loop.run_until_complete(store.flush())
+    assert not ActiveGame.select().exists()
+    store.repository.close()
+
+
+def test_registration_replaces_the_one_of_the_same_game(loop, database):
+    store = GameStore(database=database)
+    game = loop.run_until_complete(store.create_game(1, 1, 2, 3))
+    store.register_game(game, 0, 'shard 0')
+    loop.run_until_complete(store.flush())
+    store.register_game(game, 1, 'shards 1-2')  # played by another process after a restart
+    loop.run_until_complete(store.flush())
+    assert [(active.game_id, active.shard_id, active.process) for active in ActiveGame.select()] == [
+        (game.id, 1, 'shards 1-2')
+    ]
+    store.repository.close()
+
+
+def test_registration_is_an_upsert_on_postgresql():
+    database = peewee.PostgresqlDatabase('chessbot')  # only builds the SQL, never connects
+    registration = {'game': 1, 'guild_id': 2, 'shard_id': 0, 'process': 'shard 0'}
+    with database.bind_ctx([ActiveGame, Game]):
+        sql, _ = GameStore._register([registration]).sql()
+    assert 'ON CONFLICT ("game_id") DO UPDATE SET' in sql
+    assert '"process" = EXCLUDED."process"' in sql